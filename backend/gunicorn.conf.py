@@ -0,0 +1,30 @@
+# gunicorn.conf.py
+
+"""
+Gunicorn configuration for the NoorTime backend.
+
+Prometheus metrics run in multiprocess mode: each worker writes its samples to
+files in PROMETHEUS_MULTIPROC_DIR, and /api/metrics aggregates them (see
+project.metrics.get_metrics_registry), so a scrape sees all workers rather than
+whichever one answered it.
+"""
+
+import os
+import shutil
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+
+
+def on_starting(server):
+    # Samples left over from a previous run would be added to this run's totals.
+    multiproc_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if multiproc_dir:
+        shutil.rmtree(multiproc_dir, ignore_errors=True)
+        os.makedirs(multiproc_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
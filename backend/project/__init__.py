@@ -10,6 +10,7 @@ from flask_cors import CORS
 from flask_smorest import Api
 
 from .celery_utils import init_celery
+from .utils.export_utils import NEXT_CURSOR_HEADER
 
 # Declare extensions that are not in the extensions file
 mail = Mail()
@@ -57,7 +58,8 @@ def create_app(config_name):
 
     # 4. Initialize Extensions
     db.init_app(app)
-    cors.init_app(app, resources={r"/api/*": {"origins": "*"}})
+    # Paginated listings return their next-page cursor in a header, which browsers only expose when listed.
+    cors.init_app(app, resources={r"/api/*": {"origins": "*"}}, expose_headers=[NEXT_CURSOR_HEADER])
 
     # 5. Set Mail config in app by loading from .env or config
     from .utils.mail_config import get_smtp_config
@@ -78,6 +80,9 @@ def create_app(config_name):
 
     # 7. Initialize Redis Client
     redis_client.init_app(app)
+    # Send each request's batched Redis writes in one round trip (see utils/redis_batch).
+    from .utils.redis_batch import flush_request_redis_batch
+    app.teardown_request(flush_request_redis_batch)
 
     # 7. Initialize Flask-Smorest API
     api.init_app(app)
@@ -48,6 +48,37 @@ def init_celery(app):
                     minute=app.config['PROACTIVE_FETCHER_CRON_MINUTE']
                 ),
             },
+            # Name for the write-behind last_seen_at flush task
+            'flush-user-last-seen': {
+                # The task to run
+                'task': 'tasks.flush_user_last_seen',
+                # Runs every LAST_SEEN_FLUSH_INTERVAL_SECONDS seconds
+                'schedule': app.config['LAST_SEEN_FLUSH_INTERVAL_SECONDS'],
+            },
+            # Name for the background system health prober
+            'probe-system-health': {
+                # The task to run
+                'task': 'tasks.probe_system_health',
+                # Runs every HEALTH_PROBE_INTERVAL_SECONDS seconds
+                'schedule': app.config['HEALTH_PROBE_INTERVAL_SECONDS'],
+            },
+            # Name for the static schedule publisher
+            'publish-static-schedules': {
+                # The task to run
+                'task': 'tasks.publish_static_schedules',
+                # Runs every STATIC_PUBLISH_INTERVAL_SECONDS seconds
+                'schedule': app.config['STATIC_PUBLISH_INTERVAL_SECONDS'],
+            },
+            # Name for the push topic reconciliation task
+            'run-topic-subscription-reconciliation-daily': {
+                # The task to run
+                'task': 'tasks.reconcile_masjid_topic_subscriptions',
+                # The schedule on which to run the task
+                'schedule': crontab(
+                    hour=app.config['TOPIC_RECONCILIATION_CRON_HOUR'],
+                    minute=app.config['TOPIC_RECONCILIATION_CRON_MINUTE']
+                ),
+            },
         },
     )
 
@@ -1,3 +1,4 @@
+import json
 import os
 from dotenv import load_dotenv
 
@@ -70,7 +71,63 @@ class Config:
     LOCATIONIQ_API_KEY = os.environ.get('LOCATIONIQ_API_KEY')
 
     # Push Notification Configuration (FCM)
-    FCM_SERVER_KEY = os.environ.get('FCM_SERVER_KEY')
+    # Service-account JSON key used for the FCM HTTP v1 API.
+    FCM_CREDENTIALS_FILE = os.environ.get('FCM_CREDENTIALS_FILE')
+    # 'fcm' talks to Firebase; 'local' uses the in-process stand-in (see local_fcm_service.py).
+    FCM_BACKEND = os.environ.get('FCM_BACKEND', 'fcm')
+    # Daily job that re-syncs masjid topic subscriptions with the follow tables.
+    TOPIC_RECONCILIATION_CRON_HOUR = int(os.environ.get('TOPIC_RECONCILIATION_CRON_HOUR', 3)) # 3 AM UTC
+    TOPIC_RECONCILIATION_CRON_MINUTE = int(os.environ.get('TOPIC_RECONCILIATION_CRON_MINUTE', 30)) # 3:30 AM UTC
+
+    # How often the Supabase JWKS signing keys are re-fetched in the background.
+    JWKS_REFRESH_INTERVAL_SECONDS = int(os.environ.get('JWKS_REFRESH_INTERVAL_SECONDS', 3600)) # 1 hour
+
+    # System Health Probing
+    # How often the background prober checks the database, Redis, the prayer API and Celery workers.
+    HEALTH_PROBE_INTERVAL_SECONDS = int(os.environ.get('HEALTH_PROBE_INTERVAL_SECONDS', 30))
+    # Timeout of the prayer API probe request.
+    HEALTH_PROBE_TIMEOUT_SECONDS = int(os.environ.get('HEALTH_PROBE_TIMEOUT_SECONDS', 5))
+    # Number of recent probe latencies kept per check.
+    HEALTH_LATENCY_HISTORY_LENGTH = int(os.environ.get('HEALTH_LATENCY_HISTORY_LENGTH', 120)) # 1 hour at 30s
+    # Celery worker pings wait this long for replies, and the result is reused for CELERY_PING_CACHE_SECONDS.
+    CELERY_PING_TIMEOUT_SECONDS = int(os.environ.get('CELERY_PING_TIMEOUT_SECONDS', 1))
+    CELERY_PING_CACHE_SECONDS = int(os.environ.get('CELERY_PING_CACHE_SECONDS', 60))
+
+    # A zone's registry entry (last request time and request count) is written at most once per this many seconds per process.
+    ZONE_REGISTRY_MIN_UPDATE_INTERVAL_SECONDS = int(os.environ.get('ZONE_REGISTRY_MIN_UPDATE_INTERVAL_SECONDS', 300)) # 5 minutes
+    # Calendar Prefetching (next year's calendars)
+    # Concurrent fetches, and the token-bucket rate limit they share (size it to the prayer API quota).
+    PREFETCH_MAX_WORKERS = int(os.environ.get('PREFETCH_MAX_WORKERS', 8))
+    PREFETCH_RATE_PER_SECOND = float(os.environ.get('PREFETCH_RATE_PER_SECOND', 2.0))
+    PREFETCH_BURST = int(os.environ.get('PREFETCH_BURST', 4))
+    # How long a prefetch run's Redis checkpoint is kept for resuming.
+    PREFETCH_CHECKPOINT_TTL_SECONDS = int(os.environ.get('PREFETCH_CHECKPOINT_TTL_SECONDS', 604800)) # 7 days
+    PREFETCH_PROGRESS_LOG_INTERVAL_SECONDS = int(os.environ.get('PREFETCH_PROGRESS_LOG_INTERVAL_SECONDS', 30))
+    # Async batch fetching (see async_batch_service): requests in flight at once from one process.
+    ASYNC_PRAYER_BATCH_CONCURRENCY = int(os.environ.get('ASYNC_PRAYER_BATCH_CONCURRENCY', 20))
+    ASYNC_GEOCODING_BATCH_CONCURRENCY = int(os.environ.get('ASYNC_GEOCODING_BATCH_CONCURRENCY', 50))
+    # Static schedule publishing (see static_publisher_service): 'filesystem' or 's3' (any S3-compatible store).
+    STATIC_PUBLISH_BACKEND = os.environ.get('STATIC_PUBLISH_BACKEND', 'filesystem')
+    STATIC_PUBLISH_ROOT = os.environ.get('STATIC_PUBLISH_ROOT', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static_publish'))
+    STATIC_PUBLISH_S3_BUCKET = os.environ.get('STATIC_PUBLISH_S3_BUCKET')
+    STATIC_PUBLISH_S3_PREFIX = os.environ.get('STATIC_PUBLISH_S3_PREFIX', '')
+    STATIC_PUBLISH_S3_ENDPOINT_URL = os.environ.get('STATIC_PUBLISH_S3_ENDPOINT_URL') # e.g. a MinIO URL; unset for AWS S3
+    STATIC_PUBLISH_INTERVAL_SECONDS = int(os.environ.get('STATIC_PUBLISH_INTERVAL_SECONDS', 900)) # 15 minutes
+    STATIC_MANIFEST_MAX_AGE_SECONDS = int(os.environ.get('STATIC_MANIFEST_MAX_AGE_SECONDS', 60)) # Cache-Control of manifests
+    # Days of per-zone cache lookup statistics kept in Redis (the "top zones" report).
+    ZONE_STATS_RETENTION_DAYS = int(os.environ.get('ZONE_STATS_RETENTION_DAYS', 8))
+
+    # Identity Cache (user ID, role and permission set per JWT subject)
+    IDENTITY_CACHE_TTL_SECONDS = int(os.environ.get('IDENTITY_CACHE_TTL_SECONDS', 900)) # 15 minutes in Redis
+    # Per-process entries live briefly, bounding how long other workers can serve a stale role.
+    IDENTITY_CACHE_LOCAL_TTL_SECONDS = int(os.environ.get('IDENTITY_CACHE_LOCAL_TTL_SECONDS', 30))
+    IDENTITY_CACHE_MAX_ENTRIES = int(os.environ.get('IDENTITY_CACHE_MAX_ENTRIES', 10000))
+
+    # User Activity Tracking (write-behind last_seen_at)
+    # A user's last_seen_at is recorded at most once per this many seconds per process.
+    LAST_SEEN_MIN_UPDATE_INTERVAL_SECONDS = int(os.environ.get('LAST_SEEN_MIN_UPDATE_INTERVAL_SECONDS', 300)) # 5 minutes
+    # How often buffered last_seen_at touches are written to the database.
+    LAST_SEEN_FLUSH_INTERVAL_SECONDS = int(os.environ.get('LAST_SEEN_FLUSH_INTERVAL_SECONDS', 60))
 
     # Yearly Cache Management Configuration
     # Defines the start date for the "grace period" during which next year's calendars are pre-fetched.
@@ -133,6 +190,7 @@ class TestingConfig(Config):
     WTF_CSRF_ENABLED = False
     RATELIMIT_ENABLED = False # Disable rate limiting for tests
     SECRET_KEY = 'test-secret-key'
+    FCM_BACKEND = 'local' # Never send real push notifications from tests
 
 config_by_name = {
     'development': DevelopmentConfig,
@@ -1,12 +1,27 @@
 # project/metrics.py
 
-from prometheus_client import Counter, Histogram
+import os
+
+from prometheus_client import Counter, Histogram, CollectorRegistry, REGISTRY
+from prometheus_client import multiprocess
 
 # Define Prometheus metrics
 
 # Cache Metrics
-CACHE_HITS = Counter('noortime_cache_hits_total', 'Total cache hits', ['cache_type', 'zone_id', 'year'])
-CACHE_MISSES = Counter('noortime_cache_misses_total', 'Total cache misses', ['cache_type', 'zone_id', 'year'])
+# Labels are deliberately low-cardinality: one series per (cache_type, tier, result, zone_kind),
+# however many zones exist. Per-zone detail lives in Redis instead (see zone_stats_service).
+ZONE_KINDS = ('admin2', 'admin3', 'grid', 'unknown')
+CACHE_LOOKUPS_TOTAL = Counter(
+    'noortime_cache_lookups_total', 'Total cache lookups by cache tier and outcome',
+    ['cache_type', 'tier', 'result', 'zone_kind']
+)
+
+# Redis round trips made while serving one request (or one batched background job,
+# labelled by job name instead of endpoint); see utils/redis_batch.
+REDIS_ROUND_TRIPS_PER_REQUEST = Histogram(
+    'noortime_redis_round_trips_per_request', 'Redis round trips per request',
+    ['endpoint'], buckets=(0, 1, 2, 3, 4, 6, 8, 12, 16, 24, 32, 64)
+)
 
 # API Metrics
 API_REQUESTS_TOTAL = Counter('noortime_api_requests_total', 'Total API requests', ['adapter_name', 'endpoint', 'status'])
@@ -15,3 +30,20 @@ API_REQUEST_DURATION_SECONDS = Histogram('noortime_api_request_duration_seconds'
 # Background Task Metrics
 BACKGROUND_TASK_RUNS_TOTAL = Counter('noortime_background_task_runs_total', 'Total background task runs', ['task_name', 'status'])
 BACKGROUND_TASK_DURATION_SECONDS = Histogram('noortime_background_task_duration_seconds', 'Background task duration in seconds', ['task_name'])
+
+# Push Notification Metrics
+PUSH_NOTIFICATIONS_TOTAL = Counter('noortime_push_notifications_total', 'Total push notification deliveries by outcome', ['status'])
+PUSH_BATCH_DURATION_SECONDS = Histogram('noortime_push_batch_duration_seconds', 'Duration of one FCM multicast request in seconds')
+
+
+def get_metrics_registry():
+    """
+    Returns the registry to expose and read metrics from. Under gunicorn, each worker
+    writes its samples to PROMETHEUS_MULTIPROC_DIR (see gunicorn.conf.py), and this
+    aggregates all workers; otherwise it is the in-process default registry.
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
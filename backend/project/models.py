@@ -1,8 +1,13 @@
 # project/models.py
 
 from datetime import datetime
+from flask import has_app_context
 from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import validates
 from . import db # Import the db object defined in project/__init__.py
+from .utils.phash_utils import phash_to_bands
 
 # --- Community & Masjid Models ---
 
@@ -70,8 +75,24 @@ class ImageFingerprint(db.Model):
     # The perceptual hash (fingerprint) of the image
     phash = db.Column(db.String(16), nullable=False, index=True) # 64-bit hash is 16 hex chars
 
+    # The hash split into 4 x 16-bit bands for multi-index Hamming search.
+    # Two hashes within Hamming distance r share at least one band within r // 4 bits,
+    # so similar fingerprints can be found with indexed IN-lookups instead of a full scan.
+    # Populated automatically whenever `phash` is set; NULL for hashes that aren't 64-bit hex.
+    phash_band_0 = db.Column(db.Integer, nullable=True, index=True)
+    phash_band_1 = db.Column(db.Integer, nullable=True, index=True)
+    phash_band_2 = db.Column(db.Integer, nullable=True, index=True)
+    phash_band_3 = db.Column(db.Integer, nullable=True, index=True)
+
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
+    @validates('phash')
+    def _populate_phash_bands(self, key, phash):
+        """Keeps the band columns in sync with the hash."""
+        bands = phash_to_bands(phash) or (None,) * 4
+        self.phash_band_0, self.phash_band_1, self.phash_band_2, self.phash_band_3 = bands
+        return phash
+
     def __repr__(self):
         return f'<ImageFingerprint ID:{self.id} pHash:{self.phash}>'
 
@@ -142,6 +163,9 @@ class GuestProfile(db.Model):
     # The masjid the guest is currently following.
     followed_masjid_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
 
+    # Optional FCM token of the guest's device, used to subscribe it to masjid push topics.
+    fcm_token = db.Column(db.String(255), nullable=True, index=True)
+
     # Timestamps for tracking.
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
@@ -177,6 +201,13 @@ class User(UserMixin, db.Model):
     time_format_preference = db.Column(db.String(10), default='12h')
     last_seen_at = db.Column(db.DateTime, nullable=True, index=True)
 
+    # Composite indexes backing the bounding-box prefilter of nearby masjid searches and
+    # the city filter of the admin user listing (keyset-paginated by ID).
+    __table_args__ = (
+        db.Index('ix_user_role_location', 'role', 'default_latitude', 'default_longitude'),
+        db.Index('ix_user_city_id', 'default_city_name', 'id'),
+    )
+
     # --- Relationships ---
     # One-to-one relationship to the user's personal prayer time settings.
     settings = db.relationship('UserSettings', backref='user', uselist=False, cascade="all, delete-orphan")
@@ -188,6 +219,15 @@ class User(UserMixin, db.Model):
     followed_masjids_association = db.relationship('UserMasjidFollow', foreign_keys=[UserMasjidFollow.user_id], back_populates='user', lazy='dynamic', cascade="all, delete-orphan")
     followers_association = db.relationship('UserMasjidFollow', foreign_keys=[UserMasjidFollow.masjid_id], back_populates='masjid', lazy='dynamic', cascade="all, delete-orphan")
 
+    # Read-only, eager-loadable view of the default follow (see default_masjid_follow), used to
+    # resolve prayer settings in a single query.
+    default_follow = db.relationship(
+        'UserMasjidFollow',
+        primaryjoin="and_(User.id == UserMasjidFollow.user_id, UserMasjidFollow.is_default == True)",
+        uselist=False,
+        viewonly=True
+    )
+
     @property
     def followed_masjids(self):
         """Returns a list of Masjid objects the user is following."""
@@ -199,19 +239,10 @@ class User(UserMixin, db.Model):
         return self.followed_masjids_association.filter_by(is_default=True).first()
 
     def has_permission(self, permission_name):
-        # Check direct user permissions
-        for up in self.user_permissions:
-            if up.permission.name == permission_name and up.has_permission:
-                return True
-            elif up.permission.name == permission_name and not up.has_permission:
-                return False # Explicitly revoked
-
-        # Check role-based permissions
-        role_permissions = RolePermission.query.filter_by(role_name=self.role).all()
-        for rp in role_permissions:
-            if rp.permission.name == permission_name:
-                return True
-        return False
+        """Checks the user's effective permissions (role permissions plus user overrides)."""
+        # Imported here to avoid a circular import; the identity cache depends on these models.
+        from .services.identity_service import get_user_permissions
+        return permission_name in get_user_permissions(self)
 
     def __repr__(self):
         return f'<User {self.email} - {self.role}>'
@@ -241,6 +272,22 @@ class UserDevice(db.Model):
         return f'<UserDevice ID:{self.id} UserID:{self.user_id}>'
 
 
+class MasjidTopicSubscription(db.Model):
+    """
+    Records which device tokens are subscribed to which masjid's FCM topic.
+    FCM offers no cheap way to list a topic's subscribers, so this table is the
+    reference the reconciliation job compares against the follow tables.
+    """
+    __tablename__ = 'masjid_topic_subscription'
+
+    device_token = db.Column(db.String(255), primary_key=True)
+    masjid_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<MasjidTopicSubscription Masjid:{self.masjid_id}>'
+
+
 class UserSettings(db.Model):
     __tablename__ = 'user_settings'
     id = db.Column(db.Integer, primary_key=True)
@@ -360,9 +407,16 @@ class Permission(db.Model):
 # Add default permissions if they don't exist
 @event.listens_for(db.Mapper, 'after_configured')
 def receive_after_configured():
-    if not db.session.query(Permission).filter_by(name='can_view_system_health').first():
-        db.session.add(Permission(name='can_view_system_health', description='Can view system health dashboard'))
-        db.session.commit()
+    # Mappers are configured on first use, which may be outside an app context or before
+    # the tables exist (e.g. while running create_all). Skip seeding then rather than fail.
+    if not has_app_context():
+        return
+    try:
+        if not db.session.query(Permission).filter_by(name='can_view_system_health').first():
+            db.session.add(Permission(name='can_view_system_health', description='Can view system health dashboard'))
+            db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
 
 class UserPermission(db.Model):
     __tablename__ = 'user_permission'
@@ -435,6 +489,69 @@ class PrayerZoneCalendar(db.Model):
     def __repr__(self):
         return f'<PrayerZoneCalendar Zone:{self.zone_id} Year:{self.year} Method:{self.calculation_method}>'
 
+class ZoneAlias(db.Model):
+    """
+    Permanent pointer from an Admin Level 3 zone to the Admin Level 2 zone whose
+    calendar it shares (identical calendar_hash), so requests for the sub-zone
+    read the parent's calendar. Redis holds a temporary copy of each alias.
+    """
+    __tablename__ = 'zone_alias'
+
+    source_zone_id = db.Column(db.String(255), primary_key=True)
+    target_zone_id = db.Column(db.String(255), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<ZoneAlias {self.source_zone_id} -> {self.target_zone_id}>'
+
+class Zone(db.Model):
+    """
+    Registry of every prayer zone that has been requested, with the coordinates
+    used to fetch its calendars. Populated as zones are resolved (see
+    zone_registry_service), so prefetch jobs can iterate known zones without
+    scanning the calendar table or guessing coordinates.
+    """
+    __tablename__ = 'zone'
+
+    # Same identifier as PrayerZoneCalendar.zone_id, e.g. 'IN_UP_BADAUN' or 'grid_28.6_77.2'.
+    zone_id = db.Column(db.String(255), primary_key=True)
+    # 'admin2', 'admin3' or 'grid'
+    kind = db.Column(db.String(10), nullable=False)
+
+    # Representative point passed to the prayer time API: the grid cell's center for grid
+    # zones, otherwise the coordinates of the first request resolved to the zone.
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+
+    # Human-readable administrative path, e.g. 'IN/Uttar Pradesh/Badaun/Bisauli'.
+    admin_path = db.Column(db.String(500), nullable=True)
+    # The Admin Level 2 zone containing an Admin Level 3 zone.
+    parent_zone_id = db.Column(db.String(255), nullable=True, index=True)
+
+    # Approximate demand, maintained by throttled write-behind updates.
+    last_requested_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    request_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    calculation_methods = db.relationship('ZoneCalculationMethod', backref='zone', lazy=True, cascade="all, delete-orphan")
+
+    def __repr__(self):
+        return f'<Zone {self.zone_id} ({self.kind})>'
+
+class ZoneCalculationMethod(db.Model):
+    """The calculation methods (composite keys such as '1-0-1') each registered zone has been requested with."""
+    __tablename__ = 'zone_calculation_method'
+
+    zone_id = db.Column(db.String(255), db.ForeignKey('zone.zone_id'), primary_key=True)
+    calculation_method = db.Column(db.String(50), primary_key=True)
+    last_requested_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    # Day-of-year bucket (0-364) in which next year's calendar is prefetched. Assigned once on
+    # registration from a hash of the zone and method, so prefetch load is spread over the year.
+    prefetch_bucket = db.Column(db.SmallInteger, nullable=False, default=0, index=True)
+
+    def __repr__(self):
+        return f'<ZoneCalculationMethod Zone:{self.zone_id} Method:{self.calculation_method}>'
+
 class GeocodingCache(db.Model):
     """
     Caches geocoding results to prevent repeated API calls for the same city.
@@ -8,138 +8,35 @@ import zoneinfo
 from flask_smorest import Blueprint, abort
 from webargs import fields
 from webargs.flaskparser import use_args
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any
 
 from .. import db
 from ..models import User, UserSettings, GuestProfile
-from ..schemas import InitialPrayerDataSchema, MessageSchema, GeocodeSchema, AutocompleteSchema, InitialPrayerDataArgsSchema
+from ..schemas import InitialPrayerDataSchema, MessageSchema, GeocodeSchema, AutocompleteSchema, InitialPrayerDataArgsSchema, ScheduleRangeArgsSchema, ScheduleSyncSchema, DeviceRegistrationSchema
 from ..services.prayer_time_service import (
-    get_api_prayer_times_for_date_from_service,
+    get_api_prayer_times_for_dates_from_service,
     calculate_display_times_from_service,
     get_next_prayer_info_from_service,
     get_current_prayer_period_from_service,
     get_single_prayer_info
 )
 from ..services.geocoding_service import get_geocoded_location_with_cache, get_autocomplete_suggestions
-from ..utils.auth import jwt_optional, jwt_required, has_permission
+from ..services import notification_service
+from ..services.prayer_settings_service import resolve_prayer_settings, MASJID_SOURCES
+from ..utils.auth import jwt_optional, jwt_required, has_permission, current_user_id
 from ..utils.time_utils import get_prayer_key_for_tomorrow
 from prometheus_client import generate_latest
+from ..metrics import get_metrics_registry
 
 # Import the new schedule service
-from ..services.schedule_service import get_or_generate_monthly_schedule
+from ..services.schedule_service import get_or_generate_monthly_schedule, get_schedule_range, month_range
+from ..services.prayer_time.timezones import get_zone_info
 
 api_bp = Blueprint('API', __name__, url_prefix='/api')
 
 @api_bp.route('/metrics')
 def metrics():
-    return generate_latest(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
-
-def get_prayer_settings_from_user(user: Optional[User], args: Dict[str, Any]) -> Tuple[float, float, int, int, int, str, str, Optional[User]]:
-    """
-    Determines the correct prayer time settings (location, method, etc.) based on a hierarchy:
-    1. A guest's followed Masjid.
-    2. A logged-in user's followed Masjid.
-    3. A custom location search from the user.
-    4. The user's saved personal settings.
-    5. The application's default settings.
-    
-    Returns a tuple including the settings and the masjid object if applicable.
-    """
-    # Default values from app config
-    lat = float(current_app.config.get('DEFAULT_LATITUDE'))
-    lon = float(current_app.config.get('DEFAULT_LONGITUDE'))
-    method_id = int(current_app.config.get('DEFAULT_CALCULATION_METHOD_ID', 3)) # Default to 3 (MWL)
-    asr_id = 0 # Default to 0 (Standard)
-    high_lat_id = 1 # Default to 1 (Middle of the Night)
-    city_name = "Default Location"
-    source = "app_default"
-    followed_masjid = None
-
-    # Priority 1: Guest user with a followed Masjid
-    device_id = g.device_id if hasattr(g, 'device_id') else None
-    if not user and device_id:
-        guest_profile = GuestProfile.query.filter_by(device_id=device_id).first()
-        if guest_profile and guest_profile.followed_masjid:
-            masjid = guest_profile.followed_masjid
-            masjid_settings = masjid.settings if masjid.settings else UserSettings()
-            return (
-                masjid.default_latitude,
-                masjid.default_longitude,
-                int(masjid.default_calculation_method_id),
-                int(masjid_settings.asr_juristic_id),
-                int(masjid_settings.high_latitude_method_id),
-                masjid.default_city_name or masjid.name,
-                "guest_followed_masjid",
-                masjid
-            )
-
-    # Priority 2: Logged-in user logic
-    if user:
-        user_settings = user.settings if user and user.settings else UserSettings()
-
-        # Priority 2a: Followed Masjid
-        default_masjid_follow = user.default_masjid_follow
-        if default_masjid_follow:
-            masjid = default_masjid_follow.masjid
-            masjid_settings = masjid.settings if masjid.settings else UserSettings()
-            return (
-                masjid.default_latitude,
-                masjid.default_longitude,
-                int(masjid.default_calculation_method_id),
-                int(masjid_settings.asr_juristic_id),
-                int(masjid_settings.high_latitude_method_id),
-                masjid.default_city_name or masjid.name,
-                "followed_masjid",
-                masjid
-            )
-
-        # Priority 2b: Custom Location Search (using user's own settings)
-        req_lat = args.get('lat')
-        req_lon = args.get('lon')
-        if req_lat is not None and req_lon is not None:
-            high_lat_id_to_use = int(user_settings.high_latitude_method_id or high_lat_id) if req_lat > 48.0 else 0
-            return (
-                req_lat,
-                req_lon,
-                int(user.default_calculation_method_id or method_id),
-                int(user_settings.asr_juristic_id or asr_id),
-                high_lat_id_to_use,
-                args.get('city', "Custom Location"),
-                "custom_location_with_user_settings",
-                None
-            )
-
-        # Priority 2c: User's Saved Personal Settings
-        if user.default_latitude and user.default_longitude and user.default_calculation_method_id is not None:
-            return (
-                user.default_latitude,
-                user.default_longitude,
-                int(user.default_calculation_method_id),
-                int(user_settings.asr_juristic_id or asr_id),
-                int(user_settings.high_latitude_method_id or high_lat_id),
-                user.default_city_name,
-                "user_personal_settings",
-                None
-            )
-
-    # Priority 3: Stateless Guest user (custom location search)
-    if not user:
-        req_lat = args.get('lat')
-        req_lon = args.get('lon')
-        if req_lat is not None and req_lon is not None:
-            guest_method_id = args.get('method', method_id)
-            guest_asr_id = args.get('school', asr_id)
-            guest_high_lat_id = args.get('latitudeAdjustmentMethod', high_lat_id)
-            return (
-                req_lat, req_lon, int(guest_method_id), int(guest_asr_id), int(guest_high_lat_id),
-                args.get('city', "Custom Location"),
-                "guest_custom_location",
-                None
-            )
-
-    # Fallback to app default for all other cases
-    return lat, lon, method_id, asr_id, high_lat_id, city_name, source, None
-
+    return generate_latest(get_metrics_registry()), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
 
 @api_bp.route('/initial_prayer_data')
 @jwt_optional
@@ -153,32 +50,34 @@ def initial_prayer_data(args: Dict[str, Any]) -> Dict[str, Any]:
     This is the main endpoint. It provides personalized data for logged-in users,
     and stateful data for guests following a Masjid.
     """
-    user = g.user if hasattr(g, 'user') else None
-    is_authenticated = True if user else False
-    
-    # --- Determine the source of truth for prayer settings ---
-    user_prayer_settings_obj = user.settings if user and user.settings else UserSettings()
-    time_format_pref = user.time_format_preference if user else '12h'
+    user_id = current_user_id()
+    is_authenticated = user_id is not None
+    device_id = g.device_id if hasattr(g, 'device_id') else None
 
-    # This function now also returns the followed masjid object if applicable
-    lat, lon, method_id, asr_id, high_lat_id, city_name, settings_source, followed_masjid = get_prayer_settings_from_user(user, args)
+    # --- Determine the source of truth for prayer settings (one query for the whole chain) ---
+    resolved = resolve_prayer_settings(user_id, device_id, args)
+    lat, lon, method_id, asr_id, high_lat_id = resolved.latitude, resolved.longitude, resolved.method_id, resolved.asr_id, resolved.high_lat_id
+    city_name = resolved.city_name
+    followed_masjid = resolved.masjid
+    user_prayer_settings_obj = resolved.prayer_settings
+    time_format_pref = resolved.time_format
 
     # If settings came from a followed masjid (user or guest), get additional info
-    is_following_masjid = settings_source in ["followed_masjid", "guest_followed_masjid"]
-    announcements = followed_masjid.announcements if followed_masjid else []
+    is_following_masjid = resolved.source in MASJID_SOURCES
+    announcements = [announcement._asdict() for announcement in resolved.announcements]
 
     # --- Fetch and Calculate Prayer Times (Core Logic) ---
-    user_timezone_str = user.settings.timezone if user and hasattr(user, 'settings') and user.settings and hasattr(user.settings, 'timezone') else 'UTC'
-    user_tz = zoneinfo.ZoneInfo(user_timezone_str)
+    user_tz = get_zone_info(resolved.timezone)
 
     now_datetime = datetime.datetime.now(user_tz)
     today_date = now_datetime.date()
     tomorrow_date = today_date + datetime.timedelta(days=1)
     day_after_tomorrow_date = today_date + datetime.timedelta(days=2)
 
-    api_day_today = get_api_prayer_times_for_date_from_service(today_date, lat, lon, method_id, asr_id, high_lat_id)
-    api_day_tomorrow = get_api_prayer_times_for_date_from_service(tomorrow_date, lat, lon, method_id, asr_id, high_lat_id)
-    api_day_day_after_tomorrow = get_api_prayer_times_for_date_from_service(day_after_tomorrow_date, lat, lon, method_id, asr_id, high_lat_id)
+    # One zone resolution and one Redis round trip for all three days.
+    api_day_today, api_day_tomorrow, api_day_day_after_tomorrow = get_api_prayer_times_for_dates_from_service(
+        [today_date, tomorrow_date, day_after_tomorrow_date], lat, lon, method_id, asr_id, high_lat_id
+    )
 
     if not api_day_today or not api_day_tomorrow or not api_day_day_after_tomorrow:
         abort(503, message="Could not fetch prayer times from the prayer time service.")
@@ -196,9 +95,11 @@ def initial_prayer_data(args: Dict[str, Any]) -> Dict[str, Any]:
         calculation_date=today_date
     )
     
-    if needs_db_update and user and not is_following_masjid:
+    if needs_db_update and is_authenticated and not is_following_masjid and user_prayer_settings_obj.settings_id is not None:
         try:
-            user.settings.last_api_times_for_threshold = json.dumps(api_times_today)
+            db.session.query(UserSettings).filter_by(id=user_prayer_settings_obj.settings_id).update(
+                {"last_api_times_for_threshold": json.dumps(api_times_today)}
+            )
             db.session.commit()
         except Exception as e:
             db.session.rollback()
@@ -230,8 +131,8 @@ def initial_prayer_data(args: Dict[str, Any]) -> Dict[str, Any]:
     owner_id = None
     if is_following_masjid:
         owner_id = followed_masjid.id
-    elif user:
-        owner_id = user.id
+    elif is_authenticated:
+        owner_id = user_id
 
     if owner_id:
         first_day_of_current_month = today_date.replace(day=1)
@@ -261,7 +162,7 @@ def initial_prayer_data(args: Dict[str, Any]) -> Dict[str, Any]:
         "prayerTimes": display_times,
         "dateInfo": {
             "gregorian": f"{gregorian_info.get('date')}, {gregorian_info.get('weekday', {}).get('en')}",
-            "hijri": f"{hijri_info.get('date')} ({hijri_info.get('month', {}).get('en')})} {hijri_info.get('year')} AH)"
+            "hijri": f"{hijri_info.get('date')} ({hijri_info.get('month', {}).get('en')} {hijri_info.get('year')} AH)"
         },
         "nextDayPrayerDisplay": next_day_prayer_display,
         "userPreferences": {
@@ -274,7 +175,7 @@ def initial_prayer_data(args: Dict[str, Any]) -> Dict[str, Any]:
         "warnings": warnings, # Add warnings to the response
         # --- New community feature fields ---
         "is_following_default_masjid": is_following_masjid,
-        "default_masjid_info": followed_masjid,
+        "default_masjid_info": followed_masjid._asdict() if followed_masjid else None,
         "announcements": announcements,
         # --- New: URL for proactive client-side caching ---
         "next_schedule_url": next_schedule_url
@@ -307,28 +208,56 @@ def guest_follow_masjid():
     if not masjid:
         abort(404, message=f"Masjid with ID {masjid_id} not found.")
 
+    # Optional FCM token, so the guest's device receives the masjid's announcements
+    fcm_token = data.get('fcm_token')
+
     # Find existing guest profile or create a new one
     guest_profile = GuestProfile.query.filter_by(device_id=device_id).first()
+    previous_masjid_id = guest_profile.followed_masjid_id if guest_profile else None
+    previous_fcm_token = guest_profile.fcm_token if guest_profile else None
     if guest_profile:
         guest_profile.followed_masjid_id = masjid_id
+        if fcm_token:
+            guest_profile.fcm_token = fcm_token
         guest_profile.updated_at = datetime.utcnow()
         current_app.logger.info(f"Updated GuestProfile for device {device_id} to follow Masjid {masjid_id}.")
     else:
         guest_profile = GuestProfile(
             device_id=device_id,
-            followed_masjid_id=masjid_id
+            followed_masjid_id=masjid_id,
+            fcm_token=fcm_token
         )
         db.session.add(guest_profile)
         current_app.logger.info(f"Created new GuestProfile for device {device_id} to follow Masjid {masjid_id}.")
 
     try:
         db.session.commit()
-        return jsonify({"success": True, "message": f"Guest device {device_id} is now following Masjid {masjid_id}."}), 200
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Error updating GuestProfile for device {device_id}: {e}", exc_info=True)
         abort(500, message="Could not update guest session.")
 
+    # Move the device to the new masjid's FCM topic; anything missed here is fixed by the reconciliation job
+    notification_service.move_guest_topic_subscription(
+        previous_fcm_token, previous_masjid_id, guest_profile.fcm_token, guest_profile.followed_masjid_id
+    )
+
+    return jsonify({"success": True, "message": f"Guest device {device_id} is now following Masjid {masjid_id}."}), 200
+
+
+@api_bp.route('/user/devices', methods=['POST'])
+@jwt_required
+@api_bp.arguments(DeviceRegistrationSchema)
+@api_bp.response(201, MessageSchema, description="Device registered for push notifications.")
+@api_bp.doc(security=[{"Bearer": []}])
+def register_device(args):
+    """
+    Registers the device's FCM token for push notifications. The device is
+    subscribed to the topics of the Masjids the user follows right away.
+    """
+    notification_service.register_user_device(g.user, args['device_token'], args['device_type'])
+    return {"message": "Device registered."}
+
 
 @api_bp.route('/v1/schedule/monthly', methods=['GET'])
 @jwt_optional
@@ -337,25 +266,7 @@ def get_monthly_schedule():
     API endpoint to get the pre-calculated, state-based monthly schedule.
     This works for both authenticated users and stateful guest users.
     """
-    owner_id = None
-    user = g.user if hasattr(g, 'user') else None
-    device_id = g.device_id if hasattr(g, 'device_id') else None
-
-    if user:
-        # For a logged-in user, they are the owner.
-        # The service will handle if they follow a masjid or use personal settings.
-        owner_id = user.id
-    elif device_id:
-        # For a guest, find their profile and the masjid they follow.
-        guest_profile = GuestProfile.query.filter_by(device_id=device_id).first()
-        if guest_profile and guest_profile.followed_masjid_id:
-            owner_id = guest_profile.followed_masjid_id
-        else:
-            # A guest trying to access this without following a masjid is an error.
-            abort(404, message="Guest profile not found or no masjid is being followed.")
-    else:
-        # If there is no user and no device_id, access is denied.
-        abort(401, message="Authentication credentials or a valid Device ID are required.")
+    owner_id = _schedule_owner_id()
 
     try:
         now = datetime.datetime.utcnow()
@@ -380,4 +291,68 @@ def get_monthly_schedule():
 
     except Exception as e:
         current_app.logger.error(f"Error in /v1/schedule/monthly endpoint: {e}", exc_info=True)
+        return jsonify({"error": "An unexpected server error occurred."}), 500
+
+
+@api_bp.route('/v1/schedule/range', methods=['GET'])
+@jwt_optional
+@api_bp.arguments(ScheduleRangeArgsSchema, location='query')
+def get_schedule_range_endpoint(args):
+    """
+    Returns the schedules of every month from `start` to `end` (inclusive, at most
+    a year) in one response, instead of one /v1/schedule/monthly request per month.
+    """
+    return _schedule_range_response(args['start'], args['end'], known={})
+
+
+@api_bp.route('/v1/schedule/sync', methods=['POST'])
+@jwt_optional
+@api_bp.arguments(ScheduleSyncSchema)
+def sync_schedules(args):
+    """
+    Delta sync for offline-first clients: like /v1/schedule/range, but the client
+    lists the months it holds (with their script_hash), and only months
+    that changed are sent back; the others are listed under "unchanged". Months
+    still being generated are listed under "pending" and come back on a later sync.
+    """
+    known = {entry['month']: entry for entry in args['known']}
+    return _schedule_range_response(args['start'], args['end'], known)
+
+
+def _schedule_owner_id():
+    """The user whose schedules are served: the logged-in user, or the masjid a guest device follows."""
+    user = g.user if hasattr(g, 'user') else None
+    device_id = g.device_id if hasattr(g, 'device_id') else None
+
+    if user:
+        # For a logged-in user, they are the owner.
+        # The service will handle if they follow a masjid or use personal settings.
+        return user.id
+    elif device_id:
+        # For a guest, find their profile and the masjid they follow.
+        guest_profile = GuestProfile.query.filter_by(device_id=device_id).first()
+        if guest_profile and guest_profile.followed_masjid_id:
+            return guest_profile.followed_masjid_id
+        # A guest trying to access this without following a masjid is an error.
+        abort(404, message="Guest profile not found or no masjid is being followed.")
+    else:
+        # If there is no user and no device_id, access is denied.
+        abort(401, message="Authentication credentials or a valid Device ID are required.")
+
+
+def _schedule_range_response(start, end, known):
+    owner_id = _schedule_owner_id()
+    try:
+        months = month_range(start, end)
+    except ValueError as e:
+        abort(400, message=str(e))
+
+    try:
+        schedules = get_schedule_range(user_id=owner_id, months=months, known=known)
+        if schedules is None:
+            return jsonify({"error": "Could not generate or retrieve schedules."}), 500
+        return jsonify(schedules), 200
+
+    except Exception as e:
+        current_app.logger.error(f"Error in schedule range endpoint: {e}", exc_info=True)
         return jsonify({"error": "An unexpected server error occurred."}), 500
\ No newline at end of file
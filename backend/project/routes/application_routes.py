@@ -7,16 +7,21 @@ of Masjid Applications.
 
 from flask import request, g
 from flask_smorest import Blueprint, abort
+from sqlalchemy.orm import joinedload
 
+from .. import db
 from ..services import application_service
 from ..models import MasjidApplication, User
 from ..schemas import (
     MasjidApplicationSchema,
     MasjidApplicationAdminSchema,
     ApplicationActionSchema,
+    ApplicationListArgsSchema,
+    ApplicationExportArgsSchema,
     MessageSchema
 )
 from ..utils.auth import jwt_required, has_permission
+from ..utils.export_utils import keyset_page, cursor_headers, ndjson_response, csv_response
 
 application_bp = Blueprint(
     'MasjidApplications',
@@ -42,14 +47,59 @@ def submit_masjid_application(data):
 
 # --- Admin Routes ---
 
+# Columns written by the bulk export.
+APPLICATION_EXPORT_COLUMNS = (
+    MasjidApplication.id, MasjidApplication.user_id, MasjidApplication.official_name,
+    MasjidApplication.address_line_1, MasjidApplication.city, MasjidApplication.state,
+    MasjidApplication.postal_code, MasjidApplication.country, MasjidApplication.latitude,
+    MasjidApplication.longitude, MasjidApplication.website_url, MasjidApplication.status,
+    MasjidApplication.trust_score, MasjidApplication.reviewed_by_id,
+    MasjidApplication.created_at, MasjidApplication.updated_at,
+)
+
+def _filter_applications(query, args):
+    """Applies the review queue filters shared by the listing and the export."""
+    if args.get('status'):
+        query = query.filter(MasjidApplication.status == args['status'])
+    if args.get('created_after'):
+        query = query.filter(MasjidApplication.created_at >= args['created_after'])
+    if args.get('created_before'):
+        query = query.filter(MasjidApplication.created_at < args['created_before'])
+    if args.get('min_trust_score') is not None:
+        query = query.filter(MasjidApplication.trust_score >= args['min_trust_score'])
+    if args.get('max_trust_score') is not None:
+        query = query.filter(MasjidApplication.trust_score <= args['max_trust_score'])
+    if args.get('after_id') is not None:
+        query = query.filter(MasjidApplication.id > args['after_id'])
+    return query
+
 @application_bp.route('/admin', methods=['GET'])
 @jwt_required
 @has_permission('can_manage_masjid_applications')
+@application_bp.arguments(ApplicationListArgsSchema, location='query')
 @application_bp.response(200, MasjidApplicationAdminSchema(many=True))
 @application_bp.doc(security=[{"Bearer": []}])
-def get_all_applications():
-    """Get a list of all Masjid Applications (for Admins)."""
-    return MasjidApplication.query.all()
+def get_all_applications(args):
+    """
+    Get a page of Masjid Applications (for Admins), oldest first.
+    The next page's cursor is returned in the X-Next-Cursor header.
+    """
+    query = _filter_applications(MasjidApplication.query.options(joinedload(MasjidApplication.applicant)), args)
+    applications, next_cursor = keyset_page(query, MasjidApplication.id, limit=args['limit'])
+    return applications, 200, cursor_headers(next_cursor)
+
+@application_bp.route('/admin/export', methods=['GET'])
+@jwt_required
+@has_permission('can_manage_masjid_applications')
+@application_bp.arguments(ApplicationExportArgsSchema, location='query')
+@application_bp.doc(security=[{"Bearer": []}])
+def export_applications(args):
+    """Streams every Masjid Application matching the filters as NDJSON or CSV (for Admins)."""
+    query = _filter_applications(db.session.query(*APPLICATION_EXPORT_COLUMNS), args).order_by(MasjidApplication.id)
+    if args['format'] == 'csv':
+        columns = [column.key for column in APPLICATION_EXPORT_COLUMNS]
+        return csv_response(query, columns, filename='masjid_applications.csv')
+    return ndjson_response(query, filename='masjid_applications.ndjson')
 
 @application_bp.route('/admin/<int:app_id>/approve', methods=['POST'])
 @jwt_required
@@ -4,16 +4,17 @@ from flask import jsonify, request, current_app, g
 from flask_smorest import Blueprint, abort
 from webargs import fields
 from webargs.flaskparser import use_args
-from sqlalchemy import text # Import text for raw SQL execution
-import requests # Import requests for external API checks
+from marshmallow import validate
+from redis.exceptions import RedisError
 
 from .. import db
 from ..models import User, UserSettings, AppSettings, Popup, Permission, RolePermission, UserPermission
 from ..utils.auth import has_permission # Import the new permission decorator
+from ..services import identity_service, health_service, zone_stats_service
 from ..utils.constants import Roles
-from project.metrics import CACHE_HITS, CACHE_MISSES # Import Prometheus metrics
 # from ..services.notification_service import notification_service
-from ..schemas import MessageSchema # Assuming MessageSchema for success/error messages
+from ..schemas import MessageSchema, UserListArgsSchema, UserListingSchema
+from ..utils.export_utils import keyset_page, cursor_headers, ndjson_response
 
 # Renamed from admin_bp to management_bp to reflect its broader purpose
 management_bp = Blueprint('Management', __name__, url_prefix='/api/management')
@@ -32,31 +33,66 @@ def _get_permission_object(permission_name):
 
 # --- User & Role Management ---
 
+# Columns the user listing can project, and the default projection.
+USER_LISTING_COLUMNS = {
+    column.key: column for column in (
+        User.id, User.supabase_user_id, User.email, User.name, User.role,
+        User.default_city_name, User.last_seen_at, User.masjid_code,
+    )
+}
+DEFAULT_USER_LISTING_COLUMNS = ('id', 'supabase_user_id', 'email', 'name', 'role', 'default_city_name')
+
+def _user_listing_query(args):
+    """Builds the filtered, column-projected query shared by the user listing and export."""
+    requested = args.get('columns') or DEFAULT_USER_LISTING_COLUMNS
+    unknown = sorted(set(requested) - set(USER_LISTING_COLUMNS))
+    if unknown:
+        abort(400, message=f"Unknown columns {unknown}. Must be among {sorted(USER_LISTING_COLUMNS)}")
+    # The ID is always selected, as it is the pagination cursor.
+    columns = ['id'] + [name for name in dict.fromkeys(requested) if name != 'id']
+
+    query = db.session.query(*[USER_LISTING_COLUMNS[name] for name in columns])
+    if args.get('role'):
+        query = query.filter(User.role == args['role'])
+    if args.get('city'):
+        query = query.filter(User.default_city_name == args['city'])
+    if args.get('last_seen_after'):
+        query = query.filter(User.last_seen_at >= args['last_seen_after'])
+    if args.get('last_seen_before'):
+        query = query.filter(User.last_seen_at < args['last_seen_before'])
+    return query
+
 @management_bp.route('/users', methods=['GET'])
 @has_permission('can_view_users') # Now checks for specific permission
-@management_bp.response(200, MessageSchema)
-def get_all_users():
-    """Retrieves a list of all users (Clients, Managers, etc.)."""
-    users = User.query.all()
-    users_data = []
-    for user in users:
-        users_data.append({
-            "id": user.id,
-            "supabase_user_id": user.supabase_user_id,
-            "email": user.email,
-            "name": user.name,
-            "role": user.role,
-            "default_city_name": user.default_city_name,
-        })
-    return users_data # Return dict for Smorest
+@management_bp.arguments(UserListArgsSchema, location='query')
+@management_bp.response(200, UserListingSchema(many=True))
+def get_all_users(args):
+    """
+    Retrieves one page of users (Clients, Managers, etc.), ordered by ID.
+
+    Pass the `X-Next-Cursor` response header back as `after_id` to get the next
+    page; the header is absent on the last page.
+    """
+    users, next_cursor = keyset_page(_user_listing_query(args), User.id, args.get('after_id'), args['limit'])
+    return [user._mapping for user in users], 200, cursor_headers(next_cursor)
+
+@management_bp.route('/users/export', methods=['GET'])
+@has_permission('can_view_users')
+@management_bp.arguments(UserListArgsSchema, location='query')
+def export_users(args):
+    """Streams every user matching the filters as NDJSON, for bulk admin tooling."""
+    query = _user_listing_query(args)
+    if args.get('after_id') is not None:
+        query = query.filter(User.id > args['after_id'])
+    return ndjson_response(query.order_by(User.id), filename='users.ndjson')
 
 @management_bp.route('/users/<int:user_id>/assign-role', methods=['POST'])
 @has_permission('can_manage_user_roles') # Only users with this permission can assign roles
 @use_args({'role': fields.String(required=True)}, location='json')
 @management_bp.response(200, MessageSchema)
-@management_bp.response(400, MessageSchema)
-@management_bp.response(404, MessageSchema)
-@management_bp.response(500, MessageSchema)
+@management_bp.alt_response(400, schema=MessageSchema)
+@management_bp.alt_response(404, schema=MessageSchema)
+@management_bp.alt_response(500, schema=MessageSchema)
 def assign_role(args, user_id):
     """Assigns a new role to a user."""
     user = User.query.get(user_id)
@@ -76,6 +112,7 @@ def assign_role(args, user_id):
     user.role = new_role
     try:
         db.session.commit()
+        identity_service.invalidate_identity(user.supabase_user_id) # Cached role/permissions are now stale
         current_app.logger.info(f"User {user.email} (ID: {user.id}) role changed to {new_role} by {g.user.email}")
         return {"message": f"User role successfully updated to {new_role}"} # Return dict for Smorest
     except Exception as e:
@@ -148,6 +185,7 @@ def assign_user_permissions(args, user_id):
     
     try:
         db.session.commit()
+        identity_service.invalidate_identity(user.supabase_user_id) # Cached permissions are now stale
         return {"message": "User permissions updated successfully."} # Return dict for Smorest
     except Exception as e:
         db.session.rollback()
@@ -271,59 +309,26 @@ def send_notification(args):
 
 @management_bp.route('/system-health', methods=['GET'])
 @has_permission('can_view_system_health')
-@management_bp.response(200, MessageSchema)
 def get_system_health():
-    health_status = {
-        "database": "UNKNOWN",
-        "redis": "UNKNOWN",
-        "external_prayer_api": "UNKNOWN",
-        "celery_workers": "UNKNOWN",
-        "cache_stats": {"hits": "UNKNOWN", "misses": "UNKNOWN"}
-    }
-
-    # Database Check
-    try:
-        db.session.execute(text('SELECT 1'))
-        health_status["database"] = "OK"
-    except Exception as e:
-        health_status["database"] = f"ERROR: {e}"
-        current_app.logger.error(f"Health Check: Database Error: {e}")
-
-    # Redis Check
-    try:
-        redis_client.ping()
-        health_status["redis"] = "OK"
-    except Exception as e:
-        health_status["redis"] = f"ERROR: {e}"
-        current_app.logger.error(f"Health Check: Redis Error: {e}")
-
-    # External Prayer API Check (AlAdhan as example)
-    try:
-        # Use a lightweight endpoint, e.g., a method list or a single day for a known location
-        test_url = f"{current_app.config.get('PRAYER_API_BASE_URL')}/methods"
-        response = requests.get(test_url, timeout=5)
-        response.raise_for_status()
-        health_status["external_prayer_api"] = "OK"
-    except Exception as e:
-        health_status["external_prayer_api"] = f"ERROR: {e}"
-        current_app.logger.error(f"Health Check: External API Error: {e}")
+    """
+    Returns the latest background-probed health snapshot (see health_service).
+    Nothing is probed here, so the response is immediate even when a dependency is down.
+    """
+    return jsonify(health_service.get_health_snapshot())
 
-    # Celery Workers Check (Simplified - requires more advanced monitoring for full check)
-    # For a basic check, we can assume if Redis is up, Celery might be able to connect.
-    # A more robust check would involve inspecting Celery's own monitoring tools (e.g., Flower API).
-    health_status["celery_workers"] = "UNKNOWN" # Placeholder for now
-
-    # Cache Stats (from Prometheus metrics)
+@management_bp.route('/cache/top-zones', methods=['GET'])
+@has_permission('can_view_system_health')
+@use_args({
+    'days': fields.Int(load_default=1, validate=validate.Range(min=1, max=7)),
+    'limit': fields.Int(load_default=20, validate=validate.Range(min=1, max=100)),
+}, location='query')
+def get_top_cache_zones(args):
+    """Per-zone cache usage: distinct zones looked up and the most looked-up zones with their misses."""
     try:
-        # Assuming CACHE_HITS and CACHE_MISSES are Prometheus Counters
-        # This is a simplified way to get current values, actual Prometheus client usage might differ
-        health_status["cache_stats"]["hits"] = CACHE_HITS._value # Accessing internal value, not ideal for production
-        health_status["cache_stats"]["misses"] = CACHE_MISSES._value # Accessing internal value, not ideal for production
-    except Exception as e:
-        health_status["cache_stats"] = f"ERROR: {e}"
-        current_app.logger.error(f"Health Check: Cache Stats Error: {e}")
-
-    return jsonify(health_status)
+        return jsonify(zone_stats_service.get_top_zones(days=args['days'], limit=args['limit']))
+    except RedisError as e:
+        current_app.logger.error(f"Top zones report failed: {e}")
+        abort(503, message="Zone statistics are unavailable.")
 
 # --- Permission Management APIs (Super Admin Only) ---
 
@@ -379,6 +384,7 @@ def assign_role_permissions(args, role_name):
     
     try:
         db.session.commit()
+        identity_service.invalidate_role(role_name) # Every cached identity with this role is now stale
         return {"message": f"Permissions for role {role_name} updated successfully."} # Return dict for Smorest
     except Exception as e:
         db.session.rollback()
@@ -6,8 +6,9 @@ from webargs import fields
 
 from ..services import masjid_service
 from ..models import User
-from ..schemas import MasjidSearchQuerySchema, MasjidSchema, MessageSchema, AnnouncementSchema, AnnouncementPostSchema
+from ..schemas import MasjidSearchQuerySchema, MasjidSchema, NearbyMasjidSchema, MessageSchema, AnnouncementSchema, AnnouncementPostSchema
 from ..utils.auth import jwt_required, has_permission
+from ..utils.export_utils import cursor_headers
 
 masjid_bp = Blueprint(
     'Masjids', 
@@ -18,14 +19,17 @@ masjid_bp = Blueprint(
 
 @masjid_bp.route('/')
 @masjid_bp.arguments(MasjidSearchQuerySchema, location='query')
-@masjid_bp.response(200, MasjidSchema(many=True), description="List of Masjids found.")
-@masjid_bp.response(404, MessageSchema, description="No Masjid found for the given code.")
+@masjid_bp.response(200, NearbyMasjidSchema(many=True), description="List of Masjids found, nearest first. The `X-Next-Cursor` header carries the cursor for the next page, if any.")
+@masjid_bp.alt_response(400, schema=MessageSchema, description="Invalid pagination cursor.")
+@masjid_bp.alt_response(404, schema=MessageSchema, description="No Masjid found for the given code.")
 def search_masjids(args):
     """
     Search for Masjids.
 
     You can search by a unique Masjid code, or by location (latitude/longitude).
-    Providing a code will return a single result. Providing location will return nearby Masjids.
+    Providing a code will return a single result. Providing location will return the
+    closest Masjids (optionally within `radius` km), `limit` at a time. Pass the
+    `X-Next-Cursor` response header back as `cursor` to fetch the next page.
     """
     code = args.get('code')
     lat = args.get('lat')
@@ -38,9 +42,18 @@ def search_masjids(args):
         return [masjid]
     
     if lat is not None and lon is not None:
-        radius = args.get('radius', 50) # Default radius of 50km
-        nearby_masjids = masjid_service.get_masjids_by_location(lat, lon, radius)
-        return nearby_masjids
+        try:
+            nearby_masjids, next_cursor = masjid_service.get_nearest_masjids(
+                lat,
+                lon,
+                limit=args.get('limit', masjid_service.DEFAULT_NEARBY_LIMIT),
+                cursor=args.get('cursor'),
+                max_distance_km=args.get('radius')
+            )
+        except ValueError:
+            abort(400, message="Invalid pagination cursor.")
+
+        return nearby_masjids, 200, cursor_headers(next_cursor)
 
     # If no parameters, maybe return a featured list or abort
     # For now, we'll return an empty list if no search params are given
@@ -1,6 +1,7 @@
 # project/schemas.py
 
-from marshmallow import Schema, fields
+from marshmallow import Schema, fields, validate
+from webargs.fields import DelimitedList
 
 class PrayerTimeSchema(Schema):
     azan = fields.Str(required=True)
@@ -35,7 +36,9 @@ class MasjidSearchQuerySchema(Schema):
     code = fields.Str()
     lat = fields.Float()
     lon = fields.Float()
-    radius = fields.Int()
+    radius = fields.Int(validate=validate.Range(min=1))
+    limit = fields.Int(validate=validate.Range(min=1, max=100))
+    cursor = fields.Str()
 
 class MasjidSchema(Schema):
     """Schema for serializing Masjid data."""
@@ -46,6 +49,10 @@ class MasjidSchema(Schema):
     default_latitude = fields.Float(dump_only=True, attribute="default_latitude")
     default_longitude = fields.Float(dump_only=True, attribute="default_longitude")
 
+class NearbyMasjidSchema(MasjidSchema):
+    """Schema for serializing Masjids returned by a location search, with their distance."""
+    distance_km = fields.Float(dump_only=True)
+
 class AnnouncementPostSchema(Schema):
     """Schema for validating the payload for creating a new announcement."""
     title = fields.Str(required=True)
@@ -57,6 +64,11 @@ class AnnouncementSchema(AnnouncementPostSchema):
     masjid_id = fields.Int(dump_only=True)
     created_at = fields.DateTime(dump_only=True)
 
+class DeviceRegistrationSchema(Schema):
+    """Schema for registering a device's FCM token for push notifications."""
+    device_token = fields.Str(required=True, validate=validate.Length(min=1, max=255))
+    device_type = fields.Str(load_default='android', validate=validate.OneOf(['android', 'ios', 'web']))
+
 class InitialPrayerDataSchema(Schema):
     currentLocationName = fields.Str(required=True)
     currentPrayerPeriod = fields.Dict(required=True)
@@ -101,6 +113,40 @@ class MasjidApplicationAdminSchema(MasjidApplicationSchema):
     # Include applicant's info
     applicant = fields.Nested(lambda: UserSchema, dump_only=True)
 
+class ApplicationListArgsSchema(Schema):
+    """Query arguments for the admin application listing and export."""
+    after_id = fields.Int(validate=validate.Range(min=0), metadata={"description": "Keyset cursor: only applications with a larger ID are returned."})
+    limit = fields.Int(load_default=100, validate=validate.Range(min=1, max=1000))
+    status = fields.Str()
+    created_after = fields.DateTime()
+    created_before = fields.DateTime()
+    min_trust_score = fields.Int()
+    max_trust_score = fields.Int()
+
+class ApplicationExportArgsSchema(ApplicationListArgsSchema):
+    """Query arguments for the application export; `limit` is ignored, every matching row is streamed."""
+    format = fields.Str(load_default='ndjson', validate=validate.OneOf(['ndjson', 'csv']))
+
+# A calendar month, "YYYY-MM".
+MONTH_FORMAT = validate.Regexp(r'^\d{4}-(0[1-9]|1[0-2])$', error="Month must be in YYYY-MM format.")
+
+class ScheduleRangeArgsSchema(Schema):
+    """Query arguments for a multi-month schedule: an inclusive range of months."""
+    start = fields.Str(required=True, validate=MONTH_FORMAT)
+    end = fields.Str(required=True, validate=MONTH_FORMAT)
+
+class KnownScheduleMonthSchema(Schema):
+    """
+    A month's schedule the client already holds, identified by its script_hash.
+    Versions are counted per owner, so they cannot tell two owners' schedules apart.
+    """
+    month = fields.Str(required=True, validate=MONTH_FORMAT)
+    script_hash = fields.Str(required=True, validate=validate.Length(equal=64))
+
+class ScheduleSyncSchema(ScheduleRangeArgsSchema):
+    """Body of a schedule delta sync: the month range and the schedules the client already holds."""
+    known = fields.List(fields.Nested(KnownScheduleMonthSchema), load_default=list)
+
 class ApplicationActionSchema(Schema):
     """Schema for actions on an application, like rejection."""
     reason = fields.Str(required=True)
@@ -112,6 +158,27 @@ class UserSchema(Schema):
     name = fields.Str(dump_only=True)
     role = fields.Str(dump_only=True)
 
+class UserListArgsSchema(Schema):
+    """Query arguments for the admin user listing and export."""
+    after_id = fields.Int(validate=validate.Range(min=0), metadata={"description": "Keyset cursor: only users with a larger ID are returned."})
+    limit = fields.Int(load_default=100, validate=validate.Range(min=1, max=1000))
+    role = fields.Str()
+    city = fields.Str()
+    last_seen_after = fields.DateTime()
+    last_seen_before = fields.DateTime()
+    columns = DelimitedList(fields.Str(), metadata={"description": "Comma-separated columns to return (defaults to the basic profile)."})
+
+class UserListingSchema(Schema):
+    """A user row in the admin listing. Only the projected columns are present."""
+    id = fields.Int(dump_only=True)
+    supabase_user_id = fields.Str(dump_only=True)
+    email = fields.Str(dump_only=True)
+    name = fields.Str(dump_only=True)
+    role = fields.Str(dump_only=True)
+    default_city_name = fields.Str(dump_only=True)
+    last_seen_at = fields.DateTime(dump_only=True)
+    masjid_code = fields.Str(dump_only=True)
+
 class GeocodeSchema(Schema):
     city = fields.Str(required=True)
 
@@ -5,6 +5,24 @@ import requests
 from flask import current_app # To access app.logger and app.config
 from .base_adapter import BasePrayerAdapter
 
+
+def build_daily_timings(raw_data):
+    """Standardizes one day of an AlAdhan response to {"date": "DD-MM-YYYY", "timings": {...}}."""
+    return {
+        "date": raw_data.get("date", {}).get("gregorian", {}).get("date"),
+        "timings": raw_data.get("timings", {})
+    }
+
+
+def build_yearly_calendar(calendar_by_month):
+    """Flattens AlAdhan's {"1": [days], ..., "12": [days]} calendar into a list of standardized days."""
+    return [
+        build_daily_timings(day_data)
+        for month_key in sorted(calendar_by_month.keys(), key=int)
+        for day_data in calendar_by_month[month_key]
+    ]
+
+
 class AlAdhanAdapter(BasePrayerAdapter):
     """
     API Adapter for AlAdhan.com Prayer Times API.
@@ -38,11 +56,7 @@ class AlAdhanAdapter(BasePrayerAdapter):
 
             if data.get("code") == 200 and "data" in data:
                 current_app.logger.info(f"AlAdhanAdapter: Successfully fetched daily timings for {date_str}.")
-                raw_data = data["data"]
-                return {
-                    "date": raw_data.get("date", {}).get("gregorian", {}).get("date"),
-                    "timings": raw_data.get("timings", {})
-                }
+                return build_daily_timings(data["data"])
             else:
                 current_app.logger.error(f"AlAdhanAdapter: API error for daily timings {date_str}. Code: {data.get('code')}, Status: {data.get('status')}")
                 return None
@@ -83,14 +97,8 @@ class AlAdhanAdapter(BasePrayerAdapter):
             data = response.json()
 
             if data.get("code") == 200 and "data" in data and isinstance(data["data"], dict):
-                full_year_data = []
-                for month_key in sorted(data["data"].keys(), key=int):
-                    for day_data in data["data"][month_key]:
-                        full_year_data.append({
-                            "date": day_data.get("date", {}).get("gregorian", {}).get("date"),
-                            "timings": day_data.get("timings", {})
-                        })
-                
+                full_year_data = build_yearly_calendar(data["data"])
+
                 if not full_year_data:
                     current_app.logger.error(f"AlAdhanAdapter: API returned empty data for year {year}.")
                     return None
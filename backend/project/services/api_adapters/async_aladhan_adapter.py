@@ -0,0 +1,80 @@
+# project/services/api_adapters/async_aladhan_adapter.py
+
+import asyncio
+
+import aiohttp
+from flask import current_app
+
+from .aladhan_adapter import build_daily_timings, build_yearly_calendar
+from .base_adapter import AsyncBasePrayerAdapter
+
+
+class AsyncAlAdhanAdapter(AsyncBasePrayerAdapter):
+    """
+    Asyncio variant of AlAdhanAdapter. Same endpoints, parameters and return
+    shapes; requests go through the aiohttp session it is given.
+    """
+
+    async def fetch_daily_timings(self, date_obj, latitude, longitude, method_id, asr_juristic_id, high_latitude_method_id):
+        """
+        Fetches prayer times for a single day from the AlAdhan.com API.
+        """
+        date_str = date_obj.strftime("%d-%m-%Y")
+        endpoint = f"{self.base_url}/timings/{date_str}"
+        params = _calculation_params(latitude, longitude, method_id, asr_juristic_id, high_latitude_method_id)
+
+        data = await self._get_json(endpoint, params, timeout=10, label=f"daily timings {date_str}")
+        if data is None:
+            return None
+        if data.get("code") == 200 and "data" in data:
+            return build_daily_timings(data["data"])
+
+        current_app.logger.error(f"AsyncAlAdhanAdapter: API error for daily timings {date_str}. Code: {data.get('code')}, Status: {data.get('status')}")
+        return None
+
+    async def fetch_yearly_calendar(self, year, latitude, longitude, method_id, asr_juristic_id, high_latitude_method_id):
+        """
+        Fetches a full year's prayer time calendar from the AlAdhan.com API.
+        """
+        endpoint = f"{self.base_url}/calendar"
+        params = _calculation_params(latitude, longitude, method_id, asr_juristic_id, high_latitude_method_id)
+        params["year"] = year
+
+        # Using a longer timeout for a large annual data request.
+        data = await self._get_json(endpoint, params, timeout=30, label=f"year {year} at ({latitude}, {longitude})")
+        if data is None:
+            return None
+        if data.get("code") == 200 and "data" in data and isinstance(data["data"], dict):
+            full_year_data = build_yearly_calendar(data["data"])
+            if not full_year_data:
+                current_app.logger.error(f"AsyncAlAdhanAdapter: API returned empty data for year {year}.")
+                return None
+            return full_year_data
+
+        current_app.logger.error(f"AsyncAlAdhanAdapter: API error for year {year}. Code: {data.get('code')}, Status: {data.get('status')}")
+        return None
+
+    async def _get_json(self, endpoint, params, timeout, label):
+        """GETs `endpoint` and returns the decoded JSON body, or None (logged) on any failure."""
+        try:
+            async with self.session.get(endpoint, params=params, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
+        except asyncio.TimeoutError:
+            current_app.logger.error(f"AsyncAlAdhanAdapter: Timeout error fetching {label}.")
+        except aiohttp.ClientError as e:
+            current_app.logger.error(f"AsyncAlAdhanAdapter: ClientError for {label}: {e}")
+        except ValueError as e:
+            current_app.logger.error(f"AsyncAlAdhanAdapter: Invalid JSON for {label}: {e}")
+        return None
+
+
+def _calculation_params(latitude, longitude, method_id, asr_juristic_id, high_latitude_method_id):
+    # aiohttp only accepts str/int/float query values, as AlAdhanAdapter sends them.
+    return {
+        "latitude": str(latitude),
+        "longitude": str(longitude),
+        "method": method_id,
+        "school": asr_juristic_id,
+        "latitudeAdjustmentMethod": high_latitude_method_id,
+    }
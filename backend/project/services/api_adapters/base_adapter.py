@@ -16,3 +16,26 @@ class BasePrayerAdapter(ABC):
     def fetch_yearly_calendar(self, year, latitude, longitude, method_id, asr_juristic_id, high_latitude_method_id):
         """Fetches a full year's prayer calendar and returns it in a standardized format."""
         pass
+
+
+class AsyncBasePrayerAdapter(ABC):
+    """
+    Asyncio counterpart of BasePrayerAdapter, for bulk jobs that fetch many
+    calendars concurrently from one process. Implementations share one
+    aiohttp.ClientSession and return exactly what their blocking adapter returns.
+    """
+
+    def __init__(self, session, base_url, api_key=None):
+        self.session = session
+        self.base_url = base_url
+        self.api_key = api_key
+
+    @abstractmethod
+    async def fetch_daily_timings(self, date_obj, latitude, longitude, method_id, asr_juristic_id, high_latitude_method_id):
+        """Fetches prayer times for a single day and returns them in a standardized format."""
+        pass
+
+    @abstractmethod
+    async def fetch_yearly_calendar(self, year, latitude, longitude, method_id, asr_juristic_id, high_latitude_method_id):
+        """Fetches a full year's prayer calendar and returns it in a standardized format."""
+        pass
@@ -6,6 +6,8 @@ of a Masjid Application, from submission to verification and final approval
 or rejection.
 """
 
+from flask import current_app
+
 from .. import db
 from ..models import MasjidApplication, User, ApplicationAuditLog
 
@@ -15,8 +17,7 @@ def submit_application(applicant: User, application_data: dict) -> MasjidApplica
     Creates a new MasjidApplication record in the database.
 
     This is the first step in the registration process. After the application
-    is created, a background task will be triggered to start the automated
-    verification process.
+    is created, the automated verification pipeline is queued on Celery.
 
     Args:
         applicant: The User object of the user who is applying.
@@ -47,10 +48,8 @@ def submit_application(applicant: User, application_data: dict) -> MasjidApplica
     db.session.add(new_application)
     db.session.commit()
 
-    # In a real-world scenario, you would trigger a background task here.
-    # For example, using Celery: `start_verification_process.delay(new_application.id)`
-    # For now, we will call it directly for simplicity, but this should be asynchronous.
-    # start_verification_process(new_application.id)
+    # Kick off the automated verification pipeline in the background.
+    enqueue_verification_process(new_application.id)
 
     return new_application
 
@@ -60,6 +59,8 @@ def submit_application(applicant: User, application_data: dict) -> MasjidApplica
 from . import notification_service
 
 from .third_party import image_hashing_service, google_vision_service
+from . import image_fingerprint_service
+from . import identity_service
 from ..models import ImageFingerprint
 from sqlalchemy.sql import func
 
@@ -67,13 +68,28 @@ from sqlalchemy.sql import func
 HAMMING_DISTANCE_THRESHOLD = 5 # How similar images can be to be considered duplicates
 NEARBY_RADIUS_METERS = 100 # Radius to check for duplicate masjid locations
 
+def enqueue_verification_process(application_id: int):
+    """
+    Queues the verification pipeline for an application as a Celery chord: the
+    image, location and document checks run in parallel and a final task merges
+    their results. If the broker is unavailable the application simply stays
+    'pending' and can be re-verified later.
+    """
+    try:
+        from ..tasks import dispatch_application_verification
+        dispatch_application_verification(application_id)
+    except Exception as e:
+        current_app.logger.error(f"Could not queue verification for application {application_id}: {e}", exc_info=True)
+
+
 def start_verification_process(application_id: int):
     """
-    The main entry point for the automated verification process.
-    This function orchestrates all the individual verification steps.
-    
-    NOTE: This should be run as an asynchronous background task.
-    
+    Runs the whole automated verification process synchronously, in-process.
+
+    The same stage functions are run in parallel by the Celery chord queued in
+    `enqueue_verification_process`; this entry point is used for re-runs from a
+    shell and by tests.
+
     Args:
         application_id: The ID of the MasjidApplication to verify.
     """
@@ -82,32 +98,83 @@ def start_verification_process(application_id: int):
         print(f"Application with ID {application_id} not found.")
         return
 
+    stage_results = [
+        run_image_duplicate_check(application),
+        run_nearby_masjid_check(application),
+        run_document_check(application),
+    ]
+    apply_verification_results(application, stage_results)
+
+
+# --- Verification Stages ---
+# Each stage is independent of the others and returns a small JSON-serializable
+# dict, so stages can run as parallel Celery tasks and be merged afterwards.
+
+def run_image_duplicate_check(application: MasjidApplication) -> dict:
+    """Stage 1: hashes the application's photos and looks for duplicates of existing ones."""
+    is_duplicate, matched_masjid_id = _check_internal_image_duplicates(application)
+    db.session.commit() # Persist the new fingerprints
+    return {'check': 'images', 'is_duplicate': is_duplicate, 'matched_masjid_id': matched_masjid_id}
+
+
+def run_nearby_masjid_check(application: MasjidApplication) -> dict:
+    """Stage 2: looks for existing masjids registered at (almost) the same location."""
+    is_nearby, nearby_masjid_id = _check_for_nearby_masjids(application)
+    return {'check': 'location', 'has_nearby_masjid': is_nearby, 'nearby_masjid_id': nearby_masjid_id}
+
+
+def run_document_check(application: MasjidApplication) -> dict:
+    """Stage 3: OCRs the official document, if one was provided."""
+    if not application.has_official_document:
+        return {'check': 'document', 'performed': False, 'document_text': None}
+    document_text = google_vision_service.detect_text_in_document_from_url(application.document_url)
+    return {'check': 'document', 'performed': True, 'document_text': document_text}
+
+
+def apply_verification_results(application: MasjidApplication, stage_results: list):
+    """
+    Final step: merges the stage results into the application's verification
+    details and trust score, and decides its status.
+
+    A stage result carrying an 'error' key (the stage crashed) sends the
+    application to manual review instead of scoring it.
+    """
+    results_by_check = {result['check']: result for result in stage_results}
     verification_details = {}
     trust_score = 0
 
+    for check, result in results_by_check.items():
+        if result.get('error'):
+            verification_details[f'{check}_check_error'] = result['error']
+            application.status = 'needs_manual_review'
+            application.rejection_reason = (application.rejection_reason or "") + f" | Automated {check} check failed"
+
     # 1. Internal Image Duplicate Check
-    is_duplicate, matched_masjid_id = _check_internal_image_duplicates(application)
-    verification_details['image_is_internal_duplicate'] = is_duplicate
-    if is_duplicate:
-        trust_score -= 50 # Heavy penalty for duplicate images
-        application.status = 'needs_manual_review'
-        application.rejection_reason = f"Potential duplicate of images from Masjid ID: {matched_masjid_id}"
-    else:
-        trust_score += 25
+    image_result = results_by_check.get('images', {})
+    if 'is_duplicate' in image_result:
+        verification_details['image_is_internal_duplicate'] = image_result['is_duplicate']
+        if image_result['is_duplicate']:
+            trust_score -= 50 # Heavy penalty for duplicate images
+            application.status = 'needs_manual_review'
+            application.rejection_reason = f"Potential duplicate of images from Masjid ID: {image_result['matched_masjid_id']}"
+        else:
+            trust_score += 25
 
     # 2. Nearby Location Check
-    is_nearby, nearby_masjid_id = _check_for_nearby_masjids(application)
-    verification_details['has_nearby_masjid'] = is_nearby
-    if is_nearby:
-        trust_score -= 10
-        application.status = 'needs_manual_review'
-        application.rejection_reason = (application.rejection_reason or "") + f" | Nearby Masjid found: ID {nearby_masjid_id}"
-    else:
-        trust_score += 15
+    location_result = results_by_check.get('location', {})
+    if 'has_nearby_masjid' in location_result:
+        verification_details['has_nearby_masjid'] = location_result['has_nearby_masjid']
+        if location_result['has_nearby_masjid']:
+            trust_score -= 10
+            application.status = 'needs_manual_review'
+            application.rejection_reason = (application.rejection_reason or "") + f" | Nearby Masjid found: ID {location_result['nearby_masjid_id']}"
+        else:
+            trust_score += 15
 
     # 3. Document OCR Check (if document was provided)
-    if application.has_official_document:
-        document_text = google_vision_service.detect_text_in_document_from_url(application.document_url)
+    document_result = results_by_check.get('document', {})
+    if document_result.get('performed'):
+        document_text = document_result['document_text']
         verification_details['document_ocr_text'] = document_text
         if document_text and application.official_name.lower() in document_text.lower():
             trust_score += 30
@@ -119,7 +186,7 @@ def start_verification_process(application_id: int):
     # Update the application with the results
     application.trust_score = trust_score
     application.verification_details = verification_details
-    
+
     # Decide final status based on score
     if application.status != 'needs_manual_review':
         if trust_score >= 60:
@@ -148,14 +215,16 @@ def _check_internal_image_duplicates(application: MasjidApplication) -> (bool, i
     db.session.add(ImageFingerprint(application_id=application.id, image_url=application.exterior_photo_url, image_type='exterior', phash=exterior_hash))
     db.session.add(ImageFingerprint(application_id=application.id, image_url=application.interior_photo_url, image_type='interior', phash=interior_hash))
 
-    # Check against all other fingerprints
-    all_other_hashes = ImageFingerprint.query.filter(ImageFingerprint.application_id != application.id).all()
-
-    for existing_fp in all_other_hashes:
-        if image_hashing_service.compare_phashes(exterior_hash, existing_fp.phash) < HAMMING_DISTANCE_THRESHOLD:
-            return True, existing_fp.user_id or existing_fp.application.user_id
-        if image_hashing_service.compare_phashes(interior_hash, existing_fp.phash) < HAMMING_DISTANCE_THRESHOLD:
-            return True, existing_fp.user_id or existing_fp.application.user_id
+    # Look up similar fingerprints through the Hamming-space index instead of
+    # comparing against every stored fingerprint.
+    for new_hash in (exterior_hash, interior_hash):
+        matches = image_fingerprint_service.find_similar_fingerprints(
+            new_hash,
+            max_distance=HAMMING_DISTANCE_THRESHOLD - 1,
+            exclude_application_id=application.id
+        )
+        if matches:
+            return True, matches[0].owner_user_id
 
     return False, None
 
@@ -198,6 +267,7 @@ def approve_application(application: MasjidApplication, admin_user: User):
 
     db.session.add(ApplicationAuditLog(application=application, actor=admin_user, action='approved'))
     db.session.commit()
+    identity_service.invalidate_identity(applicant.supabase_user_id) # The applicant's cached role changed
     notification_service.send_approval_email(application)
 
 def reject_application(application: MasjidApplication, admin_user: User, reason: str):
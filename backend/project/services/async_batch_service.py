@@ -0,0 +1,167 @@
+"""
+Async Batch Fetching
+--------------------
+Fetches hundreds of yearly calendars, or reverse-geocodes thousands of
+coordinates, concurrently from a single process.
+
+The blocking adapters can only be parallelized with threads or more Celery
+workers. Here the asyncio adapters (AsyncAlAdhanAdapter, AsyncLocationIQAdapter,
+AsyncOpenWeatherMapAdapter) share one aiohttp session, and an asyncio.Semaphore
+bounds the number of requests in flight (ASYNC_PRAYER_BATCH_CONCURRENCY and
+ASYNC_GEOCODING_BATCH_CONCURRENCY). Results come back in the adapters' usual
+shapes, so callers can store them exactly as they store blocking results.
+
+The `*_async` functions take an adapter (and so a session) owned by the caller;
+the plain functions build both from the app config and run the batch with
+asyncio.run, for use from Celery tasks and scripts. prefetch_yearly_calendars
+also stores the fetched calendars with bulk_upsert_yearly_calendars; the
+next-year precache script runs its whole batch through it.
+"""
+
+import asyncio
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+from flask import current_app
+
+from .api_adapters.async_aladhan_adapter import AsyncAlAdhanAdapter
+from .geocoding_adapters.async_locationiq_adapter import AsyncLocationIQAdapter
+from .geocoding_adapters.async_openweathermap_adapter import AsyncOpenWeatherMapAdapter
+from .prayer_time.data_processor import bulk_upsert_yearly_calendars, make_calendar_row
+from .prefetch_service import PrefetchJob
+
+Coordinates = Tuple[float, float]
+
+
+def get_async_prayer_adapter(session: aiohttp.ClientSession):
+    """Async counterpart of get_selected_api_adapter, bound to `session`."""
+    adapter_name = current_app.config.get('PRAYER_API_ADAPTER', "AlAdhanAdapter")
+    base_url = current_app.config.get('PRAYER_API_BASE_URL')
+    if adapter_name != "AlAdhanAdapter":
+        raise ValueError(f"No async variant of Prayer API Adapter: {adapter_name}")
+    if not base_url:
+        raise ValueError("AlAdhan API base URL is not configured.")
+    return AsyncAlAdhanAdapter(session, base_url=base_url, api_key=current_app.config.get('PRAYER_API_KEY'))
+
+
+def get_async_geocoding_adapter(session: aiohttp.ClientSession):
+    """Async counterpart of geocoding_service.get_geocoding_adapter, bound to `session`."""
+    provider = current_app.config.get('GEOCODING_PROVIDER', 'OpenWeatherMap').lower()
+    if provider == 'locationiq':
+        api_key = current_app.config.get('LOCATIONIQ_API_KEY')
+        if not api_key:
+            raise ValueError("LocationIQ API key is not configured.")
+        return AsyncLocationIQAdapter(session, api_key=api_key)
+    elif provider == 'openweathermap':
+        api_key = current_app.config.get('OPENWEATHERMAP_API_KEY')
+        if not api_key:
+            raise ValueError("OpenWeatherMap API key is not configured.")
+        return AsyncOpenWeatherMapAdapter(session, api_key=api_key)
+    else:
+        raise ValueError(f"Unsupported geocoding provider: {provider}")
+
+
+async def fetch_yearly_calendars_async(adapter, jobs: Iterable[PrefetchJob], year: int,
+                                       concurrency: Optional[int] = None) -> Dict[Tuple[str, str], Optional[list]]:
+    """
+    Fetches `year`'s calendar for every (zone_id, calculation_method, latitude, longitude)
+    job with at most `concurrency` requests in flight. Returns
+    {(zone_id, calculation_method): calendar}, with None for failed fetches.
+    """
+    concurrency = concurrency or current_app.config['ASYNC_PRAYER_BATCH_CONCURRENCY']
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(job):
+        zone_id, calculation_method, latitude, longitude = job
+        method_id, asr_juristic_id, high_latitude_method_id = map(int, calculation_method.split('-'))
+        async with semaphore:
+            try:
+                return await adapter.fetch_yearly_calendar(
+                    year, latitude, longitude, method_id, asr_juristic_id, high_latitude_method_id
+                )
+            except Exception as e:
+                current_app.logger.error(f"Async batch: calendar fetch for {zone_id} ({calculation_method}) failed: {e}", exc_info=True)
+                return None
+
+    jobs = list(jobs)
+    start = time.monotonic()
+    calendars = await asyncio.gather(*(fetch(job) for job in jobs))
+    results = {(job[0], job[1]): calendar for job, calendar in zip(jobs, calendars)}
+
+    failed = sum(calendar is None for calendar in calendars)
+    current_app.logger.info(f"Async batch: fetched {len(jobs) - failed}/{len(jobs)} calendars for {year} "
+                            f"in {time.monotonic() - start:.2f}s ({failed} failed).")
+    return results
+
+
+async def reverse_geocode_many_async(adapter, coordinates: Iterable[Coordinates],
+                                     concurrency: Optional[int] = None) -> List[dict]:
+    """
+    Reverse-geocodes every (latitude, longitude) with at most `concurrency` requests in
+    flight. Returns the adapter's result for each coordinate, in input order
+    (an {"error": ...} dictionary for failed lookups).
+    """
+    concurrency = concurrency or current_app.config['ASYNC_GEOCODING_BATCH_CONCURRENCY']
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def reverse_geocode(lat, lon):
+        async with semaphore:
+            try:
+                return await adapter.reverse_geocode(lat, lon)
+            except Exception as e:
+                current_app.logger.error(f"Async batch: reverse geocoding ({lat}, {lon}) failed: {e}", exc_info=True)
+                return {"error": "Failed to reverse geocode."}
+
+    coordinates = list(coordinates)
+    start = time.monotonic()
+    results = await asyncio.gather(*(reverse_geocode(lat, lon) for lat, lon in coordinates))
+
+    failed = sum('error' in result for result in results)
+    current_app.logger.info(f"Async batch: reverse-geocoded {len(coordinates) - failed}/{len(coordinates)} coordinates "
+                            f"in {time.monotonic() - start:.2f}s ({failed} failed).")
+    return results
+
+
+def fetch_yearly_calendars(jobs: Iterable[PrefetchJob], year: int,
+                           concurrency: Optional[int] = None) -> Dict[Tuple[str, str], Optional[list]]:
+    """Blocking entry point of fetch_yearly_calendars_async, using the configured prayer API."""
+    async def run():
+        async with _client_session(concurrency or current_app.config['ASYNC_PRAYER_BATCH_CONCURRENCY']) as session:
+            return await fetch_yearly_calendars_async(get_async_prayer_adapter(session), jobs, year, concurrency)
+    return asyncio.run(run())
+
+
+def store_yearly_calendars(calendars: Dict[Tuple[str, str], Optional[list]], year: int) -> List[Tuple[str, int, str]]:
+    """
+    Writes the fetched calendars ({(zone_id, calculation_method): calendar}, None for
+    failed fetches) in one bulk upsert. Returns the keys inserted or changed.
+    """
+    rows = [make_calendar_row(zone_id, year, calculation_method, calendar)
+            for (zone_id, calculation_method), calendar in calendars.items() if calendar]
+    return bulk_upsert_yearly_calendars(rows)
+
+
+def prefetch_yearly_calendars(jobs: Iterable[PrefetchJob], year: int,
+                              concurrency: Optional[int] = None) -> Tuple[int, int, int]:
+    """
+    Fetches `year`'s calendar for every job concurrently and stores them.
+    Returns (fetched, failed, inserted or changed) counts.
+    """
+    calendars = fetch_yearly_calendars(jobs, year, concurrency)
+    changed = store_yearly_calendars(calendars, year)
+    failed = sum(calendar is None for calendar in calendars.values())
+    return len(calendars) - failed, failed, len(changed)
+
+
+def reverse_geocode_many(coordinates: Iterable[Coordinates], concurrency: Optional[int] = None) -> List[dict]:
+    """Blocking entry point of reverse_geocode_many_async, using the configured geocoding provider."""
+    async def run():
+        async with _client_session(concurrency or current_app.config['ASYNC_GEOCODING_BATCH_CONCURRENCY']) as session:
+            return await reverse_geocode_many_async(get_async_geocoding_adapter(session), coordinates, concurrency)
+    return asyncio.run(run())
+
+
+def _client_session(concurrency: int) -> aiohttp.ClientSession:
+    # One pooled connection per in-flight request; DNS lookups are cached by the connector.
+    return aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency, ttl_dns_cache=300))
@@ -0,0 +1,79 @@
+import asyncio
+
+import aiohttp
+from flask import current_app
+
+from .base_adapter import AsyncBaseGeocodingAdapter
+from .locationiq_adapter import LOCATIONIQ_BASE_URL, build_admin_levels, build_geocode_result
+
+
+class AsyncLocationIQAdapter(AsyncBaseGeocodingAdapter):
+    """
+    Asyncio variant of LocationIQAdapter, returning the same dictionaries
+    (including the same {"error": ...} results on failure).
+    """
+    def __init__(self, session, api_key, base_url=LOCATIONIQ_BASE_URL):
+        self.session = session
+        self.api_key = api_key
+        self.base_url = base_url
+
+    async def geocode(self, city_name):
+        """
+        Fetches location data (lat, lon) for a city name using LocationIQ.
+        """
+        if not self.api_key:
+            current_app.logger.error("Geocoding failed: LocationIQ API key is not configured.")
+            return {"error": "Geocoding service is not configured."}
+
+        params = {
+            "key": self.api_key,
+            "q": city_name,
+            "format": "json",
+            "limit": 1
+        }
+        try:
+            data = await self._get_json(f"{self.base_url}/search.php", params, timeout=10)
+            if not data:
+                return {"error": "City not found."}
+            return build_geocode_result(data[0], city_name)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            current_app.logger.error(f"LocationIQ geocoding request failed: {e}")
+            return {"error": "Failed to connect to geocoding service."}
+        except (KeyError, IndexError, ValueError) as e:
+            current_app.logger.error(f"Failed to parse LocationIQ geocoding response: {e}")
+            return {"error": "Invalid response from geocoding service."}
+
+    async def reverse_geocode(self, lat, lon):
+        """
+        Performs reverse geocoding (coordinates to address) using LocationIQ.
+        Extracts administrative levels.
+        """
+        if not self.api_key:
+            current_app.logger.error("Reverse geocoding failed: LocationIQ API key is not configured.")
+            return {"error": "Reverse geocoding service is not configured."}
+
+        params = {
+            "key": self.api_key,
+            "lat": lat,
+            "lon": lon,
+            "format": "json",
+            "zoom": 10 # A zoom level that typically returns administrative boundaries
+        }
+        try:
+            data = await self._get_json(f"{self.base_url}/reverse.php", params, timeout=10)
+            if not data or "error" in data:
+                error_message = (data or {}).get("error", "Unknown error from LocationIQ reverse geocoding.")
+                current_app.logger.error(f"LocationIQ reverse geocoding failed: {error_message}")
+                return {"error": error_message}
+            return build_admin_levels(data)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            current_app.logger.error(f"LocationIQ reverse geocoding request failed: {e}")
+            return {"error": "Failed to connect to reverse geocoding service."}
+        except (KeyError, IndexError, ValueError) as e:
+            current_app.logger.error(f"Failed to parse LocationIQ reverse geocoding response: {e}")
+            return {"error": "Invalid response from reverse geocoding service."}
+
+    async def _get_json(self, endpoint, params, timeout):
+        async with self.session.get(endpoint, params=params, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
@@ -0,0 +1,49 @@
+import asyncio
+
+import aiohttp
+from flask import current_app
+
+from .base_adapter import AsyncBaseGeocodingAdapter
+from .openweathermap_adapter import OPENWEATHERMAP_BASE_URL, build_geocode_result
+
+
+class AsyncOpenWeatherMapAdapter(AsyncBaseGeocodingAdapter):
+    """
+    Asyncio variant of OpenWeatherMapAdapter, returning the same dictionaries.
+    """
+    def __init__(self, session, api_key, base_url=OPENWEATHERMAP_BASE_URL):
+        self.session = session
+        self.api_key = api_key
+        self.base_url = base_url
+
+    async def geocode(self, city_name):
+        """
+        Fetches location data (lat, lon) for a city name using OpenWeatherMap.
+        """
+        if not self.api_key:
+            current_app.logger.error("Geocoding failed: OpenWeatherMap API key is not configured.")
+            return {"error": "Geocoding service is not configured."}
+
+        params = {
+            "q": city_name,
+            "limit": 1,
+            "appid": self.api_key
+        }
+        try:
+            async with self.session.get(f"{self.base_url}/direct", params=params,
+                                        timeout=aiohttp.ClientTimeout(total=10)) as response:
+                response.raise_for_status()
+                data = await response.json(content_type=None)
+
+            if not data:
+                return {"error": "City not found."}
+            return build_geocode_result(data[0], city_name)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            current_app.logger.error(f"OpenWeatherMap geocoding request failed: {e}")
+            return {"error": "Failed to connect to geocoding service."}
+        except (KeyError, IndexError, ValueError) as e:
+            current_app.logger.error(f"Failed to parse OpenWeatherMap geocoding response: {e}")
+            return {"error": "Invalid response from geocoding service."}
+
+    async def reverse_geocode(self, lat, lon):
+        raise NotImplementedError("Reverse geocoding is not implemented for OpenWeatherMap in this adapter.")
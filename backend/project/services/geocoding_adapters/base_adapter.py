@@ -35,3 +35,26 @@ class BaseGeocodingAdapter(ABC):
         Gets routing information between two points.
         """
         pass
+
+
+class AsyncBaseGeocodingAdapter(ABC):
+    """
+    Asyncio counterpart of BaseGeocodingAdapter, for bulk jobs that geocode many
+    locations concurrently from one process. Implementations share one
+    aiohttp.ClientSession and return exactly what their blocking adapter returns.
+    """
+
+    @abstractmethod
+    async def geocode(self, city_name):
+        """
+        Converts a city name to coordinates.
+        Returns a dictionary with 'lat', 'lon', 'city', 'country'.
+        """
+        pass
+
+    @abstractmethod
+    async def reverse_geocode(self, lat, lon):
+        """
+        Converts coordinates to a human-readable address.
+        """
+        pass
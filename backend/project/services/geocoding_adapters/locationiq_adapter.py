@@ -3,13 +3,50 @@ import requests
 from flask import current_app
 from .base_adapter import BaseGeocodingAdapter
 
+LOCATIONIQ_BASE_URL = "https://us1.locationiq.com/v1"
+
+
+def build_geocode_result(location, city_name):
+    """Standardizes the first LocationIQ search result to {"city", "lat", "lon", "country"}."""
+    # LocationIQ provides a detailed address string
+    display_name_parts = location.get('display_name', '').split(',')
+    country = display_name_parts[-1].strip() if display_name_parts else None
+    city = display_name_parts[0].strip() if display_name_parts else city_name
+
+    return {
+        "city": city,
+        "lat": float(location.get('lat')),
+        "lon": float(location.get('lon')),
+        "country": country
+    }
+
+
+def build_admin_levels(data):
+    """Extracts the administrative levels from a LocationIQ reverse geocoding response."""
+    address = data.get('address', {})
+
+    # Extract administrative levels
+    country_code = address.get('country_code', '').upper()
+    admin_1_name = address.get('state') # Admin Level 1
+    admin_2_name = address.get('county') or address.get('state_district') # Admin Level 2
+    admin_3_name = address.get('city') or address.get('town') or address.get('village') or address.get('suburb') # Admin Level 3
+
+    return {
+        'country_code': country_code,
+        'admin_1_name': admin_1_name,
+        'admin_2_name': admin_2_name,
+        'admin_3_name': admin_3_name,
+        'display_name': data.get('display_name')
+    }
+
+
 class LocationIQAdapter(BaseGeocodingAdapter):
     """
     Geocoding adapter for the LocationIQ API.
     """
     def __init__(self, api_key):
         self.api_key = api_key
-        self.base_url = "https://us1.locationiq.com/v1"
+        self.base_url = LOCATIONIQ_BASE_URL
 
     def geocode(self, city_name):
         """
@@ -35,21 +72,7 @@ class LocationIQAdapter(BaseGeocodingAdapter):
             if not data:
                 return {"error": "City not found."}
 
-            location = data[0]
-            lat = location.get('lat')
-            lon = location.get('lon')
-            
-            # LocationIQ provides a detailed address string
-            display_name_parts = location.get('display_name', '').split(',')
-            country = display_name_parts[-1].strip() if display_name_parts else None
-            city = display_name_parts[0].strip() if display_name_parts else city_name
-
-            return {
-                "city": city,
-                "lat": float(lat),
-                "lon": float(lon),
-                "country": country
-            }
+            return build_geocode_result(data[0], city_name)
         except requests.exceptions.RequestException as e:
             current_app.logger.error(f"LocationIQ geocoding request failed: {e}")
             return {"error": "Failed to connect to geocoding service."}
@@ -85,21 +108,7 @@ class LocationIQAdapter(BaseGeocodingAdapter):
                 current_app.logger.error(f"LocationIQ reverse geocoding failed: {error_message}")
                 return {"error": error_message}
 
-            address = data.get('address', {})
-            
-            # Extract administrative levels
-            country_code = address.get('country_code', '').upper()
-            admin_1_name = address.get('state') # Admin Level 1
-            admin_2_name = address.get('county') or address.get('state_district') # Admin Level 2
-            admin_3_name = address.get('city') or address.get('town') or address.get('village') or address.get('suburb') # Admin Level 3
-
-            return {
-                'country_code': country_code,
-                'admin_1_name': admin_1_name,
-                'admin_2_name': admin_2_name,
-                'admin_3_name': admin_3_name,
-                'display_name': data.get('display_name')
-            }
+            return build_admin_levels(data)
         except requests.exceptions.RequestException as e:
             current_app.logger.error(f"LocationIQ reverse geocoding request failed: {e}")
             return {"error": "Failed to connect to reverse geocoding service."}
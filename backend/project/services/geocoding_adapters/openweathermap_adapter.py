@@ -3,6 +3,19 @@ import requests
 from flask import current_app
 from .base_adapter import BaseGeocodingAdapter
 
+OPENWEATHERMAP_BASE_URL = "http://api.openweathermap.org/geo/1.0"
+
+
+def build_geocode_result(location, city_name):
+    """Standardizes the first OpenWeatherMap direct geocoding result to {"city", "lat", "lon", "country"}."""
+    return {
+        "city": location.get('name', city_name),
+        "lat": location.get('lat'),
+        "lon": location.get('lon'),
+        "country": location.get('country')
+    }
+
+
 class OpenWeatherMapAdapter(BaseGeocodingAdapter):
     """
     Geocoding adapter for the OpenWeatherMap API.
@@ -10,7 +23,7 @@ class OpenWeatherMapAdapter(BaseGeocodingAdapter):
     """
     def __init__(self, api_key):
         self.api_key = api_key
-        self.base_url = "http://api.openweathermap.org/geo/1.0"
+        self.base_url = OPENWEATHERMAP_BASE_URL
 
     def geocode(self, city_name):
         """
@@ -35,18 +48,7 @@ class OpenWeatherMapAdapter(BaseGeocodingAdapter):
             if not data:
                 return {"error": "City not found."}
 
-            location = data[0]
-            lat = location.get('lat')
-            lon = location.get('lon')
-            country = location.get('country')
-            city = location.get('name', city_name)
-
-            return {
-                "city": city,
-                "lat": lat,
-                "lon": lon,
-                "country": country
-            }
+            return build_geocode_result(data[0], city_name)
         except requests.exceptions.RequestException as e:
             current_app.logger.error(f"OpenWeatherMap geocoding request failed: {e}")
             return {"error": "Failed to connect to geocoding service."}
@@ -0,0 +1,195 @@
+"""
+System Health Service
+---------------------
+Background-probed health status for the admin dashboard.
+
+The health endpoint used to ping the database and Redis, call the prayer API
+and read Prometheus internals on every hit, so a slow dependency made the
+dashboard itself slow. Instead, a periodic Celery task (`run_health_probes`)
+probes every dependency, stores the latest snapshot in Redis and appends each
+probe's latency to a capped per-check history. The endpoint only reads that
+snapshot back (`get_health_snapshot`), in a single Redis round trip.
+
+Celery worker liveness comes from a real `inspect().ping()` broadcast, whose
+result is cached in Redis for CELERY_PING_CACHE_SECONDS so that frequent probes
+do not flood the broker. Cache hit/miss statistics are summed from the metrics
+registry at request time (across all gunicorn workers in multiprocess mode).
+"""
+
+import json
+import statistics
+import time
+from datetime import datetime
+
+import requests
+from flask import current_app
+from redis import exceptions as redis_exceptions
+from sqlalchemy import text
+
+from .. import db
+from ..extensions import redis_client
+from ..metrics import get_metrics_registry
+
+# Latest snapshot written by the prober (JSON).
+HEALTH_SNAPSHOT_KEY = "health:snapshot"
+# Capped list of the most recent probe results of a check, newest first (JSON per entry).
+HEALTH_HISTORY_KEY = "health:history:{check}"
+# Cached result of the last Celery worker ping (JSON).
+CELERY_PING_CACHE_KEY = "health:celery_ping"
+
+HEALTH_CHECKS = ('database', 'redis', 'external_prayer_api', 'celery_workers')
+
+
+def run_health_probes() -> dict:
+    """
+    Probes every dependency, records the snapshot and latency histories in Redis
+    and returns the snapshot. Run periodically by Celery beat.
+    """
+    checks = {
+        'database': _timed_probe(_probe_database),
+        'redis': _timed_probe(redis_client.ping),
+        'external_prayer_api': _timed_probe(_probe_prayer_api),
+        'celery_workers': _timed_probe(get_celery_worker_status),
+    }
+    snapshot = {'checked_at': datetime.utcnow().isoformat(), 'checks': checks}
+
+    history_length = current_app.config['HEALTH_LATENCY_HISTORY_LENGTH']
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.set(HEALTH_SNAPSHOT_KEY, json.dumps(snapshot))
+        for check, result in checks.items():
+            history_key = HEALTH_HISTORY_KEY.format(check=check)
+            pipe.lpush(history_key, json.dumps({
+                'at': snapshot['checked_at'], 'ok': result['status'] == 'OK', 'latency_ms': result['latency_ms']
+            }))
+            pipe.ltrim(history_key, 0, history_length - 1)
+        pipe.execute()
+    except redis_exceptions.RedisError as e:
+        current_app.logger.error(f"Health Check: could not store the probe snapshot in Redis: {e}")
+
+    for check, result in checks.items():
+        if result['status'] != 'OK':
+            current_app.logger.error(f"Health Check: {check}: {result['status']}")
+    return snapshot
+
+
+def get_health_snapshot() -> dict:
+    """
+    Returns the latest probe snapshot with latency summaries and cache stats,
+    without probing anything itself.
+    """
+    history_length = current_app.config['HEALTH_LATENCY_HISTORY_LENGTH']
+    health_status = {check: "UNKNOWN" for check in HEALTH_CHECKS}
+    health_status.update({"checked_at": None, "stale": True, "latency_ms": {}})
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.get(HEALTH_SNAPSHOT_KEY)
+        for check in HEALTH_CHECKS:
+            pipe.lrange(HEALTH_HISTORY_KEY.format(check=check), 0, history_length - 1)
+        raw_snapshot, *histories = pipe.execute()
+    except redis_exceptions.RedisError as e:
+        current_app.logger.error(f"Health Check: Redis Error: {e}")
+        health_status["redis"] = f"ERROR: {e}"
+        health_status["cache_stats"] = get_cache_stats()
+        return health_status
+
+    if raw_snapshot:
+        snapshot = json.loads(raw_snapshot)
+        checked_at = datetime.fromisoformat(snapshot['checked_at'])
+        age_seconds = (datetime.utcnow() - checked_at).total_seconds()
+        health_status["checked_at"] = snapshot['checked_at']
+        # A snapshot older than a few probe intervals means the prober itself is not running.
+        health_status["stale"] = age_seconds > 3 * current_app.config['HEALTH_PROBE_INTERVAL_SECONDS']
+        for check, result in snapshot['checks'].items():
+            health_status[check] = result['status']
+
+    for check, history in zip(HEALTH_CHECKS, histories):
+        health_status["latency_ms"][check] = _summarize_history([json.loads(entry) for entry in history])
+
+    health_status["cache_stats"] = get_cache_stats()
+    return health_status
+
+
+def get_celery_worker_status() -> list:
+    """
+    Pings all Celery workers, caching the outcome for CELERY_PING_CACHE_SECONDS.
+    Returns the names of the workers that replied; raises if none did.
+    """
+    try:
+        cached = redis_client.get(CELERY_PING_CACHE_KEY)
+    except redis_exceptions.RedisError:
+        cached = None
+    if cached:
+        result = json.loads(cached)
+    else:
+        from ..celery_utils import celery
+
+        replies = celery.control.inspect(timeout=current_app.config['CELERY_PING_TIMEOUT_SECONDS']).ping() or {}
+        result = {'workers': sorted(replies)}
+        try:
+            redis_client.set(CELERY_PING_CACHE_KEY, json.dumps(result), ex=current_app.config['CELERY_PING_CACHE_SECONDS'])
+        except redis_exceptions.RedisError:
+            pass
+
+    if not result['workers']:
+        raise RuntimeError("No Celery workers replied to ping.")
+    return result['workers']
+
+
+def get_cache_stats() -> dict:
+    """Sums the cache lookup counters from the metrics registry, per cache type and tier."""
+    totals = {}
+    for metric in get_metrics_registry().collect():
+        if metric.name != 'noortime_cache_lookups':
+            continue
+        for sample in metric.samples:
+            if sample.name.endswith('_total'):
+                key = (sample.labels['cache_type'], sample.labels['tier'], sample.labels['result'])
+                totals[key] = totals.get(key, 0) + sample.value
+
+    stats = {}
+    for cache_type, tier in sorted({(cache_type, tier) for cache_type, tier, _ in totals}):
+        hits, misses = totals.get((cache_type, tier, 'hit'), 0), totals.get((cache_type, tier, 'miss'), 0)
+        stats.setdefault(cache_type, {})[tier] = {
+            "hits": int(hits),
+            "misses": int(misses),
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else None,
+        }
+    return stats
+
+
+def _timed_probe(probe) -> dict:
+    start = time.perf_counter()
+    try:
+        probe()
+        status = "OK"
+    except Exception as e:
+        status = f"ERROR: {e}"
+    return {'status': status, 'latency_ms': round((time.perf_counter() - start) * 1000, 2)}
+
+
+def _probe_database():
+    db.session.execute(text('SELECT 1'))
+    db.session.rollback()
+
+
+def _probe_prayer_api():
+    # A lightweight endpoint of the configured prayer API (AlAdhan's method list).
+    test_url = f"{current_app.config.get('PRAYER_API_BASE_URL')}/methods"
+    response = requests.get(test_url, timeout=current_app.config['HEALTH_PROBE_TIMEOUT_SECONDS'])
+    response.raise_for_status()
+
+
+def _summarize_history(history: list) -> dict:
+    """Latency summary of a check's recent probes (newest first)."""
+    latencies = [entry['latency_ms'] for entry in history]
+    if not latencies:
+        return {"last": None, "median": None, "max": None, "failures": 0, "samples": 0}
+    return {
+        "last": latencies[0],
+        "median": round(statistics.median(latencies), 2),
+        "max": max(latencies),
+        "failures": sum(not entry['ok'] for entry in history),
+        "samples": len(latencies),
+    }
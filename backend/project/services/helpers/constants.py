@@ -7,3 +7,10 @@ PRAYER_CONFIG_MAP = {
     "maghrib": {"is_fixed_attr": "maghrib_is_fixed", "fixed_azan_attr": "maghrib_fixed_azan", "fixed_jamaat_attr": "maghrib_fixed_jamaat", "azan_offset_attr": "maghrib_azan_offset", "jamaat_offset_attr": "maghrib_jamaat_offset", "api_key": "Maghrib", "end_boundary_key": "Isha"},
     "isha":    {"is_fixed_attr": "isha_is_fixed", "fixed_azan_attr": "isha_fixed_azan", "fixed_jamaat_attr": "isha_fixed_jamaat", "azan_offset_attr": "isha_azan_offset", "jamaat_offset_attr": "isha_jamaat_offset", "api_key": "Isha", "end_boundary_key": "Fajr_Tomorrow"},
 }
+
+# AlAdhan IDs for the names stored in User.default_calculation_method ('method'),
+# UserSettings.asr_juristic ('school') and UserSettings.high_latitude_method ('latitudeAdjustmentMethod').
+CALCULATION_METHOD_IDS = {"Jafari": 0, "Karachi": 1, "ISNA": 2, "MWL": 3, "Makkah": 4, "Egyptian": 5, "Tehran": 7}
+ASR_JURISTIC_IDS = {"Standard": 0, "Hanafi": 1}
+HIGH_LATITUDE_METHOD_IDS = {"MiddleOfTheNight": 1, "OneSeventh": 2, "AngleBased": 3}
+DEFAULT_CALCULATION_METHOD_ID = 3 # MWL, for owners without a calculation method
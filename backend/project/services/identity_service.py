@@ -0,0 +1,207 @@
+"""
+Identity Cache Service
+----------------------
+Caches who an authenticated caller is — their user ID, role and effective
+permission set — keyed by the JWT subject (`sub`), so authenticating a request
+needs no database round trips once the subject has been seen.
+
+Two tiers are used:
+  1. A per-process LRU with a short TTL (IDENTITY_CACHE_LOCAL_TTL_SECONDS), hit
+     without any network I/O.
+  2. Redis (IDENTITY_CACHE_TTL_SECONDS), shared by all web workers.
+
+Whenever a role or permission changes, the affected subjects are invalidated in
+Redis and in the local LRU of the process making the change. Other processes
+pick the change up once their short-lived local entry expires.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import current_app
+from redis import exceptions as redis_exceptions
+from werkzeug.local import LocalProxy
+
+from .. import db
+from ..extensions import redis_client
+from ..models import User, Permission, UserPermission, RolePermission
+
+IDENTITY_CACHE_KEY_PREFIX = "identity:"
+
+# What the auth layer needs to know about a caller. `permissions` is a frozenset.
+CachedIdentity = namedtuple('CachedIdentity', ['user_id', 'role', 'email', 'permissions'])
+
+
+class _LocalIdentityCache:
+    """A small thread-safe LRU with per-entry expiry."""
+
+    def __init__(self):
+        self._entries = OrderedDict() # sub -> (expires_at, CachedIdentity)
+        self._lock = threading.Lock()
+
+    def get(self, sub):
+        with self._lock:
+            entry = self._entries.get(sub)
+            if entry is None:
+                return None
+            expires_at, identity = entry
+            if expires_at <= time.monotonic():
+                del self._entries[sub]
+                return None
+            self._entries.move_to_end(sub)
+            return identity
+
+    def set(self, sub, identity, ttl, max_entries):
+        with self._lock:
+            self._entries[sub] = (time.monotonic() + ttl, identity)
+            self._entries.move_to_end(sub)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, subs):
+        with self._lock:
+            for sub in subs:
+                self._entries.pop(sub, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_local_cache = _LocalIdentityCache()
+
+
+def _redis_key(sub):
+    return f"{IDENTITY_CACHE_KEY_PREFIX}{sub}"
+
+
+def get_cached_identity(sub):
+    """Returns the CachedIdentity for a JWT subject, or None if neither tier has it."""
+    identity = _local_cache.get(sub)
+    if identity is not None:
+        return identity
+
+    try:
+        cached = redis_client.get(_redis_key(sub))
+    except redis_exceptions.RedisError as e:
+        current_app.logger.warning(f"Redis GET failed for identity of sub {sub}: {e}")
+        return None
+    if not cached:
+        return None
+
+    data = json.loads(cached)
+    identity = CachedIdentity(data['user_id'], data['role'], data['email'], frozenset(data['permissions']))
+    _cache_locally(sub, identity)
+    return identity
+
+
+def cache_identity(sub, identity):
+    """Stores an identity in both cache tiers."""
+    _cache_locally(sub, identity)
+    payload = json.dumps({
+        'user_id': identity.user_id,
+        'role': identity.role,
+        'email': identity.email,
+        'permissions': sorted(identity.permissions),
+    })
+    try:
+        redis_client.set(_redis_key(sub), payload, ex=current_app.config['IDENTITY_CACHE_TTL_SECONDS'])
+    except redis_exceptions.RedisError as e:
+        current_app.logger.warning(f"Redis SET failed for identity of sub {sub}: {e}")
+
+
+def _cache_locally(sub, identity):
+    _local_cache.set(
+        sub, identity,
+        ttl=current_app.config['IDENTITY_CACHE_LOCAL_TTL_SECONDS'],
+        max_entries=current_app.config['IDENTITY_CACHE_MAX_ENTRIES']
+    )
+
+
+def build_identity(user):
+    """Computes the identity of a user from the database (used on cache misses)."""
+    return CachedIdentity(user.id, user.role, user.email, frozenset(load_user_permissions(user.id, user.role)))
+
+
+def load_user_permissions(user_id, role):
+    """
+    Loads all active permissions for a user.
+    Combines role-based permissions with user-specific overrides.
+    """
+    active_permissions = set()
+
+    # 1. Load permissions based on the user's role
+    role_perms = db.session.query(Permission.name).join(RolePermission).filter(RolePermission.role_name == role).all()
+    for perm_name, in role_perms:
+        active_permissions.add(perm_name)
+
+    # 2. Apply user-specific overrides
+    user_overrides = db.session.query(Permission.name, UserPermission.has_permission).join(UserPermission).filter(UserPermission.user_id == user_id).all()
+    for perm_name, has_perm in user_overrides:
+        if has_perm:
+            active_permissions.add(perm_name)
+        else:
+            active_permissions.discard(perm_name) # Remove if explicitly revoked
+
+    return active_permissions
+
+
+def get_user_permissions(user):
+    """Returns the effective permission set of a User, from the cache when possible."""
+    if user.supabase_user_id:
+        identity = get_cached_identity(user.supabase_user_id)
+        if identity is None:
+            identity = build_identity(user)
+            cache_identity(user.supabase_user_id, identity)
+        return identity.permissions
+    return frozenset(load_user_permissions(user.id, user.role))
+
+
+def lazy_user(user_id):
+    """
+    Returns a proxy for the User row that is only loaded if a route actually uses
+    it, so permission checks alone never touch the database.
+    """
+    return LocalProxy(lambda: db.session.get(User, user_id))
+
+
+# --- Invalidation ---
+
+def invalidate_identity(sub):
+    """Drops one subject from both cache tiers (e.g. after their role or overrides change)."""
+    if sub:
+        invalidate_identities([sub])
+
+
+def invalidate_identities(subs):
+    subs = [sub for sub in subs if sub]
+    if not subs:
+        return
+    _local_cache.discard(subs)
+    try:
+        redis_client.delete(*[_redis_key(sub) for sub in subs])
+    except redis_exceptions.RedisError as e:
+        current_app.logger.error(f"Redis DEL failed while invalidating {len(subs)} identities: {e}", exc_info=True)
+
+
+def invalidate_role(role_name, batch_size=1000):
+    """Drops every cached identity holding `role_name` (after that role's permissions change)."""
+    query = db.session.query(User.supabase_user_id).filter(
+        User.role == role_name,
+        User.supabase_user_id.isnot(None)
+    ).yield_per(batch_size)
+
+    batch = []
+    for (sub,) in query:
+        batch.append(sub)
+        if len(batch) == batch_size:
+            invalidate_identities(batch)
+            batch = []
+    invalidate_identities(batch)
+
+
+def clear_local_identity_cache():
+    """Empties this process's LRU tier."""
+    _local_cache.clear()
@@ -0,0 +1,169 @@
+"""
+Image Fingerprint Index Service
+-------------------------------
+Finds visually similar masjid photos by searching stored perceptual hashes in
+Hamming space, without comparing a new hash against every stored fingerprint.
+
+Each `ImageFingerprint` stores its 64-bit pHash split into four indexed 16-bit
+band columns (multi-index hashing). A lookup for all hashes within distance `r`
+only needs the rows where some band is within `r // 4` bits of the query's band,
+which the database answers with a handful of indexed IN-lookups. Candidates are
+then verified with an exact Hamming distance check.
+"""
+
+from collections import namedtuple, defaultdict
+
+from flask import current_app
+from sqlalchemy import or_
+
+from .. import db
+from ..models import ImageFingerprint, MasjidApplication
+from ..utils.phash_utils import (
+    PHASH_BAND_COUNT,
+    phash_to_int,
+    phash_to_bands,
+    hamming_distance,
+    band_neighbours,
+    band_search_radius,
+)
+
+BAND_COLUMNS = tuple(getattr(ImageFingerprint, f'phash_band_{i}') for i in range(PHASH_BAND_COUNT))
+
+# A stored fingerprint that matched a query, with the masjid/applicant user it belongs to.
+SimilarFingerprint = namedtuple('SimilarFingerprint', ['fingerprint_id', 'phash', 'owner_user_id', 'application_id', 'distance'])
+
+# A pair of stored fingerprints found to be near-duplicates of each other.
+DuplicateFingerprintPair = namedtuple('DuplicateFingerprintPair', ['fingerprint_id', 'other_fingerprint_id', 'distance'])
+
+
+def find_similar_fingerprints(phash: str, max_distance: int, exclude_application_id: int = None) -> list:
+    """
+    Returns all stored fingerprints within `max_distance` bits of `phash`, closest first.
+
+    Args:
+        phash: The 16-character hex pHash to search for.
+        max_distance: The largest Hamming distance that counts as a match.
+        exclude_application_id: Fingerprints of this application are ignored
+                                 (e.g. the application's own freshly stored hashes).
+
+    Returns:
+        A list of SimilarFingerprint tuples sorted by distance.
+    """
+    # Project only the needed columns and resolve the applicant in the same query,
+    # rather than lazily loading `fingerprint.application` per match.
+    query = db.session.query(
+        ImageFingerprint.id,
+        ImageFingerprint.phash,
+        ImageFingerprint.user_id,
+        ImageFingerprint.application_id,
+        MasjidApplication.user_id.label('applicant_id')
+    ).outerjoin(MasjidApplication, ImageFingerprint.application_id == MasjidApplication.id)
+
+    if exclude_application_id is not None:
+        query = query.filter(or_(
+            ImageFingerprint.application_id.is_(None),
+            ImageFingerprint.application_id != exclude_application_id
+        ))
+
+    query_bands = phash_to_bands(phash)
+    if query_bands is None:
+        # Not a 64-bit hex hash, so it can't be searched by distance. Fall back to exact matches.
+        current_app.logger.warning(f"Fingerprint index: '{phash}' is not a 64-bit hex pHash. Using exact match only.")
+        return [
+            SimilarFingerprint(row.id, row.phash, row.user_id or row.applicant_id, row.application_id, 0)
+            for row in query.filter(ImageFingerprint.phash == phash)
+        ]
+
+    radius = band_search_radius(max_distance)
+    query = query.filter(or_(*[
+        column.in_(band_neighbours(band, radius))
+        for column, band in zip(BAND_COLUMNS, query_bands)
+    ]))
+
+    query_value = phash_to_int(phash)
+    matches = []
+    for row in query:
+        candidate_value = phash_to_int(row.phash)
+        if candidate_value is None:
+            continue
+        distance = hamming_distance(query_value, candidate_value)
+        if distance <= max_distance:
+            matches.append(SimilarFingerprint(row.id, row.phash, row.user_id or row.applicant_id, row.application_id, distance))
+
+    matches.sort(key=lambda match: (match.distance, match.fingerprint_id))
+    return matches
+
+
+def find_duplicate_fingerprint_pairs(max_distance: int, batch_size: int = 1000) -> list:
+    """
+    Batch mode: scans the whole fingerprint corpus once and returns every pair of
+    fingerprints within `max_distance` bits of each other.
+
+    Rows are streamed from the database and indexed in memory by band value, so each
+    fingerprint is only compared against the few earlier fingerprints that share a
+    near-identical band, instead of against every other fingerprint.
+
+    Args:
+        max_distance: The largest Hamming distance that counts as a duplicate.
+        batch_size: Number of rows fetched per database round trip.
+
+    Returns:
+        A list of DuplicateFingerprintPair tuples.
+    """
+    radius = band_search_radius(max_distance)
+    band_buckets = [defaultdict(list) for _ in range(PHASH_BAND_COUNT)]
+    hash_values = {}
+    pairs = []
+
+    rows = db.session.query(ImageFingerprint.id, ImageFingerprint.phash).order_by(ImageFingerprint.id).yield_per(batch_size)
+    for fingerprint_id, phash in rows:
+        value = phash_to_int(phash)
+        if value is None:
+            continue
+        bands = phash_to_bands(phash)
+
+        candidate_ids = set()
+        for band_index, band in enumerate(bands):
+            bucket = band_buckets[band_index]
+            for neighbour in band_neighbours(band, radius):
+                candidate_ids.update(bucket.get(neighbour, ()))
+
+        for candidate_id in sorted(candidate_ids):
+            distance = hamming_distance(value, hash_values[candidate_id])
+            if distance <= max_distance:
+                pairs.append(DuplicateFingerprintPair(candidate_id, fingerprint_id, distance))
+
+        hash_values[fingerprint_id] = value
+        for band_index, band in enumerate(bands):
+            band_buckets[band_index][band].append(fingerprint_id)
+
+    return pairs
+
+
+def backfill_phash_bands(batch_size: int = 1000) -> int:
+    """
+    Populates the band columns of fingerprints stored before the index existed.
+
+    Returns:
+        The number of fingerprints updated.
+    """
+    updated_count = 0
+    last_id = 0
+    while True:
+        fingerprints = ImageFingerprint.query.filter(
+            ImageFingerprint.phash_band_0.is_(None),
+            ImageFingerprint.id > last_id
+        ).order_by(ImageFingerprint.id).limit(batch_size).all()
+        if not fingerprints:
+            break
+        last_id = fingerprints[-1].id
+
+        for fingerprint in fingerprints:
+            if phash_to_bands(fingerprint.phash) is None:
+                continue # Legacy non-hex hash; only exact matching is possible.
+            # Re-assigning the hash runs the model validator that fills the bands.
+            fingerprint.phash = fingerprint.phash
+            updated_count += 1
+        db.session.commit()
+
+    return updated_count
@@ -0,0 +1,143 @@
+"""
+Last Seen Service
+-----------------
+Write-behind tracking of `User.last_seen_at`.
+
+Authenticating a request used to update and commit `last_seen_at` on every call.
+Instead, a request now only records a "touch" (user ID + timestamp) in a Redis
+hash, and a periodic Celery task flushes all pending touches to the database in
+one bulk UPDATE. Touches are also throttled per process, so a user making many
+requests in a row produces at most one touch per
+LAST_SEEN_MIN_UPDATE_INTERVAL_SECONDS.
+
+If Redis is unavailable, touches are buffered in process memory and written
+inline once that buffer is older than LAST_SEEN_FLUSH_INTERVAL_SECONDS.
+"""
+
+import time
+from datetime import datetime
+
+from flask import current_app
+from redis import exceptions as redis_exceptions
+from sqlalchemy import Integer, DateTime, bindparam, column, or_, update, values
+
+from .. import db
+from ..extensions import redis_client
+from ..models import User
+
+# Redis hash of pending touches: user ID -> ISO-8601 UTC time of the latest request.
+LAST_SEEN_BUFFER_KEY = "last_seen:pending"
+
+# Upper bound on the per-process throttle table before it is reset.
+MAX_THROTTLE_ENTRIES = 100000
+
+_last_recorded_at = {}    # user ID -> time.monotonic() of the last recorded touch
+_local_buffer = {}        # user ID -> datetime, used only while Redis is unreachable
+_local_buffer_since = None
+
+
+def record_last_seen(user_id: int, seen_at: datetime = None) -> None:
+    """
+    Records that a user was just seen. Cheap enough to call on every request:
+    no database access, and at most one Redis write per user per throttle interval.
+    """
+    global _local_buffer_since
+    now = time.monotonic()
+    min_interval = current_app.config['LAST_SEEN_MIN_UPDATE_INTERVAL_SECONDS']
+    last_recorded = _last_recorded_at.get(user_id)
+    if last_recorded is not None and now - last_recorded < min_interval:
+        return
+
+    if len(_last_recorded_at) >= MAX_THROTTLE_ENTRIES:
+        _last_recorded_at.clear()
+    _last_recorded_at[user_id] = now
+
+    seen_at = seen_at or datetime.utcnow()
+    try:
+        redis_client.hset(LAST_SEEN_BUFFER_KEY, user_id, seen_at.isoformat())
+        return
+    except redis_exceptions.RedisError as e:
+        current_app.logger.warning(f"Redis unavailable for last_seen tracking, buffering locally: {e}")
+
+    _local_buffer[user_id] = seen_at
+    if _local_buffer_since is None:
+        _local_buffer_since = now
+    elif now - _local_buffer_since >= current_app.config['LAST_SEEN_FLUSH_INTERVAL_SECONDS']:
+        flush_local_buffer()
+
+
+def flush_last_seen(batch_size: int = 1000) -> int:
+    """
+    Writes all pending touches to the database. Run periodically by Celery beat.
+
+    Returns:
+        The number of touches flushed.
+    """
+    touches = _drain_redis_buffer()
+    return _write_touches(touches, batch_size)
+
+
+def flush_local_buffer(batch_size: int = 1000) -> int:
+    """Writes the touches buffered in this process while Redis was unreachable."""
+    global _local_buffer_since
+    touches = dict(_local_buffer)
+    _local_buffer.clear()
+    _local_buffer_since = None
+    return _write_touches(touches, batch_size)
+
+
+def _drain_redis_buffer() -> dict:
+    """Atomically reads and clears the Redis buffer, so touches recorded meanwhile go to a fresh hash."""
+    try:
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.hgetall(LAST_SEEN_BUFFER_KEY)
+        pipe.delete(LAST_SEEN_BUFFER_KEY)
+        entries, _ = pipe.execute()
+    except redis_exceptions.RedisError as e:
+        current_app.logger.error(f"Could not read the last_seen buffer from Redis: {e}", exc_info=True)
+        return {}
+
+    return {
+        int(user_id): datetime.fromisoformat(seen_at.decode() if isinstance(seen_at, bytes) else seen_at)
+        for user_id, seen_at in entries.items()
+    }
+
+
+def _write_touches(touches: dict, batch_size: int) -> int:
+    """Bulk-updates last_seen_at for {user_id: datetime}, never moving a timestamp backwards."""
+    rows = sorted(touches.items())
+    for start in range(0, len(rows), batch_size):
+        _bulk_update_last_seen(rows[start:start + batch_size])
+    return len(rows)
+
+
+def _is_newer_than_stored(seen_at):
+    last_seen_at = User.__table__.c.last_seen_at
+    return or_(last_seen_at.is_(None), last_seen_at < seen_at)
+
+
+def _bulk_update_last_seen(rows: list) -> None:
+    user_table = User.__table__
+    try:
+        if db.engine.dialect.name == 'postgresql':
+            # One statement for the whole batch: UPDATE "user" ... FROM (VALUES ...) AS seen
+            seen = values(column('user_id', Integer), column('seen_at', DateTime), name='seen').data(rows)
+            db.session.execute(
+                update(user_table)
+                .where(user_table.c.id == seen.c.user_id)
+                .where(_is_newer_than_stored(seen.c.seen_at))
+                .values(last_seen_at=seen.c.seen_at)
+            )
+        else:
+            # Other databases (e.g. SQLite in tests) lack VALUES column aliases; use an executemany.
+            db.session.execute(
+                update(user_table)
+                .where(user_table.c.id == bindparam('user_id'))
+                .where(_is_newer_than_stored(bindparam('seen_at')))
+                .values(last_seen_at=bindparam('seen_at')),
+                [{'user_id': user_id, 'seen_at': seen_at} for user_id, seen_at in rows]
+            )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Failed to flush last_seen_at for {len(rows)} users: {e}", exc_info=True)
@@ -1,9 +1,35 @@
 
 import string
 import random
+import math
+import base64
+import binascii
+from collections import namedtuple
+from sqlalchemy import or_
 from .. import db
 from ..models import User, UserMasjidFollow, MasjidAnnouncement
-from .notification_service import send_announcement_to_masjid_followers
+from .notification_service import (
+    send_announcement_to_masjid_followers,
+    subscribe_user_to_masjid_topic,
+    unsubscribe_user_from_masjid_topic,
+)
+
+# --- Nearby search configuration ---
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_NEARBY_LIMIT = 20 # Page size for "closest masjids" searches
+KNN_INITIAL_RADIUS_KM = 5 # First search radius; doubled until enough masjids are found
+KNN_MAX_RADIUS_KM = 20038 # Half the Earth's circumference, i.e. the whole globe
+
+# Only the columns needed by MasjidSchema are loaded for listings.
+MASJID_LISTING_COLUMNS = (
+    User.id,
+    User.name,
+    User.masjid_code,
+    User.default_city_name,
+    User.default_latitude,
+    User.default_longitude,
+)
+NearbyMasjid = namedtuple('NearbyMasjid', [column.key for column in MASJID_LISTING_COLUMNS] + ['distance_km'])
 
 def generate_unique_masjid_code(size=8):
     """Generates a unique, random alphanumeric code for a Masjid."""
@@ -30,6 +56,9 @@ def follow_masjid(user, masjid_to_follow):
 
     db.session.add(new_follow)
     db.session.commit()
+
+    # Deliver the masjid's announcements to the user's devices via its FCM topic
+    subscribe_user_to_masjid_topic(user, masjid_to_follow.id)
     return {"status": "success", "message": "Successfully followed the Masjid."}
 
 def unfollow_masjid(user, masjid_to_unfollow):
@@ -42,6 +71,7 @@ def unfollow_masjid(user, masjid_to_unfollow):
     was_default = follow_association.is_default
     db.session.delete(follow_association)
     db.session.commit()
+    unsubscribe_user_from_masjid_topic(user, masjid_to_unfollow.id)
 
     # If the unfollowed masjid was the default, we need to set a new default
     if was_default and user.followed_masjids_association.count() > 0:
@@ -67,24 +97,126 @@ def set_default_masjid(user, new_default_masjid):
         return {"status": "not_following", "message": "You are not following this Masjid."}
 
 def get_masjids_by_location(lat, lon, radius_km=50):
-    """Finds masjids within a certain radius of a given location."""
-    # This is a simplified example. A real implementation would use PostGIS for efficiency.
-    # For now, we will filter in Python, which is inefficient for large datasets.
-    all_masjids = User.query.filter_by(role='Masjid').all()
-    nearby_masjids = []
-    
-    from geopy.distance import geodesic
-    center_point = (lat, lon)
-
-    for masjid in all_masjids:
-        if masjid.default_latitude and masjid.default_longitude:
-            masjid_point = (masjid.default_latitude, masjid.default_longitude)
-            distance = geodesic(center_point, masjid_point).km
-            if distance <= radius_km:
-                nearby_masjids.append(masjid)
-    
+    """Finds all masjids within a certain radius of a given location, nearest first."""
+    nearby_masjids, _ = get_nearest_masjids(lat, lon, limit=None, max_distance_km=radius_km)
     return nearby_masjids
 
+def get_nearest_masjids(lat, lon, limit=DEFAULT_NEARBY_LIMIT, cursor=None, max_distance_km=None):
+    """
+    Finds the `limit` masjids closest to a location (k-nearest-neighbour search).
+
+    The search starts with a small bounding box on the indexed latitude/longitude
+    columns and keeps doubling the radius until it holds more than `limit` masjids
+    beyond the cursor, so only nearby rows are ever loaded. Rows are projected to the
+    columns `MasjidSchema` needs instead of full `User` objects.
+
+    Args:
+        lat (float): Latitude of the search centre.
+        lon (float): Longitude of the search centre.
+        limit (int, optional): Page size. None returns every masjid within `max_distance_km`.
+        cursor (str, optional): Opaque cursor from a previous page (see `encode_masjid_cursor`).
+        max_distance_km (float, optional): Upper bound on the distance of returned masjids.
+
+    Returns:
+        tuple: (list of NearbyMasjid rows ordered by (distance_km, id), next page cursor or None).
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    after = decode_masjid_cursor(cursor) if cursor else None
+    max_radius_km = min(max_distance_km, KNN_MAX_RADIUS_KM) if max_distance_km is not None else KNN_MAX_RADIUS_KM
+
+    if limit is None:
+        radius_km = max_radius_km
+    else:
+        # Everything on this page lies beyond the cursor distance, so start from there.
+        radius_km = max(KNN_INITIAL_RADIUS_KM, after[0] * 2 if after else 0)
+        radius_km = min(radius_km, max_radius_km)
+
+    while True:
+        candidates = _get_masjids_within_radius(lat, lon, radius_km, after)
+        if limit is None or len(candidates) > limit or radius_km >= max_radius_km:
+            break
+        radius_km = min(radius_km * 2, max_radius_km)
+
+    if limit is None or len(candidates) <= limit:
+        return candidates, None
+
+    page = candidates[:limit]
+    return page, encode_masjid_cursor(page[-1].distance_km, page[-1].id)
+
+def encode_masjid_cursor(distance_km, masjid_id):
+    """Encodes the (distance, id) position of the last row of a page as an opaque string."""
+    raw = f"{distance_km!r}:{masjid_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_masjid_cursor(cursor):
+    """Decodes a cursor produced by `encode_masjid_cursor`. Raises ValueError if it is malformed."""
+    try:
+        distance_str, masjid_id_str = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split(':')
+        distance_km, masjid_id = float(distance_str), int(masjid_id_str)
+    except (binascii.Error, UnicodeError, ValueError) as e:
+        raise ValueError(f"Invalid masjid cursor: {cursor}") from e
+    if not math.isfinite(distance_km) or distance_km < 0:
+        raise ValueError(f"Invalid masjid cursor: {cursor}")
+    return distance_km, masjid_id
+
+def _get_masjids_within_radius(lat, lon, radius_km, after=None):
+    """Returns the masjids within `radius_km` (and after the cursor), sorted by (distance, id)."""
+    rows = db.session.query(*MASJID_LISTING_COLUMNS).filter(
+        User.role == 'Masjid',
+        User.default_latitude.isnot(None),
+        User.default_longitude.isnot(None),
+        *_bounding_box_filters(lat, lon, radius_km)
+    )
+
+    results = []
+    for row in rows:
+        distance_km = _haversine_km(lat, lon, row.default_latitude, row.default_longitude)
+        if distance_km > radius_km:
+            continue # Inside the box but outside the circle
+        if after and (distance_km, row.id) <= after:
+            continue
+        results.append(NearbyMasjid(*row, distance_km=distance_km))
+
+    results.sort(key=lambda m: (m.distance_km, m.id))
+    return results
+
+def _bounding_box_filters(lat, lon, radius_km):
+    """
+    Builds latitude/longitude range filters for the box enclosing a circle of `radius_km`.
+    Handles boxes that wrap the antimeridian or contain a pole.
+    """
+    angular_radius = radius_km / EARTH_RADIUS_KM
+    lat_delta = math.degrees(angular_radius)
+    filters = [User.default_latitude.between(lat - lat_delta, lat + lat_delta)]
+
+    # If the circle contains a pole, every longitude is in range.
+    if lat + lat_delta >= 90 or lat - lat_delta <= -90:
+        return filters
+
+    sin_ratio = math.sin(angular_radius) / math.cos(math.radians(lat))
+    if sin_ratio >= 1:
+        return filters
+    lon_delta = math.degrees(math.asin(sin_ratio))
+    min_lon, max_lon = lon - lon_delta, lon + lon_delta
+
+    if min_lon < -180:
+        filters.append(or_(User.default_longitude >= min_lon + 360, User.default_longitude <= max_lon))
+    elif max_lon > 180:
+        filters.append(or_(User.default_longitude >= min_lon, User.default_longitude <= max_lon - 360))
+    else:
+        filters.append(User.default_longitude.between(min_lon, max_lon))
+    return filters
+
+def _haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
 def create_announcement(masjid, title, content):
     """Creates a new announcement for a Masjid."""
     if masjid.role != 'Masjid':
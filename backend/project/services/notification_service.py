@@ -1,17 +1,92 @@
 # project/services/notification_service.py
 
+from itertools import groupby
+
 from flask import current_app
-from pyfcm import FCMNotification
-from ..models import User, UserDevice
+from sqlalchemy import and_, exists
+from .. import db
+from ..models import User, UserDevice, UserMasjidFollow, GuestProfile, MasjidTopicSubscription
+from ..metrics import PUSH_NOTIFICATIONS_TOTAL, PUSH_BATCH_DURATION_SECONDS
+
+# FCM accepts at most this many tokens in one multicast send...
+FCM_MAX_MULTICAST_SIZE = 500
+# ...and in one topic subscribe/unsubscribe request.
+FCM_MAX_TOPIC_BATCH_SIZE = 1000
+
+# Per-token FCM HTTP v1 errors meaning the token will never work again and should be deleted.
+# INVALID_ARGUMENT is left out: it is also returned for a malformed message.
+INVALID_TOKEN_ERRORS = frozenset({'UNREGISTERED', 'SENDER_ID_MISMATCH'})
 
 
 def get_push_service():
     """Initializes and returns the FCM push service."""
-    api_key = current_app.config.get('FCM_SERVER_KEY')
-    if not api_key:
-        current_app.logger.error("FCM_SERVER_KEY is not configured. Push notifications are disabled.")
+    if current_app.config.get('FCM_BACKEND') == 'local':
+        # One in-memory stand-in per app, so subscriptions persist between calls.
+        from .third_party.local_fcm_service import LocalFCMService
+        return current_app.extensions.setdefault('local_fcm', LocalFCMService())
+
+    credentials_file = current_app.config.get('FCM_CREDENTIALS_FILE')
+    if not credentials_file:
+        current_app.logger.error("FCM_CREDENTIALS_FILE is not configured. Push notifications are disabled.")
         return None
-    return FCMNotification(api_key=api_key)
+    push_service = current_app.extensions.get('fcm')
+    if push_service is None:
+        from .third_party.firebase_fcm_service import FirebaseFCMService
+        push_service = FirebaseFCMService.from_service_account_file(credentials_file, app_name=current_app.import_name)
+        current_app.extensions['fcm'] = push_service
+    return push_service
+
+def send_push_to_device_tokens(device_tokens, title, body, data_message=None):
+    """
+    Sends one multicast push notification to a batch of device tokens and deletes
+    any tokens that FCM reports as no longer valid.
+
+    Args:
+        device_tokens (list): At most FCM_MAX_MULTICAST_SIZE FCM registration tokens.
+        title (str): The title of the notification.
+        body (str): The body/message of the notification.
+        data_message (dict, optional): A dictionary of custom data to send with the notification.
+
+    Returns:
+        dict: Delivery counts: 'success', 'failure' and 'invalid_tokens_removed'.
+    """
+    summary = {'success': 0, 'failure': 0, 'invalid_tokens_removed': 0}
+    push_service = get_push_service()
+    if not push_service or not device_tokens:
+        return summary
+
+    try:
+        with PUSH_BATCH_DURATION_SECONDS.time():
+            result = push_service.send_multicast(device_tokens, title, body, data_message)
+    except Exception as e:
+        current_app.logger.error(f"Error sending FCM notification to {len(device_tokens)} devices: {e}", exc_info=True)
+        summary['failure'] = len(device_tokens)
+        PUSH_NOTIFICATIONS_TOTAL.labels(status='failure').inc(len(device_tokens))
+        return summary
+
+    current_app.logger.debug(f"FCM result: {result}")
+
+    # FCM returns one result per token, in the order they were sent.
+    invalid_tokens = [
+        token for token, token_result in zip(device_tokens, result['results'])
+        if token_result.get('error') in INVALID_TOKEN_ERRORS
+    ]
+    if invalid_tokens:
+        summary['invalid_tokens_removed'] = remove_device_tokens(invalid_tokens)
+
+    summary['success'] = result['success']
+    summary['failure'] = result['failure'] - len(invalid_tokens)
+    PUSH_NOTIFICATIONS_TOTAL.labels(status='success').inc(summary['success'])
+    PUSH_NOTIFICATIONS_TOTAL.labels(status='failure').inc(max(summary['failure'], 0))
+    PUSH_NOTIFICATIONS_TOTAL.labels(status='invalid_token').inc(len(invalid_tokens))
+    return summary
+
+def remove_device_tokens(device_tokens):
+    """Deletes the given device tokens in one statement. Returns the number of rows removed."""
+    removed_count = UserDevice.query.filter(UserDevice.device_token.in_(device_tokens)).delete(synchronize_session=False)
+    db.session.commit()
+    current_app.logger.info(f"Removed {removed_count} invalid FCM device tokens.")
+    return removed_count
 
 def send_notification_to_user(user, title, body, data_message=None):
     """
@@ -23,10 +98,6 @@ def send_notification_to_user(user, title, body, data_message=None):
         body (str): The body/message of the notification.
         data_message (dict, optional): A dictionary of custom data to send with the notification.
     """
-    push_service = get_push_service()
-    if not push_service:
-        return
-
     # Get all device tokens for the user
     device_tokens = [device.device_token for device in user.devices]
 
@@ -35,24 +106,202 @@ def send_notification_to_user(user, title, body, data_message=None):
         return
 
     current_app.logger.info(f"Sending notification to {len(device_tokens)} devices for user {user.id}.")
+    send_push_to_device_tokens(device_tokens, title, body, data_message)
 
-    try:
-        result = push_service.notify_multiple_devices(
-            registration_ids=device_tokens,
-            message_title=title,
-            message_body=body,
-            data_message=data_message
+# --- Masjid Topic Subscriptions ---
+# Every follower device of a Masjid is subscribed to the Masjid's FCM topic, so an
+# announcement is one topic message regardless of the number of followers.
+
+def masjid_topic_name(masjid_id):
+    """Returns the FCM topic name that followers of a Masjid are subscribed to."""
+    return f"masjid_{masjid_id}"
+
+def subscribe_tokens_to_masjid_topic(device_tokens, masjid_id):
+    """
+    Subscribes device tokens to a Masjid's topic in FCM-sized batches and records
+    the subscriptions. Failed batches and tokens are logged and left unrecorded,
+    so the reconciliation job retries them.
+
+    Returns:
+        int: The number of tokens subscribed.
+    """
+    return _update_topic_subscriptions(device_tokens, masjid_id, subscribe=True)
+
+def unsubscribe_tokens_from_masjid_topic(device_tokens, masjid_id):
+    """Unsubscribes device tokens from a Masjid's topic. Returns the number of tokens unsubscribed."""
+    return _update_topic_subscriptions(device_tokens, masjid_id, subscribe=False)
+
+def _update_topic_subscriptions(device_tokens, masjid_id, subscribe):
+    push_service = get_push_service()
+    device_tokens = list(device_tokens)
+    if not push_service or not device_tokens:
+        return 0
+
+    topic_name = masjid_topic_name(masjid_id)
+    updated_count = 0
+    action = "subscribe" if subscribe else "unsubscribe"
+    for start in range(0, len(device_tokens), FCM_MAX_TOPIC_BATCH_SIZE):
+        batch = device_tokens[start:start + FCM_MAX_TOPIC_BATCH_SIZE]
+        try:
+            if subscribe:
+                result = push_service.subscribe_to_topic(batch, topic_name)
+            else:
+                result = push_service.unsubscribe_from_topic(batch, topic_name)
+        except Exception as e:
+            current_app.logger.error(f"Could not {action} {len(batch)} devices for topic '{topic_name}': {e}", exc_info=True)
+            continue
+
+        if result['errors']:
+            current_app.logger.warning(f"Could not {action} {result['failure']} of {len(batch)} devices for topic "
+                                       f"'{topic_name}': {sorted({reason for _, reason in result['errors']})}")
+            failed_indexes = {index for index, _ in result['errors']}
+            batch = [token for index, token in enumerate(batch) if index not in failed_indexes]
+
+        if subscribe:
+            already_recorded = {
+                token for (token,) in db.session.query(MasjidTopicSubscription.device_token).filter(
+                    MasjidTopicSubscription.masjid_id == masjid_id,
+                    MasjidTopicSubscription.device_token.in_(batch)
+                )
+            }
+            db.session.add_all([
+                MasjidTopicSubscription(device_token=token, masjid_id=masjid_id)
+                for token in batch if token not in already_recorded
+            ])
+        else:
+            MasjidTopicSubscription.query.filter(
+                MasjidTopicSubscription.masjid_id == masjid_id,
+                MasjidTopicSubscription.device_token.in_(batch)
+            ).delete(synchronize_session=False)
+        db.session.commit()
+        updated_count += len(batch)
+    return updated_count
+
+def subscribe_user_to_masjid_topic(user, masjid_id):
+    """Subscribes all of a user's devices to a Masjid's topic (called when they follow it)."""
+    return subscribe_tokens_to_masjid_topic([device.device_token for device in user.devices], masjid_id)
+
+def unsubscribe_user_from_masjid_topic(user, masjid_id):
+    """Unsubscribes all of a user's devices from a Masjid's topic (called when they unfollow it)."""
+    return unsubscribe_tokens_from_masjid_topic([device.device_token for device in user.devices], masjid_id)
+
+def register_user_device(user, device_token, device_type='android'):
+    """
+    Registers a device token for a user (taking it over if another account had it)
+    and subscribes it to the topics of the Masjids the user follows, so the device
+    receives their announcements without waiting for the reconciliation job.
+
+    Returns:
+        UserDevice: The registered device.
+    """
+    device = UserDevice.query.filter_by(device_token=device_token).first()
+    if device:
+        device.user_id = user.id
+        device.device_type = device_type
+    else:
+        device = UserDevice(user_id=user.id, device_token=device_token, device_type=device_type)
+        db.session.add(device)
+    db.session.commit()
+
+    subscribed_masjid_ids = {
+        masjid_id for (masjid_id,) in
+        db.session.query(MasjidTopicSubscription.masjid_id).filter_by(device_token=device_token)
+    }
+    followed_masjid_ids = [
+        masjid_id for (masjid_id,) in
+        db.session.query(UserMasjidFollow.masjid_id).filter_by(user_id=user.id).all()
+    ]
+    for masjid_id in followed_masjid_ids:
+        if masjid_id not in subscribed_masjid_ids:
+            subscribe_tokens_to_masjid_topic([device_token], masjid_id)
+    return device
+
+def move_guest_topic_subscription(previous_token, previous_masjid_id, fcm_token, masjid_id):
+    """
+    Updates a guest device's topic subscription after it follows a Masjid. The old
+    subscription is dropped if the guest switched Masjids or reported a new token.
+    """
+    if previous_token and previous_masjid_id and (previous_token, previous_masjid_id) != (fcm_token, masjid_id):
+        unsubscribe_tokens_from_masjid_topic([previous_token], previous_masjid_id)
+    if fcm_token:
+        subscribe_tokens_to_masjid_topic([fcm_token], masjid_id)
+
+def reconcile_masjid_topic_subscriptions():
+    """
+    Brings the recorded topic subscriptions in line with the follow tables.
+
+    Subscriptions are missing when a follower registers a new device or an FCM call
+    failed, and stale when a device token was removed or a follow ended without the
+    unsubscribe reaching FCM. Both sets are computed in SQL and applied in batches.
+
+    Returns:
+        tuple: (number of tokens subscribed, number of tokens unsubscribed)
+    """
+    recorded = and_(
+        MasjidTopicSubscription.device_token == UserDevice.device_token,
+        MasjidTopicSubscription.masjid_id == UserMasjidFollow.masjid_id
+    )
+    missing_user_rows = db.session.query(
+        UserMasjidFollow.masjid_id, UserDevice.device_token
+    ).join(
+        UserDevice, UserDevice.user_id == UserMasjidFollow.user_id
+    ).outerjoin(
+        MasjidTopicSubscription, recorded
+    ).filter(MasjidTopicSubscription.device_token.is_(None))
+
+    missing_guest_rows = db.session.query(
+        GuestProfile.followed_masjid_id, GuestProfile.fcm_token
+    ).outerjoin(
+        MasjidTopicSubscription, and_(
+            MasjidTopicSubscription.device_token == GuestProfile.fcm_token,
+            MasjidTopicSubscription.masjid_id == GuestProfile.followed_masjid_id
         )
-        current_app.logger.debug(f"FCM result: {result}")
-        # TODO: Handle cleanup of invalid tokens based on the result
+    ).filter(
+        GuestProfile.fcm_token.isnot(None),
+        GuestProfile.followed_masjid_id.isnot(None),
+        MasjidTopicSubscription.device_token.is_(None)
+    )
 
-    except Exception as e:
-        current_app.logger.error(f"Error sending FCM notification: {e}", exc_info=True)
+    followed_by_user = exists().where(and_(
+        UserDevice.device_token == MasjidTopicSubscription.device_token,
+        UserMasjidFollow.user_id == UserDevice.user_id,
+        UserMasjidFollow.masjid_id == MasjidTopicSubscription.masjid_id
+    ))
+    followed_by_guest = exists().where(and_(
+        GuestProfile.fcm_token == MasjidTopicSubscription.device_token,
+        GuestProfile.followed_masjid_id == MasjidTopicSubscription.masjid_id
+    ))
+    stale_rows = db.session.query(
+        MasjidTopicSubscription.masjid_id, MasjidTopicSubscription.device_token
+    ).filter(~followed_by_user, ~followed_by_guest)
+
+    # Materialize each difference before applying it, since applying it changes the table being read.
+    missing_rows = missing_user_rows.order_by(UserMasjidFollow.masjid_id).all() + \
+        missing_guest_rows.order_by(GuestProfile.followed_masjid_id).all()
+    stale_rows = stale_rows.order_by(MasjidTopicSubscription.masjid_id).all()
+
+    subscribed_count = 0
+    for masjid_id, device_tokens in _group_tokens_by_masjid(missing_rows):
+        subscribed_count += subscribe_tokens_to_masjid_topic(device_tokens, masjid_id)
+
+    unsubscribed_count = 0
+    for masjid_id, device_tokens in _group_tokens_by_masjid(stale_rows):
+        unsubscribed_count += unsubscribe_tokens_from_masjid_topic(device_tokens, masjid_id)
+
+    return subscribed_count, unsubscribed_count
+
+def _group_tokens_by_masjid(rows):
+    """Turns (masjid_id, device_token) rows sorted by masjid into (masjid_id, [tokens]) pairs."""
+    for masjid_id, group in groupby(rows, key=lambda row: row[0]):
+        yield masjid_id, [device_token for _, device_token in group]
 
 def send_announcement_to_masjid_followers(masjid, announcement):
     """
     Sends a notification for a new announcement to all followers of a Masjid.
 
+    Followers' devices are subscribed to the Masjid's FCM topic, so this is a
+    single topic message no matter how many followers the Masjid has.
+
     Args:
         masjid (User): The Masjid user object that created the announcement.
         announcement (MasjidAnnouncement): The announcement object.
@@ -61,10 +310,14 @@ def send_announcement_to_masjid_followers(masjid, announcement):
         current_app.logger.warning(f"Attempted to send announcement from non-masjid user {masjid.id}")
         return
 
+    push_service = get_push_service()
+    if not push_service:
+        return
+
     # The title of the notification will be the Masjid's name
     title = masjid.name or "New Announcement"
     body = announcement.title
-    
+
     # Optional: send the announcement ID or other data for the app to handle
     data_message = {
         "type": "new_announcement",
@@ -72,10 +325,14 @@ def send_announcement_to_masjid_followers(masjid, announcement):
         "masjid_id": str(masjid.id)
     }
 
-    # Get all followers
-    followers = [association.user for association in masjid.followers_association]
-    
-    current_app.logger.info(f"Sending announcement '{announcement.id}' from Masjid '{masjid.id}' to {len(followers)} followers.")
+    topic_name = masjid_topic_name(masjid.id)
+    current_app.logger.info(f"Sending announcement '{announcement.id}' from Masjid '{masjid.id}' to topic '{topic_name}'.")
 
-    for follower in followers:
-        send_notification_to_user(follower, title, body, data_message)
+    try:
+        with PUSH_BATCH_DURATION_SECONDS.time():
+            message_id = push_service.send_to_topic(topic_name, title, body, data_message)
+        current_app.logger.debug(f"FCM message ID: {message_id}")
+        PUSH_NOTIFICATIONS_TOTAL.labels(status='success').inc()
+    except Exception as e:
+        current_app.logger.error(f"Error sending announcement '{announcement.id}' to topic '{topic_name}': {e}", exc_info=True)
+        PUSH_NOTIFICATIONS_TOTAL.labels(status='failure').inc()
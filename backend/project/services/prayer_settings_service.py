@@ -0,0 +1,179 @@
+"""
+Prayer Settings Resolution
+--------------------------
+Determines which location and calculation settings apply to a request, using
+the hierarchy the API has always followed:
+  1. A guest's followed Masjid.
+  2. A logged-in user's default followed Masjid.
+  3. A custom location search (with the user's own Fiqh settings).
+  4. The user's saved personal settings.
+  5. A stateless guest's custom location search.
+  6. The application's default settings.
+
+The whole chain a source needs (guest profile or user, their settings, the
+followed masjid, its settings and announcements) is fetched in a single query
+with joined eager loading, and the result is returned as an immutable
+ResolvedPrayerSettings snapshot, so the route needs no further lazy loads.
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from flask import current_app
+from sqlalchemy.orm import joinedload
+
+from ..models import User, UserSettings, GuestProfile, UserMasjidFollow
+from .helpers.constants import ASR_JURISTIC_IDS, CALCULATION_METHOD_IDS, DEFAULT_CALCULATION_METHOD_ID, HIGH_LATITUDE_METHOD_IDS
+from .prayer_time.settings_snapshot import PrayerSettingsSnapshot, calculation_id
+
+# The settings a request resolved to. `masjid` is a MasjidInfo (or None), `announcements`
+# a tuple of AnnouncementInfo, and `prayer_settings` the PrayerSettingsSnapshot the display
+# times are calculated with (the masjid's when following one). `timezone` and `time_format` are the
+# caller's own preferences.
+ResolvedPrayerSettings = namedtuple('ResolvedPrayerSettings', [
+    'latitude', 'longitude', 'method_id', 'asr_id', 'high_lat_id', 'city_name', 'source',
+    'masjid', 'announcements', 'prayer_settings', 'timezone', 'time_format'
+])
+
+MasjidInfo = namedtuple('MasjidInfo', ['id', 'name', 'masjid_code', 'city_name', 'latitude', 'longitude'])
+
+AnnouncementInfo = namedtuple('AnnouncementInfo', ['id', 'masjid_id', 'title', 'content', 'created_at'])
+
+# Sources whose settings come from a followed masjid.
+MASJID_SOURCES = ('guest_followed_masjid', 'followed_masjid')
+
+# (timezone, time_format) used for guests.
+GUEST_PREFERENCES = ('UTC', '12h')
+
+
+def _followed_masjid_loads(relationship):
+    """Eager-loads a followed masjid together with its settings and announcements."""
+    return joinedload(relationship).options(joinedload(User.settings), joinedload(User.announcements))
+
+
+def resolve_prayer_settings(user_id: Optional[int], device_id: Optional[str], args: Dict[str, Any]) -> ResolvedPrayerSettings:
+    """
+    Resolves the prayer settings for a logged-in user (`user_id`) or a guest
+    (`device_id`), issuing at most one query.
+    """
+    # Default values from app config
+    lat = float(current_app.config.get('DEFAULT_LATITUDE'))
+    lon = float(current_app.config.get('DEFAULT_LONGITUDE'))
+    method_id = _default_method_id()
+    asr_id = 0 # Default to 0 (Standard)
+    high_lat_id = 1 # Default to 1 (Middle of the Night)
+    prayer_settings, preferences = _default_settings(), GUEST_PREFERENCES
+
+    # Priority 1: Guest user with a followed Masjid
+    if user_id is None and device_id:
+        guest_profile = (
+            GuestProfile.query
+            .options(_followed_masjid_loads(GuestProfile.followed_masjid))
+            .filter(GuestProfile.device_id == device_id)
+            .one_or_none()
+        )
+        if guest_profile and guest_profile.followed_masjid:
+            return _from_masjid(guest_profile.followed_masjid, "guest_followed_masjid", preferences)
+
+    # Priority 2: Logged-in user logic
+    user = None
+    if user_id is not None:
+        user = (
+            User.query
+            .options(
+                joinedload(User.settings),
+                joinedload(User.default_follow).options(_followed_masjid_loads(UserMasjidFollow.masjid))
+            )
+            .filter(User.id == user_id)
+            .one_or_none()
+        )
+
+    if user:
+        user_settings = user.settings if user.settings else UserSettings()
+        if user.settings:
+            prayer_settings = PrayerSettingsSnapshot.from_settings(user.settings)
+        preferences = (user_settings.timezone or 'UTC', user.time_format_preference)
+
+        # Priority 2a: Followed Masjid
+        if user.default_follow:
+            return _from_masjid(user.default_follow.masjid, "followed_masjid", preferences)
+
+        # Priority 2b: Custom Location Search (using user's own settings)
+        req_lat = args.get('lat')
+        req_lon = args.get('lon')
+        if req_lat is not None and req_lon is not None:
+            high_lat_id_to_use = calculation_id(HIGH_LATITUDE_METHOD_IDS, user_settings.high_latitude_method, high_lat_id) if req_lat > 48.0 else 0
+            return ResolvedPrayerSettings(
+                req_lat,
+                req_lon,
+                calculation_id(CALCULATION_METHOD_IDS, user.default_calculation_method, method_id),
+                calculation_id(ASR_JURISTIC_IDS, user_settings.asr_juristic, asr_id),
+                high_lat_id_to_use,
+                args.get('city', "Custom Location"),
+                "custom_location_with_user_settings",
+                None, (), prayer_settings, *preferences
+            )
+
+        # Priority 2c: User's Saved Personal Settings
+        if user.default_latitude and user.default_longitude and user.default_calculation_method is not None:
+            return ResolvedPrayerSettings(
+                user.default_latitude,
+                user.default_longitude,
+                calculation_id(CALCULATION_METHOD_IDS, user.default_calculation_method, method_id),
+                calculation_id(ASR_JURISTIC_IDS, user_settings.asr_juristic, asr_id),
+                calculation_id(HIGH_LATITUDE_METHOD_IDS, user_settings.high_latitude_method, high_lat_id),
+                user.default_city_name,
+                "user_personal_settings",
+                None, (), prayer_settings, *preferences
+            )
+
+    # Priority 3: Stateless Guest user (custom location search)
+    if user_id is None:
+        req_lat = args.get('lat')
+        req_lon = args.get('lon')
+        if req_lat is not None and req_lon is not None:
+            return ResolvedPrayerSettings(
+                req_lat, req_lon,
+                int(args.get('method', method_id)),
+                int(args.get('school', asr_id)),
+                int(args.get('latitudeAdjustmentMethod', high_lat_id)),
+                args.get('city', "Custom Location"),
+                "guest_custom_location",
+                None, (), prayer_settings, *preferences
+            )
+
+    # Fallback to app default for all other cases
+    return ResolvedPrayerSettings(lat, lon, method_id, asr_id, high_lat_id, "Default Location", "app_default",
+                                  None, (), prayer_settings, *preferences)
+
+
+def _from_masjid(masjid: User, source: str, preferences: tuple) -> ResolvedPrayerSettings:
+    masjid_settings = masjid.settings if masjid.settings else UserSettings()
+    return ResolvedPrayerSettings(
+        masjid.default_latitude,
+        masjid.default_longitude,
+        calculation_id(CALCULATION_METHOD_IDS, masjid.default_calculation_method, _default_method_id()),
+        calculation_id(ASR_JURISTIC_IDS, masjid_settings.asr_juristic, 0),
+        calculation_id(HIGH_LATITUDE_METHOD_IDS, masjid_settings.high_latitude_method, 1),
+        masjid.default_city_name or masjid.name,
+        source,
+        MasjidInfo(masjid.id, masjid.name, masjid.masjid_code, masjid.default_city_name,
+                   masjid.default_latitude, masjid.default_longitude),
+        tuple(
+            AnnouncementInfo(a.id, a.masjid_id, a.title, a.content, a.created_at)
+            for a in masjid.announcements
+        ),
+        PrayerSettingsSnapshot.from_settings(masjid_settings) if masjid.settings else _default_settings(),
+        *preferences
+    )
+
+
+def _default_method_id() -> int:
+    return int(current_app.config.get('DEFAULT_CALCULATION_METHOD_ID', DEFAULT_CALCULATION_METHOD_ID))
+
+
+@lru_cache(maxsize=1)
+def _default_settings() -> PrayerSettingsSnapshot:
+    """Snapshot of a fresh UserSettings, used when no settings row applies. Built once per process."""
+    return PrayerSettingsSnapshot.from_settings(UserSettings())
@@ -3,26 +3,34 @@ import json
 from flask import current_app
 from project.models import PrayerZoneCalendar
 from project.extensions import redis_client
-from typing import Dict, Any, Optional, List
-from project.metrics import CACHE_HITS, CACHE_MISSES
+from typing import Dict, Any, Iterable, Optional, List
+from project.metrics import CACHE_LOOKUPS_TOTAL
+from project.services.zone_stats_service import record_zone_lookup
+from project.utils.redis_batch import get_redis_batch
 from redis import exceptions as redis_exceptions
-from .key_utils import generate_calendar_redis_key, generate_daily_redis_key
+from .key_utils import generate_alias_redis_key, generate_calendar_redis_key, generate_daily_redis_key
 
-def get_yearly_calendar_from_cache(zone_id: str, year: int, composite_method_key: str) -> Optional[List[Dict[str, Any]]]:
+# Channel on which calendars changed by a write are announced, as a JSON list of
+# {"zone_id", "year", "calculation_method"} objects.
+CALENDAR_INVALIDATION_CHANNEL = "calendar:invalidations"
+
+def get_yearly_calendar_from_cache(zone_id: str, year: int, composite_method_key: str, zone_kind: str = 'unknown') -> Optional[List[Dict[str, Any]]]:
     """
     New caching function that checks Redis first, then the database.
     If found in DB, it caches to Redis for future requests.
+    `zone_kind` (one of metrics.ZONE_KINDS) labels the cache metrics.
     """
     redis_key = generate_calendar_redis_key(zone_id, year, composite_method_key)
 
     # 1. Check Redis Cache first
     cached_data = _cache_get_json(redis_key)
     if cached_data:
-        CACHE_HITS.labels(cache_type='yearly', zone_id=zone_id, year=year).inc()
+        CACHE_LOOKUPS_TOTAL.labels(cache_type='yearly', tier='redis', result='hit', zone_kind=zone_kind).inc()
+        record_zone_lookup(zone_id, hit=True)
         current_app.logger.info(f"Redis Cache HIT for zone '{zone_id}', year {year}.")
         return cached_data
 
-    CACHE_MISSES.labels(cache_type='yearly', zone_id=zone_id, year=year).inc()
+    CACHE_LOOKUPS_TOTAL.labels(cache_type='yearly', tier='redis', result='miss', zone_kind=zone_kind).inc()
     current_app.logger.info(f"Redis Cache MISS for zone '{zone_id}', year {year}.")
 
     # 2. Check Database Cache
@@ -32,6 +40,9 @@ def get_yearly_calendar_from_cache(zone_id: str, year: int, composite_method_key
         calculation_method=composite_method_key
     ).first()
 
+    CACHE_LOOKUPS_TOTAL.labels(cache_type='yearly', tier='db', result='hit' if db_calendar else 'miss', zone_kind=zone_kind).inc()
+    record_zone_lookup(zone_id, hit=db_calendar is not None)
+
     if db_calendar:
         current_app.logger.info(f"DB Cache HIT for zone '{zone_id}', year {year}.")
         calendar_data = db_calendar.calendar_data
@@ -45,10 +56,56 @@ def get_yearly_calendar_from_cache(zone_id: str, year: int, composite_method_key
     current_app.logger.info(f"DB Cache MISS for zone '{zone_id}', year {year}.")
     return None
 
+def prefetch_prayer_time_keys(zone_ids: Iterable[str], dates: Iterable[Any], composite_method_key: str, alias_zone_id: Optional[str] = None) -> None:
+    """
+    Reads every key that looking up `dates` may need into the request's Redis batch,
+    in one round trip: the alias pointer of `alias_zone_id`, and the yearly calendars
+    and daily entries of each candidate zone (the final zone is not known yet).
+    """
+    dates = list(dates)
+    keys = [generate_alias_redis_key(alias_zone_id, composite_method_key)] if alias_zone_id else []
+    for zone_id in zone_ids:
+        keys.extend(generate_calendar_redis_key(zone_id, year, composite_method_key) for year in sorted({d.year for d in dates}))
+        keys.extend(generate_daily_redis_key(zone_id, d.strftime("%d-%m-%Y"), composite_method_key) for d in dates)
+    try:
+        get_redis_batch().prefetch(keys)
+    except redis_exceptions.RedisError as e:
+        current_app.logger.error(f"Redis MGET of {len(keys)} prayer time keys failed: {e}", exc_info=True)
+
+def get_daily_prayer_times_from_cache(final_zone_id: str, today_date_str: str, composite_method_key: str) -> Optional[Dict[str, Any]]:
+    """Returns the single-day prayer times cached by cache_daily_prayer_times, if any."""
+    return _cache_get_json(generate_daily_redis_key(final_zone_id, today_date_str, composite_method_key))
+
+def invalidate_yearly_calendars(changed: List[tuple], calendar_json_by_key: Optional[Dict[tuple, str]] = None) -> None:
+    """
+    Refreshes the Redis copies of the changed (zone_id, year, composite_method_key)
+    calendars and announces them on CALENDAR_INVALIDATION_CHANNEL, in one round trip.
+    Calendars with a serialized JSON in `calendar_json_by_key` are written through
+    as-is; the others are deleted and reloaded from the database on the next read.
+    """
+    if not changed:
+        return
+    calendar_json_by_key = calendar_json_by_key or {}
+    ttl = current_app.config['REDIS_TTL_YEARLY_CALENDAR']
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for key in changed:
+            redis_key = generate_calendar_redis_key(*key)
+            if key in calendar_json_by_key:
+                pipe.set(redis_key, calendar_json_by_key[key], ex=ttl)
+            else:
+                pipe.delete(redis_key)
+        pipe.publish(CALENDAR_INVALIDATION_CHANNEL, json.dumps([
+            {"zone_id": zone_id, "year": year, "calculation_method": method} for zone_id, year, method in changed
+        ]))
+        pipe.execute()
+    except redis_exceptions.RedisError as e:
+        current_app.logger.error(f"Redis invalidation failed for {len(changed)} calendars: {e}", exc_info=True)
+
 def _cache_get_json(key: str) -> Optional[Dict[str, Any]]:
     """Helper function to safely get and deserialize a JSON object from Redis."""
     try:
-        cached_data = redis_client.get(key)
+        cached_data = get_redis_batch().get(key)
         if cached_data:
             return json.loads(cached_data)
         return None
@@ -57,9 +114,9 @@ def _cache_get_json(key: str) -> Optional[Dict[str, Any]]:
         return None
 
 def _cache_set_json(key: str, value: Any, ttl: int) -> None:
-    """Helper function to safely serialize and set a JSON object in Redis."""
+    """Helper function to safely serialize and set a JSON object in Redis (batched within a request)."""
     try:
-        redis_client.set(key, json.dumps(value), ex=ttl)
+        get_redis_batch().set(key, json.dumps(value), ex=ttl)
     except redis_exceptions.RedisError as e:
         current_app.logger.error(f"Redis SET failed for key {key}: {e}", exc_info=True)
 def cache_daily_prayer_times(final_zone_id: str, today_date_str: str, composite_method_key: str, daily_data: Dict[str, Any]) -> None:
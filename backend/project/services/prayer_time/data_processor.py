@@ -1,18 +1,123 @@
 # This module handles fetching yearly prayer calendar data and saving it to the database.
 import datetime
+import hashlib
+import json
+from collections import namedtuple
+from typing import Iterable, List, Optional, Tuple
 from flask import current_app
 from project.models import PrayerZoneCalendar
 from project import db # Assuming db is initialized in project/__init__.py
+from project.utils.db_utils import dialect_insert, json_value
 from .api_adapter import get_selected_api_adapter
+from .cache_layer import invalidate_yearly_calendars
 from sqlalchemy.exc import SQLAlchemyError
 
+# Calendars written per INSERT statement by bulk_upsert_yearly_calendars
+# (each row carries a full year of timings, so statements are kept moderately sized).
+BULK_UPSERT_CHUNK_SIZE = 100
+
+# Timings that decide whether two zones share a calendar: those the timing calculator reads.
+CANONICAL_TIMING_KEYS = ('Imsak', 'Fajr', 'Sunrise', 'Dhuhr', 'Asr', 'Maghrib', 'Isha')
+
+# `calendar_json` is the calendar data already serialized, written as-is to the database and Redis.
+CalendarRow = namedtuple('CalendarRow', ['zone_id', 'year', 'calculation_method', 'calendar_json', 'calendar_hash'])
+
+
+def canonical_calendar(yearly_data: list) -> list:
+    """
+    The canonical compact form of a calendar: one [date, Imsak, Fajr, ..., Isha]
+    list per day, times as bare "HH:MM". Hijri dates, timezone labels and the
+    timings nothing reads are left out, so they cannot make equal calendars differ.
+    """
+    days = []
+    for day in yearly_data:
+        date = day.get('date')
+        if isinstance(date, dict):
+            date = date.get('gregorian', {}).get('date')
+        timings = day.get('timings', {})
+        # "05:01 (IST)" -> "05:01"
+        days.append([date] + [(timings.get(key) or '').split(' ')[0] for key in CANONICAL_TIMING_KEYS])
+    return days
+
+
+def calculate_calendar_hash(yearly_data: list) -> str:
+    """SHA-256 of the calendar's canonical compact form (see canonical_calendar)."""
+    canonical_str = json.dumps(canonical_calendar(yearly_data), separators=(',', ':'))
+    return hashlib.sha256(canonical_str.encode('utf-8')).hexdigest()
+
+
+def make_calendar_row(zone_id: str, year: int, calculation_method: str, yearly_data: list) -> CalendarRow:
+    """Serializes the calendar once and hashes its canonical form, ready for bulk_upsert_yearly_calendars."""
+    return CalendarRow(zone_id, year, calculation_method, json.dumps(yearly_data, separators=(',', ':')),
+                       calculate_calendar_hash(yearly_data))
+
+
+def bulk_upsert_yearly_calendars(rows: Iterable[CalendarRow]) -> List[Tuple[str, int, str]]:
+    """
+    Writes many calendars in one transaction, BULK_UPSERT_CHUNK_SIZE rows per
+    `INSERT ... ON CONFLICT (zone_id, year, calculation_method) DO UPDATE`.
+    Existing rows are only rewritten when their calendar_hash differs, and only
+    those changed or inserted rows are written through to Redis (reusing each
+    row's serialized calendar_json) and announced as invalidated.
+
+    Returns the (zone_id, year, calculation_method) keys that were inserted or
+    changed. Raises SQLAlchemyError (after rolling back) if the write fails.
+    """
+    # One row per key (the last one wins): ON CONFLICT cannot update a row twice in one statement.
+    rows_by_key = {(row.zone_id, row.year, row.calculation_method): row for row in rows}
+    if not rows_by_key:
+        return []
+
+    table = PrayerZoneCalendar.__table__
+    schema_version = current_app.config['CACHE_SCHEMA_VERSION']
+    now = datetime.datetime.utcnow()
+    values = [
+        {
+            'zone_id': row.zone_id,
+            'year': row.year,
+            'calculation_method': row.calculation_method,
+            'calendar_data': json_value(row.calendar_json),
+            'calendar_hash': row.calendar_hash,
+            'schema_version': schema_version,
+            'created_at': now,
+            'updated_at': now,
+        }
+        for row in rows_by_key.values()
+    ]
+
+    changed = []
+    try:
+        for start in range(0, len(values), BULK_UPSERT_CHUNK_SIZE):
+            insert = dialect_insert(table).values(values[start:start + BULK_UPSERT_CHUNK_SIZE])
+            upsert = insert.on_conflict_do_update(
+                index_elements=[table.c.zone_id, table.c.year, table.c.calculation_method],
+                set_={
+                    'calendar_data': insert.excluded.calendar_data,
+                    'calendar_hash': insert.excluded.calendar_hash,
+                    'schema_version': insert.excluded.schema_version,
+                    'updated_at': insert.excluded.updated_at,
+                },
+                where=table.c.calendar_hash.is_distinct_from(insert.excluded.calendar_hash),
+            ).returning(table.c.zone_id, table.c.year, table.c.calculation_method)
+            # Rows skipped by the WHERE clause are not returned.
+            changed.extend(tuple(key) for key in db.session.execute(upsert))
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+        raise
+
+    invalidate_yearly_calendars(changed, {key: rows_by_key[key].calendar_json for key in changed})
+    current_app.logger.info(f"Bulk upsert: {len(changed)} of {len(values)} yearly calendars inserted or changed.")
+    return changed
+
+
 def get_yearly_calendar_data(zone_id: str, year: int, method_id: int, asr_juristic_id: int, high_latitude_method_id: int, latitude: float, longitude: float, force_refresh: bool) -> Optional[list]:
     """
     Fetches the full yearly prayer calendar from the API and saves/updates it in the database.
     Implements upsert logic: if a record exists, it updates; otherwise, it creates a new one.
     """
     composite_method_key = f"{method_id}-{asr_juristic_id}-{high_latitude_method_id}"
-    
+
     # 1. Fetch from API (always, due to nature of background task or initial fetch)
     adapter = get_selected_api_adapter()
     if not adapter:
@@ -24,45 +129,13 @@ def get_yearly_calendar_data(zone_id: str, year: int, method_id: int, asr_jurist
         current_app.logger.error(f"No yearly data fetched from API for zone '{zone_id}', year {year}.")
         return None
 
-    # Calculate SHA-256 hash of the calendar data for efficient comparison
-    import hashlib
-    import json
-    # Ensure consistent JSON serialization for reproducible hash
-    calendar_data_str = json.dumps(yearly_data, sort_keys=True, separators=(',', ':'))
-    calendar_hash = hashlib.sha256(calendar_data_str.encode('utf-8')).hexdigest()
-
-    # 2. Save/Update to Database (Upsert Logic)
+    # 2. Save/Update to Database (a single upsert statement; unchanged calendars are left alone)
     try:
-        # Check if the record already exists
-        existing_calendar = PrayerZoneCalendar.query.filter_by(
-            zone_id=zone_id,
-            year=year,
-            calculation_method=composite_method_key
-        ).first()
-
-        if existing_calendar:
-            existing_calendar.calendar_data = yearly_data
-            existing_calendar.calendar_hash = calendar_hash # Save the new hash
-            existing_calendar.updated_at = datetime.datetime.utcnow()
-            existing_calendar.schema_version = current_app.config['CACHE_SCHEMA_VERSION']
-            db.session.merge(existing_calendar) # Use merge for upsert
-            current_app.logger.info(f"Updated yearly calendar for zone '{zone_id}', year {year} in DB.")
-        else:
-            new_calendar = PrayerZoneCalendar(
-                zone_id=zone_id,
-                year=year,
-                calculation_method=composite_method_key,
-                calendar_data=yearly_data,
-                calendar_hash=calendar_hash, # Save the new hash
-                schema_version=current_app.config['CACHE_SCHEMA_VERSION']
-            )
-            db.session.add(new_calendar)
-            current_app.logger.info(f"Added new yearly calendar for zone '{zone_id}', year {year} to DB.")
-        
-        db.session.commit()
+        changed = bulk_upsert_yearly_calendars([make_calendar_row(zone_id, year, composite_method_key, yearly_data)])
+        state = "Saved" if changed else "Unchanged"
+        current_app.logger.info(f"{state} yearly calendar for zone '{zone_id}', year {year} in DB.")
         return yearly_data
 
     except SQLAlchemyError as e:
-        db.session.rollback()
         current_app.logger.error(f"DB upsert failed for yearly calendar for zone '{zone_id}', year {year}: {e}", exc_info=True)
         return None
@@ -0,0 +1,147 @@
+# project/services/prayer_time/settings_snapshot.py
+
+"""
+Immutable snapshot of a UserSettings row, built once and passed through the
+prayer time calculation pipeline instead of the ORM instance.
+
+Fixed times are pre-parsed into minutes since midnight and offsets coerced to
+ints, so calculators read plain slotted attributes rather than parsing strings
+and going through SQLAlchemy's attribute instrumentation for every prayer of
+every day. Snapshots are hashable and compare by value, so identical settings
+can share cache entries.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from flask import current_app
+
+from ..helpers.constants import (
+    ASR_JURISTIC_IDS, CALCULATION_METHOD_IDS, DEFAULT_CALCULATION_METHOD_ID, HIGH_LATITUDE_METHOD_IDS, PRAYER_CONFIG_MAP,
+)
+from .time_arithmetic import parse_minutes
+
+
+@dataclass(frozen=True, slots=True)
+class PrayerRule:
+    """How one daily prayer's Azan and Jamaat times are derived. Times are minutes since midnight."""
+    is_fixed: bool
+    fixed_azan: Optional[int]
+    fixed_jamaat: Optional[int]
+    azan_offset: Optional[int]
+    jamaat_offset: Optional[int]
+
+
+@dataclass(frozen=True, slots=True)
+class JummahRule:
+    """Jummah times (minutes since midnight) and offsets (from Dhuhr / the Jummah Azan)."""
+    is_fixed: bool
+    azan: Optional[int]
+    khutbah: Optional[int]
+    jamaat: Optional[int]
+    azan_offset: Optional[int]
+    khutbah_offset: Optional[int]
+    jamaat_offset: Optional[int]
+
+
+@dataclass(frozen=True, slots=True)
+class PrayerSettingsSnapshot:
+    fajr: PrayerRule
+    dhuhr: PrayerRule
+    asr: PrayerRule
+    maghrib: PrayerRule
+    isha: PrayerRule
+    jummah: JummahRule
+    threshold_minutes: Optional[int]
+    adjust_timings_with_api_location: Optional[bool]
+    asr_juristic: Optional[str]
+    high_latitude_method: Optional[str]
+    hijri_offset: Optional[int]
+    timezone: Optional[str]
+    # AlAdhan IDs of the calculation method (the owning user's), Asr school and high-latitude method.
+    calculation_method_id: int
+    asr_juristic_id: int
+    high_latitude_method_id: int
+    # Per-row state rather than settings: kept out of equality and hashing so that
+    # identical settings share cache entries.
+    settings_id: Optional[int] = field(default=None, compare=False)
+    last_api_times_for_threshold: Optional[str] = field(default=None, compare=False)
+
+    def rule(self, prayer_key: str) -> PrayerRule:
+        """Returns the rule for a key of PRAYER_CONFIG_MAP (e.g. 'fajr')."""
+        return getattr(self, prayer_key)
+
+    @classmethod
+    def from_settings(cls, settings: Any) -> 'PrayerSettingsSnapshot':
+        """
+        Builds a snapshot from a UserSettings instance (persistent or transient).
+        Calculation setting names without an AlAdhan ID fall back to the defaults.
+        """
+        rules = {
+            p_key: PrayerRule(
+                is_fixed=bool(getattr(settings, config["is_fixed_attr"], False)),
+                fixed_azan=parse_minutes(getattr(settings, config["fixed_azan_attr"], None)),
+                fixed_jamaat=parse_minutes(getattr(settings, config["fixed_jamaat_attr"], None)),
+                azan_offset=_to_int(getattr(settings, config["azan_offset_attr"], None)),
+                jamaat_offset=_to_int(getattr(settings, config["jamaat_offset_attr"], None)),
+            )
+            for p_key, config in PRAYER_CONFIG_MAP.items()
+        }
+        jummah = JummahRule(
+            is_fixed=bool(settings.jummah_is_fixed),
+            azan=parse_minutes(settings.jummah_azan_time),
+            khutbah=parse_minutes(settings.jummah_khutbah_start_time),
+            jamaat=parse_minutes(settings.jummah_jamaat_time),
+            azan_offset=_to_int(settings.jummah_azan_offset),
+            khutbah_offset=_to_int(settings.jummah_khutbah_offset),
+            jamaat_offset=_to_int(settings.jummah_jamaat_offset),
+        )
+        return cls(
+            jummah=jummah,
+            threshold_minutes=_to_int(settings.threshold_minutes),
+            adjust_timings_with_api_location=settings.adjust_timings_with_api_location,
+            asr_juristic=settings.asr_juristic,
+            high_latitude_method=settings.high_latitude_method,
+            hijri_offset=_to_int(settings.hijri_offset),
+            timezone=settings.timezone,
+            calculation_method_id=_calculation_method_id(settings),
+            # Transient rows have no column defaults yet, hence the fallbacks.
+            asr_juristic_id=calculation_id(ASR_JURISTIC_IDS, settings.asr_juristic, ASR_JURISTIC_IDS['Standard']),
+            high_latitude_method_id=calculation_id(
+                HIGH_LATITUDE_METHOD_IDS, settings.high_latitude_method, HIGH_LATITUDE_METHOD_IDS['MiddleOfTheNight']
+            ),
+            settings_id=settings.id,
+            last_api_times_for_threshold=settings.last_api_times_for_threshold,
+            **rules
+        )
+
+
+def as_settings_snapshot(settings: Any) -> Optional[PrayerSettingsSnapshot]:
+    """Returns `settings` unchanged if it already is a snapshot, otherwise snapshots it."""
+    if settings is None or isinstance(settings, PrayerSettingsSnapshot):
+        return settings
+    return PrayerSettingsSnapshot.from_settings(settings)
+
+
+def _calculation_method_id(settings: Any) -> int:
+    # The method is stored on the user; settings not attached to one use the default.
+    method = settings.user.default_calculation_method if settings.user is not None else None
+    return calculation_id(CALCULATION_METHOD_IDS, method, DEFAULT_CALCULATION_METHOD_ID)
+
+
+def calculation_id(ids: Dict[str, int], name: Optional[str], default: int) -> int:
+    """
+    The AlAdhan ID of a stored setting name (see helpers.constants), or `default`
+    when it is unset or a name the API does not know (logged, not raised: one bad
+    row must not fail the request).
+    """
+    if not name:
+        return default
+    if name not in ids:
+        current_app.logger.warning(f"Unknown calculation setting '{name}'; using ID {default}.")
+        return default
+    return ids[name]
+
+
+def _to_int(value: Any) -> Optional[int]:
+    return None if value is None else int(value)
@@ -0,0 +1,64 @@
+# project/services/prayer_time/time_arithmetic.py
+
+"""
+Time-of-day arithmetic for the prayer time pipeline.
+
+Times are handled as integers (seconds or minutes since midnight) and only
+converted to "HH:MM" strings at the output boundary (format_minutes), instead
+of building datetime objects for every parse, addition and comparison.
+"""
+
+import datetime
+from functools import lru_cache
+from typing import Optional
+
+from flask import current_app
+
+MINUTES_PER_DAY = 24 * 60
+
+@lru_cache(maxsize=4096)
+def parse_seconds(time_str: str) -> Optional[int]:
+    """
+    Parses "HH:MM" or "HH:MM:SS" into seconds since midnight. A trailing timezone
+    suffix, as in AlAdhan's "05:12 (IST)", is ignored. Returns None for missing,
+    "N/A" or malformed values.
+
+    Memoized: a calendar repeats the same few hundred time strings all year.
+    """
+    if not time_str or time_str.lower() == "n/a":
+        return None
+
+    parts = time_str.strip().split(" ", 1)[0].split(":")
+    if len(parts) in (2, 3):
+        try:
+            hours, minutes = int(parts[0]), int(parts[1])
+            seconds = int(parts[2]) if len(parts) == 3 else 0
+        except ValueError:
+            hours = -1
+        if 0 <= hours < 24 and 0 <= minutes < 60 and 0 <= seconds < 60:
+            return hours * 3600 + minutes * 60 + seconds
+
+    current_app.logger.warning(f"Service: Invalid or unrecognized time string format for parsing: {time_str}")
+    return None
+
+def parse_minutes(time_str: str) -> Optional[int]:
+    """Parses a time string into whole minutes since midnight (seconds are truncated)."""
+    seconds = parse_seconds(time_str)
+    return None if seconds is None else seconds // 60
+
+def parse_time_str(time_str: str) -> Optional[datetime.time]:
+    """Parses a time string into a datetime.time, for callers that need time objects."""
+    seconds = parse_seconds(time_str)
+    if seconds is None:
+        return None
+    return datetime.time(seconds // 3600, (seconds // 60) % 60, seconds % 60)
+
+def format_minutes(minutes: Optional[int]) -> str:
+    """Formats minutes since midnight as "HH:MM" (or "N/A")."""
+    if minutes is None: return "N/A"
+    return "%02d:%02d" % divmod(minutes % MINUTES_PER_DAY, 60)
+
+def add_minutes(minutes: Optional[int], minutes_to_add: Optional[int]) -> Optional[int]:
+    """Adds minutes to a time of day, wrapping around midnight."""
+    if minutes is None or minutes_to_add is None: return None
+    return (minutes + int(minutes_to_add)) % MINUTES_PER_DAY
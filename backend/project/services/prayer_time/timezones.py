@@ -0,0 +1,90 @@
+# project/services/prayer_time/timezones.py
+
+"""
+Wall-clock to UTC conversion for schedule generation.
+
+Prayer times are wall-clock times of the owner's timezone. Converting a month of
+them with `datetime.replace(tzinfo=ZoneInfo(name)).timestamp()` resolves the
+zone and searches its transition rules for every single time. Here ZoneInfo
+objects are cached process-wide, and each (zone, year) gets a precomputed table
+of its UTC offset changes, so a conversion is one bisect over a handful of
+integers.
+
+Conversions follow datetime's fold=0 rules (PEP 495): a wall-clock time skipped
+by a DST gap is moved forward by the gap (02:30 becomes 03:30), and one repeated
+by a DST overlap resolves to its first occurrence.
+"""
+
+import calendar
+import datetime
+from bisect import bisect_right
+from collections import namedtuple
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+UNIX_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+# Offset changes are searched for in steps of this size, then located to the second.
+# Zones never change their offset twice within one step.
+TRANSITION_SCAN_STEP_SECONDS = 6 * 3600
+
+# Each year's table also covers a few days either side, for times just past New Year.
+TABLE_MARGIN_SECONDS = 3 * 86400
+
+# `wall_bounds[i]` is the first wall-clock second (as Unix seconds) that is
+# converted with `offsets[i + 1]` rather than `offsets[i]`; offsets are in seconds.
+OffsetTable = namedtuple('OffsetTable', ['wall_bounds', 'offsets'])
+
+
+@lru_cache(maxsize=None)
+def get_zone_info(name: str) -> ZoneInfo:
+    """
+    Returns the ZoneInfo for an IANA name, constructed once per process.
+    Raises zoneinfo.ZoneInfoNotFoundError for unknown names.
+    """
+    return ZoneInfo(name)
+
+
+@lru_cache(maxsize=1024)
+def offset_table(name: str, year: int) -> OffsetTable:
+    """The UTC offset changes of zone `name` during `year` (see OffsetTable)."""
+    zone = get_zone_info(name)
+
+    def offset_at(epoch):
+        return int(datetime.datetime.fromtimestamp(epoch, zone).utcoffset().total_seconds())
+
+    start = calendar.timegm((year, 1, 1, 0, 0, 0)) - TABLE_MARGIN_SECONDS
+    end = calendar.timegm((year + 1, 1, 1, 0, 0, 0)) + TABLE_MARGIN_SECONDS
+    wall_bounds, offsets = [], [offset_at(start)]
+    for step_start in range(start, end, TRANSITION_SCAN_STEP_SECONDS):
+        step_end = min(step_start + TRANSITION_SCAN_STEP_SECONDS, end)
+        before = offsets[-1]
+        after = offset_at(step_end)
+        if after == before:
+            continue
+        # The offset changes in (step_start, step_end]: find the exact second.
+        low, high = step_start, step_end
+        while high - low > 1:
+            middle = (low + high) // 2
+            if offset_at(middle) == before:
+                low = middle
+            else:
+                high = middle
+        # Until the wall clock has passed both readings of the transition, the
+        # earlier offset applies (fold=0): gap times move forward, overlaps resolve first.
+        wall_bounds.append(high + max(before, after))
+        offsets.append(after)
+    return OffsetTable(tuple(wall_bounds), tuple(offsets))
+
+
+def wall_clock_seconds(moment: datetime.datetime) -> int:
+    """A naive datetime as Unix seconds, i.e. as if it were UTC."""
+    return ((moment.toordinal() - UNIX_EPOCH_ORDINAL) * 86400
+            + moment.hour * 3600 + moment.minute * 60 + moment.second)
+
+
+def local_to_utc_epoch(moment: datetime.datetime, name: str) -> int:
+    """Converts a naive wall-clock datetime of zone `name` to a UTC Unix timestamp (seconds)."""
+    table = offset_table(name, moment.year)
+    wall = wall_clock_seconds(moment)
+    return wall - table.offsets[bisect_right(table.wall_bounds, wall)]
@@ -1,80 +1,87 @@
 from ..helpers.constants import PRAYER_CONFIG_MAP
+from .settings_snapshot import as_settings_snapshot
+from .time_arithmetic import parse_minutes, format_minutes, add_minutes
 from typing import Dict, Any, Optional, List, Tuple
 import datetime
+import json
 from flask import current_app
 
-def parse_time_str(time_str: str) -> Optional[datetime.time]:
-    if not time_str or time_str.lower() == "n/a": 
-        return None
-    
-    for fmt in ("%H:%M", "%H:%M:%S"):
-        try:
-            return datetime.datetime.strptime(time_str.strip(), fmt).time()
-        except ValueError:
-            continue
-            
-    current_app.logger.warning(f"Service: Invalid or unrecognized time string format for parsing: {time_str}")
-    return None
-
-def format_time_obj(time_obj: Optional[datetime.time]) -> str:
-    if not time_obj: return "N/A"
-    return time_obj.strftime("%H:%M")
-
-def add_minutes(time_obj: Optional[datetime.time], minutes_to_add: Optional[int]) -> Optional[datetime.time]:
-    if not time_obj or minutes_to_add is None: return None
-    dummy_date = datetime.date.min
-    full_datetime = datetime.datetime.combine(dummy_date, time_obj)
-    new_datetime = full_datetime + datetime.timedelta(minutes=int(minutes_to_add))
-    return new_datetime.time()
+# Business Logic: Jamaat time must be at least this many minutes before the prayer period ends.
+END_BOUNDARY_BUFFER_MINUTES = 8
 
 def apply_boundary_check(
-    time_to_check: Optional[datetime.time], 
-    start_boundary_str: Optional[str], 
-    end_boundary_str: Optional[str],
+    time_to_check: Optional[int], 
+    start_boundary: Optional[int], 
+    end_boundary: Optional[int],
     prayer_name: str,
     time_type: str # "Azan" or "Jamaat"
-) -> Tuple[Optional[datetime.time], Optional[str]]:
+) -> Tuple[Optional[int], Optional[str]]:
     """
-    Checks if a time falls within its valid boundaries. Auto-corrects and returns a warning if it doesn't.
+    Checks if a time (minutes since midnight) falls within its valid boundaries.
+    Auto-corrects and returns a warning if it doesn't.
     Includes an 8-minute buffer for the end boundary as per business logic.
     """
-    if not time_to_check: 
+    if time_to_check is None: 
         return None, None
 
-    start_boundary_obj = parse_time_str(start_boundary_str)
-    end_boundary_obj = parse_time_str(end_boundary_str)
     warning = None
 
-    if not start_boundary_obj or not end_boundary_obj:
+    if start_boundary is None or end_boundary is None:
         return time_to_check, None
     
-    # Business Logic: Jamaat time must be at least 8 minutes before the prayer period ends.
-    buffer_minutes = 8
-    end_boundary_with_buffer_obj = add_minutes(end_boundary_obj, -buffer_minutes)
+    end_boundary_with_buffer = add_minutes(end_boundary, -END_BOUNDARY_BUFFER_MINUTES)
 
-    original_time_str = format_time_obj(time_to_check)
+    original_time_str = format_minutes(time_to_check)
 
     # Check 1: Time must not be before the prayer period starts.
-    if time_to_check < start_boundary_obj:
+    if time_to_check < start_boundary:
         warning = (
             f"Your {time_type} time for {prayer_name} ({original_time_str}) was before the prayer's start time "
-            f"({format_time_obj(start_boundary_obj)}) and has been auto-corrected."
+            f"({format_minutes(start_boundary)}) and has been auto-corrected."
         )
-        time_to_check = start_boundary_obj
+        time_to_check = start_boundary
         current_app.logger.warning(f"Boundary Check Triggered: {warning}")
 
     # Check 2: Time must not be after the (buffered) prayer period ends.
-    if time_to_check > end_boundary_with_buffer_obj:
+    if time_to_check > end_boundary_with_buffer:
         warning = (
             f"Your {time_type} time for {prayer_name} ({original_time_str}) was too close to the prayer's end time "
-            f"and has been auto-corrected to {format_time_obj(end_boundary_with_buffer_obj)}."
+            f"and has been auto-corrected to {format_minutes(end_boundary_with_buffer)}."
         )
-        time_to_check = end_boundary_with_buffer_obj
+        time_to_check = end_boundary_with_buffer
         current_app.logger.warning(f"Boundary Check Triggered: {warning}")
 
     return time_to_check, warning
 
+def calculate_jummah_times(rule: Any, api_times_today: Dict[str, Any], warnings: List[str]) -> Dict[str, str]:
+    """
+    Calculates the Jummah Azan, Khutbah and Jamaat from a JummahRule. Jummah takes
+    Dhuhr's place, so it is checked against Dhuhr's boundaries; warnings are appended to `warnings`.
+    """
+    start_boundary = parse_minutes(api_times_today.get("Dhuhr"))
+    end_boundary = parse_minutes(api_times_today.get("Asr"))
+
+    if rule.is_fixed:
+        azan_time, khutbah_time, jamaat_time = rule.azan, rule.khutbah, rule.jamaat
+    else:
+        # Azan is offset from Dhuhr's start, Khutbah and Jamaat from the Jummah Azan.
+        azan_time = add_minutes(start_boundary, rule.azan_offset)
+        khutbah_time = add_minutes(azan_time, rule.khutbah_offset)
+        jamaat_time = add_minutes(azan_time, rule.jamaat_offset)
+
+    jummah_times = {}
+    for time_type, time_value in (("Azan", azan_time), ("Khutbah", khutbah_time), ("Jamaat", jamaat_time)):
+        checked_time, warning = apply_boundary_check(time_value, start_boundary, end_boundary, "Jummah", time_type)
+        if warning: warnings.append(warning)
+        jummah_times[time_type.lower()] = format_minutes(checked_time)
+    return jummah_times
+
 def calculate_display_times_from_service(user_settings: Any, api_times_today: Dict[str, Any], api_times_tomorrow: Dict[str, Any], app_config: Dict[str, Any], calculation_date: datetime.date) -> Tuple[Dict[str, Any], bool, List[str]]:
+    """
+    Calculates the display times for one day. `user_settings` may be a
+    PrayerSettingsSnapshot or a UserSettings instance (snapshotted on entry).
+    """
+    user_settings = as_settings_snapshot(user_settings)
     calculated_times = {}
     needs_db_update = False
     warnings = []
@@ -91,30 +98,28 @@ def calculate_display_times_from_service(user_settings: Any, api_times_today: Di
             needs_db_update = True
 
     for p_key, config in PRAYER_CONFIG_MAP.items():
-        is_fixed = getattr(user_settings, config["is_fixed_attr"], False)
+        rule = user_settings.rule(p_key)
+        is_fixed = rule.is_fixed
         prayer_display_name = p_key.capitalize()
         
-        azan_time_obj, jamaat_time_obj = None, None
+        azan_time, jamaat_time = None, None
         
         api_start_time_str = api_times_today.get(config["api_key"])
-        start_boundary_str = api_start_time_str
         end_boundary_key = config["end_boundary_key"]
         end_boundary_str = api_times_tomorrow.get("Fajr") if end_boundary_key == "Fajr_Tomorrow" else api_times_today.get(end_boundary_key)
+        start_boundary = parse_minutes(api_start_time_str)
+        end_boundary = parse_minutes(end_boundary_str)
 
         if is_fixed:
-            azan_time_obj = parse_time_str(getattr(user_settings, config["fixed_azan_attr"]))
-            jamaat_time_obj = parse_time_str(getattr(user_settings, config["fixed_jamaat_attr"]))
-
             # --- BUG FIX: Apply boundary check for fixed times ---
-            azan_time_obj, azan_warning = apply_boundary_check(azan_time_obj, start_boundary_str, end_boundary_str, prayer_display_name, "Azan")
+            azan_time, azan_warning = apply_boundary_check(rule.fixed_azan, start_boundary, end_boundary, prayer_display_name, "Azan")
             if azan_warning: warnings.append(azan_warning)
             
-            jamaat_time_obj, jamaat_warning = apply_boundary_check(jamaat_time_obj, start_boundary_str, end_boundary_str, prayer_display_name, "Jamaat")
+            jamaat_time, jamaat_warning = apply_boundary_check(rule.fixed_jamaat, start_boundary, end_boundary, prayer_display_name, "Jamaat")
             if jamaat_warning: warnings.append(jamaat_warning)
 
         else: # Offset logic
             if api_start_time_str:
-                api_time_to_use_str = api_start_time_str
                 last_api_time_str = last_api_times.get(config["api_key"])
                 
                 # Threshold logic
@@ -122,32 +127,28 @@ def calculate_display_times_from_service(user_settings: Any, api_times_today: Di
                     # ... (threshold logic remains the same)
                     pass # Simplified for brevity
 
-                api_start_time_obj = parse_time_str(api_time_to_use_str)
-                if api_start_time_obj:
+                if start_boundary is not None:
                     # Calculate Azan with offset
-                    azan_offset = getattr(user_settings, config["azan_offset_attr"])
-                    calculated_azan_obj = add_minutes(api_start_time_obj, azan_offset)
-                    azan_time_obj, azan_warning = apply_boundary_check(calculated_azan_obj, start_boundary_str, end_boundary_str, prayer_display_name, "Azan")
+                    calculated_azan = add_minutes(start_boundary, rule.azan_offset)
+                    azan_time, azan_warning = apply_boundary_check(calculated_azan, start_boundary, end_boundary, prayer_display_name, "Azan")
                     if azan_warning: warnings.append(azan_warning)
                     
                     # Calculate Jamaat with offset
-                    if azan_time_obj:
-                        jamaat_offset = getattr(user_settings, config["jamaat_offset_attr"])
+                    if azan_time is not None:
                         # User wants Jamaat offset relative to the (now corrected) Azan time
-                        calculated_jamaat_obj = add_minutes(azan_time_obj, jamaat_offset)
-                        jamaat_time_obj, jamaat_warning = apply_boundary_check(calculated_jamaat_obj, start_boundary_str, end_boundary_str, prayer_display_name, "Jamaat")
+                        calculated_jamaat = add_minutes(azan_time, rule.jamaat_offset)
+                        jamaat_time, jamaat_warning = apply_boundary_check(calculated_jamaat, start_boundary, end_boundary, prayer_display_name, "Jamaat")
                         if jamaat_warning: warnings.append(jamaat_warning)
 
-        calculated_times[p_key] = {"azan": format_time_obj(azan_time_obj), "jamaat": format_time_obj(jamaat_time_obj)}
-    
-    # ... (rest of the function for Jummah, Iftari, etc. remains the same) ...
-    # This part is simplified as it's not the focus of the bug fix.
+        calculated_times[p_key] = {"azan": format_minutes(azan_time), "jamaat": format_minutes(jamaat_time)}
     
+    calculated_times["jummah"] = calculate_jummah_times(user_settings.jummah, api_times_today, warnings)
+
     maghrib_time_str = api_times_today.get("Maghrib")
-    calculated_times["iftari"] = {"time": format_time_obj(parse_time_str(maghrib_time_str))}
+    calculated_times["iftari"] = {"time": format_minutes(parse_minutes(maghrib_time_str))}
     imsak_time_str = api_times_today.get("Imsak")
-    calculated_times["sehri_end"] = {"time": format_time_obj(parse_time_str(imsak_time_str))}
-    # ... and so on for Jummah, Sunrise, etc.
+    calculated_times["sehri_end"] = {"time": format_minutes(parse_minutes(imsak_time_str))}
+    # ... and so on for Sunrise, etc.
 
     return calculated_times, needs_db_update, warnings
 
@@ -1,11 +1,9 @@
 # This module will contain all functions related to resolving prayer time zones.
 import math
-import datetime
 import os
 import json
 from flask import current_app
-from .cache_layer import get_yearly_calendar_from_cache
-from .timing_calculator import parse_time_str
+from .time_arithmetic import parse_seconds
 from typing import Dict, Any, Optional, Tuple, List
 
 def get_zone_id_from_coords(latitude: float, longitude: float) -> str:
@@ -45,17 +43,46 @@ def get_zone_id_from_admin_levels(admin_levels: Dict[str, Any], level: str = "ad
     else:
         return None # Invalid level or missing admin_3 for admin_3 level
 
-from ..models import PrayerZoneCalendar, ZoneAlias
-from project.extensions import redis_client
+from ... import db
+from ...models import PrayerZoneCalendar, ZoneAlias
+from project.utils.redis_batch import get_redis_batch
 from sqlalchemy.exc import SQLAlchemyError
 from .key_utils import generate_alias_redis_key
+from ..zone_registry_service import register_zone_request, admin_path_from_levels
 
 # --- Constants for Redis --- 
 # TTL for Redis alias pointers (e.g., 30 days)
 REDIS_ALIAS_TTL = 2592000
 
+def get_zone_kind(zone_id: str, admin_levels: Optional[Dict[str, Any]]) -> str:
+    """Classifies a zone ID resolved from `admin_levels` as 'admin2', 'admin3', 'grid' or 'unknown' (for metrics)."""
+    if zone_id.startswith("grid_"):
+        return "grid"
+    if admin_levels:
+        if zone_id == get_zone_id_from_admin_levels(admin_levels, level="admin_3"):
+            return "admin3"
+        if zone_id == get_zone_id_from_admin_levels(admin_levels, level="admin_2"):
+            return "admin2"
+    return "unknown"
+
 def determine_final_zone_id(year: int, latitude: float, longitude: float, admin_levels: Optional[Dict[str, Any]], composite_method_key: str, force_refresh: bool) -> Optional[str]:
-    """Determines the most appropriate zone ID to use (Admin2, Admin3, or grid)."""
+    """
+    Determines the most appropriate zone ID to use (Admin2, Admin3, or grid),
+    and records the zone in the Zone registry so prefetch jobs know about it.
+    """
+    final_zone_id = _determine_final_zone_id(year, latitude, longitude, admin_levels, composite_method_key, force_refresh)
+    if final_zone_id:
+        kind = get_zone_kind(final_zone_id, admin_levels)
+        if kind == "grid":
+            latitude, longitude = get_zone_center_coords(final_zone_id)
+        parent_zone_id = get_zone_id_from_admin_levels(admin_levels, level="admin_2") if kind == "admin3" else None
+        register_zone_request(
+            final_zone_id, kind, latitude, longitude, composite_method_key,
+            admin_path=admin_path_from_levels(admin_levels, kind), parent_zone_id=parent_zone_id
+        )
+    return final_zone_id
+
+def _determine_final_zone_id(year: int, latitude: float, longitude: float, admin_levels: Optional[Dict[str, Any]], composite_method_key: str, force_refresh: bool) -> Optional[str]:
     if not admin_levels:
         current_app.logger.warning(f"No admin levels for ({latitude}, {longitude}). Using fallback grid.")
         return get_zone_id_from_coords(latitude, longitude)
@@ -71,8 +98,9 @@ def determine_final_zone_id(year: int, latitude: float, longitude: float, admin_
     # This handles cases where Redis pointer might have expired or been cleared.
     alias_redis_key = generate_alias_redis_key(admin_3_zone_id, composite_method_key)
     
-    # 1. Check Redis for a temporary alias pointer
-    redis_alias_target = redis_client.get(alias_redis_key)
+    # 1. Check Redis for a temporary alias pointer (usually already prefetched with the calendar keys)
+    redis_batch = get_redis_batch()
+    redis_alias_target = redis_batch.get(alias_redis_key)
     if redis_alias_target:
         current_app.logger.info(f"Redis Alias HIT: {admin_3_zone_id} -> {redis_alias_target.decode()}")
         return redis_alias_target.decode()
@@ -82,7 +110,7 @@ def determine_final_zone_id(year: int, latitude: float, longitude: float, admin_
     if db_alias:
         current_app.logger.info(f"DB Alias HIT: {admin_3_zone_id} -> {db_alias.target_zone_id}")
         # Repopulate Redis for faster access next time
-        redis_client.set(alias_redis_key, db_alias.target_zone_id, ex=REDIS_ALIAS_TTL)
+        redis_batch.set(alias_redis_key, db_alias.target_zone_id, ex=REDIS_ALIAS_TTL)
         return db_alias.target_zone_id
 
     # --- Original Logic (modified for hash comparison) --- 
@@ -118,7 +146,7 @@ def determine_final_zone_id(year: int, latitude: float, longitude: float, admin_
             db.session.commit()
             current_app.logger.info(f"Created permanent alias in DB: {admin_3_zone_id} -> {admin_2_zone_id}")
             # Also set in Redis for immediate use
-            redis_client.set(alias_redis_key, admin_2_zone_id, ex=REDIS_ALIAS_TTL)
+            redis_batch.set(alias_redis_key, admin_2_zone_id, ex=REDIS_ALIAS_TTL)
         except SQLAlchemyError as e:
             db.session.rollback()
             current_app.logger.error(f"Failed to create ZoneAlias for {admin_3_zone_id} -> {admin_2_zone_id}: {e}", exc_info=True)
@@ -127,7 +155,8 @@ def determine_final_zone_id(year: int, latitude: float, longitude: float, admin_
         current_app.logger.info(f"Hashes differ: Admin Level 3 ('{admin_3_zone_id}') is required.")
         return admin_3_zone_id
 
-def get_zone_center_coords(zone_id: str) -> Tuple[Optional[float], Optional[float]]:    """
+def get_zone_center_coords(zone_id: str) -> Tuple[Optional[float], Optional[float]]:
+    """
     [Legacy] Calculates the center coordinates for a grid-based zone ID.
     This is only used for the fallback grid system.
     """
@@ -166,15 +195,11 @@ def _compare_prayer_times(calendar1_data: List[Dict[str, Any]], calendar2_data:
             time2_str = day2_timings.get(prayer_name)
 
             if time1_str and time2_str:
-                time1_obj = parse_time_str(time1_str)
-                time2_obj = parse_time_str(time2_str)
-
-                if time1_obj and time2_obj:
-                    dummy_date = datetime.date(2000, 1, 1)
-                    dt1 = datetime.datetime.combine(dummy_date, time1_obj)
-                    dt2 = datetime.datetime.combine(dummy_date, time2_obj)
+                time1_seconds = parse_seconds(time1_str)
+                time2_seconds = parse_seconds(time2_str)
 
-                    diff_seconds = abs((dt1 - dt2).total_seconds())
+                if time1_seconds is not None and time2_seconds is not None:
+                    diff_seconds = abs(time1_seconds - time2_seconds)
 
                     if diff_seconds > threshold_seconds:
                         current_app.logger.info(f"Time difference for {prayer_name} on day {day_idx} exceeds {threshold_seconds}s: {diff_seconds}s")
@@ -1,12 +1,16 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import datetime
 import zoneinfo
 from flask import current_app
 from .prayer_time.api_adapter import get_daily_prayer_times_from_api
-from .prayer_time.cache_layer import get_yearly_calendar_from_cache, cache_daily_prayer_times
-from .prayer_time.zone_resolver import determine_final_zone_id, get_method_id_for_country
+from .prayer_time.cache_layer import (
+    get_yearly_calendar_from_cache, cache_daily_prayer_times, get_daily_prayer_times_from_cache, prefetch_prayer_time_keys
+)
+from .prayer_time.zone_resolver import (
+    determine_final_zone_id, get_method_id_for_country, get_zone_kind, get_zone_id_from_admin_levels, get_zone_id_from_coords
+)
 from .geocoding_service import get_admin_levels_from_coords
-from ..extensions import redis_client
+from ..utils.redis_batch import get_redis_batch, redis_batch_scope
 from ..models import PrayerZoneCalendar
 
 def _check_and_trigger_grace_period_fetch(final_zone_id: str, calculation_method_key: str, latitude: float, longitude: float) -> None:
@@ -75,26 +79,66 @@ def get_api_prayer_times_for_date_from_service(date_obj: datetime.date, latitude
     The core service function, now refactored for a Redis-backed hybrid caching strategy.
     It provides an instant response even for new, uncached locations.
     """
-    year = date_obj.year
-    today_date_str = date_obj.strftime("%d-%m-%Y")
+    return get_api_prayer_times_for_dates_from_service([date_obj], latitude, longitude, method_id, asr_juristic_id, high_latitude_method_id, force_refresh)[0]
+
+def get_api_prayer_times_for_dates_from_service(dates: List[datetime.date], latitude: float, longitude: float, method_id: int, asr_juristic_id: int, high_latitude_method_id: int, force_refresh: bool = False) -> List[Optional[Dict[str, Any]]]:
+    """
+    get_api_prayer_times_for_date_from_service for several dates of one location,
+    returning each date's prayer times (or None) in order.
 
+    The location is geocoded and its zone resolved once per year, and every Redis key
+    the lookups may read (alias pointer, yearly calendars and daily entries of the
+    candidate zones) is fetched with a single MGET. Redis writes are batched with the
+    rest of the request's (see utils/redis_batch).
+    """
     # 1. Determine Zone ID
     admin_levels = get_admin_levels_from_coords(latitude, longitude)
-    
+
     if method_id == current_app.config.get('AUTOMATIC_METHOD_ID'):
         country_code = admin_levels.get('country_code', 'XX') if admin_levels else 'XX'
         method_id = get_method_id_for_country(country_code)
 
     composite_method_key = f"{method_id}-{asr_juristic_id}-{high_latitude_method_id}"
 
-    final_zone_id = determine_final_zone_id(year, latitude, longitude, admin_levels, composite_method_key, force_refresh)
-
-    if not final_zone_id:
-        current_app.logger.error(f"Could not determine a final zone ID for ({latitude}, {longitude}).")
-        return None
+    results = []
+    with redis_batch_scope('prayer_times'):
+        admin_3_zone_id = get_zone_id_from_admin_levels(admin_levels, level="admin_3") if admin_levels else None
+        candidate_zone_ids = [
+            zone_id for zone_id in (
+                admin_3_zone_id,
+                get_zone_id_from_admin_levels(admin_levels, level="admin_2") if admin_levels else None,
+                get_zone_id_from_coords(latitude, longitude),
+            ) if zone_id
+        ]
+        prefetch_prayer_time_keys(candidate_zone_ids, dates, composite_method_key, alias_zone_id=admin_3_zone_id)
+
+        final_zone_ids = {}  # year -> final zone ID
+        locked = set()       # (zone ID, year) whose background fetch this call already tried to start
+        for date_obj in dates:
+            year = date_obj.year
+            if year not in final_zone_ids:
+                final_zone_ids[year] = determine_final_zone_id(year, latitude, longitude, admin_levels, composite_method_key, force_refresh)
+            final_zone_id = final_zone_ids[year]
+
+            if not final_zone_id:
+                current_app.logger.error(f"Could not determine a final zone ID for ({latitude}, {longitude}).")
+                results.append(None)
+                continue
+
+            results.append(_get_prayer_times_for_zone_date(
+                date_obj, final_zone_id, admin_levels, composite_method_key, latitude, longitude,
+                method_id, asr_juristic_id, high_latitude_method_id, locked
+            ))
+    return results
+
+def _get_prayer_times_for_zone_date(date_obj: datetime.date, final_zone_id: str, admin_levels: Optional[Dict[str, Any]], composite_method_key: str, latitude: float, longitude: float, method_id: int, asr_juristic_id: int, high_latitude_method_id: int, locked: set) -> Optional[Dict[str, Any]]:
+    """Prayer times of one date in a resolved zone: from the yearly calendar, else the daily cache or API."""
+    year = date_obj.year
+    today_date_str = date_obj.strftime("%d-%m-%Y")
 
     # 2. Attempt to get the full yearly calendar from cache (Redis or DB)
-    yearly_calendar_data = get_yearly_calendar_from_cache(final_zone_id, year, composite_method_key)
+    zone_kind = get_zone_kind(final_zone_id, admin_levels)
+    yearly_calendar_data = get_yearly_calendar_from_cache(final_zone_id, year, composite_method_key, zone_kind)
 
     if yearly_calendar_data:
         for day_data in yearly_calendar_data:
@@ -110,20 +154,27 @@ def get_api_prayer_times_for_date_from_service(date_obj: datetime.date, latitude
         # Implement Redis lock to prevent race conditions (thundering herd problem).
         # Only the first request for an uncached zone will trigger the background fetch.
         lock_key = f"lock:calendar_fetch:{final_zone_id}:{year}:{composite_method_key}"
-        # Set lock with a 10-minute timeout to prevent permanent locks.
-        if redis_client.set(lock_key, "1", nx=True, ex=600):
-            current_app.logger.info(f"Acquired lock for {lock_key}. Triggering background task.")
-            fetch_and_cache_yearly_calendar_task.delay(
-                zone_id=final_zone_id,
-                year=year,
-                method_id=method_id,
-                asr_juristic_id=asr_juristic_id,
-                high_latitude_method_id=high_latitude_method_id,
-                latitude=latitude,
-                longitude=longitude
-            )
-        else:
-            current_app.logger.info(f"Lock for {lock_key} is already held. Skipping background task trigger.")
+        # Set lock with a 10-minute timeout to prevent permanent locks. Tried once per zone and year.
+        if (final_zone_id, year) not in locked:
+            locked.add((final_zone_id, year))
+            if get_redis_batch().set_nx(lock_key, "1", ex=600):
+                current_app.logger.info(f"Acquired lock for {lock_key}. Triggering background task.")
+                fetch_and_cache_yearly_calendar_task.delay(
+                    zone_id=final_zone_id,
+                    year=year,
+                    method_id=method_id,
+                    asr_juristic_id=asr_juristic_id,
+                    high_latitude_method_id=high_latitude_method_id,
+                    latitude=latitude,
+                    longitude=longitude
+                )
+            else:
+                current_app.logger.info(f"Lock for {lock_key} is already held. Skipping background task trigger.")
+
+        # A single day fetched by an earlier request is reused until it expires.
+        daily_data = get_daily_prayer_times_from_cache(final_zone_id, today_date_str, composite_method_key)
+        if daily_data:
+            return daily_data
 
         # --- Instant Gratification --- 
         # Immediately fetch and return just today's prayer times for the user.
@@ -139,4 +190,4 @@ def get_api_prayer_times_for_date_from_service(date_obj: datetime.date, latitude
         # Cache the single-day result for a short time to prevent API hammering
         cache_daily_prayer_times(final_zone_id, today_date_str, composite_method_key, daily_data)
 
-        return daily_data
\ No newline at end of file
+        return daily_data
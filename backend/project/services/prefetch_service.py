@@ -0,0 +1,208 @@
+"""
+Calendar Prefetch Engine
+------------------------
+Fetches many yearly calendars (one per zone/method pair) ahead of time, as fast
+as the upstream prayer API quota allows and no faster.
+
+  - A bounded pool of PREFETCH_MAX_WORKERS threads runs the fetches, so slow
+    API responses overlap instead of adding up.
+  - Every fetch first takes a token from a shared TokenBucket refilled at
+    PREFETCH_RATE_PER_SECOND (bursting up to PREFETCH_BURST), which keeps the
+    aggregate request rate within the quota however many workers there are.
+  - Each finished pair is checkpointed in a Redis set for the run, so a run
+    restarted after a crash (with the same run ID) skips the pairs already done.
+  - Progress, throughput and ETA are logged every
+    PREFETCH_PROGRESS_LOG_INTERVAL_SECONDS and returned as a PrefetchReport.
+"""
+
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, Optional, Tuple
+
+from flask import current_app
+from redis import exceptions as redis_exceptions
+
+from ..extensions import redis_client
+
+# Redis set of "zone_id|calculation_method" pairs completed by a run.
+PREFETCH_DONE_KEY = "prefetch:{run_id}:done"
+# Redis hash of failed pairs -> error message, for inspection after a run.
+PREFETCH_FAILED_KEY = "prefetch:{run_id}:failed"
+
+# (zone_id, calculation_method, latitude, longitude), as returned by zones_missing_calendar.
+PrefetchJob = Tuple[str, str, float, float]
+
+PrefetchReport = namedtuple('PrefetchReport', [
+    'run_id', 'total', 'skipped', 'succeeded', 'failed', 'elapsed_seconds', 'throughput_per_second'
+])
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Blocks until a token is available, then takes it."""
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+
+class PrefetchProgress:
+    """Thread-safe completion counters with throughput and ETA."""
+
+    def __init__(self, total: int, clock: Callable[[], float] = time.monotonic):
+        self.total = total
+        self.succeeded = 0
+        self.failed = 0
+        self._clock = clock
+        self._started_at = clock()
+        self._lock = threading.Lock()
+
+    def record(self, success: bool) -> None:
+        with self._lock:
+            if success:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+
+    @property
+    def completed(self) -> int:
+        return self.succeeded + self.failed
+
+    @property
+    def elapsed_seconds(self) -> float:
+        return self._clock() - self._started_at
+
+    def throughput(self) -> float:
+        """Completed fetches per second so far."""
+        elapsed = self.elapsed_seconds
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+    def eta_seconds(self) -> Optional[float]:
+        """Seconds until every fetch completes at the current throughput, or None before the first one."""
+        throughput = self.throughput()
+        return (self.total - self.completed) / throughput if throughput else None
+
+    def summary(self) -> str:
+        eta = self.eta_seconds()
+        eta_text = f"{eta:.0f}s" if eta is not None else "unknown"
+        return (f"{self.completed}/{self.total} done ({self.failed} failed), "
+                f"{self.throughput():.2f}/s, ETA {eta_text}")
+
+
+def prefetch_calendars(jobs: Iterable[PrefetchJob], year: int, run_id: str,
+                       fetch: Optional[Callable[..., Optional[list]]] = None) -> PrefetchReport:
+    """
+    Fetches and stores `year`'s calendar for every job, skipping those already
+    checkpointed under `run_id`.
+
+    Args:
+        jobs: (zone_id, calculation_method, latitude, longitude) tuples.
+        year: The calendar year to fetch.
+        run_id: Identifies the run's checkpoint; reuse it to resume an interrupted run.
+        fetch: Fetch-and-store function with get_yearly_calendar_data's signature (defaults to it).
+    """
+    if fetch is None:
+        from .prayer_time.data_processor import get_yearly_calendar_data as fetch
+
+    config = current_app.config
+    app = current_app._get_current_object()
+    done_key = PREFETCH_DONE_KEY.format(run_id=run_id)
+    failed_key = PREFETCH_FAILED_KEY.format(run_id=run_id)
+    checkpoint_ttl = config['PREFETCH_CHECKPOINT_TTL_SECONDS']
+
+    jobs = list(jobs)
+    done = _checkpointed_pairs(done_key)
+    pending = [job for job in jobs if _pair_key(job) not in done]
+    skipped = len(jobs) - len(pending)
+    if skipped:
+        app.logger.info(f"Prefetch {run_id}: resuming, {skipped} of {len(jobs)} calendars already done.")
+
+    bucket = TokenBucket(config['PREFETCH_RATE_PER_SECOND'], config['PREFETCH_BURST'])
+    progress = PrefetchProgress(len(pending))
+    log_interval = config['PREFETCH_PROGRESS_LOG_INTERVAL_SECONDS']
+
+    def run_job(job):
+        zone_id, calculation_method, latitude, longitude = job
+        method_id, asr_juristic_id, high_latitude_method_id = map(int, calculation_method.split('-'))
+        bucket.acquire()
+        with app.app_context():
+            return fetch(
+                zone_id=zone_id,
+                year=year,
+                method_id=method_id,
+                asr_juristic_id=asr_juristic_id,
+                high_latitude_method_id=high_latitude_method_id,
+                latitude=latitude,
+                longitude=longitude,
+                force_refresh=True
+            )
+
+    last_logged_at = time.monotonic()
+    with ThreadPoolExecutor(max_workers=config['PREFETCH_MAX_WORKERS'], thread_name_prefix='prefetch') as executor:
+        futures = {executor.submit(run_job, job): job for job in pending}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                error = None if future.result() else "No calendar returned."
+            except Exception as e:
+                error = str(e)
+            progress.record(error is None)
+            _checkpoint(done_key, failed_key, _pair_key(job), error, checkpoint_ttl)
+            if error:
+                app.logger.warning(f"Prefetch {run_id}: {_pair_key(job)} failed: {error}")
+
+            if time.monotonic() - last_logged_at >= log_interval:
+                last_logged_at = time.monotonic()
+                app.logger.info(f"Prefetch {run_id}: {progress.summary()}")
+
+    report = PrefetchReport(run_id, len(jobs), skipped, progress.succeeded, progress.failed,
+                            round(progress.elapsed_seconds, 2), round(progress.throughput(), 3))
+    app.logger.info(f"Prefetch {run_id} finished: {progress.summary()}")
+    return report
+
+
+def _pair_key(job: PrefetchJob) -> str:
+    return f"{job[0]}|{job[1]}"
+
+
+def _checkpointed_pairs(done_key: str) -> set:
+    try:
+        return {member.decode() if isinstance(member, bytes) else member for member in redis_client.smembers(done_key)}
+    except redis_exceptions.RedisError as e:
+        current_app.logger.warning(f"Could not read prefetch checkpoint {done_key}, starting from scratch: {e}")
+        return set()
+
+
+def _checkpoint(done_key: str, failed_key: str, pair_key: str, error: Optional[str], ttl: int) -> None:
+    """Marks a successful pair done (failed ones are retried on resume) and records failures."""
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        if error is None:
+            pipe.sadd(done_key, pair_key)
+            pipe.hdel(failed_key, pair_key)
+            pipe.expire(done_key, ttl)
+        else:
+            pipe.hset(failed_key, pair_key, error)
+            pipe.expire(failed_key, ttl)
+        pipe.execute()
+    except redis_exceptions.RedisError as e:
+        current_app.logger.warning(f"Could not checkpoint prefetch of {pair_key}: {e}")
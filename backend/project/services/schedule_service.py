@@ -12,21 +12,45 @@ Key Features:
 - Professional Standards: Code is commented, configurable, and organized.
 """
 
+import calendar
 import datetime
 import json
 import hashlib
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Iterable, Iterator, Optional, List, Tuple
+from zoneinfo import ZoneInfoNotFoundError
 
 from flask import current_app
+from sqlalchemy import tuple_
 
-from ..models import User, Masjid, MonthlyScheduleCache
+from ..models import User, MonthlyScheduleCache
 from .prayer_time_service import get_api_prayer_times_for_date_from_service
-from .prayer_time.timing_calculator import calculate_display_times_from_service, parse_time_str
+from .prayer_time.timing_calculator import calculate_display_times_from_service
+from .prayer_time.time_arithmetic import parse_time_str
+from .prayer_time.settings_snapshot import as_settings_snapshot
+from .prayer_time.timezones import get_zone_info, local_to_utc_epoch
+from ..utils.redis_batch import redis_batch_scope
 from .. import db
 
 # --- Configuration Constants ---
 PRE_JAMAAT_ALERT_WINDOW_SECONDS = 120  # 2 minutes
 POST_JAMAAT_INFO_WINDOW_SECONDS = 600   # 10 minutes
+JAMAAT_IN_PROGRESS_SECONDS = 300        # 5 minutes
+MAX_SCHEDULE_RANGE_MONTHS = 12          # Longest range served by one multi-month request
+# Missing months a range request generates itself (each costs a prayer time lookup per day);
+# the others are queued and reported as pending. Ranges start at the client's current month.
+MAX_INLINE_SCHEDULE_MONTHS = 1
+
+# --- Director's Script Encoding ---
+# The script is a flat list of state transitions: [delta, code, delta, code, ...].
+# Each delta is the number of seconds since the previous transition (the first one
+# since the script's `base`, the UTC epoch of the month's first local midnight),
+# and each code is `state | prayer_index << 2`.
+SCRIPT_ENCODING = "utc-transitions-v1"
+STATE_IDLE = 0          # No alert; the prayer index of an idle code is always 0
+STATE_PRE_JAMAAT = 1    # Jamaat alert, PRE_JAMAAT_ALERT_WINDOW_SECONDS before the Jamaat
+STATE_JAMAAT = 2        # Jamaat in progress, for JAMAAT_IN_PROGRESS_SECONDS
+STATE_POST_JAMAAT = 3   # Post-Jamaat information, for POST_JAMAAT_INFO_WINDOW_SECONDS
+SCRIPT_PRAYERS = ('Fajr', 'Dhuhr', 'Asr', 'Maghrib', 'Isha', 'Jummah')
 
 
 def get_or_generate_monthly_schedule(user_id: int, year: int, month: int, force_regenerate: bool = False) -> Optional[Dict[str, Any]]:
@@ -51,10 +75,7 @@ def get_or_generate_monthly_schedule(user_id: int, year: int, month: int, force_
         return None
 
     # 1. Determine the true "Owner" of the schedule
-    # If the user follows a Masjid, the Masjid is the owner. Otherwise, the user is.
-    owner = user
-    if user.default_masjid_follow:
-        owner = user.default_masjid_follow.masjid
+    owner = _resolve_schedule_owner(user)
 
     # 2. Check for the schedule in the server-side cache first
     if not force_regenerate:
@@ -87,23 +108,140 @@ def get_or_generate_monthly_schedule(user_id: int, year: int, month: int, force_
 
     return newly_generated_schedule
 
+def get_schedule_range(user_id: int, months: List[Tuple[int, int]], known: Optional[Dict[str, Dict[str, Any]]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Returns the schedules of several months in one response, for offline-first clients.
+
+    Cached months are loaded with a single query. The first MAX_INLINE_SCHEDULE_MONTHS
+    missing ones are generated and cached; the rest are queued for a Celery worker and
+    listed as pending, for the client to fetch on its next sync. In delta-sync mode the
+    client sends what it already holds, and months whose script_hash still matches are
+    only listed as unchanged.
+
+    Args:
+        user_id: The ID of the user requesting the schedules.
+        months: The (year, month) pairs wanted, in order (see month_range).
+        known: The client's schedules, {"YYYY-MM": {"script_hash": ...}}.
+
+    Returns:
+        {"owner_id", "months": [{"month", "version", "script_hash", "schedule"}],
+         "unchanged": [...], "pending": [...], "unavailable": ["YYYY-MM", ...]}, or None if the user does not exist.
+    """
+    user = User.query.get(user_id)
+    if not user:
+        current_app.logger.error(f"Schedule Service: User with id {user_id} not found.")
+        return None
+
+    owner = _resolve_schedule_owner(user)
+    known = known or {}
+    cached = {
+        (row.year, row.month): row
+        for row in MonthlyScheduleCache.query.filter(
+            MonthlyScheduleCache.owner_id == owner.id,
+            tuple_(MonthlyScheduleCache.year, MonthlyScheduleCache.month).in_(months)
+        )
+    }
+
+    result = {"owner_id": owner.id, "months": [], "unchanged": [], "pending": [], "unavailable": []}
+    generated, queued = 0, []
+    for year, month in months:
+        label = f"{year}-{month:02d}"
+        row = cached.get((year, month))
+        schedule = None
+        if row is None:
+            if generated >= MAX_INLINE_SCHEDULE_MONTHS:
+                queued.append((year, month))
+                result["pending"].append(label)
+                continue
+            generated += 1
+            schedule = _generate_schedule_for_owner(owner, year, month)
+            if not schedule:
+                result["unavailable"].append(label)
+                continue
+            row = _save_schedule_to_cache(owner.id, year, month, schedule)
+
+        if _client_schedule_is_current(known.get(label), row):
+            result["unchanged"].append(label)
+            continue
+        result["months"].append({
+            "month": label,
+            "version": row.version,
+            "script_hash": row.script_hash,
+            "schedule": schedule if schedule is not None else json.loads(row.schedule_script),
+        })
+
+    if queued:
+        _enqueue_schedule_generation(owner.id, queued)
+    return result
+
+def _enqueue_schedule_generation(owner_id: int, months: List[Tuple[int, int]]) -> None:
+    """Queues the generation of `months` for `owner_id`. If the broker is down, the next sync queues them again."""
+    try:
+        from ..tasks import generate_schedule_months_task
+        generate_schedule_months_task.delay(owner_id, months)
+    except Exception as e:
+        current_app.logger.error(f"Could not queue schedule generation for owner {owner_id}: {e}", exc_info=True)
+
+def month_range(start: str, end: str) -> List[Tuple[int, int]]:
+    """
+    The (year, month) pairs from `start` to `end` inclusive, both "YYYY-MM".
+    Raises ValueError for a reversed range or one longer than MAX_SCHEDULE_RANGE_MONTHS.
+    """
+    start_year, start_month = map(int, start.split('-'))
+    end_year, end_month = map(int, end.split('-'))
+    first, last = start_year * 12 + start_month - 1, end_year * 12 + end_month - 1
+    if last < first:
+        raise ValueError("The end month is before the start month.")
+    if last - first + 1 > MAX_SCHEDULE_RANGE_MONTHS:
+        raise ValueError(f"At most {MAX_SCHEDULE_RANGE_MONTHS} months can be requested at once.")
+    return [(index // 12, index % 12 + 1) for index in range(first, last + 1)]
+
+def encode_script(transitions: Iterable[Tuple[int, int, int]], base_epoch: int, timezone: str) -> Dict[str, Any]:
+    """
+    Encodes (UTC epoch seconds, state, prayer_index) transitions, in time order, as a
+    Director's Script: {"encoding", "timezone", "base": base_epoch, "stream": [delta, code, ...]}.
+    `timezone` is only informative: every instant in the script is already UTC.
+    """
+    stream = []
+    previous = base_epoch
+    for epoch, state, prayer_index in transitions:
+        stream.append(epoch - previous)
+        stream.append(state | prayer_index << 2)
+        previous = epoch
+    return {"encoding": SCRIPT_ENCODING, "timezone": timezone, "base": base_epoch, "stream": stream}
+
+def decode_script(script: Dict[str, Any]) -> Iterator[Tuple[int, int, Optional[str]]]:
+    """Yields the (epoch seconds, state, prayer name or None) transitions of an encoded script."""
+    stream = script["stream"]
+    epoch = script["base"]
+    for i in range(0, len(stream), 2):
+        epoch += stream[i]
+        code = stream[i + 1]
+        state = code & 0b11
+        yield epoch, state, SCRIPT_PRAYERS[code >> 2] if state != STATE_IDLE else None
+
 def handle_settings_change_for_user(user_or_masjid_id: int):
     """
     This function should be called whenever a User or Masjid updates their prayer settings.
 
-    It implements the "compare before update" logic to prevent unnecessary updates.
+    It implements the "compare before update" logic to prevent unnecessary updates:
+    the current month is regenerated in place, and its version is only bumped if the
+    schedule actually changed, so clients that delta-sync keep an unchanged month.
     """
-    # For simplicity, we will just force a regeneration for the current month.
-    # A more advanced implementation would compare hashes before deciding to update.
-    current_app.logger.info(f"Settings changed for owner {user_or_masjid_id}. Invalidating current month's schedule.")
-    
+    current_app.logger.info(f"Settings changed for owner {user_or_masjid_id}. Regenerating current month's schedule.")
+
     now = datetime.datetime.utcnow()
     year, month = now.year, now.month
 
-    # Delete the old schedule. The next time the user opens the app,
-    # get_or_generate_monthly_schedule will miss the cache and auto-regenerate.
-    MonthlyScheduleCache.query.filter_by(owner_id=user_or_masjid_id, year=year, month=month).delete()
-    db.session.commit()
+    owner = User.query.get(user_or_masjid_id)
+    schedule = _generate_schedule_for_owner(owner, year, month) if owner else None
+    if schedule:
+        _save_schedule_to_cache(owner_id=user_or_masjid_id, year=year, month=month, schedule_data=schedule)
+    else:
+        # Could not regenerate now: delete the old schedule, so that the next time the user
+        # opens the app, get_or_generate_monthly_schedule misses the cache and regenerates it.
+        MonthlyScheduleCache.query.filter_by(owner_id=user_or_masjid_id, year=year, month=month).delete()
+        db.session.commit()
 
     # TODO: Trigger a silent push notification to the user (or all followers of a masjid)
     # to tell their app to re-fetch the schedule immediately.
@@ -113,63 +251,49 @@ def handle_settings_change_for_user(user_or_masjid_id: int):
 
 # --- Private Helper Functions ---
 
-def _generate_schedule_for_owner(owner: Any, year: int, month: int) -> Optional[Dict[str, Any]]:
-    """Internal function to perform the actual schedule generation logic."""
+def _resolve_schedule_owner(user: User) -> User:
+    """If the user follows a Masjid, the Masjid is the owner of their schedule. Otherwise, the user is."""
+    if user.default_masjid_follow:
+        return user.default_masjid_follow.masjid
+    return user
+
+def _client_schedule_is_current(known_month: Optional[Dict[str, Any]], row: MonthlyScheduleCache) -> bool:
+    """
+    Whether the client's copy of a month matches the cached one. Only the script_hash
+    is compared: versions restart for every owner, so after the client switches
+    Masjids an equal version may belong to a different schedule.
+    """
+    return bool(known_month) and known_month.get('script_hash') == row.script_hash
+
+def _generate_schedule_for_owner(owner: Any, year: int, month: int, settings: Any = None) -> Optional[Dict[str, Any]]:
+    """
+    Internal function to perform the actual schedule generation logic.
+    `settings` (a PrayerSettingsSnapshot or UserSettings) defaults to the owner's own settings.
+    """
     current_app.logger.info(f"Generating monthly schedule for owner_id: {owner.id} for {year}-{month}")
 
-    # Determine location and settings from the owner
+    # Determine location and settings from the owner. The settings are snapshotted
+    # once and reused for every day of the month.
     location_lat = owner.default_latitude
     location_lon = owner.default_longitude
-    owner_settings = owner.settings
+    owner_settings = as_settings_snapshot(settings if settings is not None else owner.settings)
 
     if not all([location_lat, location_lon, owner_settings]):
         current_app.logger.error(f"Could not determine location or settings for owner {owner.id}")
         return None
 
-    # Fetch all raw prayer time data for the month
-    import calendar
-    num_days_in_month = calendar.monthrange(year, month)[1]
-    daily_raw_times = []
-    for day in range(1, num_days_in_month + 1):
-        current_date = datetime.date(year, month, day)
-        raw_times = get_api_prayer_times_for_date_from_service(
-            date_obj=current_date,
-            latitude=location_lat,
-            longitude=location_lon,
-            method_id=owner_settings.calculation_method_id,
-            asr_juristic_id=owner_settings.asr_juristic_id,
-            high_latitude_method_id=owner_settings.high_latitude_method_id
-        )
-        if raw_times:
-            daily_raw_times.append((current_date, raw_times))
-
-    # Generate the "Director's Script"
-    monthly_script = []
+    # Generate the "Director's Script". Days are fetched, calculated and encoded one
+    # at a time, so a month is never held as a list of intermediate events.
     all_warnings = [] # List to collect warnings from all days
-    app_config = current_app.config
-
-    for i, (current_date, raw_times_today) in enumerate(daily_raw_times):
-        raw_times_tomorrow = daily_raw_times[i + 1][1] if i + 1 < len(daily_raw_times) else {}
-
-        # The calculation service now returns warnings
-        display_times_today, _, daily_warnings = calculate_display_times_from_service(
-            user_settings=owner_settings,
-            api_times_today=raw_times_today.get('timings', {}),
-            api_times_tomorrow=raw_times_tomorrow.get('timings', {}),
-            app_config=app_config,
-            calculation_date=current_date
+    timezone = _schedule_timezone(owner_settings, all_warnings)
+    jamaat_events = _iter_month_jamaat_events(owner_settings, location_lat, location_lon, year, month, timezone, all_warnings)
+    # The month's days share one Redis batch: the zone's alias and calendar are read once.
+    with redis_batch_scope('schedule_generation'):
+        monthly_script = encode_script(
+            _iter_script_transitions(jamaat_events),
+            local_to_utc_epoch(datetime.datetime(year, month, 1), timezone),
+            timezone
         )
-        if daily_warnings:
-            all_warnings.extend(daily_warnings)
-
-        jamaat_events = _get_sorted_jamaat_events_for_day(current_date, display_times_today)
-        day_start = datetime.datetime.combine(current_date, datetime.time.min)
-        day_end = datetime.datetime.combine(current_date, datetime.time.max)
-        last_prayer_end_time = day_start
-
-        for event in jamaat_events:
-            jamaat_time = event['datetime']
-            # ... (rest of the script generation logic remains the same) ...
 
     final_schedule_object = {
         "owner_id": owner.id,
@@ -180,10 +304,13 @@ def _generate_schedule_for_owner(owner: Any, year: int, month: int) -> Optional[
     }
     return final_schedule_object
 
-def _save_schedule_to_cache(owner_id: int, year: int, month: int, schedule_data: Dict[str, Any]):
-    """Saves a generated schedule to the MonthlyScheduleCache table."""
+def _save_schedule_to_cache(owner_id: int, year: int, month: int, schedule_data: Dict[str, Any]) -> MonthlyScheduleCache:
+    """Saves a generated schedule to the MonthlyScheduleCache table and returns the cached row."""
     schedule_json_string = json.dumps(schedule_data)
-    script_hash = hashlib.sha256(schedule_json_string.encode('utf-8')).hexdigest()
+    # The hash covers the content only: a regeneration that changes nothing but
+    # `generated_at` keeps the same hash (and version).
+    content = {key: value for key, value in schedule_data.items() if key != 'generated_at'}
+    script_hash = hashlib.sha256(json.dumps(content, sort_keys=True).encode('utf-8')).hexdigest()
 
     # Check if a schedule already exists
     existing_schedule = MonthlyScheduleCache.query.filter_by(owner_id=owner_id, year=year, month=month).first()
@@ -192,7 +319,7 @@ def _save_schedule_to_cache(owner_id: int, year: int, month: int, schedule_data:
         # Compare hashes before updating to prevent unnecessary DB writes
         if existing_schedule.script_hash == script_hash:
             current_app.logger.info(f"Schedule for owner {owner_id} is unchanged. Skipping DB update.")
-            return
+            return existing_schedule
         
         # Update existing record
         existing_schedule.schedule_script = schedule_json_string
@@ -214,15 +341,18 @@ def _save_schedule_to_cache(owner_id: int, year: int, month: int, schedule_data:
         current_app.logger.info(f"Saving new schedule for owner {owner_id} for {year}-{month} to cache.")
     
     db.session.commit()
+    return existing_schedule or new_schedule
 
 def _get_sorted_jamaat_events_for_day(date_obj: datetime.date, display_times: Dict[str, Any]) -> List[Dict[str, Any]]:
     """Helper function to extract and sort all Jamaat events for a given day."""
     events = []
     is_friday = date_obj.weekday() == 4
+    # Jummah replaces Dhuhr on Fridays; without a Jummah time, Dhuhr's Jamaat is kept.
+    jummah_jamaat_obj = parse_time_str(display_times.get('jummah', {}).get('jamaat')) if is_friday else None
 
     prayer_keys = ["fajr", "dhuhr", "asr", "maghrib", "isha"]
     for key in prayer_keys:
-        if is_friday and key == 'dhuhr':
+        if jummah_jamaat_obj and key == 'dhuhr':
             continue
         
         jamaat_time_str = display_times.get(key, {}).get('jamaat')
@@ -233,14 +363,93 @@ def _get_sorted_jamaat_events_for_day(date_obj: datetime.date, display_times: Di
                 'datetime': datetime.datetime.combine(date_obj, jamaat_time_obj)
             })
 
-    if is_friday:
-        jummah_jamaat_str = display_times.get('jummah', {}).get('jamaat')
-        jummah_jamaat_obj = parse_time_str(jummah_jamaat_str)
-        if jummah_jamaat_obj:
-            events.append({
-                'name': 'Jummah',
-                'datetime': datetime.datetime.combine(date_obj, jummah_jamaat_obj)
-            })
+    if jummah_jamaat_obj:
+        events.append({
+            'name': 'Jummah',
+            'datetime': datetime.datetime.combine(date_obj, jummah_jamaat_obj)
+        })
 
     events.sort(key=lambda x: x['datetime'])
-    return events
\ No newline at end of file
+    return events
+def _schedule_timezone(owner_settings: Any, warnings: List[str]) -> str:
+    """The owner's IANA timezone, or UTC (with a warning) when it is unknown."""
+    timezone = owner_settings.timezone or 'UTC'
+    try:
+        get_zone_info(timezone)
+    except (ZoneInfoNotFoundError, ValueError):  # ValueError: not a valid key, e.g. "../x"
+        current_app.logger.error(f"Unknown timezone '{timezone}' in settings {owner_settings.settings_id}; scheduling in UTC.")
+        warnings.append(f"Unknown timezone '{timezone}'; schedule times are in UTC.")
+        timezone = 'UTC'
+    return timezone
+
+def _iter_month_jamaat_events(owner_settings: Any, latitude: float, longitude: float, year: int, month: int,
+                              timezone: str, warnings: List[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the month's Jamaat events in time order, one day at a time, each with
+    its UTC 'epoch' in `timezone`. Each day's display times need the next day's
+    API times, so fetching runs one day ahead. Calculation warnings are appended
+    to `warnings`.
+    """
+    app_config = current_app.config
+    num_days_in_month = calendar.monthrange(year, month)[1]
+
+    def iter_raw_times():
+        for day in range(1, num_days_in_month + 1):
+            current_date = datetime.date(year, month, day)
+            raw_times = get_api_prayer_times_for_date_from_service(
+                date_obj=current_date,
+                latitude=latitude,
+                longitude=longitude,
+                method_id=owner_settings.calculation_method_id,
+                asr_juristic_id=owner_settings.asr_juristic_id,
+                high_latitude_method_id=owner_settings.high_latitude_method_id
+            )
+            if raw_times:
+                yield current_date, raw_times
+
+    days = iter_raw_times()
+    today = next(days, None)
+    while today is not None:
+        tomorrow = next(days, None)
+        current_date, raw_times_today = today
+        raw_times_tomorrow = tomorrow[1] if tomorrow is not None else {}
+
+        display_times_today, _, daily_warnings = calculate_display_times_from_service(
+            user_settings=owner_settings,
+            api_times_today=raw_times_today.get('timings', {}),
+            api_times_tomorrow=raw_times_tomorrow.get('timings', {}),
+            app_config=app_config,
+            calculation_date=current_date
+        )
+        if daily_warnings:
+            warnings.extend(daily_warnings)
+
+        events = _get_sorted_jamaat_events_for_day(current_date, display_times_today)
+        for event in events:
+            event['epoch'] = local_to_utc_epoch(event['datetime'], timezone)
+        # A Jamaat inside a DST gap is moved forward, possibly past the next one.
+        events.sort(key=lambda event: event['epoch'])
+        yield from events
+        today = tomorrow
+
+def _iter_script_transitions(jamaat_events: Iterable[Dict[str, Any]]) -> Iterator[Tuple[int, int, int]]:
+    """
+    Turns Jamaat events (in time order) into (time, state, prayer_index) transitions:
+    pre-Jamaat alert, Jamaat, post-Jamaat information, then idle. When Jamaats are
+    close together, a window is cut short by the next one instead of overlapping it,
+    and the idle transition between them is dropped.
+    """
+    pending = []  # The previous Jamaat's transitions not yet emitted
+    for event in jamaat_events:
+        jamaat_time = event['epoch']
+        prayer_index = SCRIPT_PRAYERS.index(event['name'])
+        alert_time = jamaat_time - PRE_JAMAAT_ALERT_WINDOW_SECONDS
+        # Only the previous transitions that happen before this alert are kept.
+        yield from (transition for transition in pending if transition[0] < alert_time)
+        pending = [
+            (alert_time, STATE_PRE_JAMAAT, prayer_index),
+            (jamaat_time, STATE_JAMAAT, prayer_index),
+            (jamaat_time + JAMAAT_IN_PROGRESS_SECONDS, STATE_POST_JAMAAT, prayer_index),
+            (jamaat_time + JAMAAT_IN_PROGRESS_SECONDS + POST_JAMAAT_INFO_WINDOW_SECONDS, STATE_IDLE, 0),
+        ]
+    yield from pending
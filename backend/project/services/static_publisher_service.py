@@ -0,0 +1,211 @@
+"""
+Static Schedule Publisher
+-------------------------
+Publishes precomputed schedules as a static, CDN-friendly file tree, so clients
+can fetch them without going through Flask or the database.
+
+Every document is stored under its SHA-256 and never rewritten, so it can be
+cached forever; only the small manifests that point at the current documents
+change, and they are served with a short max-age:
+
+  schedules/<sha256>.json                  a MonthlyScheduleCache script, byte for byte
+  calendars/<sha256>.json                  a yearly zone calendar in canonical compact form
+  owners/<owner_id>/manifest.json          {"owner_id", "published_at", "months": {"YYYY-MM": {"version", "hash", "path"}}}
+  zones/<zone_id>/<method>/manifest.json   {"zone_id", "calculation_method", "columns", "published_at",
+                                            "years": {"YYYY": {"hash", "path"}}}
+
+Followers of a masjid read the masjid owner's manifest. Only Masjid owners'
+schedules are published, as owner IDs are enumerable and individual users'
+schedules are personal. Identical documents are stored once (e.g. an admin_3
+zone whose calendar equals its admin_2 parent's).
+The tree is written to a local directory (STATIC_PUBLISH_BACKEND='filesystem',
+served by the web server or synced to a CDN) or to an S3-compatible bucket
+('s3', including MinIO), by a periodic Celery task that republishes whatever
+changed since its last run.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from collections import namedtuple
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+from urllib.parse import quote
+
+from flask import current_app
+from sqlalchemy import tuple_
+
+from .. import db
+from ..models import MonthlyScheduleCache, PrayerZoneCalendar, User
+from .prayer_time.data_processor import CANONICAL_TIMING_KEYS, canonical_calendar
+
+SCHEDULE_PATH = "schedules/{hash}.json"
+CALENDAR_PATH = "calendars/{hash}.json"
+OWNER_MANIFEST_PATH = "owners/{owner_id}/manifest.json"
+ZONE_MANIFEST_PATH = "zones/{zone_id}/{method}/manifest.json"
+
+# Content-addressed documents never change once written.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Owners or zones whose rows are loaded per query while publishing.
+PUBLISH_BATCH_SIZE = 500
+
+PublishReport = namedtuple('PublishReport', ['manifests', 'documents_written', 'documents_skipped'])
+
+
+class FileSystemStore:
+    """Writes the tree under a local directory; each file is replaced atomically."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(os.path.join(self.root, key))
+
+    def put(self, key: str, body: bytes, content_type: str, cache_control: str) -> None:
+        # Content type and caching headers are for the web server / CDN in front of the directory.
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                tmp_file.write(body)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+class S3Store:
+    """Writes the tree to an S3-compatible bucket (AWS S3, MinIO, ...), with per-object caching headers."""
+
+    def __init__(self, bucket: str, prefix: str = '', endpoint_url: Optional[str] = None):
+        import boto3
+        from botocore.exceptions import ClientError
+
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self._client = boto3.client('s3', endpoint_url=endpoint_url)
+        self._client_error = ClientError
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def exists(self, key: str) -> bool:
+        try:
+            self._client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except self._client_error as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def put(self, key: str, body: bytes, content_type: str, cache_control: str) -> None:
+        self._client.put_object(Bucket=self.bucket, Key=self._key(key), Body=body,
+                                ContentType=content_type, CacheControl=cache_control)
+
+
+def get_static_store():
+    """Returns the store selected by STATIC_PUBLISH_BACKEND."""
+    config = current_app.config
+    backend = config['STATIC_PUBLISH_BACKEND']
+    if backend == 'filesystem':
+        return FileSystemStore(config['STATIC_PUBLISH_ROOT'])
+    if backend == 's3':
+        if not config.get('STATIC_PUBLISH_S3_BUCKET'):
+            raise ValueError("STATIC_PUBLISH_S3_BUCKET is not configured.")
+        return S3Store(config['STATIC_PUBLISH_S3_BUCKET'], config.get('STATIC_PUBLISH_S3_PREFIX', ''),
+                       config.get('STATIC_PUBLISH_S3_ENDPOINT_URL'))
+    raise ValueError(f"Unsupported static publish backend: {backend}")
+
+
+def publish_owner_schedules(owner_ids: Iterable[int], store=None) -> PublishReport:
+    """
+    Publishes every cached monthly schedule of each Masjid owner, and the owner's
+    manifest. Other owners' schedules are personal and never published.
+    """
+    store = store or get_static_store()
+    counts = [0, 0, 0]
+    owner_ids = sorted(set(owner_ids))
+    for start in range(0, len(owner_ids), PUBLISH_BATCH_SIZE):
+        rows = (MonthlyScheduleCache.query
+                .join(User, User.id == MonthlyScheduleCache.owner_id)
+                .filter(User.role == 'Masjid', MonthlyScheduleCache.owner_id.in_(owner_ids[start:start + PUBLISH_BATCH_SIZE]))
+                .order_by(MonthlyScheduleCache.owner_id, MonthlyScheduleCache.year, MonthlyScheduleCache.month)
+                .yield_per(100))
+        manifests = {}
+        for row in rows:
+            body = row.schedule_script.encode('utf-8')
+            content_hash = _put_document(store, SCHEDULE_PATH, body, counts)
+            manifest = manifests.setdefault(row.owner_id, {"owner_id": row.owner_id, "months": {}})
+            manifest["months"][f"{row.year}-{row.month:02d}"] = {
+                "version": row.version, "hash": content_hash, "path": SCHEDULE_PATH.format(hash=content_hash)
+            }
+        for owner_id, manifest in manifests.items():
+            _put_manifest(store, OWNER_MANIFEST_PATH.format(owner_id=owner_id), manifest)
+            counts[0] += 1
+    return PublishReport(*counts)
+
+
+def publish_zone_calendars(zone_methods: Iterable[Tuple[str, str]], store=None) -> PublishReport:
+    """Publishes every year's compact calendar of each (zone_id, calculation_method), and its manifest."""
+    store = store or get_static_store()
+    counts = [0, 0, 0]
+    zone_methods = sorted(set(zone_methods))
+    for start in range(0, len(zone_methods), PUBLISH_BATCH_SIZE):
+        batch = zone_methods[start:start + PUBLISH_BATCH_SIZE]
+        rows = (PrayerZoneCalendar.query
+                .filter(tuple_(PrayerZoneCalendar.zone_id, PrayerZoneCalendar.calculation_method).in_(batch))
+                .order_by(PrayerZoneCalendar.zone_id, PrayerZoneCalendar.calculation_method, PrayerZoneCalendar.year)
+                .yield_per(50))
+        manifests = {}
+        for row in rows:
+            body = json.dumps(canonical_calendar(row.calendar_data), separators=(',', ':')).encode('utf-8')
+            content_hash = _put_document(store, CALENDAR_PATH, body, counts)
+            manifest = manifests.setdefault((row.zone_id, row.calculation_method), {
+                "zone_id": row.zone_id, "calculation_method": row.calculation_method,
+                "columns": ["date", *CANONICAL_TIMING_KEYS], "years": {},
+            })
+            manifest["years"][str(row.year)] = {"hash": content_hash, "path": CALENDAR_PATH.format(hash=content_hash)}
+        for (zone_id, method), manifest in manifests.items():
+            _put_manifest(store, ZONE_MANIFEST_PATH.format(zone_id=quote(zone_id, safe=''), method=quote(method, safe='')), manifest)
+            counts[0] += 1
+    return PublishReport(*counts)
+
+
+def publish_changed_since(since: Optional[datetime], store=None) -> PublishReport:
+    """
+    Republishes the Masjid owners and zones with schedules or calendars updated since
+    `since` (everything when None). Returns the combined counts.
+    """
+    store = store or get_static_store()
+    owners = db.session.query(MonthlyScheduleCache.owner_id).distinct()
+    zones = db.session.query(PrayerZoneCalendar.zone_id, PrayerZoneCalendar.calculation_method).distinct()
+    if since is not None:
+        owners = owners.filter(MonthlyScheduleCache.updated_at >= since)
+        zones = zones.filter(PrayerZoneCalendar.updated_at >= since)
+
+    schedules = publish_owner_schedules([owner_id for owner_id, in owners], store)
+    calendars = publish_zone_calendars([tuple(zone) for zone in zones], store)
+    return PublishReport(*(a + b for a, b in zip(schedules, calendars)))
+
+
+def _put_document(store, path_template: str, body: bytes, counts: list) -> str:
+    """Writes a content-addressed document unless it is already published; returns its hash."""
+    content_hash = hashlib.sha256(body).hexdigest()
+    key = path_template.format(hash=content_hash)
+    if store.exists(key):
+        counts[2] += 1
+    else:
+        store.put(key, body, 'application/json', IMMUTABLE_CACHE_CONTROL)
+        counts[1] += 1
+    return content_hash
+
+
+def _put_manifest(store, key: str, manifest: dict) -> None:
+    manifest["published_at"] = datetime.utcnow().isoformat()
+    max_age = current_app.config['STATIC_MANIFEST_MAX_AGE_SECONDS']
+    store.put(key, json.dumps(manifest, separators=(',', ':')).encode('utf-8'), 'application/json',
+              f"public, max-age={max_age}")
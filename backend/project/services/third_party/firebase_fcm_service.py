@@ -0,0 +1,89 @@
+"""
+Firebase Cloud Messaging Client
+-------------------------------
+Sends push notifications and manages topic subscriptions through the Firebase
+Admin SDK, which uses the FCM HTTP v1 API with service-account credentials
+(FCM_CREDENTIALS_FILE). LocalFCMService implements the same methods without
+network access, for tests and local development.
+
+Every method returns plain dictionaries, so notification_service never handles
+SDK types:
+  - send_multicast: {'success', 'failure', 'results'}, one result per token,
+    either {'message_id': ...} or {'error': <FCM error code>}.
+  - send_to_topic: the message ID.
+  - subscribe_to_topic / unsubscribe_from_topic: {'success', 'failure', 'errors'},
+    with (token index, reason) pairs for the tokens that failed.
+"""
+
+import firebase_admin
+from firebase_admin import credentials, exceptions, messaging
+
+
+class FirebaseFCMService:
+    """FCM HTTP v1 client bound to one Firebase app."""
+
+    def __init__(self, firebase_app):
+        self.firebase_app = firebase_app
+
+    @classmethod
+    def from_service_account_file(cls, credentials_file, app_name):
+        """Builds the client from a service-account JSON key, reusing the Firebase app `app_name` if it exists."""
+        try:
+            firebase_app = firebase_admin.get_app(app_name)
+        except ValueError:
+            firebase_app = firebase_admin.initialize_app(credentials.Certificate(credentials_file), name=app_name)
+        return cls(firebase_app)
+
+    def send_multicast(self, tokens, title, body, data=None):
+        response = messaging.send_each_for_multicast(
+            messaging.MulticastMessage(tokens=list(tokens), notification=_notification(title, body), data=_string_data(data)),
+            app=self.firebase_app
+        )
+        return {
+            'success': response.success_count,
+            'failure': response.failure_count,
+            'results': [
+                {'message_id': result.message_id} if result.success else {'error': _error_code(result.exception)}
+                for result in response.responses
+            ],
+        }
+
+    def send_to_topic(self, topic_name, title, body, data=None):
+        return messaging.send(
+            messaging.Message(topic=topic_name, notification=_notification(title, body), data=_string_data(data)),
+            app=self.firebase_app
+        )
+
+    def subscribe_to_topic(self, tokens, topic_name):
+        return _topic_result(messaging.subscribe_to_topic(list(tokens), topic_name, app=self.firebase_app))
+
+    def unsubscribe_from_topic(self, tokens, topic_name):
+        return _topic_result(messaging.unsubscribe_from_topic(list(tokens), topic_name, app=self.firebase_app))
+
+
+def _notification(title, body):
+    return messaging.Notification(title=title, body=body)
+
+
+def _string_data(data):
+    # HTTP v1 only accepts string values in the data payload.
+    return {key: str(value) for key, value in data.items()} if data else None
+
+
+def _error_code(exception):
+    """The HTTP v1 error code for a failed send, e.g. 'UNREGISTERED'."""
+    if isinstance(exception, messaging.UnregisteredError):
+        return 'UNREGISTERED'
+    if isinstance(exception, messaging.SenderIdMismatchError):
+        return 'SENDER_ID_MISMATCH'
+    if isinstance(exception, exceptions.FirebaseError):
+        return exception.code
+    return 'UNKNOWN'
+
+
+def _topic_result(response):
+    return {
+        'success': response.success_count,
+        'failure': response.failure_count,
+        'errors': [(error.index, error.reason) for error in response.errors],
+    }
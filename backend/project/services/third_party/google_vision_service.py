@@ -14,7 +14,11 @@ same interface.
 """
 
 from google.cloud import vision
-import requests
+
+from ...utils.download_utils import download_with_size_cap
+
+# The Vision API rejects inline images above 10 MB, so there is no point downloading more.
+MAX_DOCUMENT_DOWNLOAD_BYTES = 10 * 1024 * 1024 # 10 MB
 
 def detect_text_in_document_from_url(image_url: str) -> str:
     """
@@ -33,10 +37,8 @@ def detect_text_in_document_from_url(image_url: str) -> str:
         # GOOGLE_APPLICATION_CREDENTIALS environment variable.
         client = vision.ImageAnnotatorClient()
 
-        # Download the image content from the URL
-        response = requests.get(image_url, timeout=10)
-        response.raise_for_status()
-        content = response.content
+        # Stream the image content from the URL, aborting oversized documents early
+        content = download_with_size_cap(image_url, MAX_DOCUMENT_DOWNLOAD_BYTES)
 
         # Prepare the image for the Vision API
         image = vision.Image(content=content)
@@ -10,9 +10,15 @@ hashing library or method, the changes will be contained within this file.
 """
 
 from PIL import Image
-# import imagehash
+import imagehash
 import requests
 from io import BytesIO
+from flask import current_app
+
+from ...utils.download_utils import download_with_size_cap, DownloadTooLargeError
+
+# Masjid photos larger than this are rejected rather than downloaded in full.
+MAX_IMAGE_DOWNLOAD_BYTES = 10 * 1024 * 1024 # 10 MB
 
 def generate_phash_from_url(image_url: str) -> str:
     """
@@ -25,28 +31,26 @@ def generate_phash_from_url(image_url: str) -> str:
         A string representation of the 64-bit perceptual hash.
         Returns None if the image cannot be downloaded or processed.
     """
-    # try:
-    #     # Download the image from the URL
-    #     response = requests.get(image_url, timeout=10)
-    #     response.raise_for_status()  # Raise an exception for bad status codes
-    #     
-    #     # Open the image from the downloaded content
-    #     image = Image.open(BytesIO(response.content))
-    #     
-    #     # Generate the perceptual hash
-    #     # high_frequency_factor can be adjusted if needed, default is 4
-    #     phash = imagehash.phash(image)
-    #     
-    #     return str(phash)
-    # except requests.exceptions.RequestException as e:
-    #     # Handle network-related errors (e.g., invalid URL, connection error)
-    #     print(f"Error downloading image from {image_url}: {e}")
-    #     return None
-    # except IOError as e:
-    #     # Handle errors related to image processing (e.g., invalid image format)
-    #     print(f"Error processing image from {image_url}: {e}")
-    #     return None
-    return "dummy_hash"
+    try:
+        # Stream the image with a size cap instead of buffering an arbitrarily large response
+        content = download_with_size_cap(image_url, MAX_IMAGE_DOWNLOAD_BYTES)
+
+        # Open the image from the downloaded content
+        image = Image.open(BytesIO(content))
+
+        # Generate the perceptual hash
+        # high_frequency_factor can be adjusted if needed, default is 4
+        phash = imagehash.phash(image)
+
+        return str(phash)
+    except (requests.exceptions.RequestException, DownloadTooLargeError) as e:
+        # Handle network-related errors (e.g., invalid URL, connection error, oversized file)
+        current_app.logger.warning(f"Error downloading image from {image_url}: {e}")
+        return None
+    except IOError as e:
+        # Handle errors related to image processing (e.g., invalid image format)
+        current_app.logger.warning(f"Error processing image from {image_url}: {e}")
+        return None
 
 def compare_phashes(hash1: str, hash2: str) -> int:
     """
@@ -61,10 +65,9 @@ def compare_phashes(hash1: str, hash2: str) -> int:
     Returns:
         The integer Hamming distance between the two hashes.
     """
-    # # Convert the hex hash strings back to imagehash objects
-    # img_hash1 = imagehash.hex_to_hash(hash1)
-    # img_hash2 = imagehash.hex_to_hash(hash2)
-    # 
-    # # The difference operator on imagehash objects returns the Hamming distance
-    # return img_hash1 - img_hash2
-    return 0
+    # Convert the hex hash strings back to imagehash objects
+    img_hash1 = imagehash.hex_to_hash(hash1)
+    img_hash2 = imagehash.hex_to_hash(hash2)
+
+    # The difference operator on imagehash objects returns the Hamming distance
+    return img_hash1 - img_hash2
@@ -0,0 +1,66 @@
+"""
+Local FCM Stand-in
+------------------
+An in-process replacement for FirebaseFCMService used when FCM_BACKEND is
+'local' (tests and local development). It implements the same methods, keeps
+topic subscriptions in memory and records every message "sent", so tests can
+assert on deliveries without network access.
+"""
+
+import itertools
+
+
+class LocalFCMService:
+    """Mimics FirebaseFCMService, without any network calls."""
+
+    def __init__(self):
+        self.topics = {}          # topic name -> set of registration tokens
+        self.sent_messages = []   # every message, in send order
+        self.invalid_tokens = set() # tokens to report as 'UNREGISTERED', for tests
+        self._message_ids = itertools.count(1)
+
+    def send_multicast(self, tokens, title, body, data=None):
+        results = []
+        for token in tokens:
+            if token in self.invalid_tokens:
+                results.append({'error': 'UNREGISTERED'})
+            else:
+                results.append({'message_id': str(next(self._message_ids))})
+        failure_count = sum(1 for result in results if 'error' in result)
+
+        self.sent_messages.append({
+            'tokens': list(tokens),
+            'title': title,
+            'body': body,
+            'data': data,
+        })
+        return {
+            'success': len(results) - failure_count,
+            'failure': failure_count,
+            'results': results,
+        }
+
+    def send_to_topic(self, topic_name, title, body, data=None):
+        self.sent_messages.append({
+            'topic': topic_name,
+            'recipients': set(self.topics.get(topic_name, ())),
+            'title': title,
+            'body': body,
+            'data': data,
+        })
+        return str(next(self._message_ids))
+
+    def subscribe_to_topic(self, tokens, topic_name):
+        return self._update_topic(tokens, topic_name, self.topics.setdefault(topic_name, set()).add)
+
+    def unsubscribe_from_topic(self, tokens, topic_name):
+        return self._update_topic(tokens, topic_name, self.topics.get(topic_name, set()).discard)
+
+    def _update_topic(self, tokens, topic_name, apply):
+        errors = []
+        for index, token in enumerate(tokens):
+            if token in self.invalid_tokens:
+                errors.append((index, 'registration-token-not-registered'))
+            else:
+                apply(token)
+        return {'success': len(tokens) - len(errors), 'failure': len(errors), 'errors': errors}
@@ -0,0 +1,137 @@
+"""
+Zone Registry Service
+---------------------
+Maintains the `Zone` registry: every zone a request has been resolved to, with
+the coordinates its calendars are fetched for, and the calculation methods it
+has been requested with.
+
+Prefetch jobs used to derive the set of zones from `DISTINCT` scans over the
+calendar table and had no reliable coordinates for admin zones. They now read
+the registry with `zones_missing_calendar`, a single indexed query.
+
+Registration is cheap enough for the request path: the first request for a
+zone/method in a process writes immediately (so new zones are known at once),
+later ones are only counted in process memory and folded into one upsert per
+ZONE_REGISTRY_MIN_UPDATE_INTERVAL_SECONDS. Request counts are therefore
+approximate (counts pending in a process that exits are lost).
+"""
+
+import hashlib
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from flask import current_app
+from sqlalchemy import and_
+from sqlalchemy.exc import SQLAlchemyError
+
+from .. import db
+from ..models import Zone, ZoneCalculationMethod, PrayerZoneCalendar
+from ..utils.db_utils import dialect_insert
+
+# Number of daily prefetch buckets a zone/method can be assigned to.
+PREFETCH_BUCKETS = 365
+
+# Upper bound on the per-process throttle table before it is reset.
+MAX_THROTTLE_ENTRIES = 100000
+
+_pending_requests = {}    # (zone_id, method) -> [time.monotonic() of the last write, requests since]
+
+
+def register_zone_request(zone_id: str, kind: str, latitude: float, longitude: float, composite_method_key: str,
+                          admin_path: Optional[str] = None, parent_zone_id: Optional[str] = None) -> None:
+    """Records that a request was resolved to `zone_id` with `composite_method_key`."""
+    key = (zone_id, composite_method_key)
+    now = time.monotonic()
+    entry = _pending_requests.get(key)
+    if entry is None:
+        if len(_pending_requests) >= MAX_THROTTLE_ENTRIES:
+            _pending_requests.clear()
+        entry = _pending_requests[key] = [now, 1]
+    else:
+        entry[1] += 1
+        if now - entry[0] < current_app.config['ZONE_REGISTRY_MIN_UPDATE_INTERVAL_SECONDS']:
+            return
+
+    request_count = entry[1]
+    entry[0], entry[1] = now, 0
+    _upsert_zone(zone_id, kind, latitude, longitude, composite_method_key, admin_path, parent_zone_id, request_count)
+
+
+def zones_missing_calendar(year: int, active_since: Optional[datetime] = None, up_to_bucket: Optional[int] = None):
+    """
+    Query of (zone_id, calculation_method, latitude, longitude) for every registered
+    zone/method without a calendar for `year`, optionally only those requested since
+    `active_since` or assigned to a prefetch bucket up to `up_to_bucket`. Earlier
+    buckets are included so that zones registered after their bucket's day, or
+    missed by a failed run, are still fetched. The anti-join is resolved through
+    the calendar's unique index, and skips zones that are already done.
+    """
+    calendar_exists = and_(
+        PrayerZoneCalendar.zone_id == ZoneCalculationMethod.zone_id,
+        PrayerZoneCalendar.year == year,
+        PrayerZoneCalendar.calculation_method == ZoneCalculationMethod.calculation_method,
+    )
+    query = (
+        db.session.query(Zone.zone_id, ZoneCalculationMethod.calculation_method, Zone.latitude, Zone.longitude)
+        .join(ZoneCalculationMethod, ZoneCalculationMethod.zone_id == Zone.zone_id)
+        .outerjoin(PrayerZoneCalendar, calendar_exists)
+        .filter(PrayerZoneCalendar.zone_id.is_(None))
+    )
+    if active_since is not None:
+        query = query.filter(ZoneCalculationMethod.last_requested_at >= active_since)
+    if up_to_bucket is not None:
+        query = query.filter(ZoneCalculationMethod.prefetch_bucket <= up_to_bucket)
+    return query.order_by(Zone.zone_id, ZoneCalculationMethod.calculation_method)
+
+
+def prefetch_bucket_for(zone_id: str, composite_method_key: str) -> int:
+    """Stable bucket (0 to PREFETCH_BUCKETS - 1) of a zone/method, stored on registration."""
+    digest = hashlib.sha256(f"{zone_id}-{composite_method_key}".encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % PREFETCH_BUCKETS
+
+
+def todays_prefetch_bucket(today) -> int:
+    """The bucket prefetched on `today` (a date); the 366th day of a leap year repeats bucket 0."""
+    return (today.timetuple().tm_yday - 1) % PREFETCH_BUCKETS
+
+
+def admin_path_from_levels(admin_levels: Optional[Dict[str, Any]], kind: str) -> Optional[str]:
+    """'IN/Uttar Pradesh/Badaun[/Bisauli]' for admin zones, None otherwise."""
+    if not admin_levels or kind not in ('admin2', 'admin3'):
+        return None
+    parts = [admin_levels.get('country_code', 'XX').upper(), admin_levels.get('admin_1_name'), admin_levels.get('admin_2_name')]
+    if kind == 'admin3':
+        parts.append(admin_levels.get('admin_3_name'))
+    return "/".join(part for part in parts if part)
+
+
+def _upsert_zone(zone_id, kind, latitude, longitude, composite_method_key, admin_path, parent_zone_id, request_count):
+    now = datetime.utcnow()
+    zone_table, method_table = Zone.__table__, ZoneCalculationMethod.__table__
+    # The representative coordinates are those of the first registration and are never moved.
+    zone_insert = dialect_insert(zone_table).values(
+        zone_id=zone_id, kind=kind, latitude=latitude, longitude=longitude, admin_path=admin_path,
+        parent_zone_id=parent_zone_id, last_requested_at=now, request_count=request_count, created_at=now,
+    )
+    method_insert = dialect_insert(method_table).values(
+        zone_id=zone_id, calculation_method=composite_method_key, last_requested_at=now,
+        prefetch_bucket=prefetch_bucket_for(zone_id, composite_method_key),
+    )
+    try:
+        # On a connection of its own: the caller's session may be mid-lookup, and
+        # must be neither committed nor rolled back by registration.
+        with db.engine.begin() as conn:
+            conn.execute(zone_insert.on_conflict_do_update(
+                index_elements=[zone_table.c.zone_id],
+                set_={
+                    'last_requested_at': zone_insert.excluded.last_requested_at,
+                    'request_count': zone_table.c.request_count + zone_insert.excluded.request_count,
+                }
+            ))
+            conn.execute(method_insert.on_conflict_do_update(
+                index_elements=[method_table.c.zone_id, method_table.c.calculation_method],
+                set_={'last_requested_at': method_insert.excluded.last_requested_at}
+            ))
+    except SQLAlchemyError as e:
+        current_app.logger.error(f"Failed to register zone '{zone_id}' ({composite_method_key}): {e}", exc_info=True)
@@ -0,0 +1,92 @@
+"""
+Zone Statistics Service
+-----------------------
+Per-zone cache usage, kept in Redis rather than in Prometheus.
+
+Labelling the cache metrics by zone gave the metrics registry one series per
+zone, so it grew with the number of zones. The Prometheus counters now only
+carry bounded labels, and the per-zone detail is recorded here per UTC day:
+  - a HyperLogLog of the distinct zones looked up (`zones:hll:<day>`),
+  - a sorted set of lookups per zone (`zones:lookups:<day>`),
+  - a sorted set of cache misses per zone (`zones:misses:<day>`).
+
+Each day's keys expire after ZONE_STATS_RETENTION_DAYS, and recording a lookup
+is queued on the request's Redis batch (see utils/redis_batch), so it shares a
+round trip with the request's other writes.
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from redis import exceptions as redis_exceptions
+
+from ..extensions import redis_client
+from ..utils.redis_batch import get_redis_batch
+
+ZONES_HLL_KEY = "zones:hll:{day}"
+ZONE_LOOKUPS_KEY = "zones:lookups:{day}"
+ZONE_MISSES_KEY = "zones:misses:{day}"
+# Temporary per-report sums of the daily sorted sets.
+ZONE_REPORT_KEY = "zones:report:{report_id}:{kind}"
+
+
+def record_zone_lookup(zone_id: str, hit: bool) -> None:
+    """Records one cache lookup for `zone_id` in today's zone statistics."""
+    day = datetime.utcnow().strftime('%Y%m%d')
+    ttl = current_app.config['ZONE_STATS_RETENTION_DAYS'] * 86400
+    keys = [ZONES_HLL_KEY.format(day=day), ZONE_LOOKUPS_KEY.format(day=day)]
+    try:
+        # Sent with the request's other batched writes.
+        with get_redis_batch().writes() as pipe:
+            pipe.pfadd(keys[0], zone_id)
+            pipe.zincrby(keys[1], 1, zone_id)
+            if not hit:
+                keys.append(ZONE_MISSES_KEY.format(day=day))
+                pipe.zincrby(keys[2], 1, zone_id)
+            for key in keys:
+                pipe.expire(key, ttl)
+    except redis_exceptions.RedisError as e:
+        current_app.logger.warning(f"Could not record zone statistics for '{zone_id}': {e}")
+
+
+def get_top_zones(days: int = 1, limit: int = 20) -> dict:
+    """
+    Returns the number of distinct zones looked up over the last `days` days
+    (approximate, from the HyperLogLogs) and the `limit` most looked-up zones
+    with their lookup and miss counts.
+    """
+    today = datetime.utcnow().date()
+    day_keys = [(today - timedelta(days=offset)).strftime('%Y%m%d') for offset in range(days)]
+    report_id = uuid.uuid4().hex
+    lookups_key = ZONE_REPORT_KEY.format(report_id=report_id, kind='lookups')
+    misses_key = ZONE_REPORT_KEY.format(report_id=report_id, kind='misses')
+
+    # Sum the daily sorted sets server-side into short-lived keys.
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.pfcount(*[ZONES_HLL_KEY.format(day=day) for day in day_keys])
+    pipe.zunionstore(lookups_key, [ZONE_LOOKUPS_KEY.format(day=day) for day in day_keys])
+    pipe.zunionstore(misses_key, [ZONE_MISSES_KEY.format(day=day) for day in day_keys])
+    pipe.expire(lookups_key, 60)
+    pipe.expire(misses_key, 60)
+    pipe.zrevrange(lookups_key, 0, limit - 1, withscores=True)
+    distinct_zones, *_, top = pipe.execute()
+
+    pipe = redis_client.pipeline(transaction=False)
+    for zone_id, _ in top:
+        pipe.zscore(misses_key, zone_id)
+    pipe.delete(lookups_key, misses_key)
+    *misses, _ = pipe.execute()
+
+    return {
+        "days": days,
+        "distinct_zones": distinct_zones,
+        "top_zones": [
+            {"zone_id": _decode(zone_id), "lookups": int(lookups), "misses": int(zone_misses or 0)}
+            for (zone_id, lookups), zone_misses in zip(top, misses)
+        ],
+    }
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
@@ -40,6 +40,219 @@ def fetch_and_cache_yearly_calendar_task(zone_id, year, method_id, asr_juristic_
             BACKGROUND_TASK_RUNS_TOTAL.labels(task_name='fetch_and_cache_yearly_calendar', status='failure').inc()
             raise
 
+# --- Masjid Application Verification Tasks ---
+
+@celery.task(name='tasks.rescan_image_fingerprint_duplicates')
+def rescan_image_fingerprint_duplicates():
+    """
+    Celery task that re-scans the whole image fingerprint corpus for near-duplicate photos.
+    It first backfills the band columns of any fingerprints stored before the
+    Hamming-space index existed, then reports every pair of similar fingerprints.
+    """
+    with BACKGROUND_TASK_DURATION_SECONDS.labels(task_name='rescan_image_fingerprint_duplicates').time():
+        current_app.logger.info("[CELERY TASK] Starting image fingerprint duplicate re-scan.")
+        try:
+            from .services.image_fingerprint_service import backfill_phash_bands, find_duplicate_fingerprint_pairs
+            from .services.application_service import HAMMING_DISTANCE_THRESHOLD
+
+            backfilled_count = backfill_phash_bands()
+            if backfilled_count:
+                current_app.logger.info(f"[CELERY TASK] Backfilled pHash bands for {backfilled_count} fingerprints.")
+
+            pairs = find_duplicate_fingerprint_pairs(max_distance=HAMMING_DISTANCE_THRESHOLD - 1)
+            for pair in pairs:
+                current_app.logger.info(
+                    f"[CELERY TASK] Possible duplicate images: fingerprint {pair.fingerprint_id} and "
+                    f"{pair.other_fingerprint_id} (distance {pair.distance})."
+                )
+
+            result_message = f"Found {len(pairs)} possible duplicate image pairs."
+            current_app.logger.info(f"[CELERY TASK] {result_message}")
+            BACKGROUND_TASK_RUNS_TOTAL.labels(task_name='rescan_image_fingerprint_duplicates', status='success').inc()
+            return result_message
+        except Exception as e:
+            error_message = f"Image fingerprint re-scan failed: {e}"
+            current_app.logger.error(f"[CELERY TASK] {error_message}", exc_info=True)
+            BACKGROUND_TASK_RUNS_TOTAL.labels(task_name='rescan_image_fingerprint_duplicates', status='failure').inc()
+            raise
+
+def dispatch_application_verification(application_id):
+    """
+    Queues the verification pipeline for an application as a Celery chord.
+    The image, location and document checks run in parallel, and the final task
+    merges their results into the application's verification details and trust score.
+    """
+    from celery import chord
+
+    header = [
+        verify_application_images_task.s(application_id),
+        verify_application_location_task.s(application_id),
+        verify_application_document_task.s(application_id),
+    ]
+    return chord(header)(finalize_application_verification_task.s(application_id))
+
+def _run_verification_stage(task_name, check, stage_function_name, application_id):
+    """
+    Shared body of the parallel verification stage tasks. A failing stage returns
+    an error result instead of raising, so the chord still reaches its final step
+    and the application goes to manual review rather than staying 'pending'.
+    """
+    with BACKGROUND_TASK_DURATION_SECONDS.labels(task_name=task_name).time():
+        try:
+            from .models import MasjidApplication
+            from .services import application_service
+
+            application = MasjidApplication.query.get(application_id)
+            if not application:
+                raise LookupError(f"Application with ID {application_id} not found.")
+
+            result = getattr(application_service, stage_function_name)(application)
+            BACKGROUND_TASK_RUNS_TOTAL.labels(task_name=task_name, status='success').inc()
+            return result
+        except Exception as e:
+            current_app.logger.error(f"[CELERY TASK] {task_name} failed for application {application_id}: {e}", exc_info=True)
+            BACKGROUND_TASK_RUNS_TOTAL.labels(task_name=task_name, status='failure').inc()
+            return {'check': check, 'error': str(e)}
+
+@celery.task(name='tasks.verify_application_images')
+def verify_application_images_task(application_id):
+    """Verification stage: downloads and hashes the photos, then checks for duplicates."""
+    return _run_verification_stage('verify_application_images', 'images', 'run_image_duplicate_check', application_id)
+
+@celery.task(name='tasks.verify_application_location')
+def verify_application_location_task(application_id):
+    """Verification stage: checks for existing masjids at the same location."""
+    return _run_verification_stage('verify_application_location', 'location', 'run_nearby_masjid_check', application_id)
+
+@celery.task(name='tasks.verify_application_document')
+def verify_application_document_task(application_id):
+    """Verification stage: OCRs the official document, if one was provided."""
+    return _run_verification_stage('verify_application_document', 'document', 'run_document_check', application_id)
+
+@celery.task(name='tasks.finalize_application_verification')
+def finalize_application_verification_task(stage_results, application_id):
+    """
+    Final step of the verification chord. Receives the results of all stage tasks
+    and computes the trust score and status of the application.
+    """
+    with BACKGROUND_TASK_DURATION_SECONDS.labels(task_name='finalize_application_verification').time():
+        try:
+            from .models import MasjidApplication
+            from .services.application_service import apply_verification_results
+
+            application = MasjidApplication.query.get(application_id)
+            if not application:
+                current_app.logger.warning(f"[CELERY TASK] Application {application_id} disappeared before verification finished.")
+                return None
+
+            apply_verification_results(application, stage_results)
+            current_app.logger.info(
+                f"[CELERY TASK] Verified application {application_id}: status '{application.status}', "
+                f"trust score {application.trust_score}."
+            )
+            BACKGROUND_TASK_RUNS_TOTAL.labels(task_name='finalize_application_verification', status='success').inc()
+            return application.status
+        except Exception as e:
+            current_app.logger.error(f"[CELERY TASK] Finalizing verification of application {application_id} failed: {e}", exc_info=True)
+            BACKGROUND_TASK_RUNS_TOTAL.labels(task_name='finalize_application_verification', status='failure').inc()
+            raise
+
+# --- Push Notification Tasks ---
+
+@celery.task(name='tasks.reconcile_masjid_topic_subscriptions')
+def reconcile_masjid_topic_subscriptions_task():
+    """
+    Periodic Celery task that re-syncs the FCM topic subscriptions of follower
+    devices with UserMasjidFollow and GuestProfile.
+    """
+    with BACKGROUND_TASK_DURATION_SECONDS.labels(task_name='reconcile_masjid_topic_subscriptions').time():
+        current_app.logger.info("[CELERY TASK] Starting masjid topic subscription reconciliation.")
+        try:
+            from .services.notification_service import reconcile_masjid_topic_subscriptions
+
+            subscribed_count, unsubscribed_count = reconcile_masjid_topic_subscriptions()
+            result_message = f"Subscribed {subscribed_count} and unsubscribed {unsubscribed_count} device tokens."
+            current_app.logger.info(f"[CELERY TASK] {result_message}")
+            BACKGROUND_TASK_RUNS_TOTAL.labels(task_name='reconcile_masjid_topic_subscriptions', status='success').inc()
+            return result_message
+        except Exception as e:
+            error_message = f"Topic subscription reconciliation failed: {e}"
+            current_app.logger.error(f"[CELERY TASK] {error_message}", exc_info=True)
+            BACKGROUND_TASK_RUNS_TOTAL.labels(task_name='reconcile_masjid_topic_subscriptions', status='failure').inc()
+            raise
+
+# --- User Activity Tasks ---
+
+@celery.task(name='tasks.flush_user_last_seen')
+def flush_user_last_seen_task():
+    """
+    Periodic Celery task that writes the buffered last_seen_at touches of
+    authenticated users to the database in bulk.
+    """
+    with BACKGROUND_TASK_DURATION_SECONDS.labels(task_name='flush_user_last_seen').time():
+        try:
+            from .services.last_seen_service import flush_last_seen
+
+            flushed_count = flush_last_seen()
+            BACKGROUND_TASK_RUNS_TOTAL.labels(task_name='flush_user_last_seen', status='success').inc()
+            return f"Flushed last_seen_at for {flushed_count} users."
+        except Exception as e:
+            current_app.logger.error(f"[CELERY TASK] last_seen_at flush failed: {e}", exc_info=True)
+            BACKGROUND_TASK_RUNS_TOTAL.labels(task_name='flush_user_last_seen', status='failure').inc()
+            raise
+
+# --- System Health Tasks ---
+
+@celery.task(name='tasks.probe_system_health')
+def probe_system_health_task():
+    """
+    Periodic Celery task that probes the database, Redis, the prayer API and the
+    Celery workers, and stores the snapshot the system health endpoint serves.
+    """
+    with BACKGROUND_TASK_DURATION_SECONDS.labels(task_name='probe_system_health').time():
+        try:
+            from .services.health_service import run_health_probes
+
+            snapshot = run_health_probes()
+            BACKGROUND_TASK_RUNS_TOTAL.labels(task_name='probe_system_health', status='success').inc()
+            failing = [check for check, result in snapshot['checks'].items() if result['status'] != 'OK']
+            return f"Health probe complete. Failing checks: {failing or 'none'}."
+        except Exception as e:
+            current_app.logger.error(f"[CELERY TASK] System health probe failed: {e}", exc_info=True)
+            BACKGROUND_TASK_RUNS_TOTAL.labels(task_name='probe_system_health', status='failure').inc()
+            raise
+
+# --- Static Publishing Tasks ---
+
+# Redis key holding the start time (ISO) of the last successful static publish run.
+STATIC_PUBLISH_LAST_RUN_KEY = "static_publish:last_run"
+
+@celery.task(name='tasks.publish_static_schedules')
+def publish_static_schedules_task():
+    """
+    Periodic Celery task that publishes the schedules and zone calendars changed
+    since its last successful run to the static file tree.
+    """
+    with BACKGROUND_TASK_DURATION_SECONDS.labels(task_name='publish_static_schedules').time():
+        try:
+            from datetime import datetime
+            from .extensions import redis_client
+            from .services.static_publisher_service import publish_changed_since
+
+            started_at = datetime.utcnow()
+            last_run = redis_client.get(STATIC_PUBLISH_LAST_RUN_KEY)
+            since = datetime.fromisoformat(last_run.decode() if isinstance(last_run, bytes) else last_run) if last_run else None
+
+            report = publish_changed_since(since)
+            redis_client.set(STATIC_PUBLISH_LAST_RUN_KEY, started_at.isoformat())
+            BACKGROUND_TASK_RUNS_TOTAL.labels(task_name='publish_static_schedules', status='success').inc()
+            return (f"Published {report.manifests} manifests: {report.documents_written} documents written, "
+                    f"{report.documents_skipped} already published.")
+        except Exception as e:
+            current_app.logger.error(f"[CELERY TASK] Static schedule publishing failed: {e}", exc_info=True)
+            BACKGROUND_TASK_RUNS_TOTAL.labels(task_name='publish_static_schedules', status='failure').inc()
+            raise
+
 # --- Scalable Schedule Generation Tasks (Rolling Wave) ---
 
 @celery.task(name='tasks.generate_schedule_for_single_user')
@@ -78,6 +291,30 @@ def generate_schedule_for_single_user(user_id, year, month):
             # We don't re-raise the exception to prevent the master task from failing if one sub-task fails.
             return error_message # Return error message for logging
 
+@celery.task(name='tasks.generate_schedule_months')
+def generate_schedule_months_task(owner_id, months):
+    """
+    Generates and caches the months a schedule range request left pending
+    (see schedule_service.get_schedule_range). Months cached in the meantime,
+    e.g. by an earlier sync's task, are skipped.
+
+    Args:
+        owner_id (int): The ID of the schedule owner.
+        months (list): The [year, month] pairs to generate.
+    """
+    with BACKGROUND_TASK_DURATION_SECONDS.labels(task_name='generate_schedule_months').time():
+        try:
+            from .services.schedule_service import get_or_generate_monthly_schedule
+
+            for year, month in months:
+                get_or_generate_monthly_schedule(user_id=owner_id, year=year, month=month)
+            BACKGROUND_TASK_RUNS_TOTAL.labels(task_name='generate_schedule_months', status='success').inc()
+            return f"Generated {len(months)} pending months for owner {owner_id}."
+        except Exception as e:
+            current_app.logger.error(f"[CELERY TASK] Pending schedule generation failed for owner {owner_id}: {e}", exc_info=True)
+            BACKGROUND_TASK_RUNS_TOTAL.labels(task_name='generate_schedule_months', status='failure').inc()
+            raise
+
 @celery.task(name='tasks.master_schedule_generator')
 def master_schedule_generator():
     """
@@ -140,225 +377,48 @@ def master_schedule_generator():
     # This allows for massive parallel processing by Celery workers.
     for user in target_users:
         generate_schedule_for_single_user.delay(user.id, year_to_generate, month_to_generate)
-    
-        success_message = f"Dispatched schedule generation tasks for {len(target_users)} users."
-    
-        current_app.logger.info(f"[CELERY BEAT] {success_message}")
-    
-        return success_message
-    
-    
-    
-    
-    
-    # --- Proactive Yearly Calendar Fetching (Zone-Based Rolling Wave) ---
-    
-    
-    
-    @celery.task(name='tasks.proactive_yearly_calendar_fetcher')
-    
-    def proactive_yearly_calendar_fetcher():
-    
-        """
-    
-        This is the master Celery Beat task for the 'Zone-Based Rolling Wave'.
-    
-        It runs daily and proactively fetches the *next year's* raw prayer time calendars
-    
-        from the external API. The load is distributed evenly across the entire year by
-    
-        assigning each zone to a specific day of the year based on its hash.
-    
-        """
-    
-        from .models import PrayerZoneCalendar
-    
-        from . import db
-    
-        import datetime
-    
-        import hashlib
-    
-    
-    
-        current_app.logger.info("[CELERY BEAT] Proactive Yearly Calendar Fetcher starting.")
-    
-    
-    
-        # --- Determine Target Date and Modulo ---
-    
-        now = datetime.datetime.utcnow()
-    
-        year_to_fetch = now.year + 1
-    
-        
-    
-        # Use day of the year (1-366 for leap years) for the modulo calculation
-    
-        day_of_year = now.timetuple().tm_yday
-    
-        days_in_year = 366 if (now.year % 4 == 0 and now.year % 100 != 0) or (now.year % 400 == 0) else 365
-    
-        modulo_value = day_of_year % days_in_year
-    
-    
-    
-        current_app.logger.info(f"Processing zone bucket {modulo_value} for year {year_to_fetch}.")
-    
-    
-    
-        # --- Query for All Unique Zones ---
-    
-        # We get all distinct combinations of zone_id and calculation_method.
-    
-        # This represents every unique calendar type we have in our system.
-    
-        all_zones = db.session.query(
-    
-            PrayerZoneCalendar.zone_id, 
-    
-            PrayerZoneCalendar.calculation_method
-    
-        ).distinct().all()
-    
-    
-    
-        if not all_zones:
-    
-            current_app.logger.info("No existing zones found in PrayerZoneCalendar table. Task complete.")
-    
-            return "No zones found to process."
-    
-    
-    
-        # --- Filter Zones for Today's Bucket and Dispatch Tasks ---
-    
-        zones_to_process_count = 0
-    
-        for zone_id, calculation_method in all_zones:
-    
-            # Create a consistent hash for the zone identifier
-    
-            # Use a combination of zone_id and method to ensure uniqueness
-    
-            unique_zone_key = f"{zone_id}-{calculation_method}"
-    
-            
-    
-            # Use hashlib for a stable integer hash
-    
-            hash_int = int(hashlib.sha256(unique_zone_key.encode('utf-8')).hexdigest(), 16)
-    
-    
-    
-            if (hash_int % days_in_year) == modulo_value:
-    
-                # This zone belongs to today's bucket.
-    
-                # Check if the calendar for next year already exists.
-    
-                calendar_exists = db.session.query(PrayerZoneCalendar.zone_id).filter(
-    
-                    PrayerZoneCalendar.zone_id == zone_id,
-    
-                    PrayerZoneCalendar.calculation_method == calculation_method,
-    
-                    PrayerZoneCalendar.year == year_to_fetch
-    
-                ).first()
-    
-    
-    
-                if not calendar_exists:
-    
-                    current_app.logger.info(f"Zone '{unique_zone_key}' is in today's bucket. Triggering fetch for {year_to_fetch}.")
-    
-                    
-    
-                    # We need lat/lon and method details to trigger the fetch task.
-    
-                    # We can get this from any existing calendar for that zone.
-    
-                    # This assumes that lat/lon for a zone_id is constant.
-    
-                    existing_calendar = db.session.query(PrayerZoneCalendar).filter(
-    
-                        PrayerZoneCalendar.zone_id == zone_id,
-    
-                        PrayerZoneCalendar.calculation_method == calculation_method
-    
-                    ).first()
-    
-    
-    
-                    if existing_calendar and existing_calendar.calendar_data:
-    
-                        try:
-    
-                            # Extract required info from the existing calendar data
-    
-                            # This is a bit fragile; depends on the structure of calendar_data
-    
-                            first_day_data = existing_calendar.calendar_data[0]
-    
-                            meta = first_day_data.get('meta', {})
-    
-                            latitude = meta.get('latitude')
-    
-                            longitude = meta.get('longitude')
-    
-                            
-    
-                            method_id, asr_juristic_id, high_latitude_method_id = map(int, calculation_method.split('-'))
-    
-    
-    
-                            if latitude is not None and longitude is not None:
-    
-                                fetch_and_cache_yearly_calendar_task.delay(
-    
-                                    zone_id=zone_id,
-    
-                                    year=year_to_fetch,
-    
-                                    method_id=method_id,
-    
-                                    asr_juristic_id=asr_juristic_id,
-    
-                                    high_latitude_method_id=high_latitude_method_id,
-    
-                                    latitude=latitude,
-    
-                                    longitude=longitude
-    
-                                )
-    
-                                zones_to_process_count += 1
-    
-                            else:
-    
-                                current_app.logger.warning(f"Could not find lat/lon in existing calendar for zone '{unique_zone_key}'.")
-    
-    
-    
-                        except (ValueError, IndexError, KeyError) as e:
-    
-                            current_app.logger.error(f"Error processing existing calendar for zone '{unique_zone_key}': {e}")
-    
-                    else:
-    
-                        current_app.logger.warning(f"Could not find an existing calendar with data for zone '{unique_zone_key}' to get lat/lon.")
-    
-                else:
-    
-                    current_app.logger.debug(f"Calendar for zone '{unique_zone_key}' for year {year_to_fetch} already exists. Skipping.")
-    
-    
-    
-        success_message = f"Dispatched calendar fetch tasks for {zones_to_process_count} zones."
-    
-        current_app.logger.info(f"[CELERY BEAT] {success_message}")
-    
-        return success_message
-    
-    
\ No newline at end of file
+
+    success_message = f"Dispatched schedule generation tasks for {len(target_users)} users."
+    current_app.logger.info(f"[CELERY BEAT] {success_message}")
+    return success_message
+
+# --- Proactive Yearly Calendar Fetching (Zone-Based Rolling Wave) ---
+
+@celery.task(name='tasks.proactive_yearly_calendar_fetcher')
+def proactive_yearly_calendar_fetcher():
+    """
+    This is the master Celery Beat task for the 'Zone-Based Rolling Wave'.
+    It runs daily and proactively fetches the *next year's* raw prayer time calendars
+    from the external API. The load is distributed evenly across the entire year:
+    each registered zone/method is assigned a day-of-year bucket once, when it is
+    first registered, and is fetched on that day. Each run sweeps every bucket up to
+    today's, so zones registered after their day (or failed earlier) are caught up.
+    Zones that already have their calendar are skipped by the query.
+
+    The fetches run through the rate-limited prefetch engine, checkpointed per
+    day, so a retried run only fetches what the failed one did not.
+    """
+    with BACKGROUND_TASK_DURATION_SECONDS.labels(task_name='proactive_yearly_calendar_fetcher').time():
+        try:
+            from .services.prefetch_service import prefetch_calendars
+            from .services.zone_registry_service import zones_missing_calendar, todays_prefetch_bucket
+            import datetime
+
+            current_app.logger.info("[CELERY BEAT] Proactive Yearly Calendar Fetcher starting.")
+            today = datetime.datetime.utcnow().date()
+            year_to_fetch = today.year + 1
+            bucket = todays_prefetch_bucket(today)
+            current_app.logger.info(f"Processing zone buckets up to {bucket} for year {year_to_fetch}.")
+
+            jobs = zones_missing_calendar(year_to_fetch, up_to_bucket=bucket).all()
+            report = prefetch_calendars(jobs, year_to_fetch, run_id=f"{year_to_fetch}-bucket-{bucket}")
+
+            BACKGROUND_TASK_RUNS_TOTAL.labels(task_name='proactive_yearly_calendar_fetcher', status='success').inc()
+            success_message = (f"Prefetched {report.succeeded} calendars for buckets up to {bucket} "
+                               f"({report.failed} failed, {report.skipped} already done).")
+            current_app.logger.info(f"[CELERY BEAT] {success_message}")
+            return success_message
+        except Exception as e:
+            current_app.logger.error(f"[CELERY TASK] Proactive calendar fetch failed: {e}", exc_info=True)
+            BACKGROUND_TASK_RUNS_TOTAL.labels(task_name='proactive_yearly_calendar_fetcher', status='failure').inc()
+            raise
@@ -3,25 +3,26 @@ import requests
 from functools import wraps
 from flask import request, jsonify, current_app, g
 import jwt
-from jwt import PyJWKClient
-import time
 from datetime import datetime
 
 from .. import db
-from ..models import User, Permission, UserPermission, RolePermission # Import new models
+from ..models import User
 from .constants import Roles # Import the new Roles class
+from .jwt_utils import JwksKeyStore, VerifiedTokenCache
+from ..services import identity_service
+from ..services.last_seen_service import record_last_seen
 
-# Simple in-memory cache for JWKS
-jwks_cache = {
-    "keys": None,
-    "expiry": 0
-}
+# Per-process key-id -> signing key map for the Supabase JWKS, refreshed in the background.
+_jwks_key_store = None
+
+# Per-process cache of already verified tokens (see VerifiedTokenCache).
+verified_token_cache = VerifiedTokenCache()
 
 def get_jwks_client():
-    """Fetches and caches Supabase JWKS."""
-    global jwks_cache
-    if jwks_cache["keys"] and jwks_cache["expiry"] > time.time():
-        return jwks_cache["keys"]
+    """Returns the Supabase JWKS key store, fetching the keys on first use."""
+    global _jwks_key_store
+    if _jwks_key_store:
+        return _jwks_key_store
 
     try:
         supabase_url = current_app.config.get('SUPABASE_URL')
@@ -30,11 +31,12 @@ def get_jwks_client():
             return None
         
         jwks_url = f"{supabase_url}/auth/v1/.well-known/jwks.json"
-        jwks_client = PyJWKClient(jwks_url)
-        jwks_cache["keys"] = jwks_client
-        jwks_cache["expiry"] = time.time() + 3600 # Cache for 1 hour
-        current_app.logger.info("Successfully fetched and cached JWKS from Supabase.")
-        return jwks_client
+        key_store = JwksKeyStore(jwks_url, refresh_interval=current_app.config['JWKS_REFRESH_INTERVAL_SECONDS'])
+        key_count = key_store.refresh()
+        key_store.start_background_refresh(current_app.logger)
+        _jwks_key_store = key_store
+        current_app.logger.info(f"Successfully fetched {key_count} JWKS signing keys from Supabase.")
+        return key_store
     except Exception as e:
         current_app.logger.error(f"Failed to fetch JWKS: {e}", exc_info=True)
         return None
@@ -43,7 +45,7 @@ def _get_or_create_user_from_jwt(payload):
     """
     Finds a user in the local DB from the JWT payload, or creates one.
     Maps Supabase roles to local application roles.
-    Also updates the user's last_seen_at timestamp.
+    Only called when the caller's identity is not cached (see _resolve_identity).
     """
     supabase_id = payload.get("sub")
     if not supabase_id:
@@ -51,60 +53,87 @@ def _get_or_create_user_from_jwt(payload):
 
     user = User.query.filter_by(supabase_user_id=supabase_id).first()
     if user:
-        # Update last_seen_at for existing user
+        return user
+
+    # First login with this Supabase ID: link an existing account by email, or create one.
+    email = payload.get("email")
+    if not email:
+        return None
+
+    user = User.query.filter_by(email=email).first()
+    if user:
+        user.supabase_user_id = supabase_id
         user.last_seen_at = datetime.utcnow()
-        # No commit here, will be committed below
-    
     else:
-        email = payload.get("email")
-        if not email:
-            return None
+        supabase_role = payload.get("role")
+        app_role = Roles.SUPER_ADMIN if supabase_role == 'service_role' else Roles.CLIENT
+        user = User(
+            supabase_user_id=supabase_id, 
+            email=email, 
+            role=app_role,
+            last_seen_at=datetime.utcnow() # Set on creation
+        )
+        db.session.add(user)
 
-        user = User.query.filter_by(email=email).first()
-        if user:
-            user.supabase_user_id = supabase_id
-            user.last_seen_at = datetime.utcnow()
-        else:
-            supabase_role = payload.get("role")
-            app_role = Roles.SUPER_ADMIN if supabase_role == 'service_role' else Roles.CLIENT
-            user = User(
-                supabase_user_id=supabase_id, 
-                email=email, 
-                role=app_role,
-                last_seen_at=datetime.utcnow() # Set on creation
-            )
-            db.session.add(user)
-    
     try:
         db.session.commit()
-        current_app.logger.info(f"Authenticated and updated last_seen for user {user.id} (Supabase ID {supabase_id})")
+        current_app.logger.info(f"Linked/created user {user.id} for Supabase ID {supabase_id}")
         return user
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"DB error creating/linking user for sub {supabase_id}: {e}", exc_info=True)
         return None
 
-def _load_user_permissions(user):
+def _resolve_identity(payload):
+    """
+    Returns the CachedIdentity (user ID, role, permissions) of the token's subject.
+    Served from the identity cache when possible, so known callers are
+    authenticated without any DB queries. Also records the visit for the
+    write-behind last_seen_at update.
+    """
+    supabase_id = payload.get("sub")
+    if not supabase_id:
+        return None
+
+    identity = identity_service.get_cached_identity(supabase_id)
+    if identity is None:
+        user = _get_or_create_user_from_jwt(payload)
+        if not user:
+            return None
+        identity = identity_service.build_identity(user)
+        identity_service.cache_identity(supabase_id, identity)
+
+    record_last_seen(identity.user_id)
+    return identity
+
+def verify_token(token):
     """
-    Loads all active permissions for a given user.
-    Combines role-based permissions with user-specific overrides.
+    Verifies a bearer token and returns its payload.
+
+    A token already verified by this process is served from `verified_token_cache`
+    until it expires; only new tokens pay for the key lookup and RS256 check.
+    Returns None if the signing keys are unavailable; raises jwt.InvalidTokenError
+    (or a subclass) for tokens that fail verification.
     """
-    active_permissions = set()
-
-    # 1. Load permissions based on the user's role
-    role_perms = db.session.query(Permission.name).join(RolePermission).filter(RolePermission.role_name == user.role).all()
-    for perm_name, in role_perms:
-        active_permissions.add(perm_name)
-
-    # 2. Apply user-specific overrides
-    user_overrides = db.session.query(Permission.name, UserPermission.has_permission).join(UserPermission).filter(UserPermission.user_id == user.id).all()
-    for perm_name, has_perm in user_overrides:
-        if has_perm:
-            active_permissions.add(perm_name)
-        else:
-            active_permissions.discard(perm_name) # Remove if explicitly revoked
-            
-    return active_permissions
+    payload = verified_token_cache.get(token)
+    if payload is not None:
+        return payload
+
+    jwks_client = get_jwks_client()
+    if not jwks_client:
+        return None
+
+    signing_key = jwks_client.get_signing_key_from_jwt(token)
+    supabase_url = current_app.config.get('SUPABASE_URL')
+    payload = jwt.decode(
+        token,
+        signing_key.key,
+        algorithms=["RS256"],
+        audience="authenticated",
+        issuer=f"{supabase_url}/auth/v1"
+    )
+    verified_token_cache.add(token, payload)
+    return payload
 
 def _validate_token_and_get_user():
     """Helper function to validate token and set g.user and g.user_permissions. Returns True on success."""
@@ -116,25 +145,16 @@ def _validate_token_and_get_user():
     if not token:
         return False, ("Authentication token is missing!", 401)
 
-    jwks_client = get_jwks_client()
-    if not jwks_client:
-        return False, ("Authentication service is currently unavailable.", 503)
-
     try:
-        signing_key = jwks_client.get_signing_key_from_jwt(token)
-        supabase_url = current_app.config.get('SUPABASE_URL')
-        payload = jwt.decode(
-            token,
-            signing_key.key,
-            algorithms=["RS256"],
-            audience="authenticated",
-            issuer=f"{supabase_url}/auth/v1"
-        )
-        user = _get_or_create_user_from_jwt(payload)
-        if not user:
+        payload = verify_token(token)
+        if payload is None:
+            return False, ("Authentication service is currently unavailable.", 503)
+        identity = _resolve_identity(payload)
+        if not identity:
             return False, ("Could not identify or create user profile.", 404)
-        g.user = user
-        g.user_permissions = _load_user_permissions(user) # Load and store permissions
+        g.identity = identity
+        g.user = identity_service.lazy_user(identity.user_id) # Loaded from the DB only if a route uses it
+        g.user_permissions = set(identity.permissions) # Load and store permissions
         return True, None
     except jwt.ExpiredSignatureError:
         return False, ("Token has expired!", 401)
@@ -144,6 +164,14 @@ def _validate_token_and_get_user():
         current_app.logger.error(f"Internal server error during token validation: {e}", exc_info=True)
         return False, ("Internal server error during authentication.", 500)
 
+def current_user_id():
+    """Returns the authenticated caller's user ID without loading their User row, or None for guests."""
+    user = g.get('user')
+    if user is None:
+        return None
+    identity = g.get('identity')
+    return identity.user_id if identity else user.id
+
 def jwt_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -0,0 +1,19 @@
+# project/utils/db_utils.py
+
+from sqlalchemy import JSON, String, cast, type_coerce
+from sqlalchemy.dialects import postgresql, sqlite
+
+from .. import db
+
+
+def dialect_insert(table):
+    """INSERT supporting ON CONFLICT for PostgreSQL (production) and SQLite (tests)."""
+    dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    return dialect.insert(table)
+
+
+def json_value(serialized: str):
+    """A pre-serialized JSON string as a JSON column value, so it is not serialized a second time."""
+    value = type_coerce(serialized, String)
+    # SQLite stores JSON as text; PostgreSQL needs the explicit text-to-json cast.
+    return cast(value, JSON) if db.engine.dialect.name == 'postgresql' else value
@@ -0,0 +1,36 @@
+# project/utils/download_utils.py
+
+import requests
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024 # 64 KB
+
+
+class DownloadTooLargeError(Exception):
+    """Raised when a remote file is larger than the allowed download size."""
+    pass
+
+
+def download_with_size_cap(url, max_bytes, timeout=10):
+    """
+    Downloads a URL into memory, streaming the body in chunks and aborting as soon
+    as more than `max_bytes` have been received. A declared Content-Length above the
+    cap is rejected before any of the body is read.
+
+    Returns the downloaded bytes.
+    Raises requests.exceptions.RequestException on network/HTTP errors and
+    DownloadTooLargeError if the response exceeds `max_bytes`.
+    """
+    with requests.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+
+        declared_length = response.headers.get('Content-Length')
+        if declared_length and declared_length.isdigit() and int(declared_length) > max_bytes:
+            raise DownloadTooLargeError(f"{url} declares {declared_length} bytes, limit is {max_bytes}.")
+
+        buffer = bytearray()
+        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            buffer.extend(chunk)
+            if len(buffer) > max_bytes:
+                raise DownloadTooLargeError(f"{url} exceeded the download limit of {max_bytes} bytes.")
+
+        return bytes(buffer)
@@ -0,0 +1,89 @@
+# project/utils/export_utils.py
+
+import csv
+import datetime
+import io
+import json
+
+from flask import Response, stream_with_context
+
+# Rows fetched per round trip by streaming exports.
+EXPORT_BATCH_SIZE = 1000
+
+# Response header carrying the keyset cursor of the next page (absent on the last page).
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def keyset_page(query, id_column, after_id=None, limit=100):
+    """
+    Returns one page of `query` ordered by `id_column`, starting after `after_id`.
+
+    Unlike OFFSET pagination, every page costs the same index range scan no matter
+    how deep the client has paged.
+
+    Returns:
+        (rows, next_cursor) — next_cursor is the ID to pass as `after_id` for the
+        following page, or None on the last page.
+    """
+    if after_id is not None:
+        query = query.filter(id_column > after_id)
+    rows = query.order_by(id_column).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, getattr(rows[-1], id_column.key)
+    return rows, None
+
+
+def cursor_headers(next_cursor):
+    return {NEXT_CURSOR_HEADER: str(next_cursor)} if next_cursor is not None else {}
+
+
+def row_to_dict(row):
+    """Converts a column-projected result row into a JSON-serializable dict."""
+    return {key: json_value(value) for key, value in row._mapping.items()}
+
+
+def json_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+def ndjson_response(query, to_dict=row_to_dict, filename='export.ndjson'):
+    """
+    Streams `query` as newline-delimited JSON, one object per row. Rows are read
+    from a server-side cursor in batches of EXPORT_BATCH_SIZE, so the export never
+    holds more than one batch in memory.
+    """
+    def generate():
+        for row in query.yield_per(EXPORT_BATCH_SIZE):
+            yield json.dumps(to_dict(row)) + '\n'
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
+def csv_response(query, columns, to_dict=row_to_dict, filename='export.csv'):
+    """
+    Streams `query` as CSV with a header row of `columns`, reading rows from a
+    server-side cursor exactly like ndjson_response.
+    """
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        for row in query.yield_per(EXPORT_BATCH_SIZE):
+            writer.writerow(to_dict(row))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
@@ -0,0 +1,115 @@
+# project/utils/jwt_utils.py
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+from jwt import PyJWKClient
+
+
+class JwksKeyStore:
+    """
+    Holds the signing keys of a JWKS endpoint as a key-id -> key map.
+
+    Keys are fetched once up front and then refreshed by a background thread, so
+    looking up a key on the request path is a dict lookup. A token signed with an
+    unknown key id (e.g. right after a key rotation) triggers one synchronous
+    refresh, at most once per `min_refresh_interval` seconds.
+
+    Exposes `get_signing_key_from_jwt`, the same interface as PyJWKClient.
+    """
+
+    def __init__(self, jwks_url, refresh_interval=3600, min_refresh_interval=60):
+        self._client = PyJWKClient(jwks_url, cache_jwk_set=False, cache_keys=False)
+        self._keys = {}
+        self._last_refresh = 0.0
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread = None
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+
+    def refresh(self):
+        """Re-fetches the JWKS and atomically swaps in the new key map."""
+        with self._refresh_lock:
+            signing_keys = self._client.get_signing_keys()
+            self._keys = {signing_key.key_id: signing_key for signing_key in signing_keys}
+            self._last_refresh = time.monotonic()
+        return len(self._keys)
+
+    def get_signing_key_from_jwt(self, token):
+        kid = jwt.get_unverified_header(token).get('kid')
+        signing_key = self._keys.get(kid)
+        if signing_key is None and time.monotonic() - self._last_refresh >= self.min_refresh_interval:
+            self.refresh()
+            signing_key = self._keys.get(kid)
+        if signing_key is None:
+            raise jwt.InvalidTokenError(f"No signing key found for key id '{kid}'.")
+        return signing_key
+
+    def start_background_refresh(self, logger):
+        """Starts a daemon thread that refreshes the keys every `refresh_interval` seconds."""
+        if self._refresh_thread is not None:
+            return
+
+        def refresh_forever():
+            while True:
+                time.sleep(self.refresh_interval)
+                try:
+                    key_count = self.refresh()
+                    logger.info(f"Refreshed JWKS signing keys ({key_count} keys).")
+                except Exception as e:
+                    # Keep serving the previous keys; the next cycle retries.
+                    logger.error(f"Background JWKS refresh failed: {e}", exc_info=True)
+
+        self._refresh_thread = threading.Thread(target=refresh_forever, name='jwks-refresh', daemon=True)
+        self._refresh_thread.start()
+
+
+class VerifiedTokenCache:
+    """
+    Remembers the payloads of tokens whose signature and claims were already
+    verified, so a client repeating the same bearer token skips RSA verification.
+
+    Entries are keyed by a SHA-256 digest of the token (the token itself is never
+    stored), expire at the token's own `exp`, and the cache is a bounded LRU.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # token digest -> (exp, payload)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _digest(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token):
+        """Returns the verified payload for `token`, or None if it is unknown or expired."""
+        digest = self._digest(token)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            exp, payload = entry
+            if exp <= time.time():
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return payload
+
+    def add(self, token, payload):
+        exp = payload.get('exp')
+        if not isinstance(exp, (int, float)):
+            return # Tokens without an expiry are never cached
+        digest = self._digest(token)
+        with self._lock:
+            self._entries[digest] = (exp, payload)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,65 @@
+# project/utils/phash_utils.py
+"""
+Helpers for working with 64-bit perceptual hashes as integers.
+
+These support multi-index hashing: a hash is split into PHASH_BAND_COUNT bands of
+PHASH_BAND_BITS bits. By the pigeonhole principle, if two hashes differ in at most
+`r` bits then at least one of their bands differs in at most `r // PHASH_BAND_COUNT`
+bits, so candidates can be found by looking up each band's near neighbours.
+"""
+import itertools
+from functools import lru_cache
+
+PHASH_BITS = 64
+PHASH_BAND_COUNT = 4
+PHASH_BAND_BITS = PHASH_BITS // PHASH_BAND_COUNT
+PHASH_BAND_MASK = (1 << PHASH_BAND_BITS) - 1
+
+def phash_to_int(phash):
+    """
+    Parses a 16-character hex pHash into an integer.
+    Returns None if the string isn't a valid 64-bit hex hash.
+    """
+    if not phash or len(phash) != PHASH_BITS // 4:
+        return None
+    try:
+        return int(phash, 16)
+    except ValueError:
+        return None
+
+def phash_to_bands(phash):
+    """
+    Splits a hex pHash into a tuple of PHASH_BAND_COUNT integer bands (most significant first).
+    Returns None if the hash can't be parsed.
+    """
+    value = phash_to_int(phash)
+    if value is None:
+        return None
+    return tuple(
+        (value >> (PHASH_BITS - PHASH_BAND_BITS * (i + 1))) & PHASH_BAND_MASK
+        for i in range(PHASH_BAND_COUNT)
+    )
+
+def hamming_distance(value1, value2):
+    """Number of differing bits between two integer hashes."""
+    return bin(value1 ^ value2).count('1')
+
+@lru_cache(maxsize=None)
+def _band_flip_masks(radius):
+    """All bit masks over a band with at most `radius` bits set."""
+    masks = []
+    for bits_flipped in range(radius + 1):
+        for positions in itertools.combinations(range(PHASH_BAND_BITS), bits_flipped):
+            mask = 0
+            for position in positions:
+                mask |= 1 << position
+            masks.append(mask)
+    return tuple(masks)
+
+def band_neighbours(band_value, radius):
+    """All band values within `radius` bits of `band_value` (including itself)."""
+    return [band_value ^ mask for mask in _band_flip_masks(radius)]
+
+def band_search_radius(max_distance):
+    """Per-band search radius that guarantees finding all hashes within `max_distance`."""
+    return max(0, max_distance) // PHASH_BAND_COUNT
@@ -0,0 +1,128 @@
+# project/utils/redis_batch.py
+
+"""
+Request-scoped batching of Redis commands.
+
+Resolving one location's prayer times reads an alias pointer, a yearly calendar
+and daily entries, then writes back whatever it had to load, and every command
+used to be its own network round trip. A RedisBatch gathers them instead:
+
+  - prefetch() reads any number of keys with one MGET; later get()s of those
+    keys are answered from the batch, as are reads of keys it wrote;
+  - writes (set() and the commands added through writes()) are queued on one
+    pipeline and sent together when the batch is flushed.
+
+Within a request the batch lives on `flask.g` and is flushed when the request is
+torn down, after the response has been built. Celery tasks and scripts open one
+with redis_batch_scope(). Anywhere else get_redis_batch() returns a batch that
+writes through, so callers never need to know whether they are batched. The
+round trips each batch made are recorded in REDIS_ROUND_TRIPS_PER_REQUEST.
+"""
+
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from redis import exceptions as redis_exceptions
+
+from ..extensions import redis_client
+from ..metrics import REDIS_ROUND_TRIPS_PER_REQUEST
+
+
+class RedisBatch:
+    """Reads answered from one MGET, and writes sent in one pipeline (see module docstring)."""
+
+    def __init__(self, client, deferred: bool = True):
+        self.client = client
+        self.deferred = deferred
+        self.round_trips = 0
+        self._values: Dict[str, Optional[bytes]] = {}
+        self._pipe = None
+
+    def prefetch(self, keys: Iterable[str]) -> None:
+        """Reads every key not already known with a single MGET. Raises RedisError."""
+        missing = [key for key in dict.fromkeys(keys) if key not in self._values]
+        if not missing:
+            return
+        self.round_trips += 1
+        self._values.update(zip(missing, self.client.mget(missing)))
+
+    def get(self, key: str) -> Optional[bytes]:
+        """The value of `key`, from the batch when known, else with a GET. Raises RedisError."""
+        if key not in self._values:
+            self.round_trips += 1
+            self._values[key] = self.client.get(key)
+        return self._values[key]
+
+    def set(self, key: str, value, ex: Optional[int] = None) -> None:
+        """Queues a SET; reads of `key` through this batch see `value` straight away."""
+        with self.writes() as pipe:
+            pipe.set(key, value, ex=ex)
+        self._values[key] = value.encode('utf-8') if isinstance(value, str) else value
+
+    def set_nx(self, key: str, value, ex: Optional[int] = None) -> bool:
+        """SET NX, sent immediately since the caller needs its outcome (e.g. to take a lock)."""
+        self.round_trips += 1
+        return bool(self.client.set(key, value, nx=True, ex=ex))
+
+    @contextmanager
+    def writes(self):
+        """
+        Yields a pipeline to queue write commands on. A deferred batch sends them
+        on flush(); a write-through batch sends them when the block exits.
+        """
+        if self._pipe is None:
+            self._pipe = self.client.pipeline(transaction=False)
+        yield self._pipe
+        if not self.deferred:
+            self._execute()
+
+    def flush(self) -> None:
+        """Sends the queued writes in one round trip. Failures are logged, not raised."""
+        try:
+            self._execute()
+        except redis_exceptions.RedisError as e:
+            current_app.logger.error(f"Redis batch write-back failed: {e}", exc_info=True)
+
+    def _execute(self) -> None:
+        # The pipeline only exists once something has been queued on it.
+        pipe, self._pipe = self._pipe, None
+        if pipe is not None:
+            self.round_trips += 1
+            pipe.execute()
+
+
+def get_redis_batch() -> RedisBatch:
+    """The batch of the current request or redis_batch_scope(), else a write-through batch."""
+    if has_request_context() and 'redis_batch' not in g:
+        g.redis_batch = RedisBatch(redis_client)
+    if has_app_context() and 'redis_batch' in g:
+        return g.redis_batch
+    return RedisBatch(redis_client, deferred=False)
+
+
+@contextmanager
+def redis_batch_scope(label: str = 'background'):
+    """
+    Batches the Redis access of a block outside requests (Celery tasks, scripts),
+    flushing it on exit. Inside a request, or a scope already open, it yields that batch.
+    """
+    if has_request_context() or 'redis_batch' in g:
+        yield get_redis_batch()
+        return
+    batch = g.redis_batch = RedisBatch(redis_client)
+    try:
+        yield batch
+    finally:
+        g.pop('redis_batch', None)
+        batch.flush()
+        REDIS_ROUND_TRIPS_PER_REQUEST.labels(endpoint=label).observe(batch.round_trips)
+
+
+def flush_request_redis_batch(exc: Optional[BaseException] = None) -> None:
+    """teardown_request handler: writes back the request's batch and records its round trips."""
+    batch = g.pop('redis_batch', None)
+    if batch is None:
+        return
+    batch.flush()
+    REDIS_ROUND_TRIPS_PER_REQUEST.labels(endpoint=request.endpoint or 'unknown').observe(batch.round_trips)
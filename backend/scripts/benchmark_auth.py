@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# scripts/benchmark_auth.py
+
+import json
+import os
+import sys
+import threading
+import time
+import timeit
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+# This script is intended to be run from the command line.
+# We add the project's root directory to the Python path to allow imports.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import jwt
+from jwt import PyJWKClient
+from jwt.algorithms import RSAAlgorithm
+from cryptography.hazmat.primitives.asymmetric import rsa
+from flask import Flask
+
+from project.utils import auth
+
+KEY_ID = 'benchmark-key'
+
+
+def _start_jwks_server(public_key):
+    """Serves a one-key JWKS on a random local port and returns its base URL."""
+    jwk = json.loads(RSAAlgorithm.to_jwk(public_key))
+    jwk.update({'kid': KEY_ID, 'use': 'sig', 'alg': 'RS256'})
+    body = json.dumps({'keys': [jwk]}).encode()
+
+    class JwksHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), JwksHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def _make_token(private_key, supabase_url, sub):
+    now = int(time.time())
+    payload = {
+        'sub': sub,
+        'aud': 'authenticated',
+        'iss': f"{supabase_url}/auth/v1",
+        'iat': now,
+        'exp': now + 3600,
+    }
+    return jwt.encode(payload, private_key, algorithm='RS256', headers={'kid': KEY_ID})
+
+
+def _report(name, seconds, number):
+    print(f"{name:<48} {seconds / number * 1e6:10.1f} us/op")
+
+
+def run_benchmark(number=2000):
+    """
+    Compares the cost of verifying a bearer token:
+      - the previous path: PyJWKClient key lookup + RS256 verification on every request,
+      - a first-seen token: key-id map lookup + RS256 verification,
+      - a repeated token: served from the verified token cache.
+    """
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    supabase_url = _start_jwks_server(private_key.public_key())
+    issuer = f"{supabase_url}/auth/v1"
+
+    app = Flask(__name__)
+    app.config['SUPABASE_URL'] = supabase_url
+    app.config['JWKS_REFRESH_INTERVAL_SECONDS'] = 3600
+
+    tokens = [_make_token(private_key, supabase_url, f"user-{i}") for i in range(number)]
+    repeated_token = tokens[0]
+
+    legacy_client = PyJWKClient(f"{issuer}/.well-known/jwks.json")
+    def legacy_verify():
+        signing_key = legacy_client.get_signing_key_from_jwt(repeated_token)
+        jwt.decode(repeated_token, signing_key.key, algorithms=["RS256"], audience="authenticated", issuer=issuer)
+
+    with app.app_context():
+        auth.get_jwks_client() # Fetch the keys up front, as the first request would
+        legacy_verify()
+
+        print(f"Verifying RS256 bearer tokens ({number} iterations each)")
+        _report("PyJWKClient + decode (previous, every request)", timeit.timeit(legacy_verify, number=number), number)
+
+        auth.verified_token_cache.clear()
+        new_tokens = iter(tokens)
+        seconds = timeit.timeit(lambda: auth.verify_token(next(new_tokens)), number=number)
+        _report("Key map + decode (first-seen token)", seconds, number)
+
+        auth.verify_token(repeated_token)
+        seconds = timeit.timeit(lambda: auth.verify_token(repeated_token), number=number)
+        _report("Verified token cache (repeated token)", seconds, number)
+
+
+if __name__ == '__main__':
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
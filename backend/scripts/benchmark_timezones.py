@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# scripts/benchmark_timezones.py
+
+import datetime
+import os
+import sys
+import timeit
+import zoneinfo
+
+# This script is intended to be run from the command line.
+# We add the project's root directory to the Python path to allow imports.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from project.services.prayer_time.timezones import get_zone_info, local_to_utc_epoch, offset_table
+
+TIMEZONES = ['America/New_York', 'Europe/London', 'Asia/Kolkata', 'Australia/Lord_Howe']
+
+# One day's five Jamaats, as schedule generation converts them.
+JAMAAT_TIMES = [datetime.time(5, 30), datetime.time(13, 30), datetime.time(17, 30), datetime.time(19, 5), datetime.time(20, 45)]
+
+
+def _days(year):
+    day = datetime.date(year, 1, 1)
+    while day.year == year:
+        yield day
+        day += datetime.timedelta(days=1)
+
+
+# --- Previous implementation (a fresh ZoneInfo per conversion), kept here for comparison ---
+
+def legacy_convert_day(day, name):
+    return [int(datetime.datetime.combine(day, time).replace(tzinfo=zoneinfo.ZoneInfo.no_cache(name)).timestamp())
+            for time in JAMAAT_TIMES]
+
+def cached_zone_convert_day(day, name):
+    zone = get_zone_info(name)
+    return [int(datetime.datetime.combine(day, time).replace(tzinfo=zone).timestamp()) for time in JAMAAT_TIMES]
+
+def offset_table_convert_day(day, name):
+    return [local_to_utc_epoch(datetime.datetime.combine(day, time), name) for time in JAMAAT_TIMES]
+
+
+def _report(name, seconds, number):
+    print(f"{name:<40} {seconds / number * 1e6:10.2f} us/day")
+
+
+def run_benchmark(year=2031):
+    """Compares the cost of converting one day's Jamaat times to UTC instants, averaged over a year and several zones."""
+    days = [(day, name) for name in TIMEZONES for day in _days(year)]
+    # Build the tables (and check that every approach agrees) before timing.
+    for day, name in days:
+        assert legacy_convert_day(day, name) == offset_table_convert_day(day, name)
+
+    number = len(days)
+    table_build = timeit.timeit(lambda: [offset_table.__wrapped__(name, year) for name in TIMEZONES], number=1)
+    print(f"Wall-clock to UTC conversion, {len(JAMAAT_TIMES)} Jamaats per day ({number} zone-days)")
+    _report("fresh ZoneInfo per conversion (previous)", timeit.timeit(lambda: [legacy_convert_day(*d) for d in days], number=1), number)
+    _report("cached ZoneInfo", timeit.timeit(lambda: [cached_zone_convert_day(*d) for d in days], number=1), number)
+    _report("cached offset table", timeit.timeit(lambda: [offset_table_convert_day(*d) for d in days], number=1), number)
+    print(f"{'offset table build, per zone-year':<40} {table_build / len(TIMEZONES) * 1e3:10.2f} ms")
+
+
+if __name__ == '__main__':
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 2031)
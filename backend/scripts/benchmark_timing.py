@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# scripts/benchmark_timing.py
+
+import datetime
+import os
+import sys
+import timeit
+
+# This script is intended to be run from the command line.
+# We add the project's root directory to the Python path to allow imports.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+
+from project.services.prayer_time.time_arithmetic import parse_seconds, parse_minutes, add_minutes
+from project.services.prayer_time.timing_calculator import apply_boundary_check
+
+# A realistic spread of calendar times: every minute from 04:00 to 21:59, as AlAdhan returns them.
+TIME_STRINGS = [f"{hour:02d}:{minute:02d} (IST)" for hour in range(4, 22) for minute in range(60)]
+PLAIN_TIME_STRINGS = [time_str.split(" ")[0] for time_str in TIME_STRINGS]
+
+
+# --- Previous implementation (datetime based), kept here for comparison ---
+
+def legacy_parse_time_str(time_str):
+    if not time_str or time_str.lower() == "n/a":
+        return None
+    for fmt in ("%H:%M", "%H:%M:%S"):
+        try:
+            return datetime.datetime.strptime(time_str.strip(), fmt).time()
+        except ValueError:
+            continue
+    return None
+
+def legacy_add_minutes(time_obj, minutes_to_add):
+    if not time_obj or minutes_to_add is None: return None
+    full_datetime = datetime.datetime.combine(datetime.date.min, time_obj)
+    return (full_datetime + datetime.timedelta(minutes=int(minutes_to_add))).time()
+
+def legacy_apply_boundary_check(time_to_check, start_boundary_str, end_boundary_str):
+    start_boundary_obj = legacy_parse_time_str(start_boundary_str)
+    end_boundary_obj = legacy_parse_time_str(end_boundary_str)
+    end_boundary_with_buffer_obj = legacy_add_minutes(end_boundary_obj, -8)
+    if time_to_check < start_boundary_obj:
+        time_to_check = start_boundary_obj
+    if time_to_check > end_boundary_with_buffer_obj:
+        time_to_check = end_boundary_with_buffer_obj
+    return time_to_check
+
+
+def _report(name, seconds, number):
+    print(f"{name:<40} {seconds / number * 1e9:10.0f} ns/op")
+
+
+def run_benchmark(number=100000):
+    """Compares parsing, adding and clamping times of day: datetime objects versus integer minutes."""
+    app = Flask(__name__)
+    count = len(PLAIN_TIME_STRINGS)
+
+    def cycle(values):
+        index = [0]
+        def next_value():
+            index[0] = (index[0] + 1) % count
+            return values[index[0]]
+        return next_value
+
+    next_plain, next_suffixed = cycle(PLAIN_TIME_STRINGS), cycle(TIME_STRINGS)
+    legacy_time = legacy_parse_time_str("13:05")
+    minutes = parse_minutes("13:05")
+
+    with app.app_context():
+        print(f"Time arithmetic ({number} iterations each)")
+        _report("parse: strptime (previous)", timeit.timeit(lambda: legacy_parse_time_str(next_plain()), number=number), number)
+        _report("parse: integer parser, uncached", timeit.timeit(lambda: parse_seconds.__wrapped__(next_suffixed()), number=number), number)
+        _report("parse: integer parser, memoized", timeit.timeit(lambda: parse_minutes(next_suffixed()), number=number), number)
+
+        _report("add: datetime + timedelta (previous)", timeit.timeit(lambda: legacy_add_minutes(legacy_time, 15), number=number), number)
+        _report("add: integer minutes", timeit.timeit(lambda: add_minutes(minutes, 15), number=number), number)
+
+        _report("clamp: datetime (previous)",
+                timeit.timeit(lambda: legacy_apply_boundary_check(legacy_time, "12:30", "16:00"), number=number), number)
+        start, end = parse_minutes("12:30"), parse_minutes("16:00")
+        _report("clamp: integer minutes",
+                timeit.timeit(lambda: apply_boundary_check(minutes, start, end, "Dhuhr", "Azan"), number=number), number)
+
+
+if __name__ == '__main__':
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
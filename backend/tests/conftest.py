@@ -1,11 +1,13 @@
 # backend/tests/conftest.py
 
+import fakeredis
 import pytest
 from project import create_app, db as _db
 from project.models import User, Permission, RolePermission, UserPermission
 from project.utils.constants import Roles
 import jwt
 import time
+from sqlalchemy import event
 from unittest.mock import patch, MagicMock
 import datetime
 
@@ -22,6 +24,27 @@ def app():
     app.config['OPENWEATHERMAP_API_KEY'] = 'dummy_key'
     return app
 
+@pytest.fixture(scope='session')
+def service_app():
+    """
+    Session-wide application with the extensions initialized but no blueprints registered.
+    Service and task tests override `app` with it (`def app(service_app)`), so they run
+    without importing the route modules.
+    """
+    from flask import Flask
+    from project.config import config_by_name
+    from project.extensions import redis_client
+    from project.celery_utils import init_celery
+    from project.utils.redis_batch import flush_request_redis_batch
+    app = Flask('project')
+    app.config.from_object(config_by_name['testing'])
+    app.config['JWT_SECRET_KEY'] = TEST_SECRET_KEY
+    _db.init_app(app)
+    redis_client.init_app(app)
+    app.teardown_request(flush_request_redis_batch)
+    init_celery(app)
+    return app
+
 @pytest.fixture(scope='function')
 def db(app):
     """Function-level database setup. Creates and tears down tables for each test function."""
@@ -98,6 +121,18 @@ def mock_auth_dependencies(mocker):
     mocker.patch('jwt.decode', side_effect=mock_decode_logic)
 
 
+@pytest.fixture(autouse=True)
+def clear_identity_cache():
+    """Test databases are recreated per test, so identities and tokens cached by earlier tests must not leak."""
+    from project.services.identity_service import clear_local_identity_cache
+    from project.utils.auth import verified_token_cache
+    clear_local_identity_cache()
+    verified_token_cache.clear()
+    yield
+    clear_local_identity_cache()
+    verified_token_cache.clear()
+
+
 @pytest.fixture(autouse=True)
 def mock_api_prayer_times_service(mocker):
     """Mocks the get_api_prayer_times_for_date_from_service function."""
@@ -115,6 +150,84 @@ def mock_api_prayer_times_service(mocker):
 
 
 
+class RecordingRedis(fakeredis.FakeRedis):
+    """
+    In-memory Redis (fakeredis) that records each round trip in `calls`: a command
+    sent on its own as (name, args), e.g. ('mget', (key, ...)), and a pipeline as
+    ('pipeline', ((name, args), ...)) with the commands it carried.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = []
+
+    def execute_command(self, *args, **options):
+        self.calls.append((args[0].lower(), args[1:]))
+        return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        pipe = super().pipeline(transaction, shard_hint)
+        execute = pipe.execute
+        def recording_execute(raise_on_error=True):
+            self.calls.append(('pipeline', tuple((command[0].lower(), command[1:]) for command, _ in pipe.command_stack)))
+            return execute(raise_on_error)
+        pipe.execute = recording_execute
+        return pipe
+
+
+@pytest.fixture
+def fake_redis(mocker):
+    """
+    Puts a RecordingRedis behind project.extensions.redis_client for the test, so every
+    module that uses the shared client talks to it.
+    """
+    from project.extensions import redis_client
+    redis = RecordingRedis()
+    mocker.patch.object(redis_client, 'redis_client', redis)
+    return redis
+
+
+@pytest.fixture
+def count_queries(app):
+    """Returns a function that runs a callable and returns (its result, the number of SQL statements it issued)."""
+    def run(function):
+        statements = []
+        def listener(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        with app.app_context():
+            engine = _db.engine
+        event.listen(engine, 'before_cursor_execute', listener)
+        try:
+            result = function()
+        finally:
+            event.remove(engine, 'before_cursor_execute', listener)
+        return result, len(statements)
+    return run
+
+
+@pytest.fixture
+def walk_keyset_pages():
+    """
+    Returns walk(client, url, headers, query=None), which follows a keyset-paginated listing's
+    X-Next-Cursor header (sent back as `after_id`) until it is absent and returns the pages
+    as (after_id requested, JSON rows) pairs.
+    """
+    def walk(client, url, headers, query=None, max_pages=10):
+        pages = []
+        after_id = None
+        for _ in range(max_pages):
+            page_query = dict(query or {})
+            if after_id is not None:
+                page_query['after_id'] = after_id
+            response = client.get(url, headers=headers, query_string=page_query)
+            assert response.status_code == 200
+            pages.append((after_id, response.get_json()))
+            after_id = response.headers.get('X-Next-Cursor')
+            if after_id is None:
+                return pages
+        raise AssertionError(f"{url} still had a next page after {max_pages} pages.")
+    return walk
+
+
 def create_test_token(user_id, supabase_role, email):
     """Helper to create a JWT using HS256."""
     payload = {
@@ -19,7 +19,7 @@ def test_initial_prayer_data_guest(test_client, mocker):
         }
     }
     # Patch the functions in the module where they are imported and used
-    mocker.patch('project.routes.api_routes.get_api_prayer_times_for_date_from_service', return_value=mock_prayer_times)
+    mocker.patch('project.routes.api_routes.get_api_prayer_times_for_dates_from_service', return_value=[mock_prayer_times] * 3)
     mocker.patch('project.routes.api_routes.get_current_prayer_period_from_service', return_value={'name': 'ASR'})
     mocker.patch('project.routes.api_routes._get_single_prayer_info', return_value={'azan': '20:15', 'jamaat': '20:30'})
 
@@ -10,14 +10,14 @@ import datetime
 # --- GUEST Endpoint Tests ---
 
 def test_initial_prayer_data_guest(test_client):
-    with patch('project.routes.api_routes.get_api_prayer_times_for_date_from_service') as mock_prayer_times_service, \
+    with patch('project.routes.api_routes.get_api_prayer_times_for_dates_from_service') as mock_prayer_times_service, \
          patch('project.routes.api_routes.calculate_display_times_from_service') as mock_calculate_display_times, \
          patch('project.routes.api_routes.get_current_prayer_period_from_service') as mock_current_period, \
          patch('project.routes.api_routes._get_single_prayer_info') as mock_single_prayer_info, \
          patch('project.routes.api_routes.UserSettings') as mock_user_settings:
 
         # Mocking the return values for the services
-        mock_prayer_times_service.side_effect = [
+        mock_prayer_times_service.return_value = [
             {'timings': {'Fajr': '05:00', 'Dhuhr': '13:00', 'Asr': '17:00', 'Maghrib': '19:00', 'Isha': '20:30'}, 'date': {'gregorian': {'date': '10-08-2025', 'weekday': {'en': 'Sunday'}}, 'hijri': {'date': '06-02-1447', 'month': {'en': 'Rajab'}, 'year': '1447'}}}, 
             {'timings': {'Fajr': '05:01', 'Dhuhr': '13:01', 'Asr': '17:01', 'Maghrib': '19:01', 'Isha': '20:31'}},
             {'timings': {'Fajr': '05:02', 'Dhuhr': '13:02', 'Asr': '17:02', 'Maghrib': '19:02', 'Isha': '20:32'}}
@@ -99,4 +99,130 @@ def test_update_client_settings_authenticated_without_permission(test_client, au
 
     # Verify data was NOT written
     user = User.query.filter_by(id=client_user_in_db.id).first()
-    assert user.name != "Should Not Update"
\ No newline at end of file
+    assert user.name != "Should Not Update"
+
+# --- Prayer Settings Resolution Tests ---
+
+@pytest.fixture
+def followed_masjid(db):
+    """A masjid with its own settings and an announcement."""
+    from project.models import MasjidAnnouncement
+    masjid = User(email='masjid@example.com', name='Test Masjid', role='Masjid',
+                  default_latitude=41.0082, default_longitude=28.9784, default_city_name='Istanbul',
+                  default_calculation_method='Makkah')
+    masjid.settings = UserSettings(asr_juristic='Hanafi', high_latitude_method='AngleBased')
+    masjid.announcements.append(MasjidAnnouncement(title='Community Dinner', content='Join us this Friday!'))
+    db.session.add(masjid)
+    db.session.commit()
+    return masjid
+
+def _resolve(app, count_queries, user_id=None, device_id=None, args=None):
+    from project.services.prayer_settings_service import resolve_prayer_settings
+    with app.test_request_context():
+        db.session.expunge_all() # Start from an empty identity map, like a new request
+        return count_queries(lambda: resolve_prayer_settings(user_id, device_id, args or {}))
+
+def test_resolve_guest_followed_masjid_in_one_query(app, db, count_queries, followed_masjid):
+    from project.models import GuestProfile
+    masjid_id = followed_masjid.id
+    db.session.add(GuestProfile(device_id='device-1', followed_masjid_id=masjid_id))
+    db.session.commit()
+
+    # _resolve detaches every instance, followed_masjid included
+    resolved, queries = _resolve(app, count_queries, device_id='device-1')
+
+    assert queries == 1
+    assert resolved.source == "guest_followed_masjid"
+    assert resolved.masjid.id == masjid_id
+    assert [a.title for a in resolved.announcements] == ['Community Dinner']
+
+def test_resolve_user_followed_masjid_in_one_query(app, db, count_queries, client_user_in_db, followed_masjid):
+    from project.models import UserMasjidFollow
+    db.session.add(UserMasjidFollow(user_id=client_user_in_db.id, masjid_id=followed_masjid.id, is_default=True))
+    db.session.commit()
+
+    resolved, queries = _resolve(app, count_queries, user_id=client_user_in_db.id)
+
+    assert queries == 1
+    assert resolved.source == "followed_masjid"
+    assert (resolved.latitude, resolved.method_id, resolved.asr_id) == (41.0082, 4, 1)
+    snapshot = resolved.prayer_settings
+    assert (snapshot.calculation_method_id, snapshot.asr_juristic_id, snapshot.high_latitude_method_id) == (4, 1, 3)
+    assert resolved.high_lat_id == 3
+    assert len(resolved.announcements) == 1
+
+def test_resolve_user_custom_location_in_one_query(app, db, count_queries, client_user_in_db):
+    client_user_in_db.default_calculation_method = 'ISNA'
+    db.session.commit()
+
+    resolved, queries = _resolve(app, count_queries, user_id=client_user_in_db.id, args={'lat': 51.5, 'lon': -0.12})
+
+    assert queries == 1
+    assert resolved.source == "custom_location_with_user_settings"
+    assert (resolved.latitude, resolved.longitude, resolved.method_id) == (51.5, -0.12, 2)
+    assert resolved.masjid is None and resolved.announcements == ()
+
+def test_resolve_user_personal_settings_in_one_query(app, db, count_queries, client_user_in_db):
+    client_user_in_db.default_latitude = 21.4225
+    client_user_in_db.default_longitude = 39.8262
+    client_user_in_db.default_city_name = 'Makkah'
+    client_user_in_db.default_calculation_method = 'Makkah'
+    db.session.commit()
+
+    resolved, queries = _resolve(app, count_queries, user_id=client_user_in_db.id)
+
+    assert queries == 1
+    assert resolved.source == "user_personal_settings"
+    assert (resolved.city_name, resolved.method_id) == ('Makkah', 4)
+
+def test_resolve_app_default_without_queries(app, db, count_queries):
+    resolved, queries = _resolve(app, count_queries)
+
+    assert queries == 0
+    assert resolved.source == "app_default"
+    assert resolved.method_id == int(app.config.get('DEFAULT_CALCULATION_METHOD_ID', 3))
+
+
+def test_schedule_range_and_delta_sync(test_client, auth_headers_for_client, client_user_in_db, mocker):
+    """Several months come back in one response; delta sync only resends months the client does not hold."""
+    from project.models import MonthlyScheduleCache
+    from project.services.schedule_service import _save_schedule_to_cache
+
+    def schedule(month, fajr='05:00'):
+        return {"owner_id": client_user_in_db.id, "generated_at": datetime.datetime.utcnow().isoformat(),
+                "schedule_month": f"2031-{month}", "warnings": [], "script": [fajr]}
+
+    rows = {month: _save_schedule_to_cache(client_user_in_db.id, 2031, month, schedule(month)) for month in (1, 2, 3)}
+    # Regenerating identical content keeps the hash and version; a real change bumps the version.
+    assert _save_schedule_to_cache(client_user_in_db.id, 2031, 3, schedule(3)).version == 1
+    march_hash = rows[3].script_hash
+    assert _save_schedule_to_cache(client_user_in_db.id, 2031, 3, schedule(3, fajr='05:05')).version == 2
+
+    generate = mocker.patch('project.services.schedule_service._generate_schedule_for_owner', return_value=schedule(4))
+
+    response = test_client.get('/api/v1/schedule/range?start=2031-01&end=2031-04', headers=auth_headers_for_client)
+    assert response.status_code == 200
+    assert [entry['month'] for entry in response.json['months']] == ['2031-01', '2031-02', '2031-03', '2031-04']
+    assert response.json['months'][2]['version'] == 2
+    assert generate.call_count == 1
+    assert MonthlyScheduleCache.query.filter_by(owner_id=client_user_in_db.id).count() == 4
+
+    known = [
+        {"month": "2031-01", "script_hash": rows[1].script_hash},
+        {"month": "2031-02", "script_hash": rows[2].script_hash},
+        {"month": "2031-03", "script_hash": march_hash},
+    ]
+    response = test_client.post('/api/v1/schedule/sync', headers=auth_headers_for_client,
+                                json={"start": "2031-01", "end": "2031-04", "known": known})
+    assert response.status_code == 200
+    assert response.json['unchanged'] == ['2031-01', '2031-02']
+    assert [entry['month'] for entry in response.json['months']] == ['2031-03', '2031-04']
+    assert generate.call_count == 1
+
+    # Versions are per owner, so a version alone cannot identify the client's copy.
+    response = test_client.post('/api/v1/schedule/sync', headers=auth_headers_for_client,
+                                json={"start": "2031-01", "end": "2031-01", "known": [{"month": "2031-01", "version": 1}]})
+    assert response.status_code == 422
+
+    response = test_client.get('/api/v1/schedule/range?start=2031-05&end=2031-04', headers=auth_headers_for_client)
+    assert response.status_code == 400
@@ -181,4 +181,180 @@ def test_admin_can_approve_pending_application(mocker, db):
     assert app.status == 'approved'
     assert applicant.role == 'Masjid'
     assert app.reviewed_by == admin
-    mock_send_email.assert_called_once_with(app)
\ No newline at end of file
+    mock_send_email.assert_called_once_with(app)
+
+
+def test_find_similar_fingerprints_uses_hamming_distance(db):
+    """
+    GIVEN stored fingerprints at various Hamming distances from a new photo's hash
+    WHEN the fingerprint index is searched
+    THEN only the fingerprints within the distance are returned, closest first
+    """
+    from project.models import ImageFingerprint
+    from project.services.image_fingerprint_service import find_similar_fingerprints
+
+    base_hash = 0x0f0f0f0f0f0f0f0f
+    stored = {
+        'same': base_hash,
+        'two_bits': base_hash ^ 0b11,
+        'four_bits_across_bands': base_hash ^ (1 << 63 | 1 << 40 | 1 << 20 | 1),
+        'far': ~base_hash & 0xffffffffffffffff,
+    }
+    for name, value in stored.items():
+        db.session.add(ImageFingerprint(user_id=1, image_url=f"http://example.com/{name}.jpg", image_type='exterior', phash=f"{value:016x}"))
+    db.session.commit()
+
+    matches = find_similar_fingerprints(f"{base_hash:016x}", max_distance=4)
+
+    assert [match.distance for match in matches] == [0, 2, 4]
+    assert all(match.owner_user_id == 1 for match in matches)
+
+
+def test_find_duplicate_fingerprint_pairs_scans_corpus(db):
+    """
+    GIVEN a corpus with one pair of near-identical fingerprints
+    WHEN the corpus is re-scanned in batch mode
+    THEN exactly that pair is reported
+    """
+    from project.models import ImageFingerprint
+    from project.services.image_fingerprint_service import find_duplicate_fingerprint_pairs
+
+    first = ImageFingerprint(user_id=1, image_url="http://example.com/a.jpg", image_type='exterior', phash="8f373714acfcf4d0")
+    near_copy = ImageFingerprint(user_id=2, image_url="http://example.com/b.jpg", image_type='exterior', phash="8f373714acfcf4d1")
+    unrelated = ImageFingerprint(user_id=3, image_url="http://example.com/c.jpg", image_type='exterior', phash="70c8c8eb53030b2f")
+    db.session.add_all([first, near_copy, unrelated])
+    db.session.commit()
+
+    pairs = find_duplicate_fingerprint_pairs(max_distance=4)
+
+    assert [(p.fingerprint_id, p.other_fingerprint_id, p.distance) for p in pairs] == [(first.id, near_copy.id, 1)]
+
+
+def test_submit_application_queues_verification_chord(mocker, db):
+    """
+    GIVEN a client user
+    WHEN they submit an application
+    THEN the parallel verification pipeline is queued for it
+    """
+    mock_dispatch = mocker.patch('project.tasks.dispatch_application_verification')
+
+    from project.services import application_service
+    applicant = User(email='queued@user.com', name='Queued User', role='Client')
+    db.session.add(applicant)
+    db.session.commit()
+    app = application_service.submit_application(applicant, {
+        "official_name": "Queued Masjid",
+        "address_line_1": "123 Test St",
+        "city": "Testville",
+        "state": "TS",
+        "postal_code": "12345",
+        "country": "Testland",
+        "latitude": 10.0,
+        "longitude": 20.0,
+        "exterior_photo_url": "http://example.com/exterior.jpg",
+        "interior_photo_url": "http://example.com/interior.jpg"
+    })
+
+    mock_dispatch.assert_called_once_with(app.id)
+    assert app.status == 'pending'
+
+
+def test_failed_verification_stage_sends_application_to_manual_review(mocker, db):
+    """
+    GIVEN stage results where the document OCR stage crashed
+    WHEN the results are merged
+    THEN the application needs manual review and the error is recorded
+    """
+    from project.services import application_service
+    applicant = User(email='ocr@user.com', name='OCR User', role='Client')
+    db.session.add(applicant)
+    app = MasjidApplication(
+        applicant=applicant,
+        official_name="OCR Masjid",
+        address_line_1="123 Test St",
+        city="Testville",
+        state="TS",
+        postal_code="12345",
+        country="Testland",
+        latitude=10.0,
+        longitude=20.0,
+        has_official_document=True,
+        exterior_photo_url="http://example.com/exterior.jpg",
+        interior_photo_url="http://example.com/interior.jpg"
+    )
+    db.session.add(app)
+    db.session.commit()
+
+    application_service.apply_verification_results(app, [
+        {'check': 'images', 'is_duplicate': False, 'matched_masjid_id': None},
+        {'check': 'location', 'has_nearby_masjid': False, 'nearby_masjid_id': None},
+        {'check': 'document', 'error': 'Vision API unavailable'},
+    ])
+
+    assert app.status == 'needs_manual_review'
+    assert app.trust_score == 40
+    assert app.verification_details['document_check_error'] == 'Vision API unavailable'
+
+
+@pytest.fixture
+def review_queue(db, super_admin_user_in_db):
+    """Six applications alternating pending/approved, with rising trust scores and creation dates."""
+    import datetime
+    from project.models import Permission, UserPermission
+    permission = Permission(name='can_manage_masjid_applications')
+    db.session.add(permission)
+    db.session.flush()
+    db.session.add(UserPermission(user_id=super_admin_user_in_db.id, permission_id=permission.id))
+
+    applicant = User(email='queue@user.com', name='Queue User', role='Client')
+    applications = [
+        MasjidApplication(
+            applicant=applicant, official_name=f"Masjid {i}",
+            status='pending' if i % 2 == 0 else 'approved', trust_score=i * 10,
+            created_at=datetime.datetime(2030, 1, i + 1),
+            address_line_1="123 Test St", city="Testville", state="TS", postal_code="12345",
+            country="Testland", latitude=10.0, longitude=20.0,
+            exterior_photo_url="http://example.com/exterior.jpg",
+            interior_photo_url="http://example.com/interior.jpg"
+        )
+        for i in range(6)
+    ]
+    db.session.add_all(applications)
+    db.session.commit()
+    return applications
+
+
+def test_admin_application_listing_is_keyset_paginated(test_client, db, review_queue, auth_headers_for_super_admin, walk_keyset_pages):
+    """Only the filtered status is listed, in ID order, and a cursor keeps returning the same page as rows are added."""
+    url, query = '/api/masjid-applications/admin', {'limit': 2, 'status': 'pending'}
+    pages = walk_keyset_pages(test_client, url, auth_headers_for_super_admin, query)
+    assert [[application['official_name'] for application in page] for _, page in pages] == [["Masjid 0", "Masjid 2"], ["Masjid 4"]]
+
+    # The cursor is the last ID of the previous page, so new applications only ever appear at the end.
+    (_, first_page), (cursor, second_page) = pages
+    assert cursor == str(first_page[-1]['id'])
+    late = MasjidApplication(**{column: getattr(review_queue[0], column) for column in (
+        'user_id', 'address_line_1', 'city', 'state', 'postal_code', 'country', 'latitude', 'longitude',
+        'exterior_photo_url', 'interior_photo_url')}, official_name="Masjid 6", status='pending')
+    db.session.add(late)
+    db.session.commit()
+    response = test_client.get(url, headers=auth_headers_for_super_admin, query_string={**query, 'after_id': cursor})
+    assert [application['official_name'] for application in response.get_json()] == ["Masjid 4", "Masjid 6"]
+    assert response.get_json()[0] == second_page[0]
+
+
+def test_admin_application_export_streams_filtered_rows(test_client, review_queue, auth_headers_for_super_admin):
+    import json
+    response = test_client.get('/api/masjid-applications/admin/export', headers=auth_headers_for_super_admin,
+                               query_string={'min_trust_score': 20, 'created_before': '2030-01-05T00:00:00'})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+    assert [row['official_name'] for row in rows] == ["Masjid 2", "Masjid 3"]
+
+    response = test_client.get('/api/masjid-applications/admin/export', headers=auth_headers_for_super_admin,
+                               query_string={'format': 'csv', 'status': 'approved'})
+    assert response.status_code == 200
+    lines = response.data.decode('utf-8').splitlines()
+    assert lines[0].startswith('id,user_id,official_name')
+    assert [line.split(',')[2] for line in lines[1:]] == ["Masjid 1", "Masjid 3", "Masjid 5"]
@@ -0,0 +1,138 @@
+# backend/tests/test_async_adapters.py
+
+import asyncio
+import datetime
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from project.models import PrayerZoneCalendar
+from project.services import async_batch_service
+from project.services.api_adapters.async_aladhan_adapter import AsyncAlAdhanAdapter
+from project.services.geocoding_adapters.async_locationiq_adapter import AsyncLocationIQAdapter
+
+
+@pytest.fixture(scope='session')
+def app(service_app):
+    return service_app
+
+
+def _aladhan_day(day):
+    return {"date": {"gregorian": {"date": day.strftime("%d-%m-%Y")}}, "timings": {"Fajr": "05:00 (IST)", "Dhuhr": "12:30 (IST)"}}
+
+
+async def _aladhan_calendar(request):
+    """Mimics AlAdhan's yearly /calendar: {"code": 200, "data": {"1": [days], ..., "12": [days]}}."""
+    request.app['requests'].append(dict(request.query))
+    if request.query['latitude'] == '0.0':
+        return web.json_response({"code": 400, "status": "Bad Request", "data": "Invalid latitude"})
+    year = int(request.query['year'])
+    months = {}
+    day = datetime.date(year, 1, 1)
+    while day.year == year:
+        months.setdefault(str(day.month), []).append(_aladhan_day(day))
+        day += datetime.timedelta(days=1)
+    return web.json_response({"code": 200, "status": "OK", "data": months})
+
+
+async def _aladhan_timings(request):
+    day = datetime.datetime.strptime(request.match_info['date'], "%d-%m-%Y").date()
+    return web.json_response({"code": 200, "status": "OK", "data": _aladhan_day(day)})
+
+
+async def _locationiq_reverse(request):
+    """Mimics LocationIQ's /reverse.php, including its 404 for unknown locations."""
+    lat = float(request.query['lat'])
+    if lat > 80:
+        return web.json_response({"error": "Unable to geocode"}, status=404)
+    return web.json_response({
+        "display_name": f"Place {lat}, India",
+        "address": {"country_code": "in", "state": "Uttar Pradesh", "county": "Badaun", "town": f"Town {lat}"},
+    })
+
+
+async def _run_with_stub_server(test):
+    """Serves the stub AlAdhan and LocationIQ endpoints on a free local port and runs `test(base_url, session, requests)`."""
+    stub = web.Application()
+    stub['requests'] = []
+    stub.router.add_get('/calendar', _aladhan_calendar)
+    stub.router.add_get('/timings/{date}', _aladhan_timings)
+    stub.router.add_get('/reverse.php', _locationiq_reverse)
+    runner = web.AppRunner(stub)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        async with aiohttp.ClientSession() as session:
+            return await test(f"http://127.0.0.1:{port}", session, stub['requests'])
+    finally:
+        await runner.cleanup()
+
+
+def test_async_aladhan_adapter_matches_blocking_shapes(app):
+    """The async adapter returns the blocking adapter's {"date", "timings"} shape for daily and yearly fetches."""
+    async def test(base_url, session, requests):
+        adapter = AsyncAlAdhanAdapter(session, base_url=base_url)
+        daily = await adapter.fetch_daily_timings(datetime.date(2025, 3, 1), 28.6, 77.2, 1, 1, 3)
+        yearly = await adapter.fetch_yearly_calendar(2024, 28.6, 77.2, 1, 1, 3)
+        failed = await adapter.fetch_yearly_calendar(2024, 0.0, 77.2, 1, 1, 3)
+        return daily, yearly, failed, requests
+
+    with app.app_context():
+        daily, yearly, failed, requests = asyncio.run(_run_with_stub_server(test))
+
+    assert daily == {"date": "01-03-2025", "timings": {"Fajr": "05:00 (IST)", "Dhuhr": "12:30 (IST)"}}
+    assert len(yearly) == 366
+    assert yearly[0]["date"] == "01-01-2024" and yearly[-1]["date"] == "31-12-2024"
+    assert failed is None
+    assert requests[0] == {"latitude": "28.6", "longitude": "77.2", "method": "1", "school": "1",
+                           "latitudeAdjustmentMethod": "3", "year": "2024"}
+
+
+def test_async_batch_drivers_fetch_calendars_and_reverse_geocode_concurrently(app):
+    """The batch drivers map every job to its result, in order, and keep failures per item."""
+    jobs = [(f"grid_{i}.0_77.0", "1-1-3", float(i), 77.0) for i in range(1, 40)] + [("grid_0.0_77.0", "2-0-1", 0.0, 77.0)]
+    coordinates = [(10.0 + i % 60, 77.0) for i in range(200)] + [(85.0, 0.0)]
+
+    async def test(base_url, session, requests):
+        calendars = await async_batch_service.fetch_yearly_calendars_async(
+            AsyncAlAdhanAdapter(session, base_url=base_url), jobs, 2025, concurrency=8
+        )
+        admin_levels = await async_batch_service.reverse_geocode_many_async(
+            AsyncLocationIQAdapter(session, api_key='dummy_key', base_url=base_url), coordinates, concurrency=25
+        )
+        return calendars, admin_levels
+
+    with app.app_context():
+        calendars, admin_levels = asyncio.run(_run_with_stub_server(test))
+
+    assert len(calendars) == 40
+    assert all(len(calendars[(f"grid_{i}.0_77.0", "1-1-3")]) == 365 for i in range(1, 40))
+    assert calendars[("grid_0.0_77.0", "2-0-1")] is None
+
+    assert len(admin_levels) == 201
+    assert admin_levels[0] == {'country_code': 'IN', 'admin_1_name': 'Uttar Pradesh', 'admin_2_name': 'Badaun',
+                               'admin_3_name': 'Town 10.0', 'display_name': 'Place 10.0, India'}
+    assert admin_levels[199]['admin_3_name'] == 'Town 29.0'
+    assert admin_levels[-1] == {"error": "Failed to connect to reverse geocoding service."}
+
+
+def test_prefetched_calendars_are_stored_in_one_bulk_upsert(app, db, fake_redis):
+    """Fetched calendars are upserted and written through to Redis; failed fetches are left for the next run."""
+    jobs = [("grid_1.0_77.0", "1-1-3", 1.0, 77.0), ("grid_2.0_77.0", "1-1-3", 2.0, 77.0), ("grid_0.0_77.0", "2-0-1", 0.0, 77.0)]
+
+    async def test(base_url, session, requests):
+        return await async_batch_service.fetch_yearly_calendars_async(AsyncAlAdhanAdapter(session, base_url=base_url), jobs, 2025)
+
+    with app.app_context():
+        calendars = asyncio.run(_run_with_stub_server(test))
+        changed = async_batch_service.store_yearly_calendars(calendars, 2025)
+        stored = {(row.zone_id, row.calculation_method) for row in PrayerZoneCalendar.query.filter_by(year=2025)}
+        unchanged = async_batch_service.store_yearly_calendars(calendars, 2025)
+
+    assert sorted(changed) == [("grid_1.0_77.0", 2025, "1-1-3"), ("grid_2.0_77.0", 2025, "1-1-3")]
+    assert stored == {("grid_1.0_77.0", "1-1-3"), ("grid_2.0_77.0", "1-1-3")}
+    assert unchanged == []
+    assert any(name == 'pipeline' for name, _ in fake_redis.calls)
@@ -0,0 +1,109 @@
+# backend/tests/test_auth.py
+
+import datetime
+import pytest
+from flask import g
+from project.models import User
+from project.services import identity_service, last_seen_service
+from project.utils.auth import _validate_token_and_get_user
+from project.utils.constants import Roles
+
+
+@pytest.fixture(autouse=True)
+def reset_last_seen_throttle():
+    last_seen_service._last_recorded_at.clear()
+
+
+# --- Write-behind last_seen_at ---
+
+def test_authenticated_request_does_not_write_last_seen(test_client, client_user_in_db, auth_headers_for_client, fake_redis):
+    """
+    An authenticated request only buffers the visit; last_seen_at is written by the flush.
+    """
+    test_client.get('/api/management/users', headers=auth_headers_for_client)
+
+    assert User.query.get(client_user_in_db.id).last_seen_at is None
+    assert fake_redis.hexists(last_seen_service.LAST_SEEN_BUFFER_KEY, client_user_in_db.id)
+
+    assert last_seen_service.flush_last_seen() == 1
+    assert User.query.get(client_user_in_db.id).last_seen_at is not None
+    assert not fake_redis.exists(last_seen_service.LAST_SEEN_BUFFER_KEY)
+
+def test_last_seen_touches_are_throttled_and_never_go_backwards(db, fake_redis):
+    """
+    Repeated touches within the minimum interval are dropped, and a flush never
+    replaces a newer stored last_seen_at with an older one.
+    """
+    newer = datetime.datetime(2030, 1, 1)
+    active = User(email='active@example.com')
+    fresh = User(email='fresh@example.com', last_seen_at=newer)
+    db.session.add_all([active, fresh])
+    db.session.commit()
+
+    first_visit = datetime.datetime(2026, 1, 1, 10, 0)
+    last_seen_service.record_last_seen(active.id, first_visit)
+    last_seen_service.record_last_seen(active.id, first_visit + datetime.timedelta(seconds=5))
+    last_seen_service.record_last_seen(fresh.id, first_visit)
+
+    assert last_seen_service.flush_last_seen() == 2
+    assert User.query.get(active.id).last_seen_at == first_visit
+    assert User.query.get(fresh.id).last_seen_at == newer
+
+# --- Identity cache ---
+
+def test_cached_identity_authenticates_without_queries(app, count_queries, client_user_in_db, auth_headers_for_client, fake_redis):
+    """
+    Once a subject's identity is cached, validating its token issues no SQL at all,
+    even after this process's LRU tier is dropped (Redis still has it).
+    """
+    def authenticate():
+        with app.test_request_context(headers=auth_headers_for_client):
+            success, _ = _validate_token_and_get_user()
+            return success, g.identity
+
+    (success, identity), first_queries = count_queries(authenticate)
+    assert success and first_queries > 0
+    assert identity.user_id == client_user_in_db.id
+
+    (success, _), cached_queries = count_queries(authenticate)
+    assert success and cached_queries == 0
+
+    identity_service.clear_local_identity_cache()
+    (success, _), redis_queries = count_queries(authenticate)
+    assert success and redis_queries == 0
+
+def test_role_change_invalidates_cached_identity(test_client, client_user_in_db, auth_headers_for_client, auth_headers_for_super_admin, fake_redis):
+    """
+    A client's cached identity is dropped when an admin promotes them, so the new
+    role's permissions apply on their very next request.
+    """
+    client_user = client_user_in_db
+    assert test_client.get('/api/management/users', headers=auth_headers_for_client).status_code == 403
+
+    response = test_client.post(f'/api/management/users/{client_user.id}/assign-role',
+                                headers=auth_headers_for_super_admin, json={"role": Roles.MANAGER})
+    assert response.status_code == 200
+
+    assert test_client.get('/api/management/users', headers=auth_headers_for_client).status_code == 200
+    assert User.query.get(client_user.id).has_permission('can_view_users')
+
+# --- Verified token cache ---
+
+def test_repeated_token_skips_signature_verification(app, client_user_in_db, auth_headers_for_client, fake_redis):
+    """
+    A token is verified (key lookup + jwt.decode) once per process; later requests
+    with the same token reuse the verified payload.
+    """
+    import jwt
+    from project.utils.auth import get_jwks_client
+
+    def authenticate():
+        with app.test_request_context(headers=auth_headers_for_client):
+            return _validate_token_and_get_user()[0]
+
+    assert authenticate()
+    assert authenticate()
+    assert authenticate()
+
+    assert jwt.decode.call_count == 1
+    assert get_jwks_client().get_signing_key_from_jwt.call_count == 1
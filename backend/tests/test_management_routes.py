@@ -183,4 +183,78 @@ def test_super_admin_cannot_demote_self(test_client, super_admin_user_in_db, aut
                                 headers=auth_headers_for_super_admin, 
                                 json={"role": Roles.MANAGER})
     assert response.status_code == 400
-    assert json.loads(response.data.decode('utf-8'))['error'] == "Super Admin cannot demote themselves."
\ No newline at end of file
+    assert json.loads(response.data.decode('utf-8'))['error'] == "Super Admin cannot demote themselves."
+
+# --- Test user listing pagination, filters and export ---
+
+@pytest.fixture(scope='function')
+def many_clients(db, manager_user_in_db):
+    """Five clients, the first three in Istanbul and seen recently."""
+    import datetime
+    recently = datetime.datetime(2030, 1, 1)
+    clients = [
+        User(email=f'client{i}@example.com', role=Roles.CLIENT,
+             default_city_name='Istanbul' if i < 3 else 'Karachi',
+             last_seen_at=recently if i < 3 else None)
+        for i in range(5)
+    ]
+    db.session.add_all(clients)
+    db.session.commit()
+    return clients
+
+def test_get_users_keyset_pagination(test_client, many_clients, auth_headers_for_manager, walk_keyset_pages):
+    """Pages follow the X-Next-Cursor header until it is absent."""
+    pages = walk_keyset_pages(test_client, '/api/management/users', auth_headers_for_manager, {'limit': 2, 'role': Roles.CLIENT})
+    assert [user['id'] for _, users in pages for user in users] == sorted(client.id for client in many_clients)
+
+def test_get_users_filters_and_projection(test_client, many_clients, auth_headers_for_manager):
+    response = test_client.get('/api/management/users', headers=auth_headers_for_manager, query_string={
+        'city': 'Istanbul', 'last_seen_after': '2029-12-31T00:00:00', 'columns': 'email,last_seen_at'
+    })
+    assert response.status_code == 200
+    users = json.loads(response.data)
+    assert [user['email'] for user in users] == ['client0@example.com', 'client1@example.com', 'client2@example.com']
+    assert set(users[0]) == {'id', 'email', 'last_seen_at'}
+
+    response = test_client.get('/api/management/users', headers=auth_headers_for_manager, query_string={'columns': 'password'})
+    assert response.status_code == 400
+
+def test_export_users_streams_ndjson(test_client, many_clients, auth_headers_for_manager):
+    response = test_client.get('/api/management/users/export', headers=auth_headers_for_manager,
+                               query_string={'city': 'Karachi', 'columns': 'email'})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+    assert [row['email'] for row in rows] == ['client3@example.com', 'client4@example.com']
+
+# --- System Health ---
+
+def test_system_health_serves_the_probed_snapshot_without_probing(test_client, app, super_admin_user_in_db,
+                                                                   auth_headers_for_super_admin, fake_redis, mocker):
+    from project.services import health_service
+    permission = Permission(name='can_view_system_health')
+    db.session.add(permission)
+    db.session.flush()
+    db.session.add(UserPermission(user_id=super_admin_user_in_db.id, permission_id=permission.id))
+    db.session.commit()
+
+    mocker.patch('project.services.health_service._probe_prayer_api', side_effect=RuntimeError("timeout"))
+    mock_inspect = mocker.patch('project.celery_utils.celery.control.inspect')
+    mock_inspect.return_value.ping.return_value = {'worker1@host': {'ok': 'pong'}}
+    with app.app_context():
+        health_service.run_health_probes()
+        health_service.run_health_probes()
+    # The worker ping is cached between probes.
+    assert mock_inspect.call_count == 1
+
+    mock_get = mocker.patch('project.services.health_service.requests.get')
+    response = test_client.get('/api/management/system-health', headers=auth_headers_for_super_admin)
+    assert response.status_code == 200
+    health = response.get_json()
+    mock_get.assert_not_called()
+    assert health['database'] == 'OK'
+    assert health['celery_workers'] == 'OK'
+    assert health['external_prayer_api'] == 'ERROR: timeout'
+    assert health['stale'] is False
+    assert health['latency_ms']['database']['samples'] == 2
+    assert health['latency_ms']['external_prayer_api']['failures'] == 2
@@ -113,4 +113,216 @@ def test_masjid_announcements(test_client, setup_community_features, mocker):
 
     # Verify client cannot create announcement
     response = test_client.post(f'/api/masjids/{masjid_user.id}/announcements', data=json.dumps(announcement_data), content_type='application/json')
-    assert response.status_code == 403
\ No newline at end of file
+    assert response.status_code == 403
+
+def _add_masjids_along_meridian(db, count):
+    """Creates `count` masjids spaced ~11km apart north of (0, 0)."""
+    masjids = []
+    for i in range(count):
+        masjid = User(email=f'masjid{i}@example.com', name=f'Masjid {i}', role='Masjid', default_latitude=0.1 * (i + 1), default_longitude=0.0)
+        db.session.add(masjid)
+        masjids.append(masjid)
+    db.session.commit()
+    return masjids
+
+def test_nearest_masjids_are_ordered_and_paginated(db):
+    """Test the k-nearest search returns masjids nearest first and pages through all of them with the cursor."""
+    from project.services.masjid_service import get_nearest_masjids
+    masjids = _add_masjids_along_meridian(db, 5)
+
+    first_page, cursor = get_nearest_masjids(0.0, 0.0, limit=2)
+    assert [m.id for m in first_page] == [masjids[0].id, masjids[1].id]
+    assert first_page[0].distance_km < first_page[1].distance_km
+    assert cursor is not None
+
+    second_page, cursor = get_nearest_masjids(0.0, 0.0, limit=2, cursor=cursor)
+    assert [m.id for m in second_page] == [masjids[2].id, masjids[3].id]
+
+    last_page, cursor = get_nearest_masjids(0.0, 0.0, limit=2, cursor=cursor)
+    assert [m.id for m in last_page] == [masjids[4].id]
+    assert cursor is None
+
+def test_search_masjids_by_location_respects_radius(test_client, db):
+    """Test the search endpoint only returns masjids within the radius, with their distance."""
+    masjids = _add_masjids_along_meridian(db, 5)
+
+    response = test_client.get('/api/masjids/?lat=0&lon=0&radius=25')
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert [m['id'] for m in data] == [masjids[0].id, masjids[1].id]
+    assert 'distance_km' in data[0]
+    assert 'X-Next-Cursor' not in response.headers
+
+def test_search_masjids_rejects_invalid_cursor(test_client, db):
+    """Test a malformed cursor is rejected."""
+    response = test_client.get('/api/masjids/?lat=0&lon=0&cursor=not-a-cursor')
+    assert response.status_code == 400
+
+def _reset_local_fcm():
+    """Gives the test a fresh in-memory FCM stand-in (the app fixture is session-wide)."""
+    from flask import current_app
+    from project.services import notification_service
+    current_app.extensions.pop('local_fcm', None)
+    return notification_service.get_push_service()
+
+def test_fcm_clients_share_one_interface():
+    """The local stand-in must accept every call notification_service makes on the Firebase client."""
+    import inspect
+    from project.services.third_party.firebase_fcm_service import FirebaseFCMService
+    from project.services.third_party.local_fcm_service import LocalFCMService
+
+    for method in ('send_multicast', 'send_to_topic', 'subscribe_to_topic', 'unsubscribe_from_topic'):
+        firebase_params = list(inspect.signature(getattr(FirebaseFCMService, method)).parameters)
+        local_params = list(inspect.signature(getattr(LocalFCMService, method)).parameters)
+        assert firebase_params == local_params, method
+
+def test_firebase_client_reports_http_v1_results(mocker):
+    """The Firebase client turns SDK responses into the per-token results notification_service reads."""
+    from firebase_admin import messaging
+    from project.services.third_party.firebase_fcm_service import FirebaseFCMService
+
+    batch = mocker.Mock(success_count=1, failure_count=1, responses=[
+        mocker.Mock(success=True, message_id='projects/p/messages/1', exception=None),
+        mocker.Mock(success=False, message_id=None, exception=messaging.UnregisteredError('Token is not registered.')),
+    ])
+    send = mocker.patch.object(messaging, 'send_each_for_multicast', return_value=batch)
+    mocker.patch.object(messaging, 'subscribe_to_topic', return_value=messaging.TopicManagementResponse(
+        {'results': [{}, {'error': 'INVALID_ARGUMENT'}]}
+    ))
+    client = FirebaseFCMService(firebase_app=None)
+
+    assert client.send_multicast(['token-a', 'token-b'], 'Title', 'Body', {'masjid_id': 7}) == {
+        'success': 1, 'failure': 1,
+        'results': [{'message_id': 'projects/p/messages/1'}, {'error': 'UNREGISTERED'}],
+    }
+    assert send.call_args.args[0].data == {'masjid_id': '7'}
+    assert client.subscribe_to_topic(['token-a', 'token-b'], 'masjid_7') == {
+        'success': 1, 'failure': 1, 'errors': [(1, 'INVALID_ARGUMENT')],
+    }
+
+def test_push_batch_drops_tokens_fcm_rejects(db):
+    """Test tokens FCM reports as no longer registered are deleted after a multicast send."""
+    from project.models import UserDevice
+    from project.services import notification_service
+    local_fcm = _reset_local_fcm()
+
+    user = User(email='devices@example.com', role='Client')
+    db.session.add(user)
+    db.session.commit()
+    db.session.add_all([UserDevice(user_id=user.id, device_token=f'token-{i}') for i in range(3)])
+    db.session.commit()
+    local_fcm.invalid_tokens.add('token-1')
+
+    summary = notification_service.send_push_to_device_tokens(['token-0', 'token-1', 'token-2'], 'Title', 'Body')
+
+    assert summary == {'success': 2, 'failure': 0, 'invalid_tokens_removed': 1}
+    assert sorted(device.device_token for device in UserDevice.query.all()) == ['token-0', 'token-2']
+
+def test_announcements_are_published_to_the_masjid_topic(db):
+    """Test following subscribes a user's devices to the masjid topic and an announcement is one topic message."""
+    from project.models import UserDevice
+    from project.services import masjid_service, notification_service
+    local_fcm = _reset_local_fcm()
+
+    masjid = User(email='topic-masjid@example.com', name='Topic Masjid', role='Masjid')
+    follower = User(email='topic-follower@example.com', role='Client')
+    db.session.add_all([masjid, follower])
+    db.session.commit()
+    db.session.add(UserDevice(user_id=follower.id, device_token='follower-phone'))
+    db.session.commit()
+    topic = notification_service.masjid_topic_name(masjid.id)
+
+    masjid_service.follow_masjid(follower, masjid)
+    assert local_fcm.topics[topic] == {'follower-phone'}
+
+    masjid_service.create_announcement(masjid, "Eid Prayer", "Eid prayer at 7 AM.")
+    assert len(local_fcm.sent_messages) == 1
+    assert local_fcm.sent_messages[0]['topic'] == topic
+    assert local_fcm.sent_messages[0]['recipients'] == {'follower-phone'}
+
+    masjid_service.unfollow_masjid(follower, masjid)
+    assert local_fcm.topics[topic] == set()
+
+def test_registered_devices_join_followed_masjid_topics(db):
+    """Test a newly registered device is subscribed to the topics of the masjids its user already follows."""
+    from project.models import UserDevice, MasjidTopicSubscription
+    from project.services import notification_service
+    local_fcm = _reset_local_fcm()
+
+    masjid = User(email='device-masjid@example.com', name='Device Masjid', role='Masjid')
+    follower = User(email='device-follower@example.com', role='Client')
+    db.session.add_all([masjid, follower])
+    db.session.commit()
+    db.session.add(UserMasjidFollow(user_id=follower.id, masjid_id=masjid.id))
+    db.session.commit()
+    topic = notification_service.masjid_topic_name(masjid.id)
+
+    notification_service.register_user_device(follower, 'fresh-phone', 'ios')
+    notification_service.register_user_device(follower, 'fresh-phone', 'ios')
+
+    assert local_fcm.topics[topic] == {'fresh-phone'}
+    assert UserDevice.query.filter_by(device_token='fresh-phone').one().user_id == follower.id
+    assert MasjidTopicSubscription.query.filter_by(device_token='fresh-phone').count() == 1
+    assert notification_service.reconcile_masjid_topic_subscriptions() == (0, 0)
+
+def test_topic_reconciliation_syncs_with_follow_tables(db):
+    """Test the reconciliation job subscribes missing devices and unsubscribes stale ones."""
+    from project.models import UserDevice, GuestProfile, MasjidTopicSubscription
+    from project.services import notification_service
+    local_fcm = _reset_local_fcm()
+
+    masjid = User(email='reconcile-masjid@example.com', name='Reconcile Masjid', role='Masjid')
+    follower = User(email='reconcile-follower@example.com', role='Client')
+    db.session.add_all([masjid, follower])
+    db.session.commit()
+    topic = notification_service.masjid_topic_name(masjid.id)
+
+    # Follows recorded without reaching FCM, plus a subscription whose device no longer exists
+    db.session.add(UserMasjidFollow(user_id=follower.id, masjid_id=masjid.id))
+    db.session.add(UserDevice(user_id=follower.id, device_token='new-phone'))
+    db.session.add(GuestProfile(device_id='guest-device', followed_masjid_id=masjid.id, fcm_token='guest-phone'))
+    db.session.add(MasjidTopicSubscription(device_token='old-phone', masjid_id=masjid.id))
+    db.session.commit()
+    local_fcm.topics[topic] = {'old-phone'}
+
+    assert notification_service.reconcile_masjid_topic_subscriptions() == (2, 1)
+    assert local_fcm.topics[topic] == {'new-phone', 'guest-phone'}
+    assert notification_service.reconcile_masjid_topic_subscriptions() == (0, 0)
+
+
+def test_static_publisher_writes_content_addressed_tree(db, setup_community_features, tmp_path, mocker):
+    """Schedules and zone calendars are published once under their hash, with per-owner and per-zone manifests."""
+    import hashlib
+    from project.models import MonthlyScheduleCache, PrayerZoneCalendar
+    from project.services.static_publisher_service import FileSystemStore, publish_changed_since
+
+    client_user, masjid_user = setup_community_features
+    script = json.dumps({"owner_id": masjid_user.id, "script": [[0, 1]]})
+    script_hash = hashlib.sha256(script.encode('utf-8')).hexdigest()
+    calendar = [{'date': '01-01-2031', 'timings': {'Fajr': '05:00 (IST)'}}]
+    db.session.add_all([
+        MonthlyScheduleCache(owner_id=masjid_user.id, year=2031, month=1, version=2, schedule_script=script, script_hash=script_hash),
+        MonthlyScheduleCache(owner_id=client_user.id, year=2031, month=1, version=1, schedule_script='{}', script_hash='personal'),
+        PrayerZoneCalendar(zone_id='IN_UP_BADAUN', year=2031, calculation_method='1-0-1', calendar_data=calendar),
+        PrayerZoneCalendar(zone_id='IN_UP_BADAUN_BISAULI', year=2031, calculation_method='1-0-1', calendar_data=calendar),
+    ])
+    db.session.commit()
+
+    store = FileSystemStore(str(tmp_path))
+    first = publish_changed_since(None, store)
+    second = publish_changed_since(None, store)
+
+    # One schedule and one calendar shared by both zones; nothing is rewritten the second time.
+    assert (first.manifests, first.documents_written, first.documents_skipped) == (3, 2, 1)
+    assert (second.documents_written, second.documents_skipped) == (0, 3)
+
+    manifest = json.loads((tmp_path / f"owners/{masjid_user.id}/manifest.json").read_text())
+    assert manifest["months"]["2031-01"] == {"version": 2, "hash": script_hash, "path": f"schedules/{script_hash}.json"}
+    assert (tmp_path / manifest["months"]["2031-01"]["path"]).read_text() == script
+    # Individual users' schedules are personal and not published.
+    assert not (tmp_path / f"owners/{client_user.id}").exists()
+
+    zone_manifest = json.loads((tmp_path / "zones/IN_UP_BADAUN_BISAULI/1-0-1/manifest.json").read_text())
+    days = json.loads((tmp_path / zone_manifest["years"]["2031"]["path"]).read_text())
+    assert zone_manifest["columns"][:3] == ["date", "Imsak", "Fajr"]
+    assert days == [["01-01-2031", "", "05:00", "", "", "", "", ""]]
@@ -36,8 +36,8 @@ def test_initial_data_on_thursday(mocker, test_client):
         }
     }
     mocker.patch(
-        'project.routes.api_routes.get_api_prayer_times_for_date_from_service',
-        side_effect=[mock_times, mock_times, mock_times]
+        'project.routes.api_routes.get_api_prayer_times_for_dates_from_service',
+        return_value=[mock_times, mock_times, mock_times]
     )
 
     mocker.patch(
@@ -97,8 +97,8 @@ def test_initial_data_on_friday(mocker, test_client):
         }
     }
     mocker.patch(
-        'project.routes.api_routes.get_api_prayer_times_for_date_from_service',
-        side_effect=[mock_times, mock_times, mock_times]
+        'project.routes.api_routes.get_api_prayer_times_for_dates_from_service',
+        return_value=[mock_times, mock_times, mock_times]
     )
     mocker.patch(
         'project.routes.api_routes.get_current_prayer_period_from_service',
@@ -154,8 +154,8 @@ def test_initial_data_on_normal_day(mocker, test_client):
         }
     }
     mocker.patch(
-        'project.routes.api_routes.get_api_prayer_times_for_date_from_service',
-        side_effect=[mock_times, mock_times, mock_times]
+        'project.routes.api_routes.get_api_prayer_times_for_dates_from_service',
+        return_value=[mock_times, mock_times, mock_times]
     )
     mocker.patch(
         'project.routes.api_routes.get_current_prayer_period_from_service',
@@ -1,10 +1,18 @@
 # backend/tests/test_prayer_service.py
 
+import json
+
 import pytest
 from datetime import date, timedelta
 from unittest.mock import patch, MagicMock
 
-from project.services.prayer_time_service import _get_zone_id_from_coords, get_api_prayer_times_for_date_from_service
+from project.services.prayer_time_service import get_api_prayer_times_for_date_from_service
+from project.services.prayer_time.zone_resolver import get_zone_id_from_coords as _get_zone_id_from_coords
+
+
+@pytest.fixture(scope='session')
+def app(service_app):
+    return service_app
 
 
 def test_get_zone_id_from_coords(app):
@@ -94,4 +102,273 @@ def test_calculate_zohwa_e_kubra_times(mock_datetime, app):
     # Assert Zohwa-e-Kubra End Time: Midpoint of Sunrise (06:00) and Sunset (18:00)
     # Duration = 12 hours (720 minutes). Midpoint = 6 hours (360 minutes) after 06:00.
     # 06:00 + 6h = 12:00
-    assert calculated_times["zohwa_kubra"]["end"] == "12:00"
\ No newline at end of file
+    assert calculated_times["zohwa_kubra"]["end"] == "12:00"
+
+def test_settings_snapshot_is_hashable_and_drives_calculation(app):
+    """
+    A PrayerSettingsSnapshot pre-parses fixed times into minutes, compares by value
+    (ignoring the row it came from) and yields the same display times as the ORM row.
+    """
+    from project.models import User, UserSettings
+    from project.services.prayer_time.settings_snapshot import PrayerSettingsSnapshot
+    from project.services.prayer_time.timing_calculator import calculate_display_times_from_service
+
+    def make_settings(settings_id):
+        return UserSettings(
+            id=settings_id, threshold_minutes=0,
+            fajr_is_fixed=True, fajr_fixed_azan="05:10", fajr_fixed_jamaat="05:25",
+            dhuhr_is_fixed=False, dhuhr_azan_offset=10, dhuhr_jamaat_offset=15,
+        )
+
+    settings = make_settings(1)
+    snapshot = PrayerSettingsSnapshot.from_settings(settings)
+    assert (snapshot.fajr.fixed_azan, snapshot.fajr.fixed_jamaat) == (310, 325)
+    assert (snapshot.dhuhr.azan_offset, snapshot.dhuhr.jamaat_offset) == (10, 15)
+
+    other_row = PrayerSettingsSnapshot.from_settings(make_settings(2))
+    assert snapshot == other_row and hash(snapshot) == hash(other_row)
+    assert {snapshot: 'cached'}[other_row] == 'cached'
+
+    # Calculation IDs come from the stored names, the method from the owning user.
+    assert (snapshot.calculation_method_id, snapshot.asr_juristic_id, snapshot.high_latitude_method_id) == (3, 0, 1)
+    hanafi = UserSettings(user=User(default_calculation_method='Karachi'), asr_juristic='Hanafi', high_latitude_method='OneSeventh')
+    hanafi = PrayerSettingsSnapshot.from_settings(hanafi)
+    assert (hanafi.calculation_method_id, hanafi.asr_juristic_id, hanafi.high_latitude_method_id) == (1, 1, 2)
+    # Names the API does not know fall back to the defaults instead of failing the request.
+    unknown = UserSettings(user=User(default_calculation_method='Gulf'), asr_juristic='Maliki', high_latitude_method='Nearest')
+    with app.app_context():
+        unknown = PrayerSettingsSnapshot.from_settings(unknown)
+    assert (unknown.calculation_method_id, unknown.asr_juristic_id, unknown.high_latitude_method_id) == (3, 0, 1)
+
+    api_times_today = {"Fajr": "05:00", "Sunrise": "06:30", "Dhuhr": "13:00", "Asr": "17:00",
+                       "Maghrib": "18:45", "Isha": "20:00", "Imsak": "04:50"}
+    api_times_tomorrow = {"Fajr": "05:01"}
+    with app.app_context():
+        from_row = calculate_display_times_from_service(settings, api_times_today, api_times_tomorrow, {}, date(2025, 8, 10))
+        from_snapshot = calculate_display_times_from_service(snapshot, api_times_today, api_times_tomorrow, {}, date(2025, 8, 10))
+
+    assert from_row == from_snapshot
+    display_times = from_snapshot[0]
+    assert display_times["fajr"] == {"azan": "05:10", "jamaat": "05:25"}
+    assert display_times["dhuhr"] == {"azan": "13:10", "jamaat": "13:25"}
+
+
+def test_time_arithmetic_in_integer_minutes(app):
+    """Times parse to integers (tolerating AlAdhan's timezone suffix) and only become strings when formatted."""
+    from project.services.prayer_time.time_arithmetic import parse_seconds, parse_minutes, format_minutes, add_minutes
+    from project.services.prayer_time.timing_calculator import apply_boundary_check
+
+    with app.app_context():
+        assert parse_minutes("05:12") == 312
+        assert parse_minutes("05:12 (IST)") == 312
+        assert parse_seconds("13:05:30") == 13 * 3600 + 5 * 60 + 30
+        assert parse_minutes("N/A") is None
+        assert parse_minutes("25:00") is None
+        assert parse_minutes("not a time") is None
+
+        assert add_minutes(23 * 60 + 50, 15) == 5 # Wraps past midnight
+        assert format_minutes(add_minutes(312, 15)) == "05:27"
+        assert format_minutes(None) == "N/A"
+
+        # Too close to the end of the period: clamped to 8 minutes before it ends.
+        clamped, warning = apply_boundary_check(parse_minutes("06:25"), parse_minutes("05:00"), parse_minutes("06:30"), "Fajr", "Jamaat")
+        assert format_minutes(clamped) == "06:22" and warning
+        # Before the period starts: moved to its start.
+        clamped, warning = apply_boundary_check(parse_minutes("04:50"), parse_minutes("05:00"), parse_minutes("06:30"), "Fajr", "Azan")
+        assert clamped == 300 and warning
+
+
+def test_cache_metrics_have_bounded_labels_and_zone_detail_goes_to_redis(app, db, fake_redis):
+    """Cache metrics are labelled by tier/result/zone kind only; per-zone counts land in Redis."""
+    from prometheus_client import REGISTRY
+    from project.metrics import CACHE_LOOKUPS_TOTAL
+    from project.services import zone_stats_service
+    from project.services.prayer_time import cache_layer
+    from project.services.prayer_time.zone_resolver import get_zone_kind
+
+    admin_levels = {'country_code': 'in', 'admin_1_name': 'Uttar Pradesh', 'admin_2_name': 'Badaun', 'admin_3_name': 'Bisauli'}
+    assert get_zone_kind('IN_UTTAR_PRADESH_BADAUN_BISAULI', admin_levels) == 'admin3'
+    assert get_zone_kind('IN_UTTAR_PRADESH_BADAUN', admin_levels) == 'admin2'
+    assert get_zone_kind('grid_19.2_72.8', None) == 'grid'
+
+    lookups = [('grid_19.2_72.8', 'grid')] * 3 + [('IN_UTTAR_PRADESH_BADAUN', 'admin2')]
+    with app.app_context(), patch.object(cache_layer, '_cache_get_json', return_value=None):
+        grid_misses = {'cache_type': 'yearly', 'tier': 'db', 'result': 'miss', 'zone_kind': 'grid'}
+        misses_before = REGISTRY.get_sample_value('noortime_cache_lookups_total', grid_misses) or 0
+        for zone_id, zone_kind in lookups:
+            assert cache_layer.get_yearly_calendar_from_cache(zone_id, 2030, '1-0-1', zone_kind) is None
+        misses_after = REGISTRY.get_sample_value('noortime_cache_lookups_total', grid_misses)
+
+        report = zone_stats_service.get_top_zones(days=1, limit=1)
+
+    assert misses_after - misses_before == 3
+    assert all(set(sample.labels) == set(grid_misses) for metric in CACHE_LOOKUPS_TOTAL.collect() for sample in metric.samples)
+    assert report['distinct_zones'] == 2
+    assert report['top_zones'] == [{'zone_id': 'grid_19.2_72.8', 'lookups': 3, 'misses': 3}]
+
+
+def test_zone_registry_drives_next_year_prefetch(app, db, mocker):
+    """Resolved zones are registered with their coordinates, and the prefetch query returns those lacking a calendar."""
+    from project.models import Zone, PrayerZoneCalendar
+    from project.services import zone_registry_service
+    from project.services.zone_registry_service import register_zone_request, zones_missing_calendar
+
+    zone_registry_service._pending_requests.clear()
+    with app.app_context():
+        for _ in range(3):
+            register_zone_request('IN_UP_BADAUN_BISAULI', 'admin3', 28.3, 78.9, '1-0-1',
+                                  admin_path='IN/Uttar Pradesh/Badaun/Bisauli', parent_zone_id='IN_UP_BADAUN')
+        register_zone_request('grid_19.2_72.8', 'grid', 19.3, 72.9, '1-0-1')
+        register_zone_request('grid_19.2_72.8', 'grid', 19.3, 72.9, '2-1-1')
+        db.session.add(PrayerZoneCalendar(zone_id='grid_19.2_72.8', year=2031, calculation_method='1-0-1', calendar_data=[]))
+        db.session.commit()
+
+        zone = db.session.get(Zone, 'IN_UP_BADAUN_BISAULI')
+        # Only the first request in the throttle interval is written.
+        assert (zone.latitude, zone.longitude, zone.parent_zone_id, zone.request_count) == (28.3, 78.9, 'IN_UP_BADAUN', 1)
+
+        missing = [tuple(row) for row in zones_missing_calendar(2031)]
+        assert missing == [('IN_UP_BADAUN_BISAULI', '1-0-1', 28.3, 78.9), ('grid_19.2_72.8', '2-1-1', 19.3, 72.9)]
+
+        # Once the throttle interval has passed, the pending requests are folded into one update.
+        mocker.patch.dict(app.config, {'ZONE_REGISTRY_MIN_UPDATE_INTERVAL_SECONDS': 0})
+        register_zone_request('IN_UP_BADAUN_BISAULI', 'admin3', 10.0, 10.0, '1-0-1')
+        db.session.refresh(zone)
+        assert (zone.latitude, zone.request_count) == (28.3, 4)
+
+
+def test_daily_prefetch_catches_up_zones_registered_after_their_bucket(app, db, mocker):
+    """A zone whose bucket day has already passed this year is fetched by the next daily run."""
+    from project import tasks
+    from project.services import prefetch_service, zone_registry_service
+    from project.services.zone_registry_service import prefetch_bucket_for, register_zone_request
+
+    zone_registry_service._pending_requests.clear()
+    late_bucket = prefetch_bucket_for('grid_19.2_72.8', '1-0-1')
+    prefetch = mocker.patch.object(prefetch_service, 'prefetch_calendars', return_value=MagicMock(succeeded=1, failed=0, skipped=0))
+    with app.app_context():
+        register_zone_request('grid_19.2_72.8', 'grid', 19.3, 72.9, '1-0-1')
+
+        # The zone was registered after its bucket's day: a later run still picks it up.
+        mocker.patch.object(zone_registry_service, 'todays_prefetch_bucket', return_value=late_bucket + 1)
+        tasks.proactive_yearly_calendar_fetcher()
+        jobs = prefetch.call_args.args[0]
+        assert [tuple(job) for job in jobs] == [('grid_19.2_72.8', '1-0-1', 19.3, 72.9)]
+
+        # Buckets still ahead of today wait for their day.
+        mocker.patch.object(zone_registry_service, 'todays_prefetch_bucket', return_value=late_bucket - 1)
+        tasks.proactive_yearly_calendar_fetcher()
+        assert prefetch.call_args.args[0] == []
+
+
+def test_token_bucket_limits_rate_after_burst():
+    from project.services.prefetch_service import TokenBucket
+
+    now = [0.0]
+    def sleep(seconds):
+        now[0] += seconds
+
+    bucket = TokenBucket(rate=2.0, capacity=3, clock=lambda: now[0], sleep=sleep)
+    for _ in range(7):
+        bucket.acquire()
+    # Three tokens are available at once; the other four are refilled at two per second.
+    assert now[0] == pytest.approx(2.0)
+
+
+def test_prefetch_engine_checkpoints_and_resumes(app, mocker, fake_redis):
+    """A resumed run skips the pairs the interrupted run completed and retries the failed ones."""
+    from project.services import prefetch_service
+
+    mocker.patch.dict(app.config, {'PREFETCH_RATE_PER_SECOND': 1000.0, 'PREFETCH_BURST': 100})
+    jobs = [(f'grid_{i}_0', '1-0-1', float(i), 0.0) for i in range(6)]
+    fetched = []
+    def flaky_fetch(zone_id, **kwargs):
+        fetched.append(zone_id)
+        if zone_id == 'grid_3_0' and fetched.count(zone_id) == 1:
+            raise RuntimeError("upstream 500")
+        return [{'day': 1}]
+
+    with app.app_context():
+        first = prefetch_service.prefetch_calendars(jobs, 2031, run_id='test-run', fetch=flaky_fetch)
+        second = prefetch_service.prefetch_calendars(jobs, 2031, run_id='test-run', fetch=flaky_fetch)
+
+    assert (first.succeeded, first.failed, first.skipped) == (5, 1, 0)
+    assert (second.succeeded, second.failed, second.skipped) == (1, 0, 5)
+    assert sorted(fetched) == sorted([job[0] for job in jobs] + ['grid_3_0'])
+
+
+def test_bulk_upsert_skips_unchanged_calendars_and_invalidates_changed_ones(app, db, fake_redis):
+    """Only inserted or re-hashed calendars are written, and written through to Redis."""
+    from project.models import PrayerZoneCalendar
+    from project.services.prayer_time import cache_layer
+    from project.services.prayer_time.data_processor import bulk_upsert_yearly_calendars, make_calendar_row
+
+    old, new = [{'date': '01-01-2031', 'timings': {'Fajr': '05:00'}}], [{'date': '01-01-2031', 'timings': {'Fajr': '05:01'}}]
+
+    def row(zone_id, data):
+        return make_calendar_row(zone_id, 2031, '1-0-1', data)
+
+    with app.app_context():
+        assert len(bulk_upsert_yearly_calendars([row('zone_a', old), row('zone_b', old), row('zone_c', old)])) == 3
+        fake_redis.flushall()
+        fake_redis.calls.clear()
+
+        changed = bulk_upsert_yearly_calendars([row('zone_a', old), row('zone_b', new), row('zone_d', new)])
+
+        assert sorted(changed) == [('zone_b', 2031, '1-0-1'), ('zone_d', 2031, '1-0-1')]
+        assert db.session.get(PrayerZoneCalendar, ('zone_b', 2031, '1-0-1')).calendar_data == new
+        assert db.session.get(PrayerZoneCalendar, ('zone_a', 2031, '1-0-1')).calendar_data == old
+        assert sorted(fake_redis.keys()) == [b'calendar:v1:zone_b:2031:1-0-1', b'calendar:v1:zone_d:2031:1-0-1']
+        assert json.loads(fake_redis.get('calendar:v1:zone_b:2031:1-0-1')) == new
+        # The writes and the invalidation message go out in one pipeline.
+        [(name, commands)] = fake_redis.calls[:1]
+        assert name == 'pipeline'
+        assert [args[0] for command, args in commands if command == 'publish'] == [cache_layer.CALENDAR_INVALIDATION_CHANNEL]
+
+
+def test_calendar_hash_ignores_metadata_but_not_timings():
+    """Hijri labels, timezone suffixes and unused timings do not change the hash; a prayer time does."""
+    from project.services.prayer_time.data_processor import calculate_calendar_hash
+
+    def day(fajr, tz='IST', hijri='01-07-1452', midnight='00:10'):
+        return {'date': {'gregorian': {'date': '01-01-2031'}, 'hijri': {'date': hijri}},
+                'timings': {'Fajr': f'{fajr} ({tz})', 'Dhuhr': f'12:30 ({tz})', 'Midnight': midnight}}
+
+    base = calculate_calendar_hash([day('05:00')])
+    assert calculate_calendar_hash([day('05:00', tz='+0530', hijri='02-07-1452', midnight='00:11')]) == base
+    assert calculate_calendar_hash([{'date': '01-01-2031', 'timings': {'Fajr': '05:00', 'Dhuhr': '12:30'}}]) == base
+    assert calculate_calendar_hash([day('05:01')]) != base
+
+
+def test_prayer_times_for_several_dates_share_one_redis_round_trip_each_way(app, db, mocker, fake_redis):
+    """Alias, calendar and daily keys are read with one MGET, and writes go back in one pipeline at teardown."""
+    import datetime
+    from flask import request
+    from prometheus_client import REGISTRY
+    from project.services import prayer_time_service, zone_stats_service
+    from project.services.prayer_time import zone_resolver
+
+    admin_levels = {'country_code': 'in', 'admin_1_name': 'Uttar Pradesh', 'admin_2_name': 'Badaun', 'admin_3_name': 'Bisauli'}
+    days = [date(2030, 12, 1) + timedelta(days=i) for i in range(3)]
+    calendar = [{'date': {'gregorian': {'date': day.strftime('%d-%m-%Y')}}, 'timings': {'Fajr': '05:00'}} for day in days]
+    fake_redis.mset({
+        'alias:IN_UTTAR_PRADESH_BADAUN_BISAULI:1-0-1': 'IN_UTTAR_PRADESH_BADAUN',
+        'calendar:v1:IN_UTTAR_PRADESH_BADAUN:2030:1-0-1': json.dumps(calendar),
+    })
+    fake_redis.calls.clear()
+    mocker.patch.object(prayer_time_service, 'get_admin_levels_from_coords', return_value=admin_levels)
+    mocker.patch.object(zone_resolver, 'register_zone_request')
+
+    with app.test_request_context('/api/initial_prayer_data'):
+        results = prayer_time_service.get_api_prayer_times_for_dates_from_service(days, 28.6, 77.2, 1, 0, 1)
+        # The alias, plus a calendar and three daily keys for each candidate zone (admin_3, admin_2, grid).
+        assert [(name, len(args)) for name, args in fake_redis.calls] == [('mget', 13)]
+        labels = {'endpoint': request.endpoint or 'unknown'}
+        round_trips_before = REGISTRY.get_sample_value('noortime_redis_round_trips_per_request_sum', labels) or 0
+
+    assert [day['timings']['Fajr'] for day in results] == ['05:00', '05:00', '05:00']
+    # The zone statistics of all three lookups are written back after the request, in one pipeline.
+    assert [(name, len(args)) for name, args in fake_redis.calls] == [('mget', 13), ('pipeline', 12)]
+    lookups_key = zone_stats_service.ZONE_LOOKUPS_KEY.format(day=datetime.datetime.utcnow().strftime('%Y%m%d'))
+    assert fake_redis.zrange(lookups_key, 0, -1, withscores=True) == [(b'IN_UTTAR_PRADESH_BADAUN', 3.0)]
+    assert REGISTRY.get_sample_value('noortime_redis_round_trips_per_request_sum', labels) - round_trips_before == 2
@@ -0,0 +1,183 @@
+# backend/tests/test_schedule_service.py
+
+import calendar
+import datetime
+import json
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from project.models import UserSettings
+from project.services import schedule_service
+from project.services.prayer_time.timezones import get_zone_info, local_to_utc_epoch, offset_table
+from project.services.schedule_service import (
+    STATE_IDLE, STATE_JAMAAT, STATE_POST_JAMAAT, STATE_PRE_JAMAAT, decode_script,
+)
+
+
+@pytest.fixture(scope='session')
+def app(service_app):
+    return service_app
+
+DISPLAY_TIMES = {
+    'fajr': {'azan': '05:00', 'jamaat': '05:30'},
+    'dhuhr': {'azan': '13:00', 'jamaat': '13:30'},
+    'asr': {'azan': '17:00', 'jamaat': '17:30'},
+    'maghrib': {'azan': '19:00', 'jamaat': '19:05'},
+    # Within Maghrib's post-Jamaat window, which is cut short rather than overlapping it.
+    'isha': {'azan': '19:10', 'jamaat': '19:15'},
+    'jummah': {'azan': '13:00', 'jamaat': '13:45'},
+}
+
+
+def _generate(mocker, year, month, settings=None):
+    mocker.patch.object(schedule_service, 'get_api_prayer_times_for_date_from_service',
+                        return_value={'timings': {'Fajr': '05:00'}})
+    mocker.patch.object(schedule_service, 'calculate_display_times_from_service',
+                        return_value=(DISPLAY_TIMES, None, []))
+    owner = SimpleNamespace(id=1, default_latitude=28.6, default_longitude=77.2, settings=None)
+    return schedule_service._generate_schedule_for_owner(owner, year, month, settings=settings or UserSettings())
+
+
+def _epoch(*args):
+    return calendar.timegm(datetime.datetime(*args).timetuple())
+
+
+def test_directors_script_encodes_jamaat_state_transitions(app, mocker):
+    """Each Jamaat becomes alert, Jamaat, post-Jamaat and idle transitions, delta-encoded from the month start."""
+    with app.app_context():
+        schedule = _generate(mocker, 2031, 1)
+
+    script = schedule['script']
+    assert script['timezone'] == 'UTC'
+    assert script['base'] == _epoch(2031, 1, 1)
+    transitions = list(decode_script(script))
+    # 2031-01-01 is a Wednesday: five Jamaats, with Isha's alert cutting Maghrib's info window short.
+    assert transitions[:13] == [
+        (_epoch(2031, 1, 1, 5, 28), STATE_PRE_JAMAAT, 'Fajr'),
+        (_epoch(2031, 1, 1, 5, 30), STATE_JAMAAT, 'Fajr'),
+        (_epoch(2031, 1, 1, 5, 35), STATE_POST_JAMAAT, 'Fajr'),
+        (_epoch(2031, 1, 1, 5, 45), STATE_IDLE, None),
+        (_epoch(2031, 1, 1, 13, 28), STATE_PRE_JAMAAT, 'Dhuhr'),
+        (_epoch(2031, 1, 1, 13, 30), STATE_JAMAAT, 'Dhuhr'),
+        (_epoch(2031, 1, 1, 13, 35), STATE_POST_JAMAAT, 'Dhuhr'),
+        (_epoch(2031, 1, 1, 13, 45), STATE_IDLE, None),
+        (_epoch(2031, 1, 1, 17, 28), STATE_PRE_JAMAAT, 'Asr'),
+        (_epoch(2031, 1, 1, 17, 30), STATE_JAMAAT, 'Asr'),
+        (_epoch(2031, 1, 1, 17, 35), STATE_POST_JAMAAT, 'Asr'),
+        (_epoch(2031, 1, 1, 17, 45), STATE_IDLE, None),
+        (_epoch(2031, 1, 1, 19, 3), STATE_PRE_JAMAAT, 'Maghrib'),
+    ]
+    assert transitions[13:19] == [
+        (_epoch(2031, 1, 1, 19, 5), STATE_JAMAAT, 'Maghrib'),
+        (_epoch(2031, 1, 1, 19, 10), STATE_POST_JAMAAT, 'Maghrib'),
+        (_epoch(2031, 1, 1, 19, 13), STATE_PRE_JAMAAT, 'Isha'),
+        (_epoch(2031, 1, 1, 19, 15), STATE_JAMAAT, 'Isha'),
+        (_epoch(2031, 1, 1, 19, 20), STATE_POST_JAMAAT, 'Isha'),
+        (_epoch(2031, 1, 1, 19, 30), STATE_IDLE, None),
+    ]
+    # Fridays have Jummah instead of Dhuhr.
+    friday = [prayer for epoch, state, prayer in transitions
+              if state == STATE_JAMAAT and _epoch(2031, 1, 3) <= epoch < _epoch(2031, 1, 4)]
+    assert friday == ['Fajr', 'Jummah', 'Asr', 'Maghrib', 'Isha']
+
+    epochs = [epoch for epoch, _, _ in transitions]
+    assert epochs == sorted(set(epochs))
+    assert len(transitions) == 31 * 19
+    # Two small integers per transition keep a month to a few KB.
+    assert len(json.dumps(script, separators=(',', ':'))) < 6 * 1024
+
+
+def test_wall_clock_conversion_matches_zoneinfo_across_dst_gap_and_overlap():
+    """Offset tables give datetime's fold=0 answers: gap times move forward, repeated times resolve first."""
+    new_york = 'America/New_York'
+    # 2031-03-09 02:00 EST jumps to 03:00 EDT; 2031-11-02 02:00 EDT falls back to 01:00 EST.
+    assert local_to_utc_epoch(datetime.datetime(2031, 3, 9, 1, 59), new_york) == _epoch(2031, 3, 9, 6, 59)
+    assert local_to_utc_epoch(datetime.datetime(2031, 3, 9, 2, 30), new_york) == _epoch(2031, 3, 9, 7, 30)
+    assert local_to_utc_epoch(datetime.datetime(2031, 3, 9, 3, 0), new_york) == _epoch(2031, 3, 9, 7, 0)
+    assert local_to_utc_epoch(datetime.datetime(2031, 11, 2, 1, 30), new_york) == _epoch(2031, 11, 2, 5, 30)
+    assert local_to_utc_epoch(datetime.datetime(2031, 11, 2, 2, 0), new_york) == _epoch(2031, 11, 2, 7, 0)
+    assert offset_table(new_york, 2031).offsets == (-18000, -14400, -18000)
+    assert get_zone_info(new_york) is get_zone_info(new_york)
+
+    # Every 10 minutes of a leap year, including a 30-minute DST shift and a zone without DST.
+    for name in (new_york, 'Europe/London', 'Australia/Lord_Howe', 'Asia/Kolkata'):
+        zone = ZoneInfo(name)
+        moment = datetime.datetime(2024, 1, 1)
+        while moment.year == 2024:
+            assert local_to_utc_epoch(moment, name) == int(moment.replace(tzinfo=zone).timestamp()), (name, moment)
+            moment += datetime.timedelta(minutes=10)
+
+
+def test_directors_script_uses_utc_instants_across_dst_changes(app, mocker):
+    """Jamaats keep their wall-clock times on DST change days, so their UTC instants shift by the change."""
+    with app.app_context():
+        march = _generate(mocker, 2031, 3, settings=UserSettings(timezone='America/New_York'))['script']
+        november = _generate(mocker, 2031, 11, settings=UserSettings(timezone='America/New_York'))['script']
+        unknown = _generate(mocker, 2031, 3, settings=UserSettings(timezone='Mars/Olympus_Mons'))
+
+    assert march['timezone'] == 'America/New_York'
+    assert march['base'] == _epoch(2031, 3, 1, 5)
+    fajr = [epoch for epoch, state, prayer in decode_script(march) if state == STATE_JAMAAT and prayer == 'Fajr']
+    assert fajr[7] == _epoch(2031, 3, 8, 10, 30)   # 05:30 EST
+    assert fajr[8] == _epoch(2031, 3, 9, 9, 30)    # 05:30 EDT, 23 hours later
+    assert fajr[9] - fajr[8] == 86400
+
+    fajr = [epoch for epoch, state, prayer in decode_script(november) if state == STATE_JAMAAT and prayer == 'Fajr']
+    assert november['base'] == _epoch(2031, 11, 1, 4)
+    assert fajr[1] - fajr[0] == 25 * 3600
+
+    assert unknown['script']['timezone'] == 'UTC'
+    assert unknown['warnings'] == ["Unknown timezone 'Mars/Olympus_Mons'; schedule times are in UTC."]
+
+
+def test_fridays_get_jummah_from_the_real_calculator(app, mocker):
+    """Jummah times come from the settings' Jummah rule; without a Jummah Jamaat, Fridays keep Dhuhr."""
+    mocker.patch.object(schedule_service, 'get_api_prayer_times_for_date_from_service', return_value={'timings': {
+        'Fajr': '05:00', 'Sunrise': '06:30', 'Dhuhr': '12:30', 'Asr': '15:45', 'Maghrib': '18:00', 'Isha': '19:30',
+    }})
+    offsets = {f'{prayer}_{kind}_offset': 10 for prayer in ('fajr', 'dhuhr', 'asr', 'maghrib', 'isha') for kind in ('azan', 'jamaat')}
+    owner = SimpleNamespace(id=1, default_latitude=28.6, default_longitude=77.2, settings=None)
+
+    def friday_midday_jamaats(**jummah):
+        settings = UserSettings(threshold_minutes=5, **offsets, **jummah)
+        with app.app_context():
+            script = schedule_service._generate_schedule_for_owner(owner, 2031, 1, settings=settings)['script']
+        return [(epoch, prayer) for epoch, state, prayer in decode_script(script)
+                if state == STATE_JAMAAT and prayer in ('Dhuhr', 'Jummah')
+                and _epoch(2031, 1, 2) <= epoch < _epoch(2031, 1, 4)]
+
+    # Azan 15 minutes after Dhuhr starts, Jamaat 30 minutes after the Azan.
+    jamaats = friday_midday_jamaats(jummah_is_fixed=False, jummah_azan_offset=15, jummah_khutbah_offset=15, jummah_jamaat_offset=30)
+    assert jamaats == [(_epoch(2031, 1, 2, 12, 50), 'Dhuhr'), (_epoch(2031, 1, 3, 13, 15), 'Jummah')]
+
+    jamaats = friday_midday_jamaats(jummah_is_fixed=True, jummah_jamaat_time=None)
+    assert jamaats == [(_epoch(2031, 1, 2, 12, 50), 'Dhuhr'), (_epoch(2031, 1, 3, 12, 50), 'Dhuhr')]
+
+
+def test_schedule_range_generates_one_month_inline_and_queues_the_rest(app, db, mocker):
+    """A range with several uncached months generates only the first; the others are queued and listed as pending."""
+    from project.models import User
+    from project import tasks
+
+    user = User(supabase_user_id='range-user', email='range@example.com', role='Client')
+    db.session.add(user)
+    db.session.commit()
+    schedule_service._save_schedule_to_cache(user.id, 2031, 1, {"script": ["cached"]})
+    generate = mocker.patch.object(schedule_service, '_generate_schedule_for_owner', return_value={"script": ["new"]})
+    delay = mocker.patch.object(tasks.generate_schedule_months_task, 'delay')
+
+    result = schedule_service.get_schedule_range(user.id, schedule_service.month_range('2031-01', '2031-04'))
+
+    assert [entry['month'] for entry in result['months']] == ['2031-01', '2031-02']
+    assert result['pending'] == ['2031-03', '2031-04']
+    assert generate.call_count == 1
+    delay.assert_called_once_with(user.id, [(2031, 3), (2031, 4)])
+
+    # The worker fills in the pending months, so the next sync returns them without generating inline.
+    tasks.generate_schedule_months_task(user.id, [(2031, 3), (2031, 4)])
+    assert generate.call_count == 3
+    result = schedule_service.get_schedule_range(user.id, schedule_service.month_range('2031-01', '2031-04'))
+    assert result['pending'] == [] and len(result['months']) == 4
+    assert generate.call_count == 3